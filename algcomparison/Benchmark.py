@@ -0,0 +1,290 @@
+import csv
+import gc
+import json
+import time
+import tracemalloc
+from typing import List, Dict, Any, Optional, Tuple, Set
+
+from algcomparison.algorithm.Algorithm import Algorithm
+from algcomparison.independence.IndependenceWrapper import IndependenceWrapper
+from algcomparison.simulation.Simulation import Simulation
+from algcomparison.utils.CountsIndependenceTests import CountsIndependenceTests
+from algcomparison.utils.TakesIndependenceWrapper import TakesIndependenceWrapper
+from data.DataModel import DataModel
+from data.DataType import DataType
+from graph.Endpoint import Endpoint
+from graph.Graph import Graph
+
+# The fields of a benchmark record that identify a run, so that runs can be matched against a baseline.
+KEY_FIELDS = ["simulation", "run", "num_measures", "num_edges", "sample_size", "seed", "algorithm"]
+
+# The measured fields of a benchmark record.
+RESULT_FIELDS = ["elapsed_seconds", "peak_memory_bytes", "num_independence_tests", "tests_by_depth",
+                 "num_edges_found", "adjacency_precision", "adjacency_recall", "arrowhead_precision",
+                 "arrowhead_recall"]
+
+ACCURACY_FIELDS = ["adjacency_precision", "adjacency_recall", "arrowhead_precision", "arrowhead_recall"]
+
+
+class Benchmark:
+    """
+    Runs algorithms on simulated data and records the cost of each search: the best wall time over a number of
+    repetitions, the peak memory allocated by the search, the number of independence tests in total and at each
+    depth, and the accuracy of the result against the true graph. Data are simulated from seeds, so a benchmark is
+    reproduced by running it again with the same simulations and parameters.
+
+    Every algorithm that takes an independence wrapper is run once with each wrapper that handles the data type of
+    a simulation; other algorithms are run once on each data set whose type they handle.
+
+    Records can be written to and read from CSV and JSON reports, and compared against a baseline report to flag
+    runs that got slower, used more memory, did more tests or got less accurate.
+
+    Peak memory is measured with tracemalloc, in a separate run so that tracing does not distort the times, and
+    only counts the memory allocated in this process: the workers of a concurrent search are not included.
+    """
+
+    def __init__(self, repetitions: int = 1, measure_memory: bool = True, **parameters):
+        """
+        :param repetitions: the number of timed runs of each search; the fastest is recorded.
+        :param measure_memory: if true, each search is run once more, traced, to record its peak memory.
+        :param parameters: parameters passed to every simulation and algorithm.
+        """
+        if repetitions < 1:
+            raise ValueError(f"Repetitions must be >= 1: {repetitions}")
+        self.repetitions = repetitions
+        self.measure_memory = measure_memory
+        self.parameters = parameters
+        self.simulations: List[Tuple[Simulation, Dict[str, Any]]] = []
+        self.algorithms: List[Tuple[Algorithm, Dict[str, Any]]] = []
+        self.independence_wrappers: List[IndependenceWrapper] = []
+        self.verbose = False
+
+    def add_simulation(self, simulation: Simulation, **parameters):
+        """ Adds a simulation, with its sizes ("num_measures", "num_edges", "sample_size"), "seed" and other
+        parameters, which override those of the benchmark.
+
+        """
+        self.simulations.append((simulation, parameters))
+
+    def add_algorithm(self, algorithm: Algorithm, **parameters):
+        """ Adds an algorithm, with parameters that override those of the benchmark and of the simulations.
+
+        """
+        self.algorithms.append((algorithm, parameters))
+
+    def add_independence_wrapper(self, wrapper: IndependenceWrapper):
+        self.independence_wrappers.append(wrapper)
+
+    def is_verbose(self) -> bool:
+        return self.verbose
+
+    def set_verbose(self, verbose: bool):
+        self.verbose = verbose
+
+    def run(self) -> List[Dict[str, Any]]:
+        """ Simulates the data and runs every algorithm on every data set it handles.
+
+        :return: one record per search.
+        """
+        records = []
+        for simulation, simulation_parameters in self.simulations:
+            parameters = dict(self.parameters, **simulation_parameters)
+            simulation.create_data(**parameters)
+            for run in range(simulation.get_num_data_models()):
+                dataset = simulation.get_data_model(run)
+                true_graph = simulation.get_true_graph(run)
+                for algorithm, algorithm_parameters in self.algorithms:
+                    for _ in self._configure(algorithm, simulation.get_data_type()):
+                        record = {"simulation": simulation.get_description(), "run": run,
+                                  "num_measures": len(true_graph.get_nodes()),
+                                  "num_edges": len(true_graph.get_graph_edges()),
+                                  "sample_size": parameters.get("sample_size"), "seed": parameters.get("seed"),
+                                  "algorithm": algorithm.get_description().strip()}
+                        record.update(self.run_search(algorithm, dataset, true_graph,
+                                                      **dict(parameters, **algorithm_parameters)))
+                        if self.verbose:
+                            print(f"{record['algorithm']} on {record['simulation']} (run {run}): "
+                                  f"{record['elapsed_seconds']:.3f} s, "
+                                  f"{record['num_independence_tests']} tests")
+                        records.append(record)
+        return records
+
+    def _configure(self, algorithm: Algorithm, data_type: DataType):
+        """ Yields once for each configuration of the algorithm that handles the data type, after applying it.
+
+        """
+        if isinstance(algorithm, TakesIndependenceWrapper):
+            original = algorithm.get_independence_wrapper()
+            wrappers = self.independence_wrappers if self.independence_wrappers else [original]
+            try:
+                for wrapper in wrappers:
+                    if wrapper is not None and Benchmark._handles(wrapper.get_data_type(), data_type):
+                        algorithm.set_independence_wrapper(wrapper)
+                        yield
+            finally:
+                algorithm.set_independence_wrapper(original)
+        elif Benchmark._handles(algorithm.get_data_type(), data_type):
+            yield
+
+    @classmethod
+    def _handles(cls, required: DataType, data_type: DataType) -> bool:
+        return required == DataType.All or required == data_type
+
+    def run_search(self, algorithm: Algorithm, dataset: DataModel, true_graph: Graph, **parameters) \
+            -> Dict[str, Any]:
+        """ Runs one search and measures it.
+
+        :return: the measured fields of the record of the search.
+        """
+        elapsed = float("inf")
+        graph = None
+        for _ in range(self.repetitions):
+            gc.collect()
+            start = time.perf_counter()
+            graph = algorithm.search(dataset, **parameters)
+            elapsed = min(elapsed, time.perf_counter() - start)
+
+        peak_memory = None
+        if self.measure_memory:
+            gc.collect()
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+            try:
+                base = tracemalloc.get_traced_memory()[0]
+                algorithm.search(dataset, **parameters)
+                peak_memory = tracemalloc.get_traced_memory()[1] - base
+            finally:
+                if not tracing:
+                    tracemalloc.stop()
+
+        num_tests = None
+        tests_by_depth = None
+        if isinstance(algorithm, CountsIndependenceTests):
+            num_tests = algorithm.get_num_independence_tests()
+            tests_by_depth = algorithm.get_num_independence_tests_by_depth()
+
+        record = {"elapsed_seconds": elapsed, "peak_memory_bytes": peak_memory, "num_independence_tests": num_tests,
+                  "tests_by_depth": tests_by_depth, "num_edges_found": len(graph.get_graph_edges())}
+        record.update(Benchmark.accuracy(algorithm.get_comparison_graph(true_graph), graph))
+        return record
+
+    @classmethod
+    def accuracy(cls, true_graph: Graph, graph: Graph) -> Dict[str, Optional[float]]:
+        """ Compares the adjacencies and the arrowheads of a graph with those of the true graph, matching nodes by
+        name.
+
+        :return: the adjacency and arrowhead precision and recall, None where undefined.
+        """
+        true_adjacencies, true_arrowheads = Benchmark._marks(true_graph)
+        adjacencies, arrowheads = Benchmark._marks(graph)
+
+        def ratio(a: int, b: int) -> Optional[float]:
+            return a / b if b > 0 else None
+
+        return {"adjacency_precision": ratio(len(adjacencies & true_adjacencies), len(adjacencies)),
+                "adjacency_recall": ratio(len(adjacencies & true_adjacencies), len(true_adjacencies)),
+                "arrowhead_precision": ratio(len(arrowheads & true_arrowheads), len(arrowheads)),
+                "arrowhead_recall": ratio(len(arrowheads & true_arrowheads), len(true_arrowheads))}
+
+    @classmethod
+    def _marks(cls, graph: Graph) -> Tuple[Set[frozenset], Set[Tuple[str, str]]]:
+        adjacencies = set()
+        arrowheads = set()
+        for edge in graph.get_graph_edges():
+            x = edge.get_node1().get_name()
+            y = edge.get_node2().get_name()
+            adjacencies.add(frozenset((x, y)))
+            if edge.get_endpoint2() == Endpoint.ARROW:
+                arrowheads.add((x, y))
+            if edge.get_endpoint1() == Endpoint.ARROW:
+                arrowheads.add((y, x))
+        return adjacencies, arrowheads
+
+    @classmethod
+    def write_json(cls, records: List[Dict[str, Any]], path: str):
+        with open(path, "w") as f:
+            json.dump(records, f, indent=2)
+
+    @classmethod
+    def write_csv(cls, records: List[Dict[str, Any]], path: str):
+        """ Writes the records as CSV, with the tests at each depth separated by ";".
+
+        """
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=KEY_FIELDS + RESULT_FIELDS)
+            writer.writeheader()
+            for record in records:
+                row = dict(record)
+                if row.get("tests_by_depth") is not None:
+                    row["tests_by_depth"] = ";".join(str(n) for n in row["tests_by_depth"])
+                writer.writerow({k: "" if row.get(k) is None else row[k] for k in KEY_FIELDS + RESULT_FIELDS})
+
+    @classmethod
+    def read_report(cls, path: str) -> List[Dict[str, Any]]:
+        """ Reads the records of a report written by write_json or, if path ends with ".csv", by write_csv.
+
+        """
+        if not path.endswith(".csv"):
+            with open(path) as f:
+                return json.load(f)
+        records = []
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                record: Dict[str, Any] = {}
+                for k, v in row.items():
+                    if v == "":
+                        record[k] = None
+                    elif k == "tests_by_depth":
+                        record[k] = [int(n) for n in v.split(";")]
+                    elif k in ("simulation", "algorithm"):
+                        record[k] = v
+                    else:
+                        number = float(v)
+                        record[k] = int(number) if number.is_integer() and k not in ACCURACY_FIELDS and \
+                            k != "elapsed_seconds" else number
+                records.append(record)
+        return records
+
+    @classmethod
+    def compare(cls, records: List[Dict[str, Any]], baseline: List[Dict[str, Any]], time_tolerance: float = 0.25,
+                memory_tolerance: float = 0.25, accuracy_tolerance: float = 0.) -> List[str]:
+        """ Compares records with the records of the same runs in a baseline. Runs missing from the baseline are
+        not compared.
+
+        :param records: the records of a benchmark.
+        :param baseline: the records of an earlier benchmark.
+        :param time_tolerance: the fraction by which a run may be slower than in the baseline.
+        :param memory_tolerance: the fraction by which a run may use more memory than in the baseline.
+        :param accuracy_tolerance: the amount by which a precision or recall may be lower than in the baseline.
+        :return: a description of each regression.
+        """
+        base = {Benchmark._key(record): record for record in baseline}
+        regressions = []
+        for record in records:
+            old = base.get(Benchmark._key(record))
+            if old is None:
+                continue
+            name = f"{record['algorithm']} on {record['simulation']} (run {record['run']})"
+            if record["elapsed_seconds"] > old["elapsed_seconds"] * (1 + time_tolerance):
+                regressions.append(f"{name}: time {old['elapsed_seconds']:.3f} s -> "
+                                   f"{record['elapsed_seconds']:.3f} s")
+            if record.get("peak_memory_bytes") is not None and old.get("peak_memory_bytes") is not None and \
+                    record["peak_memory_bytes"] > old["peak_memory_bytes"] * (1 + memory_tolerance):
+                regressions.append(f"{name}: peak memory {old['peak_memory_bytes']} -> "
+                                   f"{record['peak_memory_bytes']} bytes")
+            if record.get("num_independence_tests") is not None and old.get("num_independence_tests") is not None \
+                    and record["num_independence_tests"] > old["num_independence_tests"]:
+                regressions.append(f"{name}: independence tests {old['num_independence_tests']} -> "
+                                   f"{record['num_independence_tests']}")
+            for field in ACCURACY_FIELDS:
+                if record.get(field) is not None and old.get(field) is not None and \
+                        record[field] < old[field] - accuracy_tolerance:
+                    regressions.append(f"{name}: {field} {old[field]:.3f} -> {record[field]:.3f}")
+        return regressions
+
+    @classmethod
+    def _key(cls, record: Dict[str, Any]) -> Tuple:
+        return tuple(record.get(k) for k in KEY_FIELDS)
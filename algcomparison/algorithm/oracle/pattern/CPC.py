@@ -1,6 +1,7 @@
 from typing import List, Optional
 
 from algcomparison.algorithm.Algorithm import Algorithm
+from algcomparison.utils.CountsIndependenceTests import CountsIndependenceTests
 from algcomparison.utils.HasKnowledge import HasKnowledge
 from algcomparison.utils.TakesInitialGraph import TakesInitialGraph
 from algcomparison.utils.TakesIndependenceWrapper import TakesIndependenceWrapper
@@ -13,9 +14,11 @@ from search.SearchGraphUtils import SearchGraphUtils
 from graph.EdgeListGraph import EdgeListGraph
 from search.PcAll import PcAll, FasType, ColliderDiscovery, Concurrent
 from search.ConflictRule import ConflictRule
+from search.GeneralResamplingTest import GeneralResamplingTest
+from search.ResamplingEdgeEnsemble import ResamplingEdgeEnsemble
 
 
-class CPC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
+class CPC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper, CountsIndependenceTests):
     """
     CPC
     """
@@ -25,16 +28,20 @@ class CPC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
         self.algorithm = algorithm
         self.initial_graph: Optional[Graph] = None
         self.knowledge: Optional[IKnowledge] = None
+        self.last_search: Optional[PcAll] = None
 
     def search(self, dataset: DataModel, **parameters) -> Graph:
-        # if parameters["number_resampling"] < 1:
+        if parameters.get("number_resampling", 0) > 0:
+            return self._resampling_search(dataset, **parameters)
+
         collider_discovery: ColliderDiscovery = parameters.get("collider_discovery_rule", ColliderDiscovery.FAS_SEPSETS)
         conflict_rule: ConflictRule = parameters.get("conflict_rule", ConflictRule.OVERWRITE)
 
         search = PcAll(self.test.get_test(dataset, **parameters), self.initial_graph)
-        search.set_depth(parameters.get("depth"))
+        search.set_depth(parameters.get("depth", -1))
         search.set_heuristic(parameters.get("fas_heuristic", 0))
-        search.set_knowledge(self.knowledge)
+        if self.knowledge is not None:
+            search.set_knowledge(self.knowledge)
         if parameters.get("stable_FAS", False):
             search.set_fas_type(FasType.STABLE)
         else:
@@ -49,29 +56,25 @@ class CPC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
         search.set_max_path_length(parameters.get("max_p_orientation_max_path_length", 0))
         search.set_verbose(parameters.get("verbose"))
 
+        self.last_search = search
         return search.search()
 
-        # else:
-        #     algorithm = Pc(self.test, self.algorithm)
-        #     data = dataset
-        #     search = GeneralResamplingTest(data, algorithm, parameters.get("number_resampling"))
-        #     search.set_knowledge(self.knowledge)
-        #     search.setPercentResampleSize(parameters.get("percentResampleSize"))
-        #     search.setResamplingWithReplacement(parameters.get("resamplingWithReplacement"))
-        #     edge_ensemble = parameters.get("resamplingEnsemble", 1)
-        #     if edge_ensemble == 0:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Preserved
-        #     elif edge_ensemble == 1:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Highest
-        #     elif edge_ensemble == 2:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Majority
-        #     else:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Highest
-        #     search.setEdgeEnsemble(edge_ensemble)
-        #     search.setAddOriginalDataset(parameters.get("addOriginalDataset"))
-        #     search.set_verbose(parameters.get("verbose"))
-        #     search.setParameters(**parameters)
-        #     return search.search()
+    def _resampling_search(self, dataset: DataModel, **parameters) -> Graph:
+        algorithm = CPC(self.test, self.algorithm)
+        algorithm.set_initial_graph(self.initial_graph)
+        search = GeneralResamplingTest(dataset, algorithm, parameters["number_resampling"])
+        search.set_knowledge(self.knowledge)
+        search.set_percent_resample_size(parameters.get("percent_resample_size", 100))
+        search.set_resampling_with_replacement(parameters.get("resampling_with_replacement", True))
+        search.set_edge_ensemble(ResamplingEdgeEnsemble.from_parameter(parameters.get("resampling_ensemble", 1)))
+        search.set_add_original_dataset(parameters.get("add_original_dataset", False))
+        search.set_seed(parameters.get("resampling_seed"))
+        if parameters.get("resampling_workers"):
+            search.set_num_workers(parameters["resampling_workers"])
+        search.set_verbose(parameters.get("verbose", False))
+        search.set_parameters(**dict(parameters, number_resampling=0))
+        self.last_search = None
+        return search.search()
 
     def get_comparison_graph(self, graph: Graph) -> Graph:
         return SearchGraphUtils.pattern_for_dag(EdgeListGraph(graph, nodes=None))
@@ -79,7 +82,7 @@ class CPC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
     def get_description(self) -> str:
         independence_desc = "no independence test" if not self.test else self.test.get_description()
         algorithm_desc = "" if not self.algorithm else f"with initial graph from {self.algorithm.get_description()}"
-        return f"PC using {independence_desc} {algorithm_desc}"
+        return f"CPC using {independence_desc} {algorithm_desc}"
 
     def get_data_type(self) -> DataType:
         return self.test.get_data_type()
@@ -87,7 +90,9 @@ class CPC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
     def get_parameters(self) -> List[str]:
         parameters = ["depth", "stable_FAS", "concurrent_FAS", "collider_discovery_rule", "collider_discovery_rule",
                       "conflict_rule", "fas_heuristic", "use_max_p_orientation_heuristic",
-                      "max_p_orientation_max_path_length", "verbose"]
+                      "max_p_orientation_max_path_length", "verbose", "number_resampling", "percent_resample_size",
+                      "resampling_with_replacement", "resampling_ensemble", "add_original_dataset", "resampling_seed",
+                      "resampling_workers"]
         return parameters
 
     def get_initial_graph(self) -> Graph:
@@ -110,3 +115,9 @@ class CPC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
 
     def get_independence_wrapper(self) -> IndependenceWrapper:
         return self.test
+
+    def get_num_independence_tests(self) -> int:
+        return self.last_search.get_num_independence_tests() if self.last_search else 0
+
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        return self.last_search.get_num_independence_tests_by_depth() if self.last_search else []
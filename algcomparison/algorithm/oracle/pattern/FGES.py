@@ -0,0 +1,111 @@
+from typing import List, Optional
+
+from algcomparison.algorithm.Algorithm import Algorithm
+from algcomparison.algorithm.score.ScoreWrapper import ScoreWrapper
+from algcomparison.utils.HasKnowledge import HasKnowledge
+from algcomparison.utils.TakesInitialGraph import TakesInitialGraph
+from algcomparison.utils.UsesScoreWrapper import UsesScoreWrapper
+from data.DataModel import DataModel
+from data.DataType import DataType
+from data.IKnowledge import IKnowledge
+from graph.EdgeListGraph import EdgeListGraph
+from graph.Graph import Graph
+from search.Fges import Fges
+from search.FgesMb import FgesMb
+from search.GeneralResamplingTest import GeneralResamplingTest
+from search.ResamplingEdgeEnsemble import ResamplingEdgeEnsemble
+from search.SearchGraphUtils import SearchGraphUtils
+
+
+class FGES(Algorithm, TakesInitialGraph, HasKnowledge, UsesScoreWrapper):
+    """
+    FGES, or with "targets" (names of variables, comma separated) FGES-MB, the Markov blanket of the targets.
+    """
+
+    def __init__(self, score: Optional[ScoreWrapper] = None, algorithm: Optional[Algorithm] = None):
+        self.score = score
+        self.algorithm = algorithm
+        self.initial_graph: Optional[Graph] = None
+        self.knowledge: Optional[IKnowledge] = None
+        self.last_search: Optional[Fges] = None
+
+    def search(self, dataset: DataModel, **parameters) -> Graph:
+        if parameters.get("number_resampling", 0) > 0:
+            return self._resampling_search(dataset, **parameters)
+
+        score = self.score.get_score(dataset, **parameters)
+        targets = parameters.get("targets")
+        if targets:
+            if isinstance(targets, str):
+                targets = [name.strip() for name in targets.split(",") if name.strip()]
+            search = FgesMb(score)
+            nodes = [score.get_variable(name) for name in targets]
+            if None in nodes:
+                raise ValueError(f"Unknown targets: {[name for name, n in zip(targets, nodes) if n is None]}")
+            search.set_targets(nodes)
+        else:
+            search = Fges(score)
+        if self.knowledge is not None:
+            search.set_knowledge(self.knowledge)
+        search.set_initial_graph(self.initial_graph)
+        search.set_faithfulness_assumed(parameters.get("faithfulness_assumed", False))
+        search.set_max_degree(parameters.get("max_degree", -1))
+        search.set_num_workers(parameters.get("num_workers") or 1)
+        search.set_verbose(parameters.get("verbose", False))
+        self.last_search = search
+        return search.search()
+
+    def _resampling_search(self, dataset: DataModel, **parameters) -> Graph:
+        algorithm = FGES(self.score, self.algorithm)
+        algorithm.set_initial_graph(self.initial_graph)
+        search = GeneralResamplingTest(dataset, algorithm, parameters["number_resampling"])
+        search.set_knowledge(self.knowledge)
+        search.set_percent_resample_size(parameters.get("percent_resample_size", 100))
+        search.set_resampling_with_replacement(parameters.get("resampling_with_replacement", True))
+        search.set_edge_ensemble(ResamplingEdgeEnsemble.from_parameter(parameters.get("resampling_ensemble", 1)))
+        search.set_add_original_dataset(parameters.get("add_original_dataset", False))
+        search.set_seed(parameters.get("resampling_seed"))
+        if parameters.get("resampling_workers"):
+            search.set_num_workers(parameters["resampling_workers"])
+        search.set_verbose(parameters.get("verbose", False))
+        search.set_parameters(**dict(parameters, number_resampling=0))
+        self.last_search = None
+        return search.search()
+
+    def get_comparison_graph(self, graph: Graph) -> Graph:
+        return SearchGraphUtils.pattern_for_dag(EdgeListGraph(graph, nodes=None))
+
+    def get_description(self) -> str:
+        score_desc = "no score" if not self.score else self.score.get_description()
+        algorithm_desc = "" if not self.algorithm else f" with initial graph from {self.algorithm.get_description()}"
+        return f"FGES (Fast Greedy Equivalence Search) using {score_desc}{algorithm_desc}"
+
+    def get_data_type(self) -> DataType:
+        return self.score.get_data_type()
+
+    def get_parameters(self) -> List[str]:
+        parameters = ["faithfulness_assumed", "max_degree", "num_workers", "targets", "verbose", "number_resampling",
+                      "percent_resample_size", "resampling_with_replacement", "resampling_ensemble",
+                      "add_original_dataset", "resampling_seed", "resampling_workers"]
+        return parameters
+
+    def get_initial_graph(self) -> Graph:
+        return self.initial_graph
+
+    def set_initial_graph(self, graph: Graph):
+        self.initial_graph = graph
+
+    def set_initial_graph_from_algorithm(self, algorithm: Algorithm):
+        self.algorithm = algorithm
+
+    def get_knowledge(self) -> IKnowledge:
+        return self.knowledge
+
+    def set_knowledge(self, knowledge: IKnowledge):
+        self.knowledge = knowledge
+
+    def set_score_wrapper(self, score: ScoreWrapper):
+        self.score = score
+
+    def get_score_wrapper(self) -> ScoreWrapper:
+        return self.score
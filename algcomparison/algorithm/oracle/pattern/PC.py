@@ -1,6 +1,7 @@
 from typing import List, Optional
 
 from algcomparison.algorithm.Algorithm import Algorithm
+from algcomparison.utils.CountsIndependenceTests import CountsIndependenceTests
 from algcomparison.utils.HasKnowledge import HasKnowledge
 from algcomparison.utils.TakesInitialGraph import TakesInitialGraph
 from algcomparison.utils.TakesIndependenceWrapper import TakesIndependenceWrapper
@@ -13,9 +14,11 @@ from search.SearchGraphUtils import SearchGraphUtils
 from graph.EdgeListGraph import EdgeListGraph
 from search.PcAll import PcAll, FasType, ColliderDiscovery, Concurrent
 from search.ConflictRule import ConflictRule
+from search.GeneralResamplingTest import GeneralResamplingTest
+from search.ResamplingEdgeEnsemble import ResamplingEdgeEnsemble
 
 
-class PC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
+class PC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper, CountsIndependenceTests):
     """
     PC
     """
@@ -25,40 +28,40 @@ class PC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
         self.algorithm = algorithm
         self.initial_graph: Optional[Graph] = None
         self.knowledge: Optional[IKnowledge] = None
+        self.last_search: Optional[PcAll] = None
 
     def search(self, dataset: DataModel, **parameters) -> Graph:
-        # if parameters["number_resampling"] < 1:
+        if parameters.get("number_resampling", 0) > 0:
+            return self._resampling_search(dataset, **parameters)
+
         search = PcAll(self.test.get_test(dataset, **parameters), self.initial_graph)
-        search.set_depth(parameters.get("depth"))
-        search.set_knowledge(self.knowledge)
+        search.set_depth(parameters.get("depth", -1))
+        if self.knowledge is not None:
+            search.set_knowledge(self.knowledge)
         search.set_conflict_rule(ConflictRule.PRIORITY)
         search.set_verbose(parameters.get("verbose"))
         search.set_collider_discovery(ColliderDiscovery.FAS_SEPSETS)
         search.set_fas_type(FasType.REGULAR)
         search.set_concurrent(Concurrent.NO)
+        self.last_search = search
         return search.search()
 
-        # else:
-        #     algorithm = Pc(self.test)
-        #     data = dataset
-        #     search = GeneralResamplingTest(data, algorithm, parameters.get("number_resampling"))
-        #     search.set_knowledge(self.knowledge)
-        #     search.setPercentResampleSize(parameters.get("percentResampleSize"))
-        #     search.setResamplingWithReplacement(parameters.get("resamplingWithReplacement"))
-        #     edge_ensemble = parameters.get("resamplingEnsemble", 1)
-        #     if edge_ensemble == 0:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Preserved
-        #     elif edge_ensemble == 1:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Highest
-        #     elif edge_ensemble == 2:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Majority
-        #     else:
-        #         edge_ensemble = ResamplingEdgeEnsemble.Highest
-        #     search.setEdgeEnsemble(edge_ensemble)
-        #     search.setAddOriginalDataset(parameters.get("addOriginalDataset"))
-        #     search.set_verbose(parameters.get("verbose"))
-        #     search.setParameters(**parameters)
-        #     return search.search()
+    def _resampling_search(self, dataset: DataModel, **parameters) -> Graph:
+        algorithm = PC(self.test, self.algorithm)
+        algorithm.set_initial_graph(self.initial_graph)
+        search = GeneralResamplingTest(dataset, algorithm, parameters["number_resampling"])
+        search.set_knowledge(self.knowledge)
+        search.set_percent_resample_size(parameters.get("percent_resample_size", 100))
+        search.set_resampling_with_replacement(parameters.get("resampling_with_replacement", True))
+        search.set_edge_ensemble(ResamplingEdgeEnsemble.from_parameter(parameters.get("resampling_ensemble", 1)))
+        search.set_add_original_dataset(parameters.get("add_original_dataset", False))
+        search.set_seed(parameters.get("resampling_seed"))
+        if parameters.get("resampling_workers"):
+            search.set_num_workers(parameters["resampling_workers"])
+        search.set_verbose(parameters.get("verbose", False))
+        search.set_parameters(**dict(parameters, number_resampling=0))
+        self.last_search = None
+        return search.search()
 
     def get_comparison_graph(self, graph: Graph) -> Graph:
         return SearchGraphUtils.pattern_for_dag(EdgeListGraph(graph, nodes=None))
@@ -72,7 +75,8 @@ class PC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
         return self.test.get_data_type()
 
     def get_parameters(self) -> List[str]:
-        parameters = ["depth", "verbose"]
+        parameters = ["depth", "verbose", "number_resampling", "percent_resample_size", "resampling_with_replacement",
+                      "resampling_ensemble", "add_original_dataset", "resampling_seed", "resampling_workers"]
         return parameters
 
     def get_initial_graph(self) -> Graph:
@@ -95,3 +99,9 @@ class PC(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
 
     def get_independence_wrapper(self) -> IndependenceWrapper:
         return self.test
+
+    def get_num_independence_tests(self) -> int:
+        return self.last_search.get_num_independence_tests() if self.last_search else 0
+
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        return self.last_search.get_num_independence_tests_by_depth() if self.last_search else []
@@ -2,6 +2,7 @@ from typing import List, Optional
 
 from algcomparison.algorithm.Algorithm import Algorithm
 from algcomparison.independence.IndependenceWrapper import IndependenceWrapper
+from algcomparison.utils.CountsIndependenceTests import CountsIndependenceTests
 from algcomparison.utils.HasKnowledge import HasKnowledge
 from algcomparison.utils.TakesIndependenceWrapper import TakesIndependenceWrapper
 from algcomparison.utils.TakesInitialGraph import TakesInitialGraph
@@ -11,16 +12,19 @@ from data.IKnowledge import IKnowledge
 from graph.EdgeListGraph import EdgeListGraph
 from graph.Graph import Graph
 from search.ConflictRule import ConflictRule
+from search.GeneralResamplingTest import GeneralResamplingTest
 from search.PcAll import ColliderDiscovery, PcAll, FasType, Concurrent
+from search.ResamplingEdgeEnsemble import ResamplingEdgeEnsemble
 from search.SearchGraphUtils import SearchGraphUtils
 
 
-class PCAll(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper):
+class PCAll(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper, CountsIndependenceTests):
     def __init__(self, test: Optional[IndependenceWrapper] = None, algorithm: Optional[Algorithm] = None):
         self.test = test
         self.algorithm = algorithm
         self.initial_graph: Optional[Graph] = None
         self.knowledge: Optional[IKnowledge] = None
+        self.last_search: Optional[PcAll] = None
 
     def get_comparison_graph(self, graph: Graph) -> Graph:
         return SearchGraphUtils.pattern_for_dag(EdgeListGraph(graph, nodes=None))
@@ -35,7 +39,9 @@ class PCAll(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper
 
     def get_parameters(self) -> List[str]:
         parameters = ["stableFAS", "concurrentFAS", "colliderDiscoveryRule", "conflictRule", "depth", "fasHeuristic",
-                      "useMaxPOrientationHeuristic", "maxPOrientationMaxPathLength", "verbose"]
+                      "useMaxPOrientationHeuristic", "maxPOrientationMaxPathLength", "verbose", "number_resampling",
+                      "percent_resample_size", "resampling_with_replacement", "resampling_ensemble",
+                      "add_original_dataset", "resampling_seed", "resampling_workers"]
         return parameters
 
     def get_initial_graph(self) -> Graph:
@@ -60,7 +66,7 @@ class PCAll(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper
         return self.test
 
     def search(self, dataset: DataModel, **parameters) -> Graph:
-        if parameters.get("numberResampling", 0) < 1:
+        if parameters.get("number_resampling", 0) < 1:
             collider_discovery_rule = parameters.get("colliderDiscoveryRule", 0)
             if collider_discovery_rule == 1:
                 collider_discovery = ColliderDiscovery.FAS_SEPSETS
@@ -82,9 +88,10 @@ class PCAll(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper
                 raise ValueError("conflictRule should in [1, 2, 3]")
 
             search = PcAll(self.test.get_test(dataset, **parameters), self.initial_graph)
-            search.set_depth(parameters.get("depth"))
-            search.set_heuristic(parameters.get("fasHeuristic"))
-            search.set_knowledge(self.knowledge)
+            search.set_depth(parameters.get("depth", -1))
+            search.set_heuristic(parameters.get("fasHeuristic", 0))
+            if self.knowledge is not None:
+                search.set_knowledge(self.knowledge)
 
             if parameters.get("stableFAS", False):
                 search.set_fas_type(FasType.STABLE)
@@ -100,32 +107,29 @@ class PCAll(Algorithm, TakesInitialGraph, HasKnowledge, TakesIndependenceWrapper
             search.set_conflict_rule(conflict_rule)
             search.set_use_heuristic(parameters.get("useMaxPOrientationHeuristic", False))
             search.set_max_path_length(parameters.get("maxPOrientationMaxPathLength", 0))
-            search.set_verbose(parameters.getBoolean("verbose", False))
+            search.set_verbose(parameters.get("verbose", False))
 
+            self.last_search = search
             return search.search()
         else:
-            raise ValueError("have not implement resampling algorithm")
-            # pcAll = PCAll(self.test, self.algorithm)
-            # if self.initial_graph:
-            #     pcAll.set_initial_graph(self.initial_graph)
-            # search = GeneralResamplingTest(dataset, pcAll, parameters.get("numberResampling", 0))
-            # search.set_knowledge(self.knowledge)
-            #
-            # search.setPercentResampleSize(parameters.get("percentResampleSize", 1.0))
-            # search.setResamplingWithReplacement(parameters.get("resamplingWithReplacement", False))
-            #
-            # edge_ensemble = ResamplingEdgeEnsemble.Highest
-            # resampling_ensemble = parameters.get("resamplingEnsemble", 1)
-            # if resampling_ensemble == 0:
-            #     edge_ensemble = ResamplingEdgeEnsemble.Preserved
-            # elif resampling_ensemble == 1:
-            #     edge_ensemble = ResamplingEdgeEnsemble.Highest
-            # elif resampling_ensemble == 2:
-            #     edge_ensemble = ResamplingEdgeEnsemble.Majority
-            #
-            # search.setEdgeEnsemble(edge_ensemble)
-            # search.setAddOriginalDataset(parameters.get("addOriginalDataset", False))
-            #
-            # search.setParameters(**parameters)
-            # search.setVerbose(parameters.getBoolean("verbose", False))
-            # return search.search()
+            pc_all = PCAll(self.test, self.algorithm)
+            pc_all.set_initial_graph(self.initial_graph)
+            search = GeneralResamplingTest(dataset, pc_all, parameters["number_resampling"])
+            search.set_knowledge(self.knowledge)
+            search.set_percent_resample_size(parameters.get("percent_resample_size", 100))
+            search.set_resampling_with_replacement(parameters.get("resampling_with_replacement", True))
+            search.set_edge_ensemble(ResamplingEdgeEnsemble.from_parameter(parameters.get("resampling_ensemble", 1)))
+            search.set_add_original_dataset(parameters.get("add_original_dataset", False))
+            search.set_seed(parameters.get("resampling_seed"))
+            if parameters.get("resampling_workers"):
+                search.set_num_workers(parameters["resampling_workers"])
+            search.set_verbose(parameters.get("verbose", False))
+            search.set_parameters(**dict(parameters, number_resampling=0))
+            self.last_search = None
+            return search.search()
+
+    def get_num_independence_tests(self) -> int:
+        return self.last_search.get_num_independence_tests() if self.last_search else 0
+
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        return self.last_search.get_num_independence_tests_by_depth() if self.last_search else []
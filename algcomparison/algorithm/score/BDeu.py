@@ -0,0 +1,30 @@
+from typing import List
+
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.DataType import DataType
+from search.BDeuScore import BDeuScore
+from search.Score import Score
+from .ScoreWrapper import ScoreWrapper
+
+
+class BDeu(ScoreWrapper):
+    """
+    Wrapper for the BDeu score of discrete Bayes nets.
+    """
+
+    def get_description(self) -> str:
+        return "BDeu Score"
+
+    def get_parameters(self) -> List[str]:
+        return ["sample_prior", "structure_prior", "score_cache_size"]
+
+    def get_data_type(self) -> DataType:
+        return DataType.Discrete
+
+    def get_score(self, dataset: DataModel, **parameters) -> Score:
+        if not isinstance(dataset, DataSet):
+            raise ValueError("Expecting a data set.")
+        return BDeuScore(dataset, sample_prior=parameters.get("sample_prior", 1.),
+                         structure_prior=parameters.get("structure_prior", 1.),
+                         cache_size=parameters.get("score_cache_size", 100000))
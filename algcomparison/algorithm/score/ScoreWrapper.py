@@ -1,5 +1,5 @@
 from typing import List
-from data import DataModel
+from data.DataModel import DataModel
 from algcomparison.utils.HasParameters import HasParameters
 from data.DataType import DataType
 from graph.Node import Node
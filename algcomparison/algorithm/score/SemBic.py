@@ -0,0 +1,26 @@
+from typing import List
+
+from data.DataModel import DataModel
+from data.DataType import DataType
+from search.Score import Score
+from search.SemBicScore import SemBicScore
+from .ScoreWrapper import ScoreWrapper
+
+
+class SemBic(ScoreWrapper):
+    """
+    Wrapper for the linear, Gaussian SEM BIC score.
+    """
+
+    def get_description(self) -> str:
+        return "Sem BIC Score"
+
+    def get_parameters(self) -> List[str]:
+        return ["penalty_discount", "score_cache_size"]
+
+    def get_data_type(self) -> DataType:
+        return DataType.Continuous
+
+    def get_score(self, dataset: DataModel, **parameters) -> Score:
+        return SemBicScore(dataset, penalty_discount=parameters.get("penalty_discount", 1.),
+                           cache_size=parameters.get("score_cache_size", 100000))
@@ -0,0 +1,40 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from algcomparison.graph.RandomGraph import RandomGraph
+from graph.Graph import Graph
+from graph.SparseDag import SparseDag
+
+
+class RandomForward(RandomGraph):
+    """
+    Random DAG with a given number of edges, drawn uniformly among the pairs of nodes and directed forward along a
+    random order of the nodes.
+    """
+
+    def create_graph(self, rng: np.random.Generator, **parameters) -> Graph:
+        return self.create_dag(rng, **parameters).to_graph()
+
+    def create_dag(self, rng: np.random.Generator, **parameters) -> SparseDag:
+        """
+        return the random DAG as a SparseDag, for graphs too large to be built as a Graph.
+        """
+        num_measures = parameters.get("num_measures", 10)
+        num_edges = parameters.get("num_edges", num_measures)
+        return SparseDag.random_forward(rng, num_measures, num_edges)
+
+    @classmethod
+    def forward_edges(cls, rng: np.random.Generator, num_nodes: int, num_edges: int) -> List[Tuple[int, int]]:
+        """ Draws num_edges distinct pairs of nodes and directs each along a random order of the nodes.
+
+        :return: the edges as (from, to) node indices.
+        """
+        dag = SparseDag.random_forward(rng, num_nodes, num_edges)
+        return list(zip(dag.get_sources().tolist(), dag.get_targets().tolist()))
+
+    def get_description(self) -> str:
+        return "Graph constructed by adding random forward edges"
+
+    def get_parameters(self) -> List[str]:
+        return ["num_measures", "num_edges"]
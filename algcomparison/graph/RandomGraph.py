@@ -0,0 +1,33 @@
+import numpy as np
+
+from algcomparison.utils.HasParameters import HasParameters
+from graph.Graph import Graph
+from graph.SparseDag import SparseDag
+
+
+class RandomGraph(HasParameters):
+    """
+    Interface for a random graph generator.
+    """
+
+    def create_graph(self, rng: np.random.Generator, **parameters) -> Graph:
+        """ Creates a random graph.
+
+        :param rng: the source of randomness, so that graphs can be reproduced from a seed.
+        :param parameters: the parameters of the graph.
+        :return: the graph
+        """
+        raise NotImplementedError
+
+    def create_dag(self, rng: np.random.Generator, **parameters) -> SparseDag:
+        """ Creates a random DAG as a SparseDag. Generators of large graphs should draw it directly; by default
+        the graph of create_graph() is converted.
+
+        """
+        return SparseDag.from_graph(self.create_graph(rng, **parameters))
+
+    def get_description(self) -> str:
+        """ Returns a short one-line description of this graph type.
+
+        """
+        raise NotImplementedError
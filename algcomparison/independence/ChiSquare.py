@@ -0,0 +1,30 @@
+from typing import List
+
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.DataType import DataType
+from search.idt.IndTestChiSquare import IndTestChiSquare
+from search.idt.IndependenceTest import IndependenceTest
+from .IndependenceWrapper import IndependenceWrapper
+
+
+class ChiSquare(IndependenceWrapper):
+    """
+    Wrapper for Chi Square test.
+    """
+
+    def get_description(self) -> str:
+        return "Chi Square test"
+
+    def get_parameters(self) -> List[str]:
+        return ["alpha", "table_cache_bytes", "cache_independence_tests", "cache_size", "cache_path"]
+
+    def get_data_type(self) -> DataType:
+        return DataType.Discrete
+
+    def get_test(self, dataset: DataModel, **parameters) -> IndependenceTest:
+        if not isinstance(dataset, DataSet):
+            raise ValueError("Expecting a data set.")
+        test = IndTestChiSquare(dataset, alpha=parameters.get("alpha", 0.05),
+                          table_cache_bytes=parameters.get("table_cache_bytes", 0))
+        return self.cache_test(test, **parameters)
@@ -0,0 +1,29 @@
+from typing import List
+
+from data.DataModel import DataModel
+from data.DataType import DataType
+from graph.Graph import Graph
+from search.idt.IndTestDSeparation import IndTestDSeparation
+from search.idt.IndependenceTest import IndependenceTest
+from .IndependenceWrapper import IndependenceWrapper
+
+
+class DSeparationTest(IndependenceWrapper):
+    """
+    Wrapper for the d-separation test, which answers from a true graph instead of data.
+    """
+
+    def __init__(self, graph: Graph):
+        self.graph = graph
+
+    def get_description(self) -> str:
+        return "D-separation oracle"
+
+    def get_parameters(self) -> List[str]:
+        return []
+
+    def get_data_type(self) -> DataType:
+        return DataType.Graph
+
+    def get_test(self, dataset: DataModel, **parameters) -> IndependenceTest:
+        return IndTestDSeparation(self.graph)
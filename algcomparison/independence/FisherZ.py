@@ -18,7 +18,7 @@ class FisherZ(IndependenceWrapper):
         return "Fisher Z test"
 
     def get_parameters(self) -> List[str]:
-        return ["alpha"]
+        return ["alpha", "missing_data", "cache_independence_tests", "cache_size", "cache_path"]
 
     def get_data_type(self) -> DataType:
         return DataType.Continuous
@@ -26,7 +26,8 @@ class FisherZ(IndependenceWrapper):
     def get_test(self, dataset: DataModel, **parameters) -> IndependenceTest:
         alpha = parameters.get("alpha", 0)
         if isinstance(dataset, CovarianceMatrix):
-            return IndTestFisherZ(dataset, alpha)
+            return self.cache_test(IndTestFisherZ(dataset, alpha=alpha), **parameters)
         elif isinstance(dataset, DataSet):
-            return IndTestFisherZ(dataset, alpha)
+            missing_data = parameters.get("missing_data", IndTestFisherZ.TESTWISE_DELETION)
+            return self.cache_test(IndTestFisherZ(dataset, alpha=alpha, missing_data=missing_data), **parameters)
         raise ValueError("Expecting either a data set or a covariance matrix.")
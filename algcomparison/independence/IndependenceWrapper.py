@@ -1,5 +1,6 @@
 from typing import List
 from search.idt.IndependenceTest import IndependenceTest
+from search.idt.CachedIndependenceTest import CachedIndependenceTest
 from algcomparison.utils.HasParameters import HasParameters
 from data.DataType import DataType
 from data.DataModel import DataModel
@@ -34,3 +35,14 @@ class IndependenceWrapper(HasParameters):
         """ Returns Independence Test instance
         """
         raise NotImplementedError
+
+    def cache_test(self, test: IndependenceTest, **parameters) -> IndependenceTest:
+        """ Wraps the test in a CachedIndependenceTest if the "cache_independence_tests" parameter is set.
+        The cache keeps at most "cache_size" facts; if "cache_path" is given, it is loaded from that file and saved
+        back to it when the search (PcAll) finishes.
+
+        :return: the test, cached or not
+        """
+        if not parameters.get("cache_independence_tests", False):
+            return test
+        return CachedIndependenceTest(test, parameters.get("cache_size", 100000), parameters.get("cache_path"))
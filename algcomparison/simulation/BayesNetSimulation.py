@@ -0,0 +1,86 @@
+from typing import List
+
+import numpy as np
+from pandas import DataFrame
+
+from algcomparison.graph.RandomGraph import RandomGraph
+from algcomparison.simulation.Simulation import Simulation
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.DataType import DataType
+from graph.Graph import Graph
+
+
+class BayesNetSimulation(Simulation):
+    """
+    Simulates discrete data from a Bayes net over a random DAG. Each variable has between min_categories and
+    max_categories categories, and the distribution of a variable given each combination of values of its parents
+    is drawn from a flat Dirichlet distribution.
+    """
+
+    def __init__(self, graph: RandomGraph):
+        self.random_graph = graph
+        self.graphs: List[Graph] = []
+        self.datasets: List[DataSet] = []
+
+    def create_data(self, **parameters):
+        rng = np.random.default_rng(parameters.get("seed"))
+        self.graphs = []
+        self.datasets = []
+        for _ in range(parameters.get("num_runs", 1)):
+            graph = self.random_graph.create_graph(rng, **parameters)
+            self.graphs.append(graph)
+            self.datasets.append(BayesNetSimulation.simulate(graph, rng, **parameters))
+
+    @classmethod
+    def simulate(cls, graph: Graph, rng: np.random.Generator, **parameters) -> DataSet:
+        """ Simulates a data set of "sample_size" rows from a random Bayes net over the given DAG.
+
+        Values are sampled one variable at a time in causal order: the rows are numbered by the combination of
+        values of the parents, and each row draws its category from the cumulative probabilities of its
+        combination. Distributions are only drawn for the combinations that occur in the data.
+        """
+        sample_size = parameters.get("sample_size", 1000)
+        min_categories = parameters.get("min_categories", 2)
+        max_categories = parameters.get("max_categories", 3)
+        if min_categories < 2 or max_categories < min_categories:
+            raise ValueError(f"Expecting 2 <= min_categories <= max_categories: {min_categories}, {max_categories}")
+
+        nodes = graph.get_nodes()
+        index = {node: i for i, node in enumerate(nodes)}
+        num_categories = rng.integers(min_categories, max_categories + 1, size=len(nodes))
+        data = np.empty((sample_size, len(nodes)), dtype=np.int32, order="F")
+        for node in graph.get_causal_ordering():
+            j = index[node]
+            c = int(num_categories[j])
+            configuration = np.zeros(sample_size, dtype=np.int64)
+            for p in (index[p] for p in graph.get_parents(node)):
+                configuration *= num_categories[p]
+                configuration += data[:, p]
+            # Only the combinations that occur need a distribution.
+            _, configuration = np.unique(configuration, return_inverse=True)
+            num_configurations = int(configuration.max()) + 1 if sample_size > 0 else 0
+            cumulative = np.cumsum(rng.dirichlet(np.ones(c), size=num_configurations), axis=1)
+            u = rng.random(sample_size)
+            values = (u[:, None] > cumulative[configuration.reshape(-1)]).sum(axis=1)
+            data[:, j] = np.minimum(values, c - 1)
+        return DataSet(DataFrame(data, columns=[node.get_name() for node in nodes]), nodes)
+
+    def get_num_data_models(self) -> int:
+        return len(self.datasets)
+
+    def get_true_graph(self, index: int) -> Graph:
+        return self.graphs[index]
+
+    def get_data_model(self, index: int) -> DataModel:
+        return self.datasets[index]
+
+    def get_description(self) -> str:
+        return f"Bayes net simulation using {self.random_graph.get_description()}"
+
+    def get_data_type(self) -> DataType:
+        return DataType.Discrete
+
+    def get_parameters(self) -> List[str]:
+        return self.random_graph.get_parameters() + ["num_runs", "sample_size", "min_categories", "max_categories",
+                                                     "seed"]
@@ -0,0 +1,226 @@
+from typing import List, Optional, Iterator, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from pandas import DataFrame
+
+from algcomparison.graph.RandomGraph import RandomGraph
+from algcomparison.simulation.Simulation import Simulation
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.DataType import DataType
+from graph.Graph import Graph
+from graph.Node import Node
+from graph.SparseDag import SparseDag
+
+
+class LargeScaleBayesNet(Simulation):
+    """
+    Simulates discrete data from a Bayes net, with the parameters of BayesNetSimulation, over DAGs held as
+    SparseDag's, for models of many thousands of variables.
+
+    The distribution of a variable given a combination of values of its parents is a flat Dirichlet draw, made
+    from exponential variates that are a hash of the variable, the combination and the category. Conditional
+    probability tables are thus never stored, and are the same in every chunk of rows. The rows are simulated in
+    chunks, as in LargeScaleSimulation; in a chunk, the combinations of parent values of the variables of a layer
+    of the DAG are numbered together by one sparse product of the parent values with their mixed-radix strides, and
+    the variables are then sampled together, a group of at most CHUNK_CELLS values at a time.
+    """
+
+    CHUNK_CELLS = 1 << 24
+
+    def __init__(self, graph: RandomGraph):
+        self.random_graph = graph
+        self.dags: List[SparseDag] = []
+        self.variables: List[List[Node]] = []
+        self.graphs: List[Optional[Graph]] = []
+        self.datasets: List[DataSet] = []
+
+    def create_data(self, **parameters):
+        rng = np.random.default_rng(parameters.get("seed"))
+        self.dags = []
+        self.variables = []
+        self.graphs = []
+        self.datasets = []
+        for _ in range(parameters.get("num_runs", 1)):
+            dag = self.random_graph.create_dag(rng, **parameters)
+            num_categories, keys = LargeScaleBayesNet.draw_model(dag, rng, **parameters)
+            variables = dag.get_nodes()
+            for variable, c in zip(variables, num_categories.tolist()):
+                variable.add_attribute("categories", [str(k) for k in range(c)])
+            chunks = LargeScaleBayesNet.simulate_chunks(dag, num_categories, keys, rng, **parameters)
+            self.dags.append(dag)
+            self.variables.append(variables)
+            self.graphs.append(None)
+            self.datasets.append(LargeScaleBayesNet.to_dataset(chunks, variables, parameters.get("sample_size", 1000),
+                                                               int(num_categories.max(initial=1))))
+
+    @classmethod
+    def draw_model(cls, dag: SparseDag, rng: np.random.Generator, **parameters) -> Tuple[np.ndarray, np.ndarray]:
+        """ Draws the number of categories of each variable, and the key of the hash of its distributions.
+
+        """
+        min_categories = parameters.get("min_categories", 2)
+        max_categories = parameters.get("max_categories", 3)
+        if min_categories < 2 or max_categories < min_categories:
+            raise ValueError(f"Expecting 2 <= min_categories <= max_categories: {min_categories}, {max_categories}")
+        num_categories = rng.integers(min_categories, max_categories + 1, size=dag.get_num_nodes())
+        keys = rng.integers(0, np.iinfo(np.int64).max, size=dag.get_num_nodes()).astype(np.uint64)
+        return num_categories, keys
+
+    @classmethod
+    def strides(cls, dag: SparseDag, num_categories: np.ndarray) -> Tuple[sp.csr_matrix, np.ndarray]:
+        """ Numbers the combinations of values of the parents of each variable in mixed radix.
+
+        :return: a sparse matrix whose row j holds the stride of each parent of variable j, so that its product with
+            the values of the variables numbers the combinations; and the number of combinations of each variable.
+        """
+        order = np.lexsort((dag.get_sources(), dag.get_targets()))
+        sources = dag.get_sources()[order]
+        targets = dag.get_targets()[order]
+        radix = num_categories[sources].astype(np.float64)
+        strides = np.ones(len(sources))
+        num_combinations = np.ones(dag.get_num_nodes(), dtype=np.int64)
+        bounds = np.flatnonzero(np.diff(targets)) + 1
+        for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(sources)]):
+            products = np.cumprod(radix[start:stop][::-1])
+            # Combinations are numbered exactly in float64 up to 2^53.
+            if products[-1] > 2. ** 53:
+                raise ValueError(f"Variable {targets[start]} has too many combinations of parent values.")
+            strides[start:stop - 1] = products[:-1][::-1]
+            num_combinations[targets[start]] = int(products[-1])
+        num_nodes = dag.get_num_nodes()
+        return sp.csr_matrix((strides, (targets, sources)), shape=(num_nodes, num_nodes)), num_combinations
+
+    @classmethod
+    def _mix(cls, z: np.ndarray) -> np.ndarray:
+        """ The splitmix64 finalizer, a bijection of 64 bit integers that scatters close inputs.
+
+        """
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+    @classmethod
+    def distributions(cls, keys: np.ndarray, num_categories: np.ndarray, combinations: np.ndarray,
+                      width: int) -> np.ndarray:
+        """ The cumulative distributions of variables given combinations of values of their parents.
+
+        :param keys: the hash key of the variable of each distribution.
+        :param num_categories: the number of categories of the variable of each distribution.
+        :param combinations: the number of the combination of parent values of each distribution; the three
+            arrays are broadcast together.
+        :param width: at least the largest number of categories.
+        :return: the cumulative probabilities of each distribution, along a last axis of the given width; ones
+            past the categories of a variable.
+        """
+        keys, num_categories, combinations = np.broadcast_arrays(keys, num_categories, combinations)
+        z = keys ^ LargeScaleBayesNet._mix(combinations.astype(np.uint64) + np.uint64(1))
+        h = LargeScaleBayesNet._mix(z[..., None] + np.arange(1, width + 1, dtype=np.uint64))
+        # A uniform variate in (0, 1) from the top 53 bits, then a standard exponential.
+        weights = -np.log(((h >> np.uint64(11)).astype(np.float64) + .5) * 2. ** -53)
+        weights *= np.arange(width) < num_categories[..., None]
+        cumulative = np.cumsum(weights, axis=-1)
+        cumulative /= cumulative[..., -1:]
+        return cumulative
+
+    @classmethod
+    def sample(cls, keys: np.ndarray, num_categories: np.ndarray, num_combinations: np.ndarray,
+               combinations: np.ndarray, u: np.ndarray) -> np.ndarray:
+        """ Samples variables given the combinations of values of their parents.
+
+        :param keys: the hash key of each variable.
+        :param num_categories: the number of categories of each variable.
+        :param num_combinations: the number of combinations of parent values of each variable.
+        :param combinations: variables x rows, the number of the combination of parent values in each row.
+        :param u: variables x rows uniform variates in [0, 1).
+        :return: variables x rows values.
+        """
+        width = int(num_categories.max())
+        values = np.empty(combinations.shape, dtype=np.int64)
+        # The variables with fewer distributions than rows compute each once, into one table, and look them up.
+        tabled = np.flatnonzero(num_combinations <= combinations.shape[1])
+        if len(tabled) > 0:
+            counts = num_combinations[tabled]
+            starts = np.cumsum(counts) - counts
+            owners = np.repeat(np.arange(len(tabled)), counts)
+            table = LargeScaleBayesNet.distributions(keys[tabled][owners], num_categories[tabled][owners],
+                                                     np.arange(int(counts.sum())) - starts[owners], width)
+            table = np.ascontiguousarray(table.T)
+            rows = starts[:, None] + combinations[tabled].astype(np.int64)
+            drawn = np.zeros(rows.shape, dtype=np.int64)
+            for k in range(width - 1):
+                drawn += table[k][rows] < u[tabled]
+            values[tabled] = drawn
+        others = np.flatnonzero(num_combinations > combinations.shape[1])
+        if len(others) > 0:
+            cumulative = LargeScaleBayesNet.distributions(keys[others][:, None], num_categories[others][:, None],
+                                                          combinations[others], width)
+            values[others] = (cumulative[..., :-1] < u[others][..., None]).sum(axis=-1)
+        return np.minimum(values, num_categories[:, None] - 1)
+
+    @classmethod
+    def simulate_chunks(cls, dag: SparseDag, num_categories: np.ndarray, keys: np.ndarray,
+                        rng: np.random.Generator, **parameters) -> Iterator[np.ndarray]:
+        """ Simulates "sample_size" rows, a chunk at a time.
+
+        :return: the chunks, as rows x variables arrays of category codes, in column-major order.
+        """
+        sample_size = parameters.get("sample_size", 1000)
+        num_variables = dag.get_num_nodes()
+        step = parameters.get("chunk_rows") or max(1, LargeScaleBayesNet.CHUNK_CELLS // max(num_variables, 1))
+        strides, num_combinations = LargeScaleBayesNet.strides(dag, num_categories)
+        layers = dag.get_layers()
+        parents = [strides[layer] for layer in layers]
+        group_size = max(1, LargeScaleBayesNet.CHUNK_CELLS // (step * int(num_categories.max(initial=1))))
+        for start in range(0, sample_size, step):
+            rows = min(step, sample_size - start)
+            # Variables by rows, as floats for the sparse products.
+            values = np.zeros((num_variables, rows))
+            for layer, weights in zip(layers, parents):
+                combinations = weights @ values
+                for g in range(0, len(layer), group_size):
+                    group = layer[g:g + group_size]
+                    values[group] = LargeScaleBayesNet.sample(keys[group], num_categories[group],
+                                                              num_combinations[group], combinations[g:g + group_size],
+                                                              rng.random((len(group), rows)))
+            yield values.T
+
+    @classmethod
+    def to_dataset(cls, chunks: Iterator[np.ndarray], variables: List[Node], sample_size: int,
+                   max_categories: int) -> DataSet:
+        """ Gathers simulated chunks into a data set of category codes, in the smallest integer type that holds
+        them.
+
+        """
+        dtype = np.int8 if max_categories <= np.iinfo(np.int8).max else np.int32
+        data = np.empty((sample_size, len(variables)), dtype=dtype, order="F")
+        start = 0
+        for chunk in chunks:
+            data[start:start + chunk.shape[0]] = chunk
+            start += chunk.shape[0]
+        return DataSet(DataFrame(data, columns=[v.get_name() for v in variables], copy=False), variables)
+
+    def get_num_data_models(self) -> int:
+        return len(self.datasets)
+
+    def get_true_graph(self, index: int) -> Graph:
+        if self.graphs[index] is None:
+            self.graphs[index] = self.dags[index].to_graph(self.variables[index])
+        return self.graphs[index]
+
+    def get_true_dag(self, index: int) -> SparseDag:
+        return self.dags[index]
+
+    def get_data_model(self, index: int) -> DataModel:
+        return self.datasets[index]
+
+    def get_description(self) -> str:
+        return f"Large scale Bayes net simulation using {self.random_graph.get_description()}"
+
+    def get_data_type(self) -> DataType:
+        return DataType.Discrete
+
+    def get_parameters(self) -> List[str]:
+        return self.random_graph.get_parameters() + ["num_runs", "sample_size", "min_categories", "max_categories",
+                                                     "seed", "chunk_rows"]
@@ -0,0 +1,141 @@
+from typing import List, Optional, Iterator, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from pandas import DataFrame
+
+from algcomparison.graph.RandomGraph import RandomGraph
+from algcomparison.simulation.Simulation import Simulation
+from data.CovarianceAccumulator import CovarianceAccumulator
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.DataType import DataType
+from graph.Graph import Graph
+from graph.Node import Node
+from graph.SparseDag import SparseDag
+
+
+class LargeScaleSimulation(Simulation):
+    """
+    Simulates data from a linear structural equation model with independent Gaussian errors, with the parameters
+    of LinearFisherModel, over DAGs held as SparseDag's, for models of many thousands of variables.
+
+    The rows are simulated in chunks of "chunk_rows" rows (by default as many as make about CHUNK_CELLS values).
+    In a chunk, the errors of all variables are drawn at once, and then the variables of each layer of the DAG
+    (see SparseDag.get_layers()) are computed together, as one sparse product of their coefficients with the
+    values of the earlier layers. With "covariance_only", the data models are the covariance matrices of the data,
+    accumulated a chunk at a time, so that samples too large to be held in memory can still be searched.
+
+    True graphs are only built as Graph's when asked for.
+    """
+
+    CHUNK_CELLS = 1 << 24
+
+    def __init__(self, graph: RandomGraph):
+        self.random_graph = graph
+        self.dags: List[SparseDag] = []
+        self.variables: List[List[Node]] = []
+        self.graphs: List[Optional[Graph]] = []
+        self.data_models: List[DataModel] = []
+
+    def create_data(self, **parameters):
+        rng = np.random.default_rng(parameters.get("seed"))
+        self.dags = []
+        self.variables = []
+        self.graphs = []
+        self.data_models = []
+        for _ in range(parameters.get("num_runs", 1)):
+            dag = self.random_graph.create_dag(rng, **parameters)
+            variables = dag.get_nodes()
+            coefficients, error_sd = LargeScaleSimulation.draw_model(dag, rng, **parameters)
+            chunks = LargeScaleSimulation.simulate_chunks(dag, coefficients, error_sd, rng, **parameters)
+            if parameters.get("covariance_only", False):
+                accumulator = CovarianceAccumulator(variables)
+                for chunk in chunks:
+                    accumulator.update(chunk)
+                data_model = accumulator.to_covariance_matrix()
+            else:
+                data_model = LargeScaleSimulation.to_dataset(chunks, variables, parameters.get("sample_size", 1000))
+            self.dags.append(dag)
+            self.variables.append(variables)
+            self.graphs.append(None)
+            self.data_models.append(data_model)
+
+    @classmethod
+    def draw_model(cls, dag: SparseDag, rng: np.random.Generator, **parameters) -> Tuple[sp.csr_matrix, np.ndarray]:
+        """ Draws the coefficients of the edges and the standard deviations of the errors.
+
+        :return: a sparse matrix whose row j holds the coefficients of the parents of variable j, and the standard
+            deviation of the error of each variable.
+        """
+        coef_low = parameters.get("coef_low", 0.2)
+        coef_high = parameters.get("coef_high", 0.7)
+        coef_symmetric = parameters.get("coef_symmetric", True)
+        var_low = parameters.get("var_low", 1.0)
+        var_high = parameters.get("var_high", 3.0)
+        coefs = rng.uniform(coef_low, coef_high, size=dag.get_num_edges())
+        if coef_symmetric:
+            coefs *= rng.choice((-1., 1.), size=dag.get_num_edges())
+        error_sd = np.sqrt(rng.uniform(var_low, var_high, size=dag.get_num_nodes()))
+        return dag.get_adjacency(coefs).T.tocsr(), error_sd
+
+    @classmethod
+    def get_chunk_rows(cls, num_variables: int, **parameters) -> int:
+        return parameters.get("chunk_rows") or max(1, LargeScaleSimulation.CHUNK_CELLS // max(num_variables, 1))
+
+    @classmethod
+    def simulate_chunks(cls, dag: SparseDag, coefficients: sp.csr_matrix, error_sd: np.ndarray,
+                        rng: np.random.Generator, **parameters) -> Iterator[np.ndarray]:
+        """ Simulates "sample_size" rows, a chunk at a time.
+
+        :return: the chunks, as rows x variables arrays in column-major order.
+        """
+        sample_size = parameters.get("sample_size", 1000)
+        num_variables = dag.get_num_nodes()
+        step = LargeScaleSimulation.get_chunk_rows(num_variables, **parameters)
+        layers = dag.get_layers()[1:]
+        parents = [coefficients[layer] for layer in layers]
+        for start in range(0, sample_size, step):
+            # Variables by rows, so that the values of a layer are contiguous.
+            values = rng.standard_normal((num_variables, min(step, sample_size - start)))
+            values *= error_sd[:, None]
+            for layer, weights in zip(layers, parents):
+                values[layer] += weights @ values
+            yield values.T
+
+    @classmethod
+    def to_dataset(cls, chunks: Iterator[np.ndarray], variables: List[Node], sample_size: int) -> DataSet:
+        """ Gathers simulated chunks into a data set of the given number of rows.
+
+        """
+        data = np.empty((sample_size, len(variables)), dtype=np.float64, order="F")
+        start = 0
+        for chunk in chunks:
+            data[start:start + chunk.shape[0]] = chunk
+            start += chunk.shape[0]
+        return DataSet(DataFrame(data, columns=[v.get_name() for v in variables], copy=False), variables)
+
+    def get_num_data_models(self) -> int:
+        return len(self.data_models)
+
+    def get_true_graph(self, index: int) -> Graph:
+        if self.graphs[index] is None:
+            self.graphs[index] = self.dags[index].to_graph(self.variables[index])
+        return self.graphs[index]
+
+    def get_true_dag(self, index: int) -> SparseDag:
+        return self.dags[index]
+
+    def get_data_model(self, index: int) -> DataModel:
+        return self.data_models[index]
+
+    def get_description(self) -> str:
+        return f"Large scale linear, Gaussian SEM simulation using {self.random_graph.get_description()}"
+
+    def get_data_type(self) -> DataType:
+        return DataType.Continuous
+
+    def get_parameters(self) -> List[str]:
+        return self.random_graph.get_parameters() + ["num_runs", "sample_size", "coef_low", "coef_high",
+                                                     "coef_symmetric", "var_low", "var_high", "seed", "chunk_rows",
+                                                     "covariance_only"]
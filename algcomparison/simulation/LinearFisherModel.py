@@ -0,0 +1,78 @@
+from typing import List
+
+import numpy as np
+from pandas import DataFrame
+
+from algcomparison.graph.RandomGraph import RandomGraph
+from algcomparison.simulation.Simulation import Simulation
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.DataType import DataType
+from graph.Graph import Graph
+
+
+class LinearFisherModel(Simulation):
+    """
+    Simulates data from a linear structural equation model with independent Gaussian errors over a random DAG.
+    Each variable is the weighted sum of its parents plus its error; coefficients are drawn uniformly from
+    [coef_low, coef_high], with a random sign if coef_symmetric, and error variances from [var_low, var_high].
+    """
+
+    def __init__(self, graph: RandomGraph):
+        self.random_graph = graph
+        self.graphs: List[Graph] = []
+        self.datasets: List[DataSet] = []
+
+    def create_data(self, **parameters):
+        rng = np.random.default_rng(parameters.get("seed"))
+        self.graphs = []
+        self.datasets = []
+        for _ in range(parameters.get("num_runs", 1)):
+            graph = self.random_graph.create_graph(rng, **parameters)
+            self.graphs.append(graph)
+            self.datasets.append(LinearFisherModel.simulate(graph, rng, **parameters))
+
+    @classmethod
+    def simulate(cls, graph: Graph, rng: np.random.Generator, **parameters) -> DataSet:
+        """ Simulates a data set of "sample_size" rows from a linear Gaussian model over the given DAG.
+
+        """
+        sample_size = parameters.get("sample_size", 1000)
+        coef_low = parameters.get("coef_low", 0.2)
+        coef_high = parameters.get("coef_high", 0.7)
+        coef_symmetric = parameters.get("coef_symmetric", True)
+        var_low = parameters.get("var_low", 1.0)
+        var_high = parameters.get("var_high", 3.0)
+
+        nodes = graph.get_nodes()
+        index = {node: i for i, node in enumerate(nodes)}
+        data = np.empty((sample_size, len(nodes)), order="F")
+        for node in graph.get_causal_ordering():
+            j = index[node]
+            parents = [index[p] for p in graph.get_parents(node)]
+            data[:, j] = rng.normal(scale=np.sqrt(rng.uniform(var_low, var_high)), size=sample_size)
+            if parents:
+                coefs = rng.uniform(coef_low, coef_high, size=len(parents))
+                if coef_symmetric:
+                    coefs *= rng.choice((-1., 1.), size=len(parents))
+                data[:, j] += data[:, parents] @ coefs
+        return DataSet(DataFrame(data, columns=[node.get_name() for node in nodes]), nodes)
+
+    def get_num_data_models(self) -> int:
+        return len(self.datasets)
+
+    def get_true_graph(self, index: int) -> Graph:
+        return self.graphs[index]
+
+    def get_data_model(self, index: int) -> DataModel:
+        return self.datasets[index]
+
+    def get_description(self) -> str:
+        return f"Linear, Gaussian SEM simulation using {self.random_graph.get_description()}"
+
+    def get_data_type(self) -> DataType:
+        return DataType.Continuous
+
+    def get_parameters(self) -> List[str]:
+        return self.random_graph.get_parameters() + ["num_runs", "sample_size", "coef_low", "coef_high",
+                                                     "coef_symmetric", "var_low", "var_high", "seed"]
@@ -0,0 +1,48 @@
+from algcomparison.utils.HasParameters import HasParameters
+from data.DataModel import DataModel
+from data.DataType import DataType
+from graph.Graph import Graph
+
+
+class Simulation(HasParameters):
+    """
+    Interface for a simulation of data sets with known true graphs.
+    """
+
+    def create_data(self, **parameters):
+        """ Creates "num_runs" true graphs with a data set for each. Given the same "seed", the same graphs and data
+        are created.
+
+        :param parameters: the parameters of the simulation.
+        """
+        raise NotImplementedError
+
+    def get_num_data_models(self) -> int:
+        """ Returns the number of data sets created.
+
+        """
+        raise NotImplementedError
+
+    def get_true_graph(self, index: int) -> Graph:
+        """ Returns the true graph of the data set at the given index.
+
+        """
+        raise NotImplementedError
+
+    def get_data_model(self, index: int) -> DataModel:
+        """ Returns the data set at the given index.
+
+        """
+        raise NotImplementedError
+
+    def get_description(self) -> str:
+        """ Returns a short one-line description of this simulation.
+
+        """
+        raise NotImplementedError
+
+    def get_data_type(self) -> DataType:
+        """ Returns the data type of the data sets.
+
+        """
+        raise NotImplementedError
@@ -0,0 +1,19 @@
+from typing import List
+
+
+class CountsIndependenceTests:
+    """
+    Tags an algorithm as reporting the number of independence tests done by its last search.
+    """
+
+    def get_num_independence_tests(self) -> int:
+        """ Returns the number of independence tests done by the last search.
+
+        """
+        raise NotImplementedError
+
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        """ Returns the number of independence tests done by the last search with each size of conditioning set.
+
+        """
+        raise NotImplementedError
@@ -1,10 +1,28 @@
+import sys
 from argparse import Namespace, ArgumentParser
+from typing import List, Optional
+
+import numpy as np
+
+from algcomparison.algorithm.oracle.pattern.FGES import FGES
+from algcomparison.algorithm.score.BDeu import BDeu
+from algcomparison.algorithm.score.SemBic import SemBic
+from data.DataReader import DataReader
+from data.DataSet import DataSet
+from data.IKnowledge import IKnowledge
+from graph.Graph import Graph
+from graph.GraphIO import GraphIO
+from graph.SparseDag import SparseDag
 
 
 class Trad:
     def __init__(self):
         self.silent: bool = False
         self.args: Namespace = self.parse_arguments()
+        self.datasets: List[DataSet] = []
+        self.knowledge: Optional[IKnowledge] = None
+        self.graph: Optional[Graph] = None
+        self.initial_graph: Optional[Graph] = None
 
     def parse_arguments(self) -> Namespace:
         parser = ArgumentParser(description=
@@ -15,11 +33,12 @@ class Trad:
                             choices=['bpc', 'eb', 'fas', 'fask', 'fask-concatenated', 'fci', 'fges', 'fges-mb',
                                      'fofc', 'ftfc', 'gfci', 'glasso', 'imgs_cont', 'imgs_disc', 'lingam', 'mbfs',
                                      'mgm', 'mimbuild', 'multi-fask', 'pc-all', 'r-skew', 'r-skew-e', 'r1', 'r2',
-                                     'r3', 'r4', 'rfci', 'rfci-bsc', 'skew', 'skew-e', 'ts-fci', 'ts-gfci', 'ts-imgs'])
-        parser.add_argument('-t', '--data_type', action='store', type=str, required=True,
+                                     'r3', 'r4', 'rfci', 'rfci-bsc', 'skew', 'skew-e', 'ts-fci', 'ts-gfci', 'ts-imgs',
+                                     'randomDag'])
+        parser.add_argument('-t', '--data_type', action='store', type=str,
                             help='tell me which data type the input data is',
                             choices=['continuous', 'covariance', 'discrete', 'mixed'])
-        parser.add_argument('-d', '--dataset', action='store', type=str, required=True, nargs='+',
+        parser.add_argument('-d', '--dataset', action='store', type=str, nargs='+',
                             help='dataset file path. Multiple files are separated by commas.')
         parser.add_argument('--delimiter', action='store', type=str, default="comma",
                             help='Delimiter: colon, comma, pipe, semicolon, space, tab, whitespace',
@@ -34,8 +53,10 @@ class Trad:
         parser.add_argument('--num_edges', action='store', type=int, default=5, help='')
         parser.add_argument('--knowledge', action='store', type=str, help='')
         parser.add_argument('--graphxml', action='store', type=str, help='')
-        parser.add_argument('--graphtxt', action='store', type=str, help='')
-        parser.add_argument('--initialgraphtxt', action='store', type=str, help='')
+        parser.add_argument('--graphtxt', action='store', type=str,
+                            help='Graph file (text, or JSON/binary by its .json/.bin extension).')
+        parser.add_argument('--initialgraphtxt', action='store', type=str,
+                            help='Graph FGES starts from (text, or JSON/binary by its .json/.bin extension).')
         parser.add_argument('--covariance', action="store_true", help='')
         parser.add_argument('--json_graph', action="store_true", help='Write out graph as json.')
         parser.add_argument('--skip_validation', action="store_true", help='Skip validation')
@@ -43,6 +64,8 @@ class Trad:
         parser.add_argument('--sample_prior', action='store', type=float, default=1.0, help='')
         parser.add_argument('--structure_prior', action='store', type=float, default=1.0, help='')
         parser.add_argument('--penalty_discount', action='store', type=float, default=1.0, help='')
+        parser.add_argument('--target', action='store', type=str, nargs='+',
+                            help='Names of the target variables of fges-mb.')
         parser.add_argument('--rfci', action="store_true", help='')
         parser.add_argument('--nodsep', action="store_true", help='')
         parser.add_argument('--silent', action="store_true", help='')
@@ -62,25 +85,83 @@ class Trad:
         if not self.args.data_type:
             raise AttributeError("No data type (continuous/discrete) was specified.")
         self.out_print(f"Loading data from {self.args.dataset}.\n")
-        # TODO load data
+        if self.args.data_type == "covariance":
+            raise AttributeError("Reading covariance matrices is not supported yet.")
+        paths = [p.strip() for arg in self.args.dataset for p in arg.split(",") if p.strip()]
+        delimiter = "whitespace" if self.args.whitespace else self.args.delimiter
+        reader = DataReader(delimiter=delimiter, data_type=self.args.data_type)
+        self.datasets = reader.read_all(paths)
+        for path, dataset in zip(paths, self.datasets):
+            self.out_print(f"{path}: {dataset.get_num_rows()} rows, {dataset.get_num_columns()} variables.")
 
     def load_knowledge(self):
         if not self.args.knowledge:
             raise AttributeError("No knowledge file was specified.")
-        # TODO load knowledge
+        self.knowledge = DataReader.read_knowledge(self.args.knowledge)
+        self.out_print(f"{self.args.knowledge}: {len(self.knowledge.get_variables())} variables, "
+                       f"{self.knowledge.get_num_tiers()} tiers.")
+
+    def load_graphs(self):
+        if self.args.graphtxt:
+            self.graph = GraphIO.load(self.args.graphtxt)
+            self.out_print(f"{self.args.graphtxt}: {self.graph.get_num_nodes()} nodes, "
+                           f"{self.graph.get_num_edges()} edges.")
+        if self.args.initialgraphtxt:
+            self.initial_graph = GraphIO.load(self.args.initialgraphtxt)
+            self.out_print(f"{self.args.initialgraphtxt}: {self.initial_graph.get_num_nodes()} nodes, "
+                           f"{self.initial_graph.get_num_edges()} edges.")
+
+    def print_graph(self, graph: Graph):
+        """
+        Prints a graph as text, or as JSON with --json_graph.
+        """
+        if self.args.json_graph:
+            GraphIO.write_json(graph, sys.stdout)
+        else:
+            print(graph)
+
+    def run_fges(self):
+        """
+        Runs FGES on each data set, or FGES-MB for the --target variables with "fges-mb": with the SEM BIC score for
+        continuous data, and the BDeu score for discrete data, the --knowledge, and from the --initialgraphtxt graph.
+        """
+        if not self.datasets:
+            raise AttributeError("No data file was specified.")
+        targets = ",".join(self.args.target or [])
+        if self.args.algorithm == "fges-mb" and not targets:
+            raise AttributeError("No target was specified.")
+        for dataset in self.datasets:
+            algorithm = FGES(BDeu() if dataset.is_discrete() else SemBic())
+            algorithm.set_knowledge(self.knowledge)
+            algorithm.set_initial_graph(self.initial_graph)
+            graph = algorithm.search(dataset, penalty_discount=self.args.penalty_discount,
+                                     sample_prior=self.args.sample_prior, structure_prior=self.args.structure_prior,
+                                     targets=targets, num_workers=self.args.thread or 1, verbose=self.args.verbose)
+            self.print_graph(graph)
+
+    def print_random_dag(self):
+        """
+        Prints a DAG over --num_nodes nodes with --num_edges edges, drawn uniformly among the pairs of nodes and
+        directed forward along a random order of the nodes; see SparseDag.random_forward().
+        """
+        rng = np.random.default_rng(self.args.seed)
+        dag = SparseDag.random_forward(rng, self.args.num_nodes, self.args.num_edges)
+        self.print_graph(dag.to_graph())
 
     def run_algorithm(self):
-        if not self.args.dataset:
+        if self.args.dataset:
             self.load_data()
-        if not self.args.knowledge:
+        if self.args.knowledge:
             self.load_knowledge()
+        if self.args.graphtxt or self.args.initialgraphtxt:
+            self.load_graphs()
         algorithm = self.args.algorithm
         if "pc" == algorithm:
             runPc()
         elif "fci" == algorithm:
             runFci()
-        elif "fges" == algorithm:
-            runFges()
+        elif algorithm in ("fges", "fges-mb"):
+            self.run_fges()
         elif "fang" == algorithm:
             runFang()
         elif "pc.stable" == algorithm:
@@ -96,7 +177,7 @@ class Trad:
         elif "fofc" == algorithm:
             runFofc()
         elif "randomDag" == algorithm:
-            printRandomDag()
+            self.print_random_dag()
         else:
             TetradLogger.getInstance().reset()
             TetradLogger.getInstance().removeOutputStream(System.out)
@@ -19,7 +19,7 @@ class CorrelationMatrix(CovarianceMatrix):
     def from_dataset(cls, dataset: DataSet, bias_corrected: bool = True):
         if dataset.exists_missing_value():
             raise ValueError("Dataset is not a continuous data set.")
-        super(CorrelationMatrix, cls).from_dataset(dataset, bias_corrected)
+        return super(CorrelationMatrix, cls).from_dataset(dataset, bias_corrected)
 
     def set_matrix(self, matrix: DataFrame):
         if matrix.shape[0] != matrix.shape[1]:
@@ -0,0 +1,196 @@
+from typing import List, Optional, Union
+
+import numpy as np
+from pandas import DataFrame
+
+from graph.GraphNode import GraphNode
+from graph.Node import Node
+
+
+class CovarianceAccumulator:
+    """
+    Accumulates the sample size, means and centered co-moment matrix of continuous data given in row chunks, so
+    that a covariance matrix can be built from data that never fits in memory, refreshed as new rows arrive, or
+    computed in parts by parallel workers.
+
+    Each chunk is centered on its own mean and combined with the running totals by the pairwise update of
+    Chan, Golub and LeVeque, which is as stable as Welford's one-row update but works a chunk at a time. The same
+    update merges accumulators, and run in reverse it removes (downdates) a chunk that was added before.
+    Accumulators are plain numpy state and can be pickled to and from worker processes.
+    """
+
+    def __init__(self, variables: List[Node]):
+        if not variables:
+            raise ValueError("At least one variable is required.")
+        self.variables = list(variables)
+        self.names = [v.get_name() for v in self.variables]
+        self.n = 0
+        self.mean = np.zeros(len(self.variables))
+        # sum over rows of (x - mean)(x - mean)'
+        self.comoment = np.zeros((len(self.variables), len(self.variables)))
+
+    @classmethod
+    def from_names(cls, names: List[str]):
+        return cls([GraphNode(name) for name in names])
+
+    def get_variables(self) -> List[Node]:
+        return self.variables
+
+    def get_sample_size(self) -> int:
+        return self.n
+
+    def get_mean(self) -> np.ndarray:
+        return self.mean.copy()
+
+    def _as_array(self, chunk: Union[DataFrame, np.ndarray]) -> np.ndarray:
+        if isinstance(chunk, DataFrame):
+            if list(map(str, chunk.columns)) != self.names:
+                missing = [name for name in self.names if name not in chunk.columns]
+                if missing:
+                    raise ValueError(f"The chunk has no columns for {missing}")
+                chunk = chunk[self.names]
+            chunk = chunk.to_numpy(dtype=np.float64)
+        else:
+            chunk = np.asarray(chunk, dtype=np.float64)
+            if chunk.ndim == 1:
+                chunk = chunk.reshape(1, -1)
+        if chunk.ndim != 2 or chunk.shape[1] != len(self.variables):
+            raise ValueError(f"Expecting rows of {len(self.variables)} values: {chunk.shape}")
+        if np.isnan(chunk).any():
+            raise ValueError("Covariances cannot be accumulated over missing values.")
+        return chunk
+
+    def _combine(self, n: int, mean: np.ndarray, comoment: np.ndarray, sign: int):
+        """ Adds (sign = 1) or removes (sign = -1) a part with the given size, mean and co-moment.
+
+        """
+        if n == 0:
+            return
+        total = self.n + sign * n
+        if total < 0:
+            raise ValueError(f"Cannot remove {n} rows from an accumulator of {self.n} rows.")
+        if total == 0:
+            self.n = 0
+            self.mean = np.zeros(len(self.variables))
+            self.comoment = np.zeros((len(self.variables), len(self.variables)))
+            return
+        if sign > 0:
+            delta = mean - self.mean
+            # In place, so that only one more matrix is allocated for large numbers of variables.
+            self.comoment += comoment
+            self.comoment += np.outer(delta, delta * (self.n * n / total))
+            self.mean = self.mean + delta * (n / total)
+        else:
+            # The rows that remain are the part A of A + B = self; recover A's mean, then its co-moment.
+            remaining_mean = (self.n * self.mean - n * mean) / total
+            delta = mean - remaining_mean
+            self.comoment = self.comoment - comoment - np.outer(delta, delta) * (total * n / self.n)
+            self.mean = remaining_mean
+        self.n = total
+
+    @classmethod
+    def _moments(cls, chunk: np.ndarray):
+        mean = chunk.mean(axis=0)
+        centered = chunk - mean
+        return mean, centered.T @ centered
+
+    def update(self, chunk: Union[DataFrame, np.ndarray]):
+        """
+        Adds the rows of the given chunk. DataFrame columns are matched to the variables by name.
+        """
+        chunk = self._as_array(chunk)
+        if chunk.shape[0] > 0:
+            self._combine(chunk.shape[0], *self._moments(chunk), sign=1)
+        return self
+
+    def update_weighted(self, chunk: Union[DataFrame, np.ndarray], weights: np.ndarray):
+        """
+        Adds each row of the given chunk as many times as its weight, a non-negative integer; e.g. the rows of a
+        bootstrap resample given as the number of times each row was drawn, without building the resample.
+        """
+        chunk = self._as_array(chunk)
+        weights = np.asarray(weights)
+        if weights.shape != (chunk.shape[0],):
+            raise ValueError(f"Expecting one weight per row: {weights.shape}")
+        if (weights < 0).any():
+            raise ValueError("Weights must not be negative.")
+        rows = np.flatnonzero(weights)
+        if len(rows) == 0:
+            return self
+        if len(rows) < chunk.shape[0]:
+            chunk = chunk[rows]
+            weights = weights[rows]
+        weights = weights.astype(np.float64)
+        n = int(weights.sum())
+        mean = weights @ chunk / n
+        centered = chunk - mean
+        self._combine(n, mean, centered.T @ (centered * weights[:, None]), sign=1)
+        return self
+
+    def downdate(self, chunk: Union[DataFrame, np.ndarray]):
+        """
+        Removes the rows of the given chunk, which must have been added before; e.g. to keep a moving window of
+        the most recent batches. Some precision is lost with each removal, so a window that is moved many times
+        should now and then be accumulated again from its rows.
+        """
+        chunk = self._as_array(chunk)
+        if chunk.shape[0] > 0:
+            self._combine(chunk.shape[0], *self._moments(chunk), sign=-1)
+        return self
+
+    def merge(self, other: "CovarianceAccumulator"):
+        """
+        Adds the rows accumulated by another accumulator over the same variables.
+        """
+        self._check_compatible(other)
+        self._combine(other.n, other.mean, other.comoment, sign=1)
+        return self
+
+    def unmerge(self, other: "CovarianceAccumulator"):
+        """
+        Removes the rows accumulated by another accumulator, which must have been merged before.
+        """
+        self._check_compatible(other)
+        self._combine(other.n, other.mean, other.comoment, sign=-1)
+        return self
+
+    def _check_compatible(self, other: "CovarianceAccumulator"):
+        if other.names != self.names:
+            raise ValueError("Only accumulators over the same variables, in the same order, can be combined.")
+
+    def copy(self):
+        accumulator = CovarianceAccumulator(self.variables)
+        accumulator.n = self.n
+        accumulator.mean = self.mean.copy()
+        accumulator.comoment = self.comoment.copy()
+        return accumulator
+
+    def get_covariances(self, bias_corrected: bool = True) -> np.ndarray:
+        """
+        return the covariance matrix, divided by n - 1 if bias corrected and by n otherwise.
+        """
+        ddof = 1 if bias_corrected else 0
+        if self.n - ddof <= 0:
+            raise ValueError(f"Not enough rows to compute covariances: {self.n}")
+        covariances = self.comoment / (self.n - ddof)
+        # Rounding in the updates can leave the matrix slightly asymmetric.
+        return (covariances + covariances.T) / 2
+
+    def to_covariance_matrix(self, bias_corrected: bool = True, correlation: bool = False):
+        """
+        return the accumulated covariance (or correlation) matrix as a CovarianceMatrix (or CorrelationMatrix).
+        """
+        from data.CorrelationMatrix import CorrelationMatrix
+        from data.CovarianceMatrix import CovarianceMatrix
+        matrix = self.get_covariances(bias_corrected)
+        if correlation:
+            sd = np.sqrt(np.diag(matrix))
+            matrix = matrix / np.outer(sd, sd)
+            np.fill_diagonal(matrix, 1.)
+        matrix = DataFrame(matrix, index=self.names, columns=self.names)
+        if correlation:
+            return CorrelationMatrix(self.variables, matrix, self.n)
+        return CovarianceMatrix(self.variables, matrix, self.n)
+
+    def __str__(self):
+        return f"CovarianceAccumulator({len(self.variables)} variables, n = {self.n})"
@@ -1,7 +1,9 @@
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Iterable, Union
 
+import numpy as np
 from pandas import DataFrame
 
+from data.CovarianceAccumulator import CovarianceAccumulator
 from data.DataSet import DataSet
 from data.ICovarianceMatrix import ICovarianceMatrix
 from data.IKnowledge import IKnowledge
@@ -24,10 +26,35 @@ class CovarianceMatrix(ICovarianceMatrix):
         if not dataset.is_continuous():
             raise ValueError("Dataset is not a continuous data set.")
         variables = list(dataset.get_variables())
-        matrix = dataset.get_data().cov()
+        matrix = dataset.get_data().cov(ddof=1 if bias_corrected else 0)
         sample_size = dataset.get_num_rows()
         return cls(variables, matrix, sample_size)
 
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Union[DataFrame, np.ndarray]], variables: Optional[List[Node]] = None,
+                    bias_corrected: bool = True):
+        """
+        Builds the covariance matrix of continuous data given as row chunks (e.g. from DataReader.read_chunks()),
+        holding only one chunk in memory at a time. The variables default to the columns of the first chunk,
+        which must then be a DataFrame. See CovarianceAccumulator to append or remove rows later.
+        """
+        accumulator = CovarianceAccumulator(variables) if variables else None
+        for chunk in chunks:
+            if accumulator is None:
+                if not isinstance(chunk, DataFrame):
+                    raise ValueError("Variables are required unless the chunks are DataFrames.")
+                accumulator = CovarianceAccumulator.from_names([str(c) for c in chunk.columns])
+            accumulator.update(chunk)
+        if accumulator is None:
+            raise ValueError("No chunks to compute covariances from.")
+        return cls.from_accumulator(accumulator, bias_corrected)
+
+    @classmethod
+    def from_accumulator(cls, accumulator: CovarianceAccumulator, bias_corrected: bool = True):
+        names = [v.get_name() for v in accumulator.get_variables()]
+        matrix = DataFrame(accumulator.get_covariances(bias_corrected), index=names, columns=names)
+        return cls(accumulator.get_variables(), matrix, accumulator.get_sample_size())
+
     @classmethod
     def from_covariance_matrix(cls, cov: ICovarianceMatrix):
         return cls(cov.get_variables(), cov.get_matrix(), cov.get_sample_size())
@@ -1,4 +1,311 @@
+import json
+import os
+from typing import List, Optional, Dict, Union, Iterator
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from data.DataSet import DataSet
+from data.DataType import DataType
+from data.Knowledge import Knowledge
+from graph.GraphNode import GraphNode
+
+
 class DataReader:
+    """
+    Reads delimited (CSV, TSV, ...) data files with a header row of variable names into DataSets.
+
+    Files are parsed in chunks with pandas' C parser, so memory use is bounded by the chunk size plus the data
+    itself. With data_type Continuous every column is read as float64, with Discrete every column is discrete,
+    and otherwise (Mixed, or no data type) a column is discrete if it is not numeric, or if it holds only integers
+    with at most max_categories distinct values. The type is inferred from the first chunk and checked against
+    the later ones: a column of integers that turns out to have other values, or more distinct values, is
+    converted to float64, and a numeric column that turns out to have non-numeric values is an error. Discrete
+    values are stored as int32 category codes, numbered as values are first seen, with
+    DataSet.DISCRETE_MISSING_VALUE for missing values; the category labels are kept in the "categories"
+    attribute of each variable.
+
+    Unless use_cache is False, each column is also written as a raw binary file next to a JSON description
+    of the columns, in a "<file>.cache" directory (or in cache_dir). A later read of the same, unchanged
+    file with the same options memory-maps these columns instead of parsing the text again.
+    """
+
+    DELIMITERS: Dict[str, str] = {"colon": ":", "comma": ",", "pipe": "|", "semicolon": ";", "space": " ",
+                                  "tab": "\t", "whitespace": r"\s+"}
+    MISSING_VALUES = ["*", "?", "NA", "NaN", "nan", ""]
+    CACHE_VERSION = 1
+
+    def __init__(self, delimiter: str = "comma", data_type: Optional[Union[DataType, str]] = None,
+                 chunk_size: int = 100000, max_categories: int = 10, use_cache: bool = True,
+                 cache_dir: Optional[str] = None):
+        """
+        :param delimiter: one of the names in DELIMITERS, or the delimiter itself.
+        :param data_type: Continuous, Discrete or Mixed (or their lower case names); None infers the types.
+        :param chunk_size: the number of rows parsed at a time.
+        :param max_categories: the largest number of distinct integers for an inferred discrete column.
+        :param use_cache: whether to read and write the binary column cache.
+        :param cache_dir: where to put the cache; by default, next to the data file.
+        """
+        self.delimiter = DataReader.DELIMITERS.get(delimiter, delimiter)
+        if not self.delimiter:
+            raise ValueError(f"Unknown delimiter: {delimiter}")
+        if isinstance(data_type, str):
+            data_type = {"continuous": DataType.Continuous, "discrete": DataType.Discrete,
+                         "mixed": DataType.Mixed}.get(data_type.lower())
+            if data_type is None:
+                raise ValueError("Only continuous, discrete or mixed data can be read as a data set.")
+        if data_type not in (None, DataType.Continuous, DataType.Discrete, DataType.Mixed):
+            raise ValueError(f"Only continuous, discrete or mixed data can be read as a data set: {data_type}")
+        if chunk_size < 1:
+            raise ValueError(f"Chunk size must be >= 1: {chunk_size}")
+        self.data_type = data_type
+        self.chunk_size = chunk_size
+        self.max_categories = max_categories
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+
+    def read_all(self, paths: List[str]) -> List[DataSet]:
+        return [self.read(path) for path in paths]
+
+    def read(self, path: str) -> DataSet:
+        """
+        Reads the given file, from its cache if there is a valid one.
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No such data file: {path}")
+        cache = self._cache_path(path)
+        if self.use_cache:
+            meta = self._read_meta(path, cache)
+            if meta is not None:
+                return self._from_cache(cache, meta)
+        return self._parse(path, cache if self.use_cache else None)
+
+    @classmethod
+    def read_knowledge(cls, path: str) -> Knowledge:
+        """
+        Reads a knowledge file in Tetrad's format: an "addtemporal" section of tiers, one per line, numbered from 1
+        ("2* X Y" forbids edges within tier 2, "2- X Y" lets tier 2 cause only tier 3), then "forbiddirect" and
+        "requiredirect" sections of "from to" pairs. Lines starting with "//" are comments.
+        """
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No such knowledge file: {path}")
+        knowledge = Knowledge()
+        section = None
+        forbidden_within: List[int] = []
+        only_next: List[int] = []
+        with open(path) as f:
+            for number, line in enumerate(f, 1):
+                tokens = line.split()
+                if not tokens or tokens[0].startswith("//") or tokens[0] == "/knowledge":
+                    continue
+                header = "".join(tokens).lower()
+                if header in ("addtemporal", "forbiddirect", "requiredirect"):
+                    section = header
+                elif section == "addtemporal":
+                    tier = tokens[0].rstrip("*-")
+                    if not tier.isdigit() or int(tier) < 1:
+                        raise ValueError(f"{path}, line {number}: expected a tier number: {tokens[0]}")
+                    tier = int(tier) - 1
+                    knowledge.set_tier(tier, tokens[1:])
+                    if "*" in tokens[0]:
+                        forbidden_within.append(tier)
+                    if "-" in tokens[0]:
+                        only_next.append(tier)
+                elif section in ("forbiddirect", "requiredirect"):
+                    if len(tokens) != 2:
+                        raise ValueError(f"{path}, line {number}: expected two variable names: {line.strip()}")
+                    if section == "forbiddirect":
+                        knowledge.set_forbidden(tokens[0], tokens[1])
+                    else:
+                        knowledge.set_required(tokens[0], tokens[1])
+                else:
+                    raise ValueError(f"{path}, line {number}: expected addtemporal, forbiddirect or requiredirect")
+        # Both rules refer to the later tiers, so they are added once all the tiers are read.
+        for tier in forbidden_within:
+            knowledge.set_tier_forbidden_within(tier, True)
+        for tier in only_next:
+            knowledge.set_only_can_cause_next_tier(tier, True)
+        return knowledge
+
+    def read_chunks(self, path: str) -> Iterator[DataFrame]:
+        """
+        Yields the rows of a continuous data file as float64 DataFrames of at most chunk_size rows, without
+        keeping the file in memory or in the cache; e.g. for CovarianceMatrix.from_chunks().
+        """
+        if self.data_type not in (None, DataType.Continuous):
+            raise ValueError("Only continuous data can be read in chunks.")
+        for chunk in self._chunks(path):
+            yield DataFrame({str(c).strip(): self._to_float(chunk[c], c) for c in chunk.columns}, copy=False)
+
+    def _chunks(self, path: str):
+        return pd.read_csv(path, sep=self.delimiter, engine="c", dtype=str, na_values=DataReader.MISSING_VALUES,
+                           keep_default_na=False, chunksize=self.chunk_size, skipinitialspace=True)
+
+    def _cache_path(self, path: str) -> str:
+        if self.cache_dir:
+            return os.path.join(self.cache_dir, os.path.basename(path) + ".cache")
+        return path + ".cache"
+
+    def _source_info(self, path: str) -> Dict:
+        stat = os.stat(path)
+        return {"version": DataReader.CACHE_VERSION, "source": os.path.abspath(path), "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns, "delimiter": self.delimiter,
+                "data_type": None if self.data_type is None else self.data_type.name,
+                "max_categories": self.max_categories}
+
+    def _read_meta(self, path: str, cache: str) -> Optional[Dict]:
+        try:
+            with open(os.path.join(cache, "meta.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("source_info") != self._source_info(path):
+            return None
+        return meta
+
+    def _column_kinds(self, chunk: DataFrame) -> List[bool]:
+        """ Decides, from the first chunk, which columns are discrete; _parse() checks the later chunks.
+
+        """
+        if self.data_type == DataType.Continuous:
+            return [False] * chunk.shape[1]
+        if self.data_type == DataType.Discrete:
+            return [True] * chunk.shape[1]
+        discrete = []
+        for c in chunk.columns:
+            values = pd.to_numeric(chunk[c], errors="coerce")
+            if values.isna().sum() > chunk[c].isna().sum():
+                discrete.append(True)
+                continue
+            values = values.dropna().to_numpy()
+            discrete.append(bool(np.all(values == np.round(values))) and
+                            len(np.unique(values)) <= self.max_categories)
+        return discrete
+
+    def _parse(self, path: str, cache: Optional[str]) -> DataSet:
+        reader = self._chunks(path)
+        names: List[str] = []
+        discrete: List[bool] = []
+        integers: List[bool] = []
+        categories: List[Dict[str, int]] = []
+        parts: List[List[np.ndarray]] = []
+        files = []
+        num_rows = 0
+        if cache:
+            os.makedirs(cache, exist_ok=True)
+            # The metadata is written last, so a cache left half written by a failed read is never used.
+            if os.path.exists(os.path.join(cache, "meta.json")):
+                os.remove(os.path.join(cache, "meta.json"))
+        try:
+            for chunk in reader:
+                if not names:
+                    names = [str(c).strip() for c in chunk.columns]
+                    discrete = self._column_kinds(chunk)
+                    # The columns inferred discrete, which may still turn out to be numbers that are not categories.
+                    integers = [d and self.data_type in (None, DataType.Mixed) for d in discrete]
+                    categories = [{} for _ in names]
+                    parts = [[] for _ in names]
+                    if cache:
+                        files = [open(os.path.join(cache, f"{i}.bin"), "wb") for i in range(len(names))]
+                for i, c in enumerate(chunk.columns):
+                    if integers[i]:
+                        values = pd.to_numeric(chunk[c], errors="coerce")
+                        if values.isna().sum() > chunk[c].isna().sum():
+                            # Not all numbers, so the column stays discrete.
+                            integers[i] = False
+                        elif not self._are_categories(values.dropna().to_numpy(), categories[i]):
+                            # Converts the values read so far, which were stored as category codes.
+                            if cache:
+                                files[i].close()
+                                codes = np.fromfile(files[i].name, dtype=np.int32)
+                                files[i] = open(files[i].name, "wb")
+                                self._decode(codes, categories[i]).tofile(files[i])
+                            else:
+                                parts[i] = [self._decode(codes, categories[i]) for codes in parts[i]]
+                            integers[i] = False
+                            discrete[i] = False
+                            categories[i] = {}
+                    column = self._encode(chunk[c], categories[i]) if discrete[i] else self._to_float(chunk[c], c)
+                    if cache:
+                        column.tofile(files[i])
+                    else:
+                        parts[i].append(column)
+                num_rows += len(chunk)
+        finally:
+            for f in files:
+                f.close()
+
+        meta = {"source_info": self._source_info(path), "num_rows": num_rows,
+                "columns": [{"name": name, "discrete": discrete[i],
+                             "dtype": "int32" if discrete[i] else "float64",
+                             "categories": list(categories[i]) if discrete[i] else None}
+                            for i, name in enumerate(names)]}
+        if cache:
+            with open(os.path.join(cache, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            return self._from_cache(cache, meta)
+        columns = [np.concatenate(p) if p else np.zeros(0, dtype=np.int32 if discrete[i] else np.float64)
+                   for i, p in enumerate(parts)]
+        return DataReader._make_dataset(meta, columns)
+
+    @classmethod
+    def _encode(cls, column: pd.Series, categories: Dict[str, int]) -> np.ndarray:
+        """ Maps the values of a discrete column to codes, adding codes for values not seen before.
+
+        """
+        values = column.to_numpy(dtype=object)
+        missing = column.isna().to_numpy()
+        uniques, inverse = np.unique(values[~missing].astype(str), return_inverse=True)
+        for u in uniques:
+            if u not in categories:
+                categories[u] = len(categories)
+        codes = np.full(len(values), DataSet.DISCRETE_MISSING_VALUE, dtype=np.int32)
+        codes[~missing] = np.array([categories[u] for u in uniques], dtype=np.int32)[inverse]
+        return codes
+
+    def _are_categories(self, values: np.ndarray, categories: Dict[str, int]) -> bool:
+        """ Whether the numbers of a discrete column, with the categories seen so far, are still integers with at
+        most max_categories distinct values.
+
+        """
+        if not np.all(values == np.round(values)):
+            return False
+        return len({float(k) for k in categories}.union(np.unique(values).tolist())) <= self.max_categories
+
+    @classmethod
+    def _decode(cls, codes: np.ndarray, categories: Dict[str, int]) -> np.ndarray:
+        """ Maps the codes of a discrete column of numbers back to their values, as float64.
+
+        """
+        values = np.array([float(k) for k in categories] + [np.nan], dtype=np.float64)
+        return values[np.where(codes == DataSet.DISCRETE_MISSING_VALUE, len(categories), codes)]
+
+    @classmethod
+    def _to_float(cls, column: pd.Series, name: str) -> np.ndarray:
+        values = pd.to_numeric(column, errors="coerce")
+        if values.isna().sum() > column.isna().sum():
+            raise ValueError(f"Column {name} has non-numeric values but was read as continuous.")
+        return values.to_numpy(dtype=np.float64)
+
+    def _from_cache(self, cache: str, meta: Dict) -> DataSet:
+        num_rows = meta["num_rows"]
+        columns = []
+        for i, c in enumerate(meta["columns"]):
+            if num_rows == 0:
+                columns.append(np.zeros(0, dtype=c["dtype"]))
+            else:
+                columns.append(np.memmap(os.path.join(cache, f"{i}.bin"), dtype=c["dtype"], mode="r",
+                                         shape=(num_rows,)))
+        return DataReader._make_dataset(meta, columns)
 
-    def __init__(self):
-        pass
+    @classmethod
+    def _make_dataset(cls, meta: Dict, columns: List[np.ndarray]) -> DataSet:
+        variables = []
+        for c in meta["columns"]:
+            node = GraphNode(c["name"])
+            if c["discrete"]:
+                node.add_attribute("categories", c["categories"])
+            variables.append(node)
+        data = DataFrame({c["name"]: column for c, column in zip(meta["columns"], columns)}, copy=False)
+        return DataSet(data, variables)
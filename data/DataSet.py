@@ -1,19 +1,35 @@
-from typing import List, Optional
+from typing import List, Optional, Dict
+import numpy as np
 from pandas import DataFrame
+from pandas.api.types import is_float_dtype, is_integer_dtype
 from data.DataModel import DataModel
 from data.IKnowledge import IKnowledge
 from data.Knowledge import Knowledge
+from graph.GraphNode import GraphNode
 from graph.Node import Node
 
 
 class DataSet(DataModel):
-    def __init__(self, data: DataFrame):
+    """
+    A data set stored as a DataFrame. Float columns are continuous variables (missing values are NaN);
+    all other columns are discrete, and integer columns hold category codes (missing values are
+    DISCRETE_MISSING_VALUE).
+    """
+
+    DISCRETE_MISSING_VALUE = -1
+
+    def __init__(self, data: DataFrame, variables: Optional[List[Node]] = None):
         # The container storing the data. Rows are cases; columns are variables.
         # The order of columns is coordinated with the order of variables in getVariables().
         self.data: DataFrame = data
 
         # The list of variables. These correspond column wise to the columns of data.
-        self.variables: List[Node] = []
+        if variables is None:
+            variables = [GraphNode(str(c)) for c in data.columns]
+        elif len(variables) != data.shape[1]:
+            raise ValueError(f"Expecting {data.shape[1]} variables, one per column: {len(variables)}")
+        self.variables: List[Node] = list(variables)
+        self.names: Dict[str, Node] = {v.get_name(): v for v in self.variables}
 
         # The name of the data model. This is not used internally;
         # It is only here in case an external class wants this dataset to have a name.
@@ -21,7 +37,26 @@ class DataSet(DataModel):
 
         # The knowledge associated with this data.
         self.knowledge = Knowledge()
-        self.has_missing_value = self.data.isnull().values.any() or self.data.isnull().values.any()
+        self.has_missing_value = DataSet._has_missing_value(self.data)
+
+    @classmethod
+    def _has_missing_value(cls, data: DataFrame) -> bool:
+        """ Checks the data a block of columns at a time, so that no mask of the size of the data is built.
+
+        """
+        step = max(1, (1 << 22) // max(data.shape[0], 1))
+        for start in range(0, data.shape[1], step):
+            block = data.iloc[:, start:start + step]
+            if all(is_float_dtype(t) for t in block.dtypes):
+                missing = np.isnan(block.to_numpy()).any()
+            elif all(is_integer_dtype(t) for t in block.dtypes):
+                missing = (block.to_numpy() == DataSet.DISCRETE_MISSING_VALUE).any()
+            else:
+                missing = any((block[c].to_numpy() == DataSet.DISCRETE_MISSING_VALUE).any() if is_integer_dtype(t)
+                              else block[c].isnull().any() for c, t in block.dtypes.items())
+            if missing:
+                return True
+        return False
 
     def get_name(self) -> str:
         return self.name
@@ -30,28 +65,33 @@ class DataSet(DataModel):
         self.name = name
 
     def is_continuous(self) -> bool:
-        pass
+        return all(is_float_dtype(t) for t in self.data.dtypes)
 
     def is_discrete(self) -> bool:
-        pass
+        return not any(is_float_dtype(t) for t in self.data.dtypes)
 
     def is_mixed(self) -> bool:
-        pass
+        return not self.is_continuous() and not self.is_discrete()
+
+    def is_continuous_column(self, column: int) -> bool:
+        return is_float_dtype(self.data.dtypes.iloc[column])
 
     def get_variable(self, name: str) -> Optional[Node]:
-        pass
+        return self.names.get(name)
 
     def get_variables(self) -> List[Node]:
-        pass
+        return self.variables
 
     def get_variable_names(self) -> List[str]:
-        pass
+        return [v.get_name() for v in self.variables]
 
     def get_knowledge(self) -> IKnowledge:
-        pass
+        return self.knowledge
 
     def set_knowledge(self, knowledge: Optional[IKnowledge]):
-        pass
+        if knowledge is None:
+            raise ValueError("knowledge is None")
+        self.knowledge = knowledge.copy()
 
     def exists_missing_value(self) -> bool:
         return self.has_missing_value
@@ -60,6 +100,12 @@ class DataSet(DataModel):
         """
         return the number of rows in the data set.
         """
+        return self.data.shape[0]
+
+    def get_num_columns(self) -> int:
+        """
+        return the number of columns in the data set.
+        """
         return self.data.shape[1]
 
     def get_data(self) -> DataFrame:
@@ -0,0 +1,42 @@
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_integer_dtype
+
+from data.DataSet import DataSet
+
+
+class DataUtils:
+    @classmethod
+    def discrete_codes(cls, dataset: DataSet) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Integer-encodes every column of a discrete data set once, for the tests and scores that count cases.
+
+        Integer columns are taken to hold category codes already (as read by DataReader), with
+        DataSet.DISCRETE_MISSING_VALUE for missing values; their number of categories is the length of the
+        "categories" attribute of the variable, or the largest code plus one if that is more. Other columns
+        are factorized, in order of appearance, with missing values coded -1.
+
+        :return: a rows x variables int32 matrix of codes in column-major order, so that each column is
+            contiguous; and the number of categories of each variable.
+        """
+        data = dataset.get_data()
+        num_rows, num_columns = data.shape
+        codes = np.empty((num_rows, num_columns), dtype=np.int32, order="F")
+        num_categories = np.zeros(num_columns, dtype=np.int64)
+        for i, (variable, column) in enumerate(zip(dataset.get_variables(), data.columns)):
+            values = data[column]
+            if is_integer_dtype(values.dtype):
+                column_codes = values.to_numpy()
+                if (column_codes < DataSet.DISCRETE_MISSING_VALUE).any():
+                    raise ValueError(f"Negative category codes in {variable}")
+                categories = variable.get_attribute("categories")
+                num = max(len(categories) if categories else 0, int(column_codes.max()) + 1 if num_rows else 0)
+            else:
+                column_codes, uniques = pd.factorize(values, use_na_sentinel=True)
+                num = len(uniques)
+            codes[:, i] = column_codes
+            # A variable with no observed category still takes one cell in a table.
+            num_categories[i] = max(num, 1)
+        return codes, num_categories
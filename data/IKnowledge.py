@@ -137,3 +137,6 @@ class IKnowledge:
 
     def set_only_can_cause_next_tier(self, tier: int, only_causes_next: bool):
         raise NotImplementedError
+
+    def compile(self, names: List[str]):
+        raise NotImplementedError
@@ -2,6 +2,7 @@ from typing import List, Set, Dict, Iterable, Optional
 from data.IKnowledge import IKnowledge
 from data.KnowledgeEdge import KnowledgeEdge
 from data.KnowledgeGroup import KnowledgeGroup
+from data.KnowledgeIndex import KnowledgeIndex
 from graph.Edges import Edges
 from graph.Graph import Graph
 from graph.Node import Node
@@ -33,27 +34,42 @@ class Knowledge(IKnowledge):
 
     def __init__(self, nodes: Optional[List[str]] = None, knowledge=None):
         self.default_to_knowledge_layout: bool = False
-        self.variables = Set[str]()
-        if not nodes:
+        self.variables: Set[str] = set()
+        # The compiled snapshot returned by compile(), dropped on every change.
+        self._compiled: Optional[KnowledgeIndex] = None
+        if nodes:
             for n in nodes:
                 if self._check_var_name(n):
                     self.variables.add(n)
                 else:
                     raise NameError(f"Bad variable node {n}.")
-        if not knowledge:
+        if knowledge:
             self.default_to_knowledge_layout = knowledge.default_to_knowledge_layout
-            self.variables = Set[str](knowledge.variables)
+            self.variables = set(knowledge.variables)
             self.forbidden_rules_specs = list(knowledge.forbidden_rules_specs)
             self.required_rules_specs = list(knowledge.required_rules_specs)
             self.tier_specs = list(knowledge.tier_specs)
             self.knowledge_groups = list(knowledge.knowledge_groups)
             self.knowledge_group_rules = dict(knowledge.knowledge_group_rules)
         else:
-            self.forbidden_rules_specs = List[OrderedPair[Set[str]]]()
-            self.required_rules_specs = List[OrderedPair[Set[str]]]()
-            self.tier_specs = List[Set[str]]()
-            self.knowledge_groups = List[KnowledgeGroup]()
-            self.knowledge_group_rules = Dict[KnowledgeGroup, OrderedPair[Set[str]]]()
+            self.forbidden_rules_specs: List[OrderedPair[Set[str]]] = []
+            self.required_rules_specs: List[OrderedPair[Set[str]]] = []
+            self.tier_specs: List[Set[str]] = []
+            self.knowledge_groups: List[KnowledgeGroup] = []
+            self.knowledge_group_rules: Dict[KnowledgeGroup, OrderedPair[Set[str]]] = {}
+
+    def _invalidate(self):
+        self._compiled = None
+
+    def compile(self, names: List[str]) -> KnowledgeIndex:
+        """
+        Returns an immutable index of this knowledge over the given variable names, for constant time
+        is_forbidden / is_required checks. The index is cached until the knowledge is changed.
+        """
+        names = list(names)
+        if self._compiled is None or self._compiled.get_names() != names:
+            self._compiled = KnowledgeIndex.from_knowledge(self, names)
+        return self._compiled
 
     def _check_var_name(self, name: str) -> bool:
         return True if Knowledge.VARNAME_PATTERN.match(name) else False
@@ -67,7 +83,7 @@ class Knowledge(IKnowledge):
         return spec.replace(".", "\\.")
 
     def _get_extent(self, spec: str) -> Set[str]:
-        var = Set[str]()
+        var = set()
         if "*" in spec:
             patterns = [re.compile(s.replace("*", ".*")) for s in self._split(spec)]
             var = {v for p in patterns if p for v in self.variables if p.match(v)}
@@ -82,33 +98,35 @@ class Knowledge(IKnowledge):
 
     def _ensure_tiers(self, tier: int):
         for i in range(len(self.tier_specs), tier + 1):
+            self._invalidate()
             self.tier_specs.append(set())
             for j in range(i):
                 self.forbidden_rules_specs.append(OrderedPair(self.tier_specs[i], self.tier_specs[j]))
 
     def _get_group_rule(self, group: KnowledgeGroup) -> OrderedPair[Set[str]]:
-        from_extent = Set[str]()
+        from_extent = set()
         var = group.get_from_variables()
         for v in var:
             from_extent |= self._get_extent(v)
-        to_extent = Set[str]()
+        to_extent = set()
         var = group.get_to_variables()
         for v in var:
             to_extent |= self._get_extent(v)
         return OrderedPair(from_extent, to_extent)
 
-    def _forbidden_tier_rules(self) -> Set[OrderedPair[Set[str]]]:
-        rules = Set[OrderedPair[Set[str]]]()
+    def _forbidden_tier_rules(self) -> List[OrderedPair[Set[str]]]:
+        # A list, since the rules hold (unhashable) sets.
+        rules = []
         for i, r in enumerate(self.tier_specs):
             if self.is_tier_forbidden_within(i):
-                rules.add(OrderedPair(r, r))
+                rules.append(OrderedPair(r, r))
         for i, r in enumerate(self.tier_specs):
             if self.is_only_can_cause_next_tier(i):
                 for j in self.tier_specs[i + 2:]:
-                    rules.add(OrderedPair(r, j))
+                    rules.append(OrderedPair(r, j))
         for i, r in enumerate(self.tier_specs):
             for j in self.tier_specs[i + 1:]:
-                rules.add(OrderedPair(j, r))
+                rules.append(OrderedPair(j, r))
         return rules
 
     def add2tier(self, tier: int, spec: str):
@@ -116,6 +134,7 @@ class Knowledge(IKnowledge):
         Adds the given variable or wildcard pattern to the given tier.
         The tier is a non-negative integer.
         """
+        self._invalidate()
         if tier < 0:
             raise ValueError
         if not spec:
@@ -132,6 +151,7 @@ class Knowledge(IKnowledge):
         """
         Puts a variable into tier i if its name is xxx:ti for some xxx and some
         """
+        self._invalidate()
         for n in var_names:
             if self._check_var_name(n):
                 index = n.rindex(":t")
@@ -149,6 +169,7 @@ class Knowledge(IKnowledge):
         Adds a knowledge group. Legacy method, replaced by setForbidden,
         setRequired with patterns. Needed for the interface.
         """
+        self._invalidate()
         self.knowledge_groups.append(group)
         o = self._get_group_rule(group)
         self.knowledge_group_rules[group] = o
@@ -159,6 +180,7 @@ class Knowledge(IKnowledge):
             self.required_rules_specs.append(o)
 
     def add_variable(self, var_name: str):
+        self._invalidate()
         if var_name not in self.variables and self._check_var_name(var_name):
             self.variables.add(var_name)
 
@@ -166,6 +188,7 @@ class Knowledge(IKnowledge):
         """
         Removes explicit knowledge and tier information.
         """
+        self._invalidate()
         self.forbidden_rules_specs.clear()
         self.required_rules_specs.clear()
         self.tier_specs.clear()
@@ -179,7 +202,7 @@ class Knowledge(IKnowledge):
         copy.remove(forbidden_rules)
         for g in self.knowledge_groups:
             copy.remove(self.knowledge_group_rules.get(g))
-        edges = Set[KnowledgeEdge]()
+        edges = set()
         for n in copy:
             for x in n.get_first():
                 for y in n.get_second():
@@ -196,7 +219,7 @@ class Knowledge(IKnowledge):
         """
         Iterator over the KnowledgeEdge's representing forbidden edges.
         """
-        edges = Set[KnowledgeEdge]()
+        edges = set()
         for r in self.forbidden_rules_specs:
             for x in r.get_first():
                 for y in r.get_second():
@@ -313,6 +336,7 @@ class Knowledge(IKnowledge):
         """
         Removes the given variable by name or search string from all tiers.
         """
+        self._invalidate()
         if not spec:
             raise ValueError()
         spec = self._check_spec(spec)
@@ -325,6 +349,7 @@ class Knowledge(IKnowledge):
         """
         Removes the knowledge group at the given index.
         """
+        self._invalidate()
         old = self.knowledge_group_rules.get(self.knowledge_groups[index])
         if old in self.forbidden_rules_specs:
             self.forbidden_rules_specs.remove(old)
@@ -336,6 +361,7 @@ class Knowledge(IKnowledge):
         """
         Removes the given variable from the list of myNodes and all rules.
         """
+        self._invalidate()
         if not self._check_var_name(name):
             raise ValueError(f"Bad variable name: {name}")
         self.variables.remove(name)
@@ -352,7 +378,7 @@ class Knowledge(IKnowledge):
         """
         Iterator over the KnowledgeEdge's representing required edges.
         """
-        edges = Set[KnowledgeEdge]()
+        edges = set()
         for r in self.required_rules_specs:
             for s1 in r.get_first():
                 for s2 in r.get_second():
@@ -364,6 +390,7 @@ class Knowledge(IKnowledge):
         """
         Marks the edge var1 --> var2 as forbid.
         """
+        self._invalidate()
         self.add_variable(var1)
         self.add_variable(var2)
 
@@ -379,6 +406,7 @@ class Knowledge(IKnowledge):
         """
         Marks the edge var1 --> var2 as not forbid.
         """
+        self._invalidate()
         var1 = self._check_spec(var1)
         var2 = self._check_spec(var2)
 
@@ -391,6 +419,7 @@ class Knowledge(IKnowledge):
         """
         Marks the edge var1 --> var2 as required.
         """
+        self._invalidate()
         self.add_variable(var1)
         self.add_variable(var2)
 
@@ -411,6 +440,7 @@ class Knowledge(IKnowledge):
         """
         Marks the edge var1 --> var2 as not required.
         """
+        self._invalidate()
         var1 = self._check_spec(var1)
         var2 = self._check_spec(var2)
 
@@ -426,6 +456,7 @@ class Knowledge(IKnowledge):
         """
         Sets the variable in a given tier to the specified list.
         """
+        self._invalidate()
         self._ensure_tiers(tier)
         vars_in_tier = self.tier_specs[tier]
         if vars_in_tier:
@@ -438,6 +469,7 @@ class Knowledge(IKnowledge):
         Forbids any variable from being parent of any other variable
         within the given tier, or cancels this forbidding.
         """
+        self._invalidate()
         self._ensure_tiers(tier)
         vars_in_tier = self.tier_specs[tier]
         if forbidden:
@@ -480,7 +512,7 @@ class Knowledge(IKnowledge):
         return self.get_list_of_required_edges()
 
     def get_list_of_forbidden_edges(self) -> List[KnowledgeEdge]:
-        edges = List[KnowledgeEdge]()
+        edges = []
         for r in self.forbidden_rules_specs:
             for e1 in r.get_first():
                 for e2 in r.get_second():
@@ -497,7 +529,7 @@ class Knowledge(IKnowledge):
         for k in self.knowledge_groups:
             copy.remove(self.knowledge_group_rules.get(k))
 
-        edges = List[KnowledgeEdge]()
+        edges = []
         for c in copy:
             for e1 in c.get_first():
                 for e2 in c.get_second():
@@ -519,6 +551,7 @@ class Knowledge(IKnowledge):
         return True
 
     def set_only_can_cause_next_tier(self, tier: int, only_causes_next: bool):
+        self._invalidate()
         self._ensure_tiers(tier)
         vars_in_tier = self.tier_specs[tier]
         for i in range(tier + 2, len(self.tier_specs)):
@@ -12,8 +12,8 @@ class KnowledgeGroup:
         if k_type != KnowledgeGroup.REQUIRED and k_type != KnowledgeGroup.FORBIDDEN:
             raise ValueError("The given type needs to be either REQUIRED or FORBIDDEN")
         self.k_type = k_type
-        self.k_from = Set[str]()
-        self.k_to = Set[str]()
+        self.k_from = set()
+        self.k_to = set()
 
     def __init__(self, k_type: int, k_from: Set[str], k_to: Set[str]):
         if k_type != KnowledgeGroup.REQUIRED and k_type != KnowledgeGroup.FORBIDDEN:
@@ -45,7 +45,7 @@ class KnowledgeGroup:
         return self.k_to
 
     def get_edges(self) -> List[KnowledgeEdge]:
-        edges = List[KnowledgeEdge]()
+        edges = []
         for f in self.k_from:
             for t in self.k_to:
                 edges.append(KnowledgeEdge(f, t))
@@ -0,0 +1,107 @@
+from typing import List, Dict
+
+import numpy as np
+
+
+class KnowledgeIndex:
+    """
+    An immutable, compiled snapshot of a Knowledge object over a fixed list of variable names.
+
+    Forbidden and required edges are expanded once into n x n boolean matrices (entry [i, j] is about the edge
+    names[i] --> names[j]) and tiers into an array of tier indices (-1 for variables in no tier), so the knowledge
+    checks made for every edge and candidate parent in an adjacency search are array lookups instead of scans
+    over the rule specs. Obtain one with Knowledge.compile(names); it is rebuilt whenever the knowledge changes.
+    """
+
+    def __init__(self, names: List[str], forbidden: np.ndarray, required: np.ndarray, tiers: np.ndarray):
+        n = len(names)
+        if forbidden.shape != (n, n) or required.shape != (n, n) or tiers.shape != (n,):
+            raise ValueError("The matrices must be n x n and the tier array of length n, n = len(names).")
+        self.names = list(names)
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        # An edge that is required is never forbidden.
+        self.forbidden = forbidden & ~required
+        self.required = required.copy()
+        self.tiers = tiers.copy()
+        self.empty = not (self.forbidden.any() or self.required.any())
+        for a in (self.forbidden, self.required, self.tiers):
+            a.setflags(write=False)
+
+    @classmethod
+    def from_knowledge(cls, knowledge, names: List[str]):
+        """
+        Compiles the rules and tiers of the given Knowledge over the given variable names.
+        """
+        n = len(names)
+        index = {name: i for i, name in enumerate(names)}
+        forbidden = np.zeros((n, n), dtype=bool)
+        required = np.zeros((n, n), dtype=bool)
+        tiers = np.full(n, -1, dtype=np.int32)
+
+        def members(spec) -> np.ndarray:
+            return np.array([index[v] for v in spec if v in index], dtype=np.intp)
+
+        for rules, matrix in ((knowledge.forbidden_rules_specs, forbidden),
+                              (knowledge.required_rules_specs, required)):
+            for r in rules:
+                matrix[np.ix_(members(r.get_first()), members(r.get_second()))] = True
+
+        for t, tier in enumerate(knowledge.tier_specs):
+            tiers[members(tier)] = t
+        # Edges from later tiers to earlier tiers are forbidden.
+        in_tier = tiers >= 0
+        forbidden |= np.outer(in_tier, in_tier) & (tiers[:, None] > tiers[None, :])
+
+        np.fill_diagonal(forbidden, False)
+        np.fill_diagonal(required, False)
+        return cls(names, forbidden, required, tiers)
+
+    def get_names(self) -> List[str]:
+        return list(self.names)
+
+    def get_index(self, name: str) -> int:
+        """
+        return the index of the variable with the given name, or -1 if it is not compiled.
+        """
+        return self.index.get(name, -1)
+
+    def is_empty(self) -> bool:
+        """
+        true if no edge among the compiled variables is forbidden or required.
+        """
+        return self.empty
+
+    def is_forbidden(self, var1: str, var2: str) -> bool:
+        """
+        Determines whether the edge var1 --> var2 is forbidden.
+        """
+        i = self.index.get(var1)
+        j = self.index.get(var2)
+        return i is not None and j is not None and bool(self.forbidden[i, j])
+
+    def is_required(self, var1: str, var2: str) -> bool:
+        """
+        Determines whether the edge var1 --> var2 is required.
+        """
+        i = self.index.get(var1)
+        j = self.index.get(var2)
+        return i is not None and j is not None and bool(self.required[i, j])
+
+    def no_edge_required(self, x: str, y: str) -> bool:
+        return not (self.is_required(x, y) or self.is_required(y, x))
+
+    def is_in_which_tier(self, name: str) -> int:
+        """
+        return the index of the tier of the named variable if it's in a tier, otherwise -1.
+        """
+        i = self.index.get(name)
+        return -1 if i is None else int(self.tiers[i])
+
+    def get_forbidden_matrix(self) -> np.ndarray:
+        return self.forbidden
+
+    def get_required_matrix(self) -> np.ndarray:
+        return self.required
+
+    def get_tiers(self) -> np.ndarray:
+        return self.tiers
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+from typing import Sequence, Tuple
+
+import numpy as np
+
+
+class MissingDataIndex:
+    """
+    Indexes which values of a continuous data matrix are present, for tests that drop incomplete rows.
+
+    The validity mask of each column is packed into bits once (8 rows per byte), so the rows that are complete
+    for a set of variables are found by AND-ing a few packed columns, not by scanning the data. Row sets are
+    cached per (sorted) variable set. The index also gives the pairwise-deletion covariance matrix, in which
+    each entry is computed from the rows where both of its variables are present, with the number of such rows.
+    """
+
+    def __init__(self, data: np.ndarray, cache_size: int = 10000):
+        """
+        :param data: a rows x variables float matrix, with NaN for missing values.
+        :param cache_size: the maximum number of complete-row sets kept in memory.
+        """
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim != 2:
+            raise ValueError("Data must be a rows x variables matrix.")
+        if cache_size < 0:
+            raise ValueError(f"Cache size must be >= 0: {cache_size}")
+        self.data = data
+        self.num_rows = data.shape[0]
+        self.valid = ~np.isnan(data)
+        # One row of packed bits per variable.
+        self.packed = np.ascontiguousarray(np.packbits(self.valid, axis=0).T)
+        self.cache_size = cache_size
+        self._rows: "OrderedDict[Tuple[int, ...], np.ndarray]" = OrderedDict()
+
+    def get_num_rows(self) -> int:
+        return self.num_rows
+
+    def has_missing_values(self) -> bool:
+        return not self.valid.all()
+
+    def get_valid_mask(self) -> np.ndarray:
+        """
+        return the rows x variables boolean matrix of the values that are present.
+        """
+        return self.valid
+
+    def complete_rows(self, variables: Sequence[int]) -> np.ndarray:
+        """
+        return the indices of the rows where all the given variables are present.
+        """
+        key = tuple(sorted(set(variables)))
+        rows = self._rows.get(key)
+        if rows is not None:
+            self._rows.move_to_end(key)
+            return rows
+        if not key:
+            rows = np.arange(self.num_rows)
+        else:
+            bits = np.bitwise_and.reduce(self.packed[list(key)], axis=0)
+            rows = np.flatnonzero(np.unpackbits(bits, count=self.num_rows))
+        if self.cache_size > 0:
+            self._rows[key] = rows
+            if len(self._rows) > self.cache_size:
+                self._rows.popitem(last=False)
+        return rows
+
+    def count_complete_rows(self, variables: Sequence[int]) -> int:
+        """
+        return the number of rows where all the given variables are present.
+        """
+        return len(self.complete_rows(variables))
+
+    def clear_cache(self):
+        self._rows.clear()
+
+    def pairwise_counts(self) -> np.ndarray:
+        """
+        return the variables x variables matrix of the number of rows where both variables are present.
+        """
+        valid = self.valid.astype(np.float64)
+        return np.rint(valid.T @ valid).astype(np.int64)
+
+    def pairwise_covariances(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Computes each covariance from the rows where both of its variables are present (pairwise deletion),
+        with the bias corrected divisor n_ij - 1. The result need not be positive definite.
+
+        :return: the covariance matrix, with NaN for pairs present together in fewer than 2 rows; and the
+            matrix of the numbers of rows n_ij used for each entry.
+        """
+        valid = self.valid.astype(np.float64)
+        # Covariances do not depend on the location, so center first to keep the sums of products small.
+        zeroed = np.where(self.valid, self.data, 0.)
+        present = valid.sum(axis=0)
+        means = np.divide(zeroed.sum(axis=0), present, out=np.zeros(len(present)), where=present > 0)
+        zeroed = np.where(self.valid, zeroed - means, 0.)
+        counts = valid.T @ valid
+        # sums[i, j] = the sum of variable i over the rows where variables i and j are both present.
+        sums = zeroed.T @ valid
+        products = zeroed.T @ zeroed
+        with np.errstate(divide="ignore", invalid="ignore"):
+            covariances = (products - sums * sums.T / counts) / (counts - 1)
+        covariances[counts < 2] = np.nan
+        return (covariances + covariances.T) / 2, np.rint(counts).astype(np.int64)
@@ -0,0 +1,115 @@
+from typing import List
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from pandas import DataFrame
+
+from data.CovarianceMatrix import CovarianceMatrix
+from data.DataSet import DataSet
+from data.Knowledge import Knowledge
+from graph.Node import Node
+from graph.TimeLagGraph import TimeLagGraph
+
+
+class TimeSeriesUtils:
+    """
+    Builds the lagged data of a time series: for T rows of n variables and L lags, the T - L rows t = L..T-1 of the
+    (L + 1) n columns X, X:1, ..., X:L, where X:k holds the value of X at row t - k. Columns are in the order of
+    the nodes of a TimeLagGraph, lag 0 first.
+    """
+
+    @classmethod
+    def lag_variables(cls, variables: List[Node], num_lags: int) -> List[Node]:
+        """
+        return the variables of the lagged data: the given ones for lag 0, then copies named X:k for each lag k.
+        """
+        return [v if lag == 0 else v.like(TimeLagGraph.lag_name(v.get_name(), lag))
+                for lag in range(num_lags + 1) for v in variables]
+
+    @classmethod
+    def lag_view(cls, values: np.ndarray, num_lags: int) -> np.ndarray:
+        """ A read-only view of the lagged values of a time series, without copying them.
+
+        :param values: the series, rows x variables.
+        :param num_lags: the number of lags L.
+        :return: an array of shape (rows - L, L + 1, variables) whose entry [r, k, v] is values[r + L - k, v].
+        """
+        if values.ndim != 2:
+            raise ValueError(f"Expecting a rows x variables array: {values.shape}")
+        if num_lags < 0 or num_lags >= values.shape[0]:
+            raise ValueError(f"Number of lags must be in [0, {values.shape[0]}): {num_lags}")
+        rows, columns = values.strides
+        return as_strided(values[num_lags:], shape=(values.shape[0] - num_lags, num_lags + 1, values.shape[1]),
+                          strides=(rows, -rows, columns), writeable=False)
+
+    @classmethod
+    def create_lag_data(cls, dataset: DataSet, num_lags: int) -> DataSet:
+        """
+        return the lagged data set of a time series. Each lagged column is a view of a column of the data set,
+        so the lagged data take no more memory than the series itself until a copy is asked for. The knowledge
+        puts the columns of lag L in tier 0 and those of lag 0 in tier L, so that no edge goes back in time.
+        """
+        data = dataset.get_data()
+        num_rows = data.shape[0]
+        if num_lags < 0 or num_lags >= num_rows:
+            raise ValueError(f"Number of lags must be in [0, {num_rows}): {num_lags}")
+        variables = TimeSeriesUtils.lag_variables(dataset.get_variables(), num_lags)
+        series = [data[c].to_numpy() for c in data.columns]
+        columns = {}
+        for lag in range(num_lags + 1):
+            for column in series:
+                columns[variables[len(columns)].get_name()] = column[num_lags - lag:num_rows - lag]
+        lagged = DataSet(DataFrame(columns, copy=False), variables)
+        names = [v.get_name() for v in variables]
+        knowledge = Knowledge(names)
+        n = len(series)
+        for lag in range(num_lags + 1):
+            knowledge.set_tier(num_lags - lag, names[lag * n:(lag + 1) * n])
+        lagged.set_knowledge(knowledge)
+        return lagged
+
+    @classmethod
+    def lag_covariance(cls, dataset: DataSet, num_lags: int, bias_corrected: bool = True) -> CovarianceMatrix:
+        """ The covariance matrix of the lagged data set of a continuous time series, computed from the series.
+
+        The block of lags (i, j), i >= j, sums the products of the rows s - d and s of the series over a window
+        of s, for d = i - j; it is the product of the whole series with itself shifted by d, shared by all the
+        blocks of that difference, less the at most L rows outside the window at each end. So the series is never
+        copied once per lag, and all the blocks take L + 1 products over the series and (L + 1)^2 products over
+        L rows, rather than (L + 1)^2 products over the series.
+
+        :param dataset: the continuous series, without missing values.
+        :param num_lags: the number of lags L.
+        :param bias_corrected: divide by the sample size - 1 instead of the sample size.
+        :return: the covariance matrix of the (L + 1) n lagged variables, over a sample of T - L rows.
+        """
+        if not dataset.is_continuous():
+            raise ValueError("Data set must be continuous.")
+        if dataset.exists_missing_value():
+            raise ValueError("Lagged covariances cannot be computed over missing values.")
+        values = dataset.get_data().to_numpy(dtype=np.float64)
+        num_rows, n = values.shape
+        if num_lags < 0 or num_lags >= num_rows - 1:
+            raise ValueError(f"Number of lags must be in [0, {num_rows - 1}): {num_lags}")
+        sample_size = num_rows - num_lags
+        values = values - values.mean(axis=0)
+        cumulative = np.vstack([np.zeros(n), np.cumsum(values, axis=0)])
+        # The means of the columns of each lag, over its window of rows L - k .. T - k - 1.
+        means = np.array([cumulative[num_rows - k] - cumulative[num_lags - k] for k in range(num_lags + 1)])
+        means /= sample_size
+        size = (num_lags + 1) * n
+        matrix = np.empty((size, size))
+        for d in range(num_lags + 1):
+            shifted = values[:num_rows - d].T @ values[d:]
+            for j in range(num_lags + 1 - d):
+                i = j + d
+                # The window is s = L - j .. T - j - 1; the product over the series runs over s = d .. T - 1.
+                head = values[:num_lags - i].T @ values[d:num_lags - j]
+                tail = values[num_rows - j - d:num_rows - d].T @ values[num_rows - j:]
+                block = shifted - head - tail - sample_size * np.outer(means[i], means[j])
+                matrix[i * n:(i + 1) * n, j * n:(j + 1) * n] = block
+                matrix[j * n:(j + 1) * n, i * n:(i + 1) * n] = block.T
+        matrix /= sample_size - 1 if bias_corrected else sample_size
+        variables = TimeSeriesUtils.lag_variables(dataset.get_variables(), num_lags)
+        names = [v.get_name() for v in variables]
+        return CovarianceMatrix(variables, DataFrame(matrix, index=names, columns=names), sample_size)
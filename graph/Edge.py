@@ -185,19 +185,19 @@ class Edge:
     def __eq__(self, other):
         if not other or not isinstance(other, Edge):
             return False
-        if self == other:
+        if self is other:
             return True
         if NodeEqualityMode.get_equality_type() == NodeEqualityMode.NodeEqualityType.OBJECT:
             if self.node1 == other.node1 and self.node2 == other.node2:
                 equal = self.endpoint1 == other.endpoint1 and self.endpoint2 == other.endpoint2
             else:
-                equal = self.node1 == other.node2 and self.node2 == self.node1 and self.endpoint1 == other.endpoint2 and self.endpoint2 == other.endpoint1
+                equal = self.node1 == other.node2 and self.node2 == other.node1 and self.endpoint1 == other.endpoint2 and self.endpoint2 == other.endpoint1
             return equal
         elif NodeEqualityMode.get_equality_type() == NodeEqualityMode.NodeEqualityType.NAME:
             if self.node1.get_name() == other.node1.get_name() and self.node2.get_name() == other.node2.get_name():
                 equal = self.endpoint1 == other.endpoint1 and self.endpoint2 == other.endpoint2
             else:
-                equal = self.node1.get_name() == other.node2.get_name() and self.node2.get_name() == self.node1.get_name() and self.endpoint1 == other.endpoint2 and self.endpoint2 == other.endpoint1
+                equal = self.node1.get_name() == other.node2.get_name() and self.node2.get_name() == other.node1.get_name() and self.endpoint1 == other.endpoint2 and self.endpoint2 == other.endpoint1
             return equal
         else:
             raise ValueError()
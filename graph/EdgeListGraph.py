@@ -1,4 +1,5 @@
 import itertools
+from collections import deque
 
 from graph.Graph import Graph
 from graph.GraphUtils import GraphUtils
@@ -35,7 +36,13 @@ class EdgeListGraph(Graph):
         self.underline_triples: Set[Triple] = set()
         self.dotted_underline_triples: Set[Triple] = set()
         self.highlighted_edges: Set[Edge] = set()
-        self.ancestors = None
+        # The transitive closure of the parent relation, built on demand (see _ancestor_closure()). ancestors[i]
+        # is a bitset with bit j set if ancestor_index maps a node to j and that node is an ancestor of
+        # the node mapped to i. None when it has to be rebuilt.
+        self.ancestors: Optional[List[int]] = None
+        self.ancestor_index: Dict[Node, int] = {}
+        self.ancestor_nodes: List[Node] = []
+        self.has_directed_cycle = False
         if graph:
             self.transfer_nodes_and_edges(graph)
             self.transfer_attributes(graph)
@@ -55,33 +62,57 @@ class EdgeListGraph(Graph):
                     raise ValueError
                 self.names_hash[node.get_name()] = node
 
-    def _collect_ancestors_visit(self, node: Node, ancestors: Set[Node]):
-        if node in ancestors:
-            return
-        ancestors.add(node)
-        parents = self.get_parents(node)
-        if parents and len(parents) > 0:
-            for parent in parents:
-                self._collect_ancestors_visit(parent, ancestors)
-
-    def _collect_descendants_visit(self, node: Node, descendants: Set[Node]):
-        descendants.add(node)
-        children = self.get_children(node)
-        if children and len(children) > 0:
-            for child in children:
-                self._do_child_closure_visit(child, descendants)
-
-    def _do_child_closure_visit(self, node: Node, closure: Set[Node]):
-        """ closure under the child relation
-
-        """
-        if node not in closure:
-            closure.add(node)
-            for edge in self.get_node_edges(node):
-                sub = Edges.traverse_directed(node, edge)
-                if not sub:
-                    continue
-                self._do_child_closure_visit(sub, closure)
+    def _ancestor_closure(self) -> List[int]:
+        """ Builds, if needed, the ancestor bitset of every node (itself included) over the directed edges.
+
+        Nodes are taken in topological order, each ancestor set being the union of the sets of its parents, so
+        a build costs O(V + E) bitset unions. If there is a directed cycle, the nodes left over are closed by a
+        search from each. Adding a directed edge updates the closure; other changes drop it, to be rebuilt on
+        the next query.
+        """
+        if self.ancestors is not None:
+            return self.ancestors
+        self.ancestor_nodes = list(self.nodes)
+        self.ancestor_index = {node: i for i, node in enumerate(self.ancestor_nodes)}
+        parents = [[self.ancestor_index[p] for p in self.get_parents(node)] for node in self.ancestor_nodes]
+        children: List[List[int]] = [[] for _ in self.ancestor_nodes]
+        for i, ps in enumerate(parents):
+            for p in ps:
+                children[p].append(i)
+        ancestors = [1 << i for i in range(len(self.ancestor_nodes))]
+        num_parents = [len(ps) for ps in parents]
+        queue = deque(i for i, k in enumerate(num_parents) if k == 0)
+        done = 0
+        while queue:
+            i = queue.popleft()
+            done += 1
+            for p in parents[i]:
+                ancestors[i] |= ancestors[p]
+            for c in children[i]:
+                num_parents[c] -= 1
+                if num_parents[c] == 0:
+                    queue.append(c)
+        self.has_directed_cycle = done < len(self.ancestor_nodes)
+        if self.has_directed_cycle:
+            for i in (i for i, k in enumerate(num_parents) if k > 0):
+                seen = {i}
+                stack = [i]
+                while stack:
+                    for p in parents[stack.pop()]:
+                        if p not in seen:
+                            seen.add(p)
+                            stack.append(p)
+                            ancestors[i] |= 1 << p
+        self.ancestors = ancestors
+        return ancestors
+
+    def _ancestor_bits(self, node: Node) -> int:
+        ancestors = self._ancestor_closure()
+        i = self.ancestor_index.get(node)
+        return 0 if i is None else ancestors[i]
+
+    def _nodes_of(self, bits: int) -> List[Node]:
+        return [node for i, node in enumerate(self.ancestor_nodes) if bits >> i & 1]
 
     def _possible_ancestor_set(self, node1: Node, nodes2: List[Node]) -> bool:
         """ return true iff node1 is a possible ancestor of at least one member of nodes2
@@ -138,9 +169,25 @@ class EdgeListGraph(Graph):
             if node.get_node_type() == NodeType.ERROR:
                 # 触发属性修改监听
                 pass
-        self.ancestors = None
+            if self.ancestors is not None:
+                self._add_to_closure(node, Edges.get_directed_edge_head(edge))
         return True
 
+    def _add_to_closure(self, tail: Node, head: Node):
+        """ Updates the ancestor closure for a new edge tail --> head: every node that has head as an ancestor
+        gains the ancestors of tail.
+
+        """
+        t = self.ancestor_index[tail]
+        h = self.ancestor_index[head]
+        if self.ancestors[t] >> h & 1:
+            # The edge closes a directed cycle.
+            self.has_directed_cycle = True
+        gained = self.ancestors[t]
+        for i, bits in enumerate(self.ancestors):
+            if bits >> h & 1:
+                self.ancestors[i] = bits | gained
+
     def add_node(self, node: Node) -> bool:
         """
         Adds a node to the graph. Precondition: The proposed name of the node
@@ -148,17 +195,21 @@ class EdgeListGraph(Graph):
         """
         if not node:
             raise ValueError()
-        if node in self.nodes:
+        if node in self.edge_lists:
             return True
         if self.get_node(node.get_name()):
-            if node in self.nodes:
+            if node in self.edge_lists:
                 self.names_hash[node.get_name()] = node
 
         if node in self.edge_lists.keys():
             return False
-        self.edge_lists[node] = List[Edge]()
+        self.edge_lists[node] = []
         self.nodes.append(node)
         self.names_hash[node.get_name()] = node
+        if self.ancestors is not None:
+            self.ancestor_index[node] = len(self.ancestor_nodes)
+            self.ancestor_nodes.append(node)
+            self.ancestors.append(1 << self.ancestor_index[node])
         if node.get_node_type() == NodeType.ERROR:
             # 触发属性修改监听
             pass
@@ -170,6 +221,7 @@ class EdgeListGraph(Graph):
         self.nodes.clear()
         self.names_hash.clear()
         self.edge_lists.clear()
+        self.ancestors = None
 
     def contains_edge(self, edge: Edge) -> bool:
         return edge in self.edges_set
@@ -178,32 +230,20 @@ class EdgeListGraph(Graph):
         return node in self.nodes
 
     def exists_directed_cycle(self) -> bool:
-        for node in self.get_nodes():
-            if self.exists_directed_path_from_to(node, node):
-                return True
-        return False
+        self._ancestor_closure()
+        return self.has_directed_cycle
 
     def exists_directed_path_from_to(self, node1: Node, node2: Node) -> bool:
         """
         Return true if there is a directed path from node1 to node2.
         """
-        q = List[Node]()
-        v = Set[Node]()
-        q.append(node1)
-        v.add(node1)
-        started = False
-        while len(q) > 0:
-            t = q.pop(0)
-            if started and t == node2:
-                return True
-            started = True
-            for c in self.get_children(t):
-                if c not in v:
-                    v.add(c)
-                    q.append(c)
+        if node1 != node2:
+            return self.is_ancestor_of(node1, node2)
+        # A path from a node to itself is a cycle through one of its parents.
+        return any(self.is_ancestor_of(node1, p) for p in self.get_parents(node1))
 
     def exists_undirected_path_from_to(self, node1: Node, node2: Node) -> bool:
-        return self.exists_undirected_path_visit(node1, node2, Set[Node]())
+        return self.exists_undirected_path_visit(node1, node2, set())
 
     def exists_undirected_path_visit(self, node1: Node, node2: Node, path: Set[Node]) -> bool:
         """
@@ -224,7 +264,7 @@ class EdgeListGraph(Graph):
         return False
 
     def exists_semidirected_path_from_to(self, node1: Node, nodes: List[Node]) -> bool:
-        return self.exists_semidirected_path_visit(node1, nodes, List[Node]())
+        return self.exists_semidirected_path_visit(node1, nodes, [])
 
     def exists_semidirected_path_visit(self, node1: Node, nodes: List[Node], path: List[Node]) -> bool:
         path.append(node1)
@@ -243,10 +283,10 @@ class EdgeListGraph(Graph):
 
     def exists_inducing_path(self, node1: Node, node2: Node) -> bool:
         """
-        Determines whether an inducing path exists between node1 and node2,
-        given a set O of observed nodes and a set sem of conditioned nodes.
+        Determines whether an inducing path exists between node1 and node2, relative to the latent nodes;
+        see GraphUtils.exists_inducing_path().
         """
-        return node1 == node2 or GraphUtils.exists_directed_path_from_to(node1, node2, self)
+        return GraphUtils.exists_inducing_path(node1, node2, self)
 
     def exists_trek(self, node1: Node, node2: Node) -> bool:
         """
@@ -254,10 +294,7 @@ class EdgeListGraph(Graph):
          A trek exists if there is a directed path between the two nodes or else,
          for some third node in the graph, there is a path to each of the two nodes in question.
         """
-        for node in self.get_nodes():
-            if self.is_ancestor_of(node, node1) and self.is_ancestor_of(node, node2):
-                return True
-        return False
+        return (self._ancestor_bits(node1) & self._ancestor_bits(node2)) != 0
 
     def __eq__(self, other):
         if not other:
@@ -273,7 +310,7 @@ class EdgeListGraph(Graph):
         return False
 
     def __str__(self):
-        GraphUtils.graph2text(self)
+        return GraphUtils.graph2text(self)
 
     def fully_connect(self, endpoint: Endpoint):
         """
@@ -281,8 +318,9 @@ class EdgeListGraph(Graph):
         """
         self.edges_set.clear()
         self.edge_lists.clear()
+        self.ancestors = None
         for node in self.nodes:
-            self.edge_lists[node] = List[Edge]()
+            self.edge_lists[node] = []
 
         combinations = itertools.combinations(self.nodes, 2)
         for combination in combinations:
@@ -304,7 +342,7 @@ class EdgeListGraph(Graph):
         an and array from these to eliminate the duplication.
         """
         edges = self.edge_lists.get(node)
-        adj = List[Node]()
+        adj = []
         for edge in edges:
             if not edge:
                 continue
@@ -314,13 +352,13 @@ class EdgeListGraph(Graph):
         return adj
 
     def get_ancestors(self, nodes: List[Node]) -> List[Node]:
-        ancestors = Set[Node]()
+        bits = 0
         for node in nodes:
-            self._collect_ancestors_visit(node, ancestors)
-        return list(ancestors)
+            bits |= self._ancestor_bits(node)
+        return self._nodes_of(bits)
 
     def get_children(self, node: Node) -> List[Node]:
-        children = List[Node]()
+        children = []
         for edge in self.get_node_edges(node):
             if Edges.is_directed_edge(edge):
                 sub = Edges.traverse_directed(node, edge)
@@ -338,10 +376,12 @@ class EdgeListGraph(Graph):
         return connectivity
 
     def get_descendants(self, nodes: List[Node]) -> List[Node]:
-        descendants = Set[Node]()
+        ancestors = self._ancestor_closure()
+        mask = 0
         for node in nodes:
-            self._collect_descendants_visit(node, descendants)
-        return list(descendants)
+            if node in self.ancestor_index:
+                mask |= 1 << self.ancestor_index[node]
+        return [node for node, bits in zip(self.ancestor_nodes, ancestors) if bits & mask]
 
     def get_edge(self, node1: Node, node2: Node) -> Optional[Edge]:
         """ return the edge connecting node1 and node2, provided a unique such edge
@@ -373,7 +413,7 @@ class EdgeListGraph(Graph):
         """
         edges = self.edge_lists.get(node)
         if not edges:
-            return List[Edge]()
+            return []
         return list(edges)
 
     def get_connecting_edges(self, node1: Node, node2: Node) -> List[Edge]:
@@ -382,15 +422,15 @@ class EdgeListGraph(Graph):
         """
         edges = self.edge_lists.get(node1)
         if not edges:
-            return List[Node]()
-        _edges = List[Node]()
+            return []
+        _edges = []
         for edge in edges:
             if edge.get_distal_node(node1) == node2:
                 _edges.append(edge)
         return _edges
 
     def get_graph_edges(self) -> Set[Edge]:
-        return Set[Edge](self.edges_set)
+        return set(self.edges_set)
 
     def get_endpoint(self, node1: Node, node2: Node) -> Optional[Endpoint]:
         """
@@ -421,7 +461,7 @@ class EdgeListGraph(Graph):
         return list(self.nodes)
 
     def get_node_names(self) -> List[str]:
-        names = List[str]()
+        names = []
         for node in self.get_nodes():
             names.append(node.get_name())
         return names
@@ -449,7 +489,7 @@ class EdgeListGraph(Graph):
         """
         return the list of parents for a node.
         """
-        parents = List[Node]()
+        parents = []
         edges = self.edge_lists.get(node)
         for edge in edges:
             if not edge:
@@ -469,7 +509,13 @@ class EdgeListGraph(Graph):
         return False
 
     def is_ancestor_of(self, node1: Node, node2: Node) -> bool:
-        return node1 in self.get_ancestors([node2])
+        i = self.ancestor_index.get(node1) if self.ancestors is not None else None
+        if i is None:
+            self._ancestor_closure()
+            i = self.ancestor_index.get(node1)
+            if i is None:
+                return False
+        return bool(self._ancestor_bits(node2) >> i & 1)
 
     def possible_ancestor(self, node1: Node, node2: Node) -> bool:
         return self.exists_semidirected_path_from_to(node1, [node2])
@@ -507,7 +553,7 @@ class EdgeListGraph(Graph):
         """
         Determines whether one node is a descendent of another.
         """
-        return node1 == node2 or GraphUtils.exists_directed_path_from_to(node2, node1, self)
+        return node1 == node2 or self.is_ancestor_of(node2, node1)
 
     def def_non_descendent(self, node1: Node, node2: Node) -> bool:
         return not self.possible_ancestor(node1, node2)
@@ -610,7 +656,7 @@ class EdgeListGraph(Graph):
 
     def is_undirected_from_to(self, node1: Node, node2: Node) -> bool:
         edge = self.get_edge(node1, node2)
-        return not edge and edge.get_endpoint1() == Endpoint.TAIL and edge.get_endpoint2() == Endpoint.TAIL
+        return edge is not None and edge.get_endpoint1() == Endpoint.TAIL and edge.get_endpoint2() == Endpoint.TAIL
 
     def def_visible(self, edge: Edge) -> bool:
         """
@@ -634,7 +680,7 @@ class EdgeListGraph(Graph):
             raise ValueError()
         if not b.get_node_type() == NodeType.MEASURED:
             raise ValueError()
-        path = List[Node]()
+        path = []
         path.append(a)
         for c in graph.get_nodes_into(a, Endpoint.ARROW):
             if graph.is_parent_of(c, a):
@@ -674,7 +720,7 @@ class EdgeListGraph(Graph):
         """ Nodes adjacent to the given node with the given proximal endpoint.
 
         """
-        nodes = List[Node]()
+        nodes = []
         edges = self.get_node_edges(node)
         for edge in edges:
             if edge.get_proximal_endpoint(node) == endpoint:
@@ -685,7 +731,7 @@ class EdgeListGraph(Graph):
         """ Nodes adjacent to the given node with the given distal endpoint.
 
         """
-        nodes = List[Node]()
+        nodes = []
         edges = self.get_node_edges(node)
         for edge in edges:
             if edge.get_distal_endpoint(node) == endpoint:
@@ -701,7 +747,7 @@ class EdgeListGraph(Graph):
         process to remove those edges using this method, a concurrent
         modification exception will be thrown.)
         """
-        if edge in self.edges_set:
+        if edge not in self.edges_set:
             return False
 
         edge_list1 = self.edge_lists.get(edge.get_node1())
@@ -714,9 +760,10 @@ class EdgeListGraph(Graph):
         self.edge_lists[edge.get_node1()] = edge_list1
         self.edge_lists[edge.get_node2()] = edge_list2
 
-        self.highlighted_edges.remove(edge)
+        self.highlighted_edges.discard(edge)
         self.stuff_removed_since_last_triple_access = True
-        self.ancestors = None
+        if Edges.is_directed_edge(edge):
+            self.ancestors = None
         # self.get_pcs().firePropertyChange("edgeRemoved", edge, None)
         return True
 
@@ -759,7 +806,6 @@ class EdgeListGraph(Graph):
         (If there is more than one edge, an exception is thrown.)
         """
         edge = self.get_edge(node1, node2)
-        self.ancestors = None
         self.remove_edge(edge)
         new_edge = Edge(node1, node2, edge.get_proximal_endpoint(node1), endpoint)
         self.add_edge(new_edge)
@@ -819,7 +865,7 @@ class EdgeListGraph(Graph):
     def add_dotted_underline_triple(self, node1: Node, node2: Node, node3: Node):
         triple = Triple(node1, node2, node3)
         if triple.along_path_in(self):
-            self.underline_triples.add(triple)
+            self.dotted_underline_triples.add(triple)
 
     def remove_ambiguous_triple(self, node1: Node, node2: Node, node3: Node):
         triple = Triple(node1, node2, node3)
@@ -903,6 +949,7 @@ class EdgeListGraph(Graph):
             raise ValueError("Sorry, there is a mismatch in the number of variables you are trying to set.")
         self.nodes.clear()
         self.nodes.extend(nodes)
+        self.ancestors = None
 
     def get_all_attributes(self) -> Dict[str, Any]:
         return self.attributes
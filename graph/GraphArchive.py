@@ -0,0 +1,87 @@
+import mmap
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from graph.Graph import Graph
+from graph.GraphIO import GraphIO
+
+
+class GraphArchive:
+    """
+    Reads a file of graphs written one after the other by GraphIO.write_binary(), through a read-only memory map.
+    Opening the archive reads the record headers only; the arrays of a graph are views of the map, so the node
+    names and the edges of a large graph can be looked at, or a range of its edges built, without reading the rest
+    of the file. Arrays returned by get_array() must not outlive close().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map: Optional[mmap.mmap] = None
+        self.records: List[Tuple[Dict[str, Any], int]] = []
+        try:
+            if self.file.seek(0, 2) > 0:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+                offset = 0
+                while offset < len(self.map):
+                    header, payload, offset = GraphIO.read_record_header(self.map, offset)
+                    self.records.append((header, payload))
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def _record(self, index: int) -> Tuple[Dict[str, Any], int]:
+        if self.map is None and self.records:
+            raise ValueError("The archive is closed.")
+        if index < 0 or index >= len(self.records):
+            raise ValueError(f"Graph index out of range [0, {len(self.records)}): {index}")
+        return self.records[index]
+
+    def get_num_graphs(self) -> int:
+        return len(self.records)
+
+    def get_header(self, index: int) -> Dict[str, Any]:
+        return self._record(index)[0]
+
+    def get_num_nodes(self, index: int) -> int:
+        return self._record(index)[0]["num_nodes"]
+
+    def get_num_edges(self, index: int) -> int:
+        return self._record(index)[0]["num_edges"]
+
+    def get_array(self, index: int, name: str) -> Optional[np.ndarray]:
+        """
+        return a read-only view of an array of the graph with the given index (see GraphIO.encode() for their
+        names), or None if the graph has no such array.
+        """
+        header, payload = self._record(index)
+        return GraphIO.record_array(self.map, header, payload, name)
+
+    def get_node_names(self, index: int) -> List[str]:
+        names = self.get_array(index, "names").tobytes()
+        offsets = self.get_array(index, "name_offsets").tolist()
+        return [names[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+    def get_graph(self, index: int, start: int = 0, stop: Optional[int] = None) -> Graph:
+        """
+        return the graph with the given index, as an EdgeListGraph, with all its nodes and its edges start..stop - 1
+        (all of them by default).
+        """
+        header, payload = self._record(index)
+        return GraphIO.decode(self.map, header, payload, start, stop)
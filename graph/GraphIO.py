@@ -0,0 +1,598 @@
+import ast
+import json
+import re
+import struct
+from typing import List, Dict, Any, Optional, TextIO, BinaryIO, Iterator, Tuple, Union
+
+import numpy as np
+
+from graph.Edge import Edge
+from graph.EdgeListGraph import EdgeListGraph
+from graph.EdgeProperty import EdgeProperty
+from graph.EdgeTypeProbability import EdgeTypeProbability
+from graph.Endpoint import Endpoint
+from graph.Graph import Graph
+from graph.GraphNode import GraphNode
+from graph.GraphUtils import GraphUtils
+from graph.Node import Node
+from graph.NodeType import NodeType
+
+EdgeType = EdgeTypeProbability.EdgeType
+
+
+class GraphIO:
+    """
+    Reads and writes graphs, with their edge properties, edge type probabilities, triples and attributes, in three
+    formats:
+
+    - text, as printed by GraphUtils.graph2text() (the Tetrad text format);
+    - JSON, an object with "nodes", "edges", the three lists of triples, "attributes", "pattern" and "pag";
+    - binary, a record of a JSON header followed by the node names and the edges as int-coded numpy arrays (see
+      write_binary()). Records can be appended to one file, and GraphArchive reads such files through a memory map.
+
+    Writers stream the graph a batch of lines or edges at a time, and readers read text and JSON a line or an item
+    at a time, so that neither the output nor the input is ever held whole as one string.
+    """
+
+    BATCH = 4096
+    CHUNK = 1 << 16
+    MAGIC = b"PTGRAPH1"
+    # Magic, header length, payload length.
+    RECORD = struct.Struct("<8sQQ")
+    AMBIGUOUS_TITLE = "Ambiguous triples (i.e. list of triples for which there is ambiguous data about whether " \
+                      "they are colliders or not):"
+    UNDERLINE_TITLE = "Underline triples:"
+    DOTTED_UNDERLINE_TITLE = "Dotted underline triples:"
+    TRIPLE_KINDS = ["ambiguous_triples", "underline_triples", "dotted_underline_triples"]
+
+    _MARK1 = {"-": Endpoint.TAIL, "<": Endpoint.ARROW, "o": Endpoint.CIRCLE}
+    _MARK2 = {"-": Endpoint.TAIL, ">": Endpoint.ARROW, "o": Endpoint.CIRCLE}
+    _TYPE_MARKS = {EdgeType.ta: "-->", EdgeType.at: "<--", EdgeType.ca: "o->", EdgeType.ac: "<-o",
+                   EdgeType.cc: "o-o", EdgeType.aa: "<->", EdgeType.tt: "---"}
+    _MARK_TYPES = {mark: t for t, mark in _TYPE_MARKS.items()}
+    _EDGE_LINE = re.compile(r"^\d+\.\s+([^\s\[]+)\s+([-<o])-([->o])\s+([^\s\[]+)(.*)$")
+    _PROBABILITY = re.compile(r"\[(no edge|[^\s\]]+ (\S{3}) [^\s\]]+)((?: \w+)*)\]: ?([-+0-9.eE]+|nan|inf);")
+    _TRIPLE = re.compile(r"^<([^,>]+), ([^,>]+), ([^,>]+)>$")
+    _NODE_ATTRIBUTE = re.compile(r";(?=[^;:\[\]]+: )")
+
+    # Text
+
+    @classmethod
+    def _triples(cls, graph: Graph) -> List[List]:
+        return [list(graph.get_ambiguous_triples()), list(graph.get_underlines()),
+                list(graph.get_dotted_underlines())]
+
+    @classmethod
+    def _write_lines(cls, stream: TextIO, lines: Iterator[str]):
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) == GraphIO.BATCH:
+                stream.write("".join(batch))
+                batch.clear()
+        stream.write("".join(batch))
+
+    @classmethod
+    def _edge_lines(cls, edges) -> Iterator[str]:
+        for count, edge in enumerate(edges, 1):
+            yield f"\n{count}. {edge}" if count > 1 else f"{count}. {edge}"
+
+    @classmethod
+    def write_text(cls, graph: Graph, stream: TextIO):
+        """ Writes a graph in the text format of GraphUtils.graph2text(), a batch of lines at a time.
+
+        """
+        # add edge properties relating to edge coloring of PAGs
+        if graph.is_pag():
+            GraphUtils.add_pag_coloring(graph)
+        stream.write("Graph Nodes:\n")
+        stream.write(";".join(graph.get_node_names()))
+        stream.write("\n\nGraph Edges:\n")
+        GraphIO._write_lines(stream, GraphIO._edge_lines(graph.get_graph_edges()))
+        stream.write("\n")
+
+        attributes = graph.get_all_attributes()
+        if attributes:
+            stream.write("Graph Attributes:\n")
+            GraphIO._write_lines(stream, (f"{key}: {value}\n" for key, value in attributes.items()))
+            stream.write("\n")
+
+        node_attributes: Dict[str, List[str]] = {}
+        for node in graph.get_nodes():
+            for key, value in (node.get_all_attributes() or {}).items():
+                node_attributes.setdefault(key, []).append(f"{node.get_name()}: {value}")
+        if node_attributes:
+            stream.write("Graph Node Attributes:")
+            for key, values in node_attributes.items():
+                stream.write(f"\n{key}: [")
+                stream.write(";".join(values))
+                stream.write("]")
+            stream.write("\n")
+
+        for title, triples in zip([GraphIO.AMBIGUOUS_TITLE, GraphIO.UNDERLINE_TITLE, GraphIO.DOTTED_UNDERLINE_TITLE],
+                                  GraphIO._triples(graph)):
+            if triples:
+                stream.write(f"\n\n{title}\n")
+                stream.write("\n".join(str(t) for t in triples))
+
+    @classmethod
+    def _literal(cls, text: str):
+        try:
+            return ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return text
+
+    @classmethod
+    def _parse_edge(cls, line: str, graph: Graph) -> Edge:
+        match = GraphIO._EDGE_LINE.match(line)
+        if not match:
+            raise ValueError(f"Not an edge: {line}")
+        name1, mark1, mark2, name2, rest = match.groups()
+        edge = Edge(GraphIO._node(graph, name1), GraphIO._node(graph, name2), GraphIO._MARK1[mark1],
+                    GraphIO._MARK2[mark2])
+        end = 0
+        for probability in GraphIO._PROBABILITY.finditer(rest):
+            edge_type = EdgeType.nil if probability.group(1) == "no edge" else GraphIO._MARK_TYPES[probability.group(2)]
+            properties = [EdgeProperty[p] for p in probability.group(3).split()]
+            edge.add_edge_type_probability(EdgeTypeProbability(edge_type, properties, float(probability.group(4))))
+            end = probability.end()
+        for p in rest[end:].split():
+            edge.add_property(EdgeProperty[p])
+        return edge
+
+    @classmethod
+    def _node(cls, graph: Graph, name: str) -> Node:
+        node = graph.get_node(name)
+        if node is None:
+            node = GraphNode(name)
+            graph.add_node(node)
+        return node
+
+    @classmethod
+    def _add_triples(cls, graph: Graph, kind: str, triples: List[Tuple[str, str, str]]):
+        add = {"ambiguous_triples": graph.add_ambiguous_triple, "underline_triples": graph.add_underline_triple,
+               "dotted_underline_triples": graph.add_dotted_underline_triple}[kind]
+        for x, y, z in triples:
+            add(GraphIO._node(graph, x), GraphIO._node(graph, y), GraphIO._node(graph, z))
+
+    @classmethod
+    def read_text(cls, stream: TextIO) -> Graph:
+        """ Reads a graph in the text format of GraphUtils.graph2text(), a line at a time.
+
+        :return: an EdgeListGraph.
+        """
+        graph = EdgeListGraph()
+        section = None
+        triples: Dict[str, List[Tuple[str, str, str]]] = {kind: [] for kind in GraphIO.TRIPLE_KINDS}
+        titles = {"Graph Nodes:": "nodes", "Graph Edges:": "edges", "Graph Attributes:": "attributes",
+                  "Graph Node Attributes:": "node_attributes", GraphIO.AMBIGUOUS_TITLE: "ambiguous_triples",
+                  GraphIO.UNDERLINE_TITLE: "underline_triples",
+                  GraphIO.DOTTED_UNDERLINE_TITLE: "dotted_underline_triples"}
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            if line in titles:
+                section = titles[line]
+            elif section == "nodes":
+                for name in line.split(";"):
+                    if name.strip():
+                        GraphIO._node(graph, name.strip())
+            elif section == "edges":
+                graph.add_edge(GraphIO._parse_edge(line, graph))
+            elif section == "attributes":
+                key, _, value = line.partition(": ")
+                graph.add_attribute(key, GraphIO._literal(value))
+            elif section == "node_attributes":
+                key, _, values = line.partition(": ")
+                if not (values.startswith("[") and values.endswith("]")):
+                    raise ValueError(f"Not a node attribute: {line}")
+                for item in GraphIO._NODE_ATTRIBUTE.split(values[1:-1]):
+                    name, _, value = item.partition(": ")
+                    GraphIO._node(graph, name).add_attribute(key, GraphIO._literal(value))
+            elif section in triples:
+                match = GraphIO._TRIPLE.match(line)
+                if not match:
+                    raise ValueError(f"Not a triple: {line}")
+                triples[section].append(match.groups())
+            else:
+                raise ValueError(f"Unexpected line: {line}")
+        for kind, listed in triples.items():
+            GraphIO._add_triples(graph, kind, listed)
+        return graph
+
+    # JSON
+
+    @classmethod
+    def _plain(cls, value):
+        """ A JSON encodable copy of an attribute value: numpy values as Python ones, anything else as text.
+
+        """
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        if isinstance(value, np.generic):
+            return value.item()
+        return str(value)
+
+    @classmethod
+    def _dumps(cls, value) -> str:
+        return json.dumps(value, default=GraphIO._plain)
+
+    @classmethod
+    def edge_to_json(cls, edge: Edge) -> Dict[str, Any]:
+        item = {"node1": edge.get_node1().get_name(), "node2": edge.get_node2().get_name(),
+                "endpoint1": edge.get_endpoint1().name, "endpoint2": edge.get_endpoint2().name}
+        if edge.get_properties():
+            item["properties"] = [p.name for p in edge.get_properties()]
+        if edge.get_edge_type_probabilities():
+            item["probabilities"] = [{"type": p.get_edge_type().name,
+                                      "properties": [q.name for q in p.get_properties() or []],
+                                      "probability": p.get_probability()}
+                                     for p in edge.get_edge_type_probabilities()]
+        return item
+
+    @classmethod
+    def edge_from_json(cls, item: Dict[str, Any], graph: Graph) -> Edge:
+        edge = Edge(GraphIO._node(graph, item["node1"]), GraphIO._node(graph, item["node2"]),
+                    Endpoint[item["endpoint1"]], Endpoint[item["endpoint2"]])
+        for p in item.get("properties", []):
+            edge.add_property(EdgeProperty[p])
+        for p in item.get("probabilities", []):
+            edge.add_edge_type_probability(EdgeTypeProbability(EdgeType[p["type"]],
+                                                               [EdgeProperty[q] for q in p.get("properties", [])],
+                                                               p["probability"]))
+        return edge
+
+    @classmethod
+    def _json_array(cls, stream: TextIO, key: str, items: Iterator[str], first: bool = False):
+        stream.write(f'{"" if first else ","}\n"{key}": [')
+        GraphIO._write_lines(stream, (("\n" if i == 0 else ",\n") + item for i, item in enumerate(items)))
+        stream.write("\n]")
+
+    @classmethod
+    def write_json(cls, graph: Graph, stream: TextIO):
+        """ Writes a graph as a JSON object, one node, edge or triple per line, a batch of lines at a time.
+
+        """
+        stream.write("{")
+        GraphIO._json_array(stream, "nodes", (GraphIO._dumps(
+            {"name": node.get_name(), "type": node.get_node_type().name, "attributes": node.get_all_attributes()})
+            for node in graph.get_nodes()), first=True)
+        GraphIO._json_array(stream, "edges", (GraphIO._dumps(GraphIO.edge_to_json(edge))
+                                              for edge in graph.get_graph_edges()))
+        for kind, triples in zip(GraphIO.TRIPLE_KINDS, GraphIO._triples(graph)):
+            GraphIO._json_array(stream, kind, (GraphIO._dumps([t.get_x().get_name(), t.get_y().get_name(),
+                                                               t.get_z().get_name()]) for t in triples))
+        stream.write(f',\n"attributes": {GraphIO._dumps(graph.get_all_attributes())},\n'
+                     f'"pattern": {GraphIO._dumps(graph.is_pattern())},\n"pag": {GraphIO._dumps(graph.is_pag())}\n}}\n')
+
+    @classmethod
+    def iter_json(cls, stream: TextIO) -> Iterator[Tuple[str, Any]]:
+        """ Parses a JSON object a member at a time, and the members whose values are arrays an item at a time,
+        reading the stream a chunk at a time.
+
+        :return: (key, value) for each member that is not an array, and (key, item) for each item of the others.
+        """
+        decoder = json.JSONDecoder()
+        buffer = ""
+        position = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buffer, position, eof
+            if eof:
+                return False
+            chunk = stream.read(GraphIO.CHUNK)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            return not eof
+
+        def peek() -> str:
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if not fill():
+                    raise ValueError("Unexpected end of JSON.")
+
+        def expect(char: str):
+            nonlocal position
+            if peek() != char:
+                raise ValueError(f"Expecting '{char}' at '{buffer[position:position + 20]}'")
+            position += 1
+
+        def value():
+            nonlocal position
+            peek()
+            while True:
+                try:
+                    parsed, end = decoder.raw_decode(buffer, position)
+                    # A number at the end of the buffer may go on in the next chunk.
+                    if end < len(buffer) or eof:
+                        position = end
+                        return parsed
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise ValueError(f"Invalid JSON: {e}")
+                fill()
+
+        expect("{")
+        if peek() == "}":
+            return
+        while True:
+            key = value()
+            expect(":")
+            if peek() == "[":
+                position += 1
+                if peek() == "]":
+                    position += 1
+                else:
+                    while True:
+                        yield key, value()
+                        if peek() == ",":
+                            position += 1
+                        else:
+                            expect("]")
+                            break
+            else:
+                yield key, value()
+            if peek() == ",":
+                position += 1
+            else:
+                expect("}")
+                return
+
+    @classmethod
+    def read_json(cls, stream: TextIO) -> Graph:
+        """ Reads a graph written by write_json(), an item at a time.
+
+        :return: an EdgeListGraph.
+        """
+        graph = EdgeListGraph()
+        triples: Dict[str, List[Tuple[str, str, str]]] = {kind: [] for kind in GraphIO.TRIPLE_KINDS}
+        for key, item in GraphIO.iter_json(stream):
+            if key == "nodes":
+                node = GraphIO._node(graph, item["name"])
+                node.set_node_type(NodeType[item.get("type", NodeType.MEASURED.name)])
+                for k, v in (item.get("attributes") or {}).items():
+                    node.add_attribute(k, v)
+            elif key == "edges":
+                graph.add_edge(GraphIO.edge_from_json(item, graph))
+            elif key in triples:
+                triples[key].append(tuple(item))
+            elif key == "attributes":
+                for k, v in item.items():
+                    graph.add_attribute(k, v)
+            elif key == "pattern":
+                graph.set_pattern(bool(item))
+            elif key == "pag":
+                graph.set_pag(bool(item))
+        for kind, listed in triples.items():
+            GraphIO._add_triples(graph, kind, listed)
+        return graph
+
+    # Binary
+
+    @classmethod
+    def _pad(cls, size: int) -> int:
+        return -size % 8
+
+    @classmethod
+    def encode(cls, graph: Graph) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+        """ Codes a graph as a JSON header and numpy arrays.
+
+        The arrays are: "names", the UTF-8 node names one after the other, with "name_offsets" (n + 1); "node_types"
+        (NodeType values); "edge_nodes" (m x 2 node indices) and "edge_endpoints" (m x 2 Endpoint values);
+        "edge_properties", a bit mask of EdgeProperty values per edge; if any edge has edge type probabilities,
+        "probability_offsets" (m + 1) into "probability_types" (EdgeType values), "probability_properties" (bit
+        masks) and "probability_values"; and k x 3 node indices for each kind of triple. The header holds the
+        attributes of the graph and of the nodes, the pattern and pag flags and the layout of the arrays.
+        """
+        nodes = graph.get_nodes()
+        index = {node.get_name(): i for i, node in enumerate(nodes)}
+        names = [node.get_name().encode("utf-8") for node in nodes]
+        dtype = np.int32 if len(nodes) < 2 ** 31 else np.int64
+        edges = graph.get_graph_edges()
+        m = len(edges)
+        edge_nodes = np.empty((m, 2), dtype=dtype)
+        edge_endpoints = np.empty((m, 2), dtype=np.uint8)
+        edge_properties = np.zeros(m, dtype=np.uint8)
+        probability_counts = np.zeros(m, dtype=np.int64)
+        probabilities = []
+        for k, edge in enumerate(edges):
+            edge_nodes[k] = index[edge.get_node1().get_name()], index[edge.get_node2().get_name()]
+            edge_endpoints[k] = edge.get_endpoint1().value, edge.get_endpoint2().value
+            for p in edge.get_properties():
+                edge_properties[k] |= 1 << (p.value - 1)
+            for p in edge.get_edge_type_probabilities():
+                mask = 0
+                for q in p.get_properties() or []:
+                    mask |= 1 << (q.value - 1)
+                probabilities.append((p.get_edge_type().value, mask, p.get_probability()))
+                probability_counts[k] += 1
+        arrays = {"names": np.frombuffer(b"".join(names), dtype=np.uint8),
+                  "name_offsets": np.cumsum([0] + [len(name) for name in names], dtype=np.int64),
+                  "node_types": np.array([node.get_node_type().value for node in nodes], dtype=np.uint8),
+                  "edge_nodes": edge_nodes, "edge_endpoints": edge_endpoints, "edge_properties": edge_properties}
+        if probabilities:
+            table = np.array(probabilities, dtype=np.float64).reshape(-1, 3)
+            arrays["probability_offsets"] = np.concatenate([[0], np.cumsum(probability_counts)])
+            arrays["probability_types"] = table[:, 0].astype(np.uint8)
+            arrays["probability_properties"] = table[:, 1].astype(np.uint8)
+            arrays["probability_values"] = table[:, 2]
+        for kind, triples in zip(GraphIO.TRIPLE_KINDS, GraphIO._triples(graph)):
+            if triples:
+                arrays[kind] = np.array([[index[t.get_x().get_name()], index[t.get_y().get_name()],
+                                          index[t.get_z().get_name()]] for t in triples], dtype=dtype)
+        header = {"num_nodes": len(nodes), "num_edges": m, "pattern": graph.is_pattern(), "pag": graph.is_pag(),
+                  "attributes": graph.get_all_attributes(),
+                  "node_attributes": {str(i): node.get_all_attributes() for i, node in enumerate(nodes)
+                                      if node.get_all_attributes()}}
+        return header, arrays
+
+    @classmethod
+    def write_binary(cls, graph: Graph, stream: BinaryIO):
+        """ Writes a graph as one binary record, which may be appended to others in the same file:
+
+            magic (8 bytes) | header length (uint64) | payload length (uint64) | header | payload
+
+        The header is the UTF-8 JSON of encode(), with the dtype, shape and offset in the payload of every array;
+        the payload holds the arrays, each in little-endian order and starting on a multiple of 8 bytes.
+        """
+        header, arrays = GraphIO.encode(graph)
+        layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+            arrays[name] = array
+            layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += array.nbytes + GraphIO._pad(array.nbytes)
+        header["arrays"] = layout
+        encoded = GraphIO._dumps(header).encode("utf-8")
+        encoded += b" " * GraphIO._pad(len(encoded))
+        stream.write(GraphIO.RECORD.pack(GraphIO.MAGIC, len(encoded), offset))
+        stream.write(encoded)
+        for array in arrays.values():
+            if array.nbytes:
+                stream.write(array.reshape(-1).view(np.uint8).data)
+            stream.write(b"\0" * GraphIO._pad(array.nbytes))
+
+    @classmethod
+    def read_record_header(cls, buffer, offset: int = 0) -> Tuple[Dict[str, Any], int, int]:
+        """ Reads the header of the binary record at the given offset of a buffer.
+
+        :return: the header, the offset of the payload and the offset of the next record.
+        """
+        if len(buffer) - offset < GraphIO.RECORD.size:
+            raise ValueError(f"Truncated graph record at {offset}.")
+        magic, header_size, payload_size = GraphIO.RECORD.unpack_from(buffer, offset)
+        if magic != GraphIO.MAGIC:
+            raise ValueError(f"Not a graph record at {offset}.")
+        start = offset + GraphIO.RECORD.size
+        if len(buffer) < start + header_size + payload_size:
+            raise ValueError(f"Truncated graph record at {offset}.")
+        header = json.loads(bytes(buffer[start:start + header_size]).decode("utf-8"))
+        return header, start + header_size, start + header_size + payload_size
+
+    @classmethod
+    def record_array(cls, buffer, header: Dict[str, Any], payload: int, name: str) -> Optional[np.ndarray]:
+        """ A read-only view of an array of a binary record in a buffer, or None if the record has no such array.
+
+        """
+        layout = header["arrays"].get(name)
+        if layout is None:
+            return None
+        dtype = np.dtype(layout["dtype"])
+        count = int(np.prod(layout["shape"], dtype=np.int64))
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=payload + layout["offset"])
+        return array.reshape(layout["shape"])
+
+    @classmethod
+    def decode(cls, buffer, header: Dict[str, Any], payload: int, start: int = 0, stop: Optional[int] = None) \
+            -> Graph:
+        """ Builds the graph of a binary record, or the nodes and the edges start..stop - 1 of it.
+
+        :return: an EdgeListGraph.
+        """
+        def array(name: str) -> Optional[np.ndarray]:
+            return GraphIO.record_array(buffer, header, payload, name)
+
+        names = array("names").tobytes()
+        offsets = array("name_offsets").tolist()
+        node_types = array("node_types").tolist()
+        node_attributes = header.get("node_attributes", {})
+        nodes = []
+        for i in range(header["num_nodes"]):
+            node = GraphNode(names[offsets[i]:offsets[i + 1]].decode("utf-8"))
+            node.set_node_type(NodeType(node_types[i]))
+            for key, value in node_attributes.get(str(i), {}).items():
+                node.add_attribute(key, value)
+            nodes.append(node)
+        graph = EdgeListGraph(nodes=nodes)
+        for key, value in header.get("attributes", {}).items():
+            graph.add_attribute(key, value)
+        graph.set_pattern(header.get("pattern", False))
+        graph.set_pag(header.get("pag", False))
+
+        stop = header["num_edges"] if stop is None else min(stop, header["num_edges"])
+        edge_nodes = array("edge_nodes")[start:stop].tolist()
+        edge_endpoints = array("edge_endpoints")[start:stop].tolist()
+        edge_properties = array("edge_properties")[start:stop].tolist()
+        probability_offsets = array("probability_offsets")
+        if probability_offsets is not None:
+            probability_offsets = probability_offsets[start:stop + 1].tolist()
+            first, last = probability_offsets[0], probability_offsets[-1]
+            types = array("probability_types")[first:last].tolist()
+            masks = array("probability_properties")[first:last].tolist()
+            values = array("probability_values")[first:last].tolist()
+        properties = list(EdgeProperty)
+        for k, ((i, j), (e1, e2), mask) in enumerate(zip(edge_nodes, edge_endpoints, edge_properties)):
+            edge = Edge(nodes[i], nodes[j], Endpoint(e1), Endpoint(e2))
+            for p in properties:
+                if mask >> (p.value - 1) & 1:
+                    edge.add_property(p)
+            if probability_offsets is not None:
+                for q in range(probability_offsets[k] - first, probability_offsets[k + 1] - first):
+                    edge.add_edge_type_probability(EdgeTypeProbability(
+                        EdgeType(types[q]), [p for p in properties if masks[q] >> (p.value - 1) & 1], values[q]))
+            graph.add_edge(edge)
+        for kind in GraphIO.TRIPLE_KINDS:
+            triples = array(kind)
+            if triples is not None:
+                GraphIO._add_triples(graph, kind, [tuple(nodes[i].get_name() for i in t) for t in triples.tolist()])
+        return graph
+
+    @classmethod
+    def read_binary(cls, stream: BinaryIO) -> Graph:
+        """ Reads the binary record at the current position of a stream; see GraphArchive to read large files
+        through a memory map instead.
+
+        :return: an EdgeListGraph.
+        """
+        prefix = stream.read(GraphIO.RECORD.size)
+        if len(prefix) < GraphIO.RECORD.size:
+            raise ValueError("Truncated graph record.")
+        _, header_size, payload_size = GraphIO.RECORD.unpack(prefix)
+        buffer = prefix + stream.read(header_size + payload_size)
+        header, payload, _ = GraphIO.read_record_header(buffer)
+        return GraphIO.decode(buffer, header, payload)
+
+    # Files
+
+    @classmethod
+    def save(cls, graph: Graph, path: str, graph_format: Optional[str] = None):
+        """ Writes a graph to a file, in the format given or else by the extension of the path: ".json", ".bin" (or
+        ".graph") for binary, and text otherwise.
+
+        """
+        graph_format = graph_format or GraphIO._format_of(path)
+        if graph_format == "binary":
+            with open(path, "wb") as stream:
+                GraphIO.write_binary(graph, stream)
+        else:
+            with open(path, "w", encoding="utf-8") as stream:
+                (GraphIO.write_json if graph_format == "json" else GraphIO.write_text)(graph, stream)
+
+    @classmethod
+    def load(cls, path: str, graph_format: Optional[str] = None) -> Graph:
+        """ Reads a graph from a file written by save().
+
+        """
+        graph_format = graph_format or GraphIO._format_of(path)
+        if graph_format == "binary":
+            with open(path, "rb") as stream:
+                return GraphIO.read_binary(stream)
+        with open(path, "r", encoding="utf-8") as stream:
+            return (GraphIO.read_json if graph_format == "json" else GraphIO.read_text)(stream)
+
+    @classmethod
+    def _format_of(cls, path: Union[str, bytes]) -> str:
+        path = str(path).lower()
+        if path.endswith(".json"):
+            return "json"
+        if path.endswith(".bin") or path.endswith(".graph"):
+            return "binary"
+        return "text"
@@ -16,10 +16,10 @@ class GraphNode(Node):
         self.node_variable_type = NodeVariableType.DOMAIN
         self.center_x = -1
         self.center_y = -1
-        self.attributes = Dict[str, object]()
-        if not name:
+        self.attributes: Dict[str, object] = {}
+        if name:
             self.name = name
-        if not node:
+        if node:
             self.name = node.get_name()
             self.node_type = node.get_node_type()
             self.center_x = node.get_center_x()
@@ -83,13 +83,13 @@ class GraphNode(Node):
 
     def __hash__(self):
         if NodeEqualityMode.get_equality_type() == NodeEqualityMode.NodeEqualityType.OBJECT:
-            return hash(self)
+            return object.__hash__(self)
         if NodeEqualityMode.get_equality_type() == NodeEqualityMode.NodeEqualityType.NAME:
             return hash(self.name)
 
     def __eq__(self, other):
         if NodeEqualityMode.get_equality_type() == NodeEqualityMode.NodeEqualityType.OBJECT:
-            return self == other
+            return self is other
         if NodeEqualityMode.get_equality_type() == NodeEqualityMode.NodeEqualityType.NAME:
             return isinstance(other, GraphNode) and other.get_name() == self.name
 
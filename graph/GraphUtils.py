@@ -1,4 +1,5 @@
 from collections import deque
+from io import StringIO
 
 from graph.Graph import Graph
 from graph.Node import Node
@@ -14,7 +15,7 @@ from typing import List, Set, Dict, Optional
 class GraphUtils:
     @classmethod
     def path_string(cls, path: List[Node], graph: Graph) -> str:
-        conditioning_vars = List[Node]()
+        conditioning_vars = []
         return cls.path_string_with_condition(graph, path, conditioning_vars)
 
     @classmethod
@@ -117,14 +118,14 @@ class GraphUtils:
         :param nodes: The list of nodes from which we select a sublist.
         :return: The sublist selected
         """
-        _list = List[Node]()
+        _list = []
         for i in indices:
             _list.append(nodes[i])
         return _list
 
     @classmethod
     def exists_directed_path_from_to(cls, node1: Node, node2: Node, graph: Graph) -> bool:
-        return cls.exists_directed_path_visit(node1, node2, List[Node](), -1, graph)
+        return cls.exists_directed_path_visit(node1, node2, [], -1, graph)
 
     @classmethod
     def exists_directed_path_visit(cls, node1: Node, node2: Node, path: List[Node], depth: int, graph: Graph):
@@ -147,13 +148,127 @@ class GraphUtils:
         path.remove(node1)
         return False
 
+    @classmethod
+    def exists_inducing_path(cls, x: Node, y: Node, graph: Graph) -> bool:
+        """
+        Determines whether there is an inducing path between x and y, relative to the latent nodes of the graph:
+        a path on which every node but x and y is a (definite) collider or a latent node, and every collider is an
+        ancestor of x or of y. The paths from x are searched depth first, as in Tetrad.
+        """
+        if x.get_node_type() != NodeType.MEASURED or y.get_node_type() != NodeType.MEASURED:
+            raise ValueError(f"The endpoints of an inducing path must be measured nodes: {x}, {y}")
+        ancestors = cls.get_ancestor_set([x, y], graph)
+        on_path = {x}
+        # The nodes of the current path, each with the nodes still to try after it.
+        stack = [(x, iter(graph.get_adjacent_nodes(x)))]
+        while stack:
+            b, candidates = stack[-1]
+            c = next(candidates, None)
+            if c is None:
+                stack.pop()
+                on_path.discard(b)
+            elif c == y:
+                return True
+            elif c not in on_path:
+                on_path.add(c)
+                stack.append((c, cls._inducing_path_successors(b, c, on_path, ancestors, graph)))
+        return False
+
+    @classmethod
+    def _inducing_path_successors(cls, a: Node, b: Node, on_path: Set[Node], ancestors: Set[Node], graph: Graph):
+        """ the nodes c off the path such that a, b, c may be part of an inducing path.
+
+        """
+        for c in graph.get_adjacent_nodes(b):
+            if c in on_path:
+                continue
+            collider = graph.is_def_collider(a, b, c)
+            if not collider and b.get_node_type() == NodeType.MEASURED:
+                continue
+            if collider and b not in ancestors:
+                continue
+            yield c
+
     @classmethod
     def is_d_connected_to(cls, x: Node, y: Node, z: List[Node], graph: Graph) -> bool:
         return cls._is_d_connected_to_1(x, y, z, graph)
 
     @classmethod
     def _is_d_connected_to_1(cls, x: Node, y: Node, z: List[Node], graph: Graph) -> bool:
-        pass
+        if x == y:
+            return True
+        z = set(z)
+        return cls.d_reachable(x, z, cls.get_ancestor_set(z, graph), graph, y) is True
+
+    @classmethod
+    def is_d_connected_to_batch(cls, xs: List[Node], ys: List[Node], z: List[Node], graph: Graph) -> List[bool]:
+        """
+        Determines whether xs[i] is d-connected to ys[i] given z, for many pairs sharing the same z. The ancestors
+        of z are computed once, and the nodes d-connected to each distinct x are found in one pass.
+        """
+        z = set(z)
+        ancestors = cls.get_ancestor_set(z, graph)
+        reached: Dict[Node, Set[Node]] = {}
+        connected = []
+        for x, y in zip(xs, ys):
+            if x not in reached:
+                reached[x] = cls.d_reachable(x, z, ancestors, graph)
+            connected.append(x == y or y in reached[x])
+        return connected
+
+    @classmethod
+    def get_ancestor_set(cls, nodes, graph: Graph) -> Set[Node]:
+        """
+        return the given nodes together with all their ancestors, found in one search over parents.
+        """
+        ancestors = set(nodes)
+        q = deque(ancestors)
+        while len(q) > 0:
+            t = q.pop()
+            for c in graph.get_parents(t):
+                if c not in ancestors:
+                    ancestors.add(c)
+                    q.append(c)
+        return ancestors
+
+    @classmethod
+    def d_reachable(cls, x: Node, z: Set[Node], ancestors: Set[Node], graph: Graph, target: Optional[Node] = None):
+        """ Finds the nodes d-connected to x given z, by a reachability search (as in Bayes-ball) over states
+        (node, whether it was entered through an arrowhead). A path may pass a collider b when b is an ancestor of
+        z (or in z), and a non-collider b when b is not in z. Each state is expanded once, so a search takes
+        O(V + E) time.
+
+        :param x: the node to search from.
+        :param z: the conditioning nodes.
+        :param ancestors: z and its ancestors, see get_ancestor_set().
+        :param graph: the graph.
+        :param target: if given, the search stops, returning True, as soon as target is reached, and returns
+            False if it is not.
+        :return: the set of nodes d-connected to x, or whether target is, if a target is given.
+        """
+        reached: Set[Node] = set()
+        visited = {(x, True), (x, False)}
+        q = deque()
+        for edge in graph.get_node_edges(x):
+            c = edge.get_distal_node(x)
+            state = (c, edge.get_proximal_endpoint(c) == Endpoint.ARROW)
+            if state not in visited:
+                visited.add(state)
+                q.append(state)
+        while len(q) > 0:
+            b, into = q.popleft()
+            if b == target:
+                return True
+            reached.add(b)
+            for edge in graph.get_node_edges(b):
+                collider = into and edge.get_proximal_endpoint(b) == Endpoint.ARROW
+                if (b in ancestors) if collider else (b not in z):
+                    c = edge.get_distal_node(b)
+                    state = (c, edge.get_proximal_endpoint(c) == Endpoint.ARROW)
+                    if state not in visited:
+                        visited.add(state)
+                        q.append(state)
+        return False if target is not None else reached
 
     @classmethod
     def add_pag_coloring(cls, graph: Graph):
@@ -255,7 +370,7 @@ class GraphUtils:
     @classmethod
     def graph_node_attributes2text(cls, graph: Graph, title: str, delimiter: str) -> str:
         nodes = graph.get_nodes()
-        graph_node_attributes = Dict[str, Dict[str, object]]()
+        graph_node_attributes = {}
         for node in nodes:
             attributes = node.get_all_attributes()
             if attributes and len(attributes) > 0:
@@ -301,54 +416,36 @@ class GraphUtils:
 
     @classmethod
     def graph2text(cls, graph: Graph):
-        # add edge properties relating to edge coloring of PAGs
-        if graph.is_pag():
-            cls.add_pag_coloring(graph)
-        fmt = list()
-        fmt.append("%s\n\n" % cls.graph_nodes2text(graph, "Graph Nodes:", ";"))
-        fmt.append("%s\n" % cls.graph_edges2text(graph, "Graph Edges:"))
-
-        # Graph Attributes
-        graph_attributes = cls.graph_attributes2text(graph, "Graph Attributes:")
-        if graph_attributes:
-            fmt.append("%s\n" % graph_attributes)
-
-        # Nodes Attributes
-        graph_node_attributes = cls.graph_node_attributes2text(graph, "Graph Node Attributes:", ";")
-        if graph_node_attributes:
-            fmt.append("%s\n" % graph_node_attributes)
-
-        ambiguous_triples = graph.get_ambiguous_triples()
-        if not ambiguous_triples and len(ambiguous_triples) > 0:
-            fmt.append("\n\n%s" % cls.triples2text(ambiguous_triples,
-                                                   "Ambiguous triples (i.e. list of triples for which there is "
-                                                   "ambiguous data about whether they are colliders or not):"))
-
-        underline_triples = graph.get_underlines()
-        if not underline_triples and len(underline_triples) > 0:
-            fmt.append("\n\n%s" % cls.triples2text(underline_triples, "Underline triples:"))
-
-        dotted_underline_triples = graph.get_dotted_underlines()
-        if not dotted_underline_triples and len(dotted_underline_triples) > 0:
-            fmt.append("\n\n%s" % cls.triples2text(dotted_underline_triples, "Dotted underline triples:"))
-
-        return "".join(fmt)
+        """
+        return the graph in the Tetrad text format; see GraphIO.write_text().
+        """
+        from graph.GraphIO import GraphIO
+        text = StringIO()
+        GraphIO.write_text(graph, text)
+        return text.getvalue()
 
     @classmethod
     def get_causal_ordering(cls, graph: Graph) -> List[Node]:
+        """ return the nodes of an acyclic graph, other than error nodes, with every node after its parents.
+
+        """
         if graph.exists_directed_cycle():
             raise AttributeError("Graph must be acyclic.")
+        nodes = [node for node in graph.get_nodes() if node.get_node_type() != NodeType.ERROR]
+        # The number of parents of each node that are not yet ordered.
+        waiting = {node: 0 for node in nodes}
+        for node in nodes:
+            waiting[node] = sum(1 for parent in graph.get_parents(node) if parent in waiting)
+        queue = deque(node for node in nodes if waiting[node] == 0)
         found: List[Node] = []
-        not_found = [node for node in graph.get_nodes() if node.get_node_type() != NodeType.ERROR]
-        all_nodes = list(not_found)
-        while len(not_found) > 0:
-            to_remove = []
-            for node in not_found:
-                parents = graph.get_parents(node)
-                if all(n in found for n in parents):
-                    found.append(node)
-                    to_remove.append(node)
-            not_found = [n for n in not_found if n not in to_remove]
+        while queue:
+            node = queue.popleft()
+            found.append(node)
+            for child in graph.get_children(node):
+                if child in waiting:
+                    waiting[child] -= 1
+                    if waiting[child] == 0:
+                        queue.append(child)
         return found
 
     @classmethod
@@ -0,0 +1,669 @@
+from collections import deque
+from typing import List, Dict, Set, Any, Optional
+
+import numpy as np
+
+from graph.Edge import Edge
+from graph.Endpoint import Endpoint
+from graph.Graph import Graph
+from graph.GraphUtils import GraphUtils
+from graph.Node import Node
+from graph.Triple import Triple
+
+# Endpoint codes stored in the endpoint matrix; 0 means there is no edge.
+_NONE = 0
+_TAIL = Endpoint.TAIL.value
+_ARROW = Endpoint.ARROW.value
+_CIRCLE = Endpoint.CIRCLE.value
+
+
+class IndexedGraph(Graph):
+    """
+    Stores a graph as a dense int8 matrix of endpoint codes over nodes numbered 0..n-1, where entry [i, j] is
+    the endpoint at node j of the edge between node i and node j (0 if they are not adjacent), together with
+    the set of adjacent indices of every node. Nodes are mapped to indices by name, so adjacency, endpoint and
+    parent queries are constant time or linear in the degree and never hash Edge objects. Edge objects are
+    only built on demand (get_edge, get_graph_edges, ...).
+
+    Unlike EdgeListGraph, at most one edge may connect a pair of nodes. This is the graph the adjacency
+    searches and orientation rules work on; use to_edge_list_graph() to hand a result to the rest of the API.
+    """
+
+    def __init__(self, graph: Optional[Graph] = None, nodes: Optional[List[Node]] = None):
+        self.nodes: List[Node] = []
+        self.index: Dict[str, int] = {}
+        self.endpoints = np.zeros((0, 0), dtype=np.int8)
+        self.adjacencies: List[Set[int]] = []
+        self.num_edges = 0
+        self.pattern = False
+        self.pag = False
+        self.attributes: Dict[str, Any] = {}
+        self.ambiguous_triples: Set[Triple] = set()
+        self.underline_triples: Set[Triple] = set()
+        self.dotted_underline_triples: Set[Triple] = set()
+        self.highlighted_edges: Set[Edge] = set()
+        if graph:
+            self.transfer_nodes_and_edges(graph)
+            self.transfer_attributes(graph)
+            self.ambiguous_triples = graph.get_ambiguous_triples()
+            self.underline_triples = graph.get_underlines()
+            self.dotted_underline_triples = graph.get_dotted_underlines()
+            self.pag = graph.is_pag()
+            self.pattern = graph.is_pattern()
+        if nodes:
+            for node in nodes:
+                self.add_node(node)
+
+    @classmethod
+    def from_graph(cls, graph: Graph):
+        """
+        return an IndexedGraph with the nodes, edges and triples of the given graph.
+        """
+        return cls(graph=graph)
+
+    def to_edge_list_graph(self) -> Graph:
+        """
+        return an EdgeListGraph with the same nodes, edges and triples as this graph.
+        """
+        from graph.EdgeListGraph import EdgeListGraph
+        return EdgeListGraph(graph=self)
+
+    def get_index(self, node: Node) -> int:
+        """
+        return the index of the given node, or -1 if it is not in the graph.
+        """
+        if node is None:
+            return -1
+        return self.index.get(node.get_name(), -1)
+
+    def get_adjacency_indices(self, i: int) -> Set[int]:
+        """
+        return the indices of the nodes adjacent to the node with index i. The returned set must not be
+        modified.
+        """
+        return self.adjacencies[i]
+
+    def get_endpoint_matrix(self) -> np.ndarray:
+        """
+        return an n x n view of the endpoint codes (Endpoint values, 0 for no edge).
+        """
+        n = len(self.nodes)
+        return self.endpoints[:n, :n]
+
+    def _indices(self, node1: Node, node2: Node):
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        if i < 0 or j < 0:
+            raise ValueError(f"Both nodes must be in the graph: {node1}, {node2}")
+        return i, j
+
+    def _make_edge(self, i: int, j: int) -> Edge:
+        return Edge(self.nodes[i], self.nodes[j], Endpoint(int(self.endpoints[j, i])),
+                    Endpoint(int(self.endpoints[i, j])))
+
+    def _add(self, i: int, j: int, endpoint1: int, endpoint2: int) -> bool:
+        if self.endpoints[i, j] != _NONE:
+            return bool(self.endpoints[j, i] == endpoint1 and self.endpoints[i, j] == endpoint2)
+        self.endpoints[j, i] = endpoint1
+        self.endpoints[i, j] = endpoint2
+        self.adjacencies[i].add(j)
+        self.adjacencies[j].add(i)
+        self.num_edges += 1
+        return True
+
+    def _remove(self, i: int, j: int) -> bool:
+        if self.endpoints[i, j] == _NONE:
+            return False
+        self.endpoints[i, j] = _NONE
+        self.endpoints[j, i] = _NONE
+        self.adjacencies[i].discard(j)
+        self.adjacencies[j].discard(i)
+        self.num_edges -= 1
+        return True
+
+    def _children(self, i: int) -> List[int]:
+        return [j for j in self.get_adjacency_indices(i)
+                if self.endpoints[j, i] == _TAIL and self.endpoints[i, j] == _ARROW]
+
+    def _parents(self, i: int) -> List[int]:
+        return [j for j in self.get_adjacency_indices(i)
+                if self.endpoints[i, j] == _TAIL and self.endpoints[j, i] == _ARROW]
+
+    def _reachable(self, sources: List[int], step) -> Set[int]:
+        """ the indices reachable in one or more steps from the sources.
+
+        """
+        seen: Set[int] = set()
+        queue = deque(sources)
+        while queue:
+            i = queue.popleft()
+            for j in step(i):
+                if j not in seen:
+                    seen.add(j)
+                    queue.append(j)
+        return seen
+
+    def _semidirected(self, i: int) -> List[int]:
+        return [j for j in self.get_adjacency_indices(i) if self.endpoints[j, i] in (_TAIL, _CIRCLE)]
+
+    def _undirected(self, i: int) -> List[int]:
+        return [j for j in self.get_adjacency_indices(i)
+                if self.endpoints[i, j] == _TAIL and self.endpoints[j, i] == _TAIL]
+
+    def add_bidirected_edge(self, node1: Node, node2: Node) -> bool:
+        i, j = self._indices(node1, node2)
+        return self._add(i, j, _ARROW, _ARROW)
+
+    def add_directed_edge(self, node1: Node, node2: Node) -> bool:
+        i, j = self._indices(node1, node2)
+        return self._add(i, j, _TAIL, _ARROW)
+
+    def add_undirected_edge(self, node1: Node, node2: Node) -> bool:
+        i, j = self._indices(node1, node2)
+        return self._add(i, j, _TAIL, _TAIL)
+
+    def add_nondirected_edge(self, node1: Node, node2: Node) -> bool:
+        i, j = self._indices(node1, node2)
+        return self._add(i, j, _CIRCLE, _CIRCLE)
+
+    def add_partially_oriented_edge(self, node1: Node, node2: Node) -> bool:
+        i, j = self._indices(node1, node2)
+        return self._add(i, j, _CIRCLE, _ARROW)
+
+    def add_edge(self, edge: Edge) -> bool:
+        """
+        Adds an edge to the graph. Returns false if a different edge already connects its nodes.
+        """
+        if not edge:
+            raise ValueError()
+        i, j = self._indices(edge.get_node1(), edge.get_node2())
+        return self._add(i, j, edge.get_endpoint1().value, edge.get_endpoint2().value)
+
+    def add_node(self, node: Node) -> bool:
+        """
+        Adds a node to the graph. Precondition: The proposed name of the node
+        cannot already be used by any other node in the same graph.
+        """
+        if not node:
+            raise ValueError()
+        name = node.get_name()
+        if name in self.index:
+            return self.nodes[self.index[name]] is node
+        n = len(self.nodes)
+        if n == self.endpoints.shape[0]:
+            grown = np.zeros((max(2 * n, 8), max(2 * n, 8)), dtype=np.int8)
+            grown[:n, :n] = self.endpoints
+            self.endpoints = grown
+        self.index[name] = n
+        self.nodes.append(node)
+        self.adjacencies.append(set())
+        return True
+
+    def clear(self):
+        self.nodes.clear()
+        self.index.clear()
+        self.adjacencies.clear()
+        self.endpoints = np.zeros((0, 0), dtype=np.int8)
+        self.num_edges = 0
+
+    def contains_edge(self, edge: Edge) -> bool:
+        i = self.get_index(edge.get_node1())
+        j = self.get_index(edge.get_node2())
+        if i < 0 or j < 0 or self.endpoints[i, j] == _NONE:
+            return False
+        return bool(self.endpoints[j, i] == edge.get_endpoint1().value and
+                    self.endpoints[i, j] == edge.get_endpoint2().value)
+
+    def contains_node(self, node: Node) -> bool:
+        return self.get_index(node) >= 0
+
+    def exists_directed_cycle(self) -> bool:
+        """
+        Return true if the directed edges of the graph contain a cycle (Kahn's algorithm).
+        """
+        n = len(self.nodes)
+        in_degree = [len(self._parents(i)) for i in range(n)]
+        queue = deque(i for i in range(n) if in_degree[i] == 0)
+        visited = 0
+        while queue:
+            i = queue.popleft()
+            visited += 1
+            for j in self._children(i):
+                in_degree[j] -= 1
+                if in_degree[j] == 0:
+                    queue.append(j)
+        return visited < n
+
+    def exists_directed_path_from_to(self, node1: Node, node2: Node) -> bool:
+        """
+        Return true if there is a directed path from node1 to node2.
+        """
+        i, j = self._indices(node1, node2)
+        return j in self._reachable([i], self._children)
+
+    def exists_undirected_path_from_to(self, node1: Node, node2: Node) -> bool:
+        i, j = self._indices(node1, node2)
+        return j in self._reachable([i], self._undirected)
+
+    def exists_semidirected_path_from_to(self, node1: Node, nodes: List[Node]) -> bool:
+        reachable = self._reachable([self.get_index(node1)], self._semidirected)
+        return any(self.get_index(n) in reachable for n in nodes)
+
+    def exists_inducing_path(self, node1: Node, node2: Node) -> bool:
+        return GraphUtils.exists_inducing_path(node1, node2, self)
+
+    def exists_trek(self, node1: Node, node2: Node) -> bool:
+        """
+         Determines whether a trek exists between two nodes in the graph, i.e. whether they have a common
+         ancestor.
+        """
+        i, j = self._indices(node1, node2)
+        ancestors1 = self._reachable([i], self._parents) | {i}
+        ancestors2 = self._reachable([j], self._parents) | {j}
+        return len(ancestors1 & ancestors2) > 0
+
+    def __eq__(self, other):
+        if not other or not isinstance(other, Graph):
+            return False
+        nodes_equal = len(set(self.get_node_names()) ^ set(other.get_node_names())) == 0
+        edges_equal = len(set(self.get_graph_edges()) ^ set(other.get_graph_edges())) == 0
+        return nodes_equal and edges_equal
+
+    def __str__(self):
+        return GraphUtils.graph2text(self)
+
+    def fully_connect(self, endpoint: Endpoint):
+        """
+        Resets the graph so that it is fully connects it using #-# edges, where # is the given endpoint.
+        """
+        n = len(self.nodes)
+        self.endpoints[:n, :n] = endpoint.value
+        np.fill_diagonal(self.endpoints[:n, :n], _NONE)
+        self.adjacencies = [set(range(n)) - {i} for i in range(n)]
+        self.num_edges = n * (n - 1) // 2
+
+    def reorient_all_with(self, endpoint: Endpoint):
+        n = len(self.nodes)
+        view = self.endpoints[:n, :n]
+        view[view != _NONE] = endpoint.value
+
+    def get_adjacent_nodes(self, node: Node) -> List[Node]:
+        i = self.get_index(node)
+        if i < 0:
+            return []
+        return [self.nodes[j] for j in sorted(self.get_adjacency_indices(i))]
+
+    def get_ancestors(self, nodes: List[Node]) -> List[Node]:
+        sources = [self.get_index(n) for n in nodes]
+        ancestors = self._reachable(sources, self._parents) | set(sources)
+        return [self.nodes[i] for i in sorted(ancestors)]
+
+    def get_children(self, node: Node) -> List[Node]:
+        return [self.nodes[j] for j in sorted(self._children(self.get_index(node)))]
+
+    def get_connectivity(self) -> int:
+        return max((len(adj) for adj in self.adjacencies), default=0)
+
+    def get_descendants(self, nodes: List[Node]) -> List[Node]:
+        sources = [self.get_index(n) for n in nodes]
+        descendants = self._reachable(sources, self._children) | set(sources)
+        return [self.nodes[i] for i in sorted(descendants)]
+
+    def get_edge(self, node1: Node, node2: Node) -> Optional[Edge]:
+        """ return the edge connecting node1 and node2, provided a unique such edge
+
+        """
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        if i < 0 or j < 0 or self.endpoints[i, j] == _NONE:
+            return None
+        return self._make_edge(i, j)
+
+    def get_directed_edge(self, node1: Node, node2: Node) -> Optional[Edge]:
+        if not self.is_directed_from_to(node1, node2):
+            return None
+        return self.get_edge(node1, node2)
+
+    def get_node_edges(self, node: Node) -> List[Edge]:
+        i = self.get_index(node)
+        if i < 0:
+            return []
+        return [self._make_edge(i, j) for j in sorted(self.get_adjacency_indices(i))]
+
+    def get_connecting_edges(self, node1: Node, node2: Node) -> List[Edge]:
+        edge = self.get_edge(node1, node2)
+        return [edge] if edge else []
+
+    def get_graph_edges(self) -> Set[Edge]:
+        edges = set()
+        for i, adj in enumerate(self.adjacencies):
+            for j in adj:
+                if i < j:
+                    edges.add(self._make_edge(i, j))
+        return edges
+
+    def get_endpoint(self, node1: Node, node2: Node) -> Optional[Endpoint]:
+        """
+        return the endpoint along the edge from node to node2 at the node2 end.
+        """
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        if i < 0 or j < 0 or self.endpoints[i, j] == _NONE:
+            return None
+        return Endpoint(int(self.endpoints[i, j]))
+
+    def get_in_degree(self, node: Node) -> int:
+        return len(self._parents(self.get_index(node)))
+
+    def get_out_degree(self, node: Node) -> int:
+        return len(self._children(self.get_index(node)))
+
+    def get_degree(self, node: Node) -> int:
+        return len(self.get_adjacency_indices(self.get_index(node)))
+
+    def get_node(self, name: str) -> Optional[Node]:
+        i = self.index.get(name, -1)
+        return self.nodes[i] if i >= 0 else None
+
+    def get_nodes(self) -> List[Node]:
+        return list(self.nodes)
+
+    def get_node_names(self) -> List[str]:
+        return [node.get_name() for node in self.nodes]
+
+    def get_num_edges(self) -> int:
+        return self.num_edges
+
+    def get_num_connected_edges(self, node: Node) -> int:
+        i = self.get_index(node)
+        return len(self.get_adjacency_indices(i)) if i >= 0 else 0
+
+    def get_num_nodes(self) -> int:
+        return len(self.nodes)
+
+    def get_parents(self, node: Node) -> List[Node]:
+        return [self.nodes[j] for j in sorted(self._parents(self.get_index(node)))]
+
+    def is_adjacent_to(self, node1: Node, node2: Node) -> bool:
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        return i >= 0 and j >= 0 and self.endpoints[i, j] != _NONE
+
+    def is_ancestor_of(self, node1: Node, node2: Node) -> bool:
+        i, j = self._indices(node1, node2)
+        return i == j or i in self._reachable([j], self._parents)
+
+    def possible_ancestor(self, node1: Node, node2: Node) -> bool:
+        return self.exists_semidirected_path_from_to(node1, [node2])
+
+    def is_child_of(self, node1: Node, node2: Node) -> bool:
+        return self.is_directed_from_to(node2, node1)
+
+    def is_parent_of(self, node1: Node, node2: Node) -> bool:
+        return self.is_directed_from_to(node1, node2)
+
+    def is_proper_ancestor_of(self, node1: Node, node2: Node) -> bool:
+        return node1 != node2 and self.is_ancestor_of(node1, node2)
+
+    def is_proper_descendent_of(self, node1: Node, node2: Node) -> bool:
+        return node1 != node2 and self.is_descendent_of(node1, node2)
+
+    def is_descendent_of(self, node1: Node, node2: Node) -> bool:
+        return self.is_ancestor_of(node2, node1)
+
+    def def_non_descendent(self, node1: Node, node2: Node) -> bool:
+        return not self.possible_ancestor(node1, node2)
+
+    def is_def_noncollider(self, node1: Node, node2: Node, node3: Node) -> bool:
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        k = self.get_index(node3)
+        if self.endpoints[j, i] == _ARROW and self.endpoints[i, j] == _TAIL:
+            return True
+        if self.endpoints[j, k] == _ARROW and self.endpoints[k, j] == _TAIL:
+            return True
+        return self.endpoints[i, j] == _CIRCLE and self.endpoints[k, j] == _CIRCLE and \
+            self.endpoints[i, k] == _NONE
+
+    def is_def_collider(self, node1: Node, node2: Node, node3: Node) -> bool:
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        k = self.get_index(node3)
+        return self.endpoints[i, j] == _ARROW and self.endpoints[k, j] == _ARROW
+
+    def is_d_connected_to(self, node1: Node, node2: Node, z: List[Node]) -> bool:
+        return GraphUtils.is_d_connected_to(node1, node2, z, self)
+
+    def is_d_separated_from(self, node1: Node, node2: Node, z: List[Node]) -> bool:
+        return not self.is_d_connected_to(node1, node2, z)
+
+    def poss_d_connected_to(self, node1: Node, node2: Node, z: List[Node]) -> bool:
+        return self.to_edge_list_graph().poss_d_connected_to(node1, node2, z)
+
+    def is_pattern(self) -> bool:
+        return self.pattern
+
+    def set_pattern(self, pattern: bool):
+        self.pattern = pattern
+
+    def is_pag(self) -> bool:
+        return self.pag
+
+    def set_pag(self, pag: bool):
+        self.pag = pag
+
+    def is_directed_from_to(self, node1: Node, node2: Node) -> bool:
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        return i >= 0 and j >= 0 and self.endpoints[j, i] == _TAIL and self.endpoints[i, j] == _ARROW
+
+    def is_undirected_from_to(self, node1: Node, node2: Node) -> bool:
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        return i >= 0 and j >= 0 and self.endpoints[j, i] == _TAIL and self.endpoints[i, j] == _TAIL
+
+    def def_visible(self, edge: Edge) -> bool:
+        return self.to_edge_list_graph().def_visible(edge)
+
+    def is_exogenous(self, node: Node) -> bool:
+        return self.get_in_degree(node) == 0
+
+    def get_nodes_into(self, node: Node, endpoint: Endpoint) -> List[Node]:
+        """ Nodes adjacent to the given node with the given proximal endpoint.
+
+        """
+        i = self.get_index(node)
+        return [self.nodes[j] for j in sorted(self.get_adjacency_indices(i)) if self.endpoints[j, i] == endpoint.value]
+
+    def get_nodes_out_of(self, node: Node, endpoint: Endpoint) -> List[Node]:
+        """ Nodes adjacent to the given node with the given distal endpoint.
+
+        """
+        i = self.get_index(node)
+        return [self.nodes[j] for j in sorted(self.get_adjacency_indices(i)) if self.endpoints[i, j] == endpoint.value]
+
+    def remove_edge(self, edge: Edge) -> bool:
+        if not self.contains_edge(edge):
+            return False
+        self.highlighted_edges.discard(edge)
+        return self._remove(self.get_index(edge.get_node1()), self.get_index(edge.get_node2()))
+
+    def remove_connecting_edge(self, node1: Node, node2: Node) -> bool:
+        i = self.get_index(node1)
+        j = self.get_index(node2)
+        if i < 0 or j < 0:
+            return False
+        return self._remove(i, j)
+
+    def remove_connecting_edges(self, node1: Node, node2: Node) -> bool:
+        return self.remove_connecting_edge(node1, node2)
+
+    def remove_edges(self, edges: List[Edge]) -> bool:
+        change = False
+        for edge in edges:
+            change |= self.remove_edge(edge)
+        return change
+
+    def remove_node(self, node: Node) -> bool:
+        """ Removes a node from the graph. The indices of the nodes after it are shifted down by one.
+
+        """
+        i = self.get_index(node)
+        if i < 0:
+            return False
+        n = len(self.nodes)
+        self.num_edges -= len(self.adjacencies[i])
+        keep = np.array([k for k in range(n) if k != i], dtype=np.intp)
+        endpoints = np.zeros_like(self.endpoints)
+        endpoints[:n - 1, :n - 1] = self.endpoints[np.ix_(keep, keep)]
+        self.endpoints = endpoints
+        del self.nodes[i]
+        self.index = {v.get_name(): k for k, v in enumerate(self.nodes)}
+        self.adjacencies = [set(np.flatnonzero(self.endpoints[k, :n - 1]).tolist()) for k in range(n - 1)]
+        return True
+
+    def remove_nodes(self, nodes: List[Node]) -> bool:
+        changed = False
+        for node in nodes:
+            changed |= self.remove_node(node)
+        return changed
+
+    def set_endpoint(self, node1: Node, node2: Node, endpoint: Endpoint) -> bool:
+        """ If there is currently an edge from node1 to node2, sets the endpoint at node2 to the given endpoint.
+
+        """
+        i, j = self._indices(node1, node2)
+        if self.endpoints[i, j] == _NONE:
+            return False
+        self.endpoints[i, j] = endpoint.value
+        return True
+
+    def subgraph(self, nodes: List[Node]):
+        graph = IndexedGraph(nodes=nodes)
+        for i, node1 in enumerate(nodes):
+            for node2 in nodes[i + 1:]:
+                edge = self.get_edge(node1, node2)
+                if edge:
+                    graph.add_edge(edge)
+        return graph
+
+    def transfer_nodes_and_edges(self, graph):
+        if not graph:
+            raise ValueError("No graph was provided.")
+        for node in graph.get_nodes():
+            if not self.add_node(node):
+                raise ValueError()
+        for edge in graph.get_graph_edges():
+            if not self.add_edge(edge):
+                raise ValueError(f"IndexedGraph allows one edge per pair of nodes: {edge}")
+
+    def transfer_attributes(self, graph):
+        if not graph:
+            raise ValueError("No graph was provided.")
+        self.attributes = {**graph.get_all_attributes()}
+
+    def get_ambiguous_triples(self) -> Set[Triple]:
+        return set(self.ambiguous_triples)
+
+    def get_underlines(self) -> Set[Triple]:
+        return set(self.underline_triples)
+
+    def get_dotted_underlines(self) -> Set[Triple]:
+        return set(self.dotted_underline_triples)
+
+    def is_ambiguous_triple(self, node1: Node, node2: Node, node3: Node) -> bool:
+        return Triple(node1, node2, node3) in self.ambiguous_triples
+
+    def is_underline_triple(self, node1: Node, node2: Node, node3: Node) -> bool:
+        return Triple(node1, node2, node3) in self.underline_triples
+
+    def is_dotted_underline_triple(self, node1: Node, node2: Node, node3: Node) -> bool:
+        return Triple(node1, node2, node3) in self.dotted_underline_triples
+
+    def _along_path(self, node1: Node, node2: Node, node3: Node) -> bool:
+        return self.is_adjacent_to(node1, node2) and self.is_adjacent_to(node2, node3)
+
+    def add_ambiguous_triple(self, node1: Node, node2: Node, node3: Node):
+        self.ambiguous_triples.add(Triple(node1, node2, node3))
+
+    def add_underline_triple(self, node1: Node, node2: Node, node3: Node):
+        if self._along_path(node1, node2, node3):
+            self.underline_triples.add(Triple(node1, node2, node3))
+
+    def add_dotted_underline_triple(self, node1: Node, node2: Node, node3: Node):
+        if self._along_path(node1, node2, node3):
+            self.dotted_underline_triples.add(Triple(node1, node2, node3))
+
+    def remove_ambiguous_triple(self, node1: Node, node2: Node, node3: Node):
+        self.ambiguous_triples.discard(Triple(node1, node2, node3))
+
+    def remove_underline_triple(self, node1: Node, node2: Node, node3: Node):
+        self.underline_triples.discard(Triple(node1, node2, node3))
+
+    def remove_dotted_underline_triple(self, node1: Node, node2: Node, node3: Node):
+        self.dotted_underline_triples.discard(Triple(node1, node2, node3))
+
+    def set_ambiguous_triples(self, triples: Set[Triple]):
+        self.ambiguous_triples.clear()
+        for t in triples:
+            self.add_ambiguous_triple(t.get_x(), t.get_y(), t.get_z())
+
+    def set_underline_triples(self, triples: Set[Triple]):
+        self.underline_triples.clear()
+        for t in triples:
+            self.add_underline_triple(t.get_x(), t.get_y(), t.get_z())
+
+    def set_dotted_underline_triples(self, triples: Set[Triple]):
+        self.dotted_underline_triples.clear()
+        for t in triples:
+            self.add_dotted_underline_triple(t.get_x(), t.get_y(), t.get_z())
+
+    def get_causal_ordering(self) -> List[Node]:
+        return GraphUtils.get_causal_ordering(self)
+
+    def set_high_lighted(self, edge: Edge, highlighted: bool):
+        if highlighted:
+            self.highlighted_edges.add(edge)
+        else:
+            self.highlighted_edges.discard(edge)
+
+    def is_high_lighted(self, edge: Edge) -> bool:
+        return edge in self.highlighted_edges
+
+    def is_parameterizable(self, node: Node) -> bool:
+        return True
+
+    def is_time_lag_model(self) -> bool:
+        return False
+
+    def get_time_lag_graph(self):
+        return None
+
+    def remove_triples_not_in_graph(self):
+        for triples in (self.ambiguous_triples, self.underline_triples, self.dotted_underline_triples):
+            for t in list(triples):
+                if not all(self.contains_node(n) for n in (t.get_x(), t.get_y(), t.get_z())) or \
+                        not self._along_path(t.get_x(), t.get_y(), t.get_z()):
+                    triples.discard(t)
+
+    def get_sepset(self, node1: Node, node2: Node) -> Optional[List[Node]]:
+        return GraphUtils.get_sepset(node1, node2, self)
+
+    def set_nodes(self, nodes: List[Node]):
+        if len(nodes) != len(self.nodes):
+            raise ValueError("Sorry, there is a mismatch in the number of variables you are trying to set.")
+        self.nodes = list(nodes)
+        self.index = {node.get_name(): i for i, node in enumerate(self.nodes)}
+
+    def get_all_attributes(self) -> Dict[str, Any]:
+        return self.attributes
+
+    def get_attribute(self, key: str):
+        return self.attributes.get(key)
+
+    def remove_attribute(self, key: str):
+        if key in self.attributes:
+            del self.attributes[key]
+
+    def add_attribute(self, key: str, value):
+        self.attributes[key] = value
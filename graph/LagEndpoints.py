@@ -0,0 +1,95 @@
+from typing import Set, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+class LagEndpoints:
+    """
+    The endpoint codes of a graph over variables 0..n-1 repeated at lags 0..L, in which the edge between two nodes
+    depends only on their variables and on the difference of their lags. Node i stands for variable i % n at lag
+    i // n. Codes are stored once per lag difference, as a (2L + 1) x n x n int8 array whose entry [d + L, a, b] is
+    the endpoint at b of the edges between a at lag l + d and b at lag l, for every l.
+
+    Indexing with a pair of node numbers, [i, j], reads and writes the endpoint at j of the edge between i and j
+    as in the endpoint matrix of an IndexedGraph, so writing one edge writes all its copies along the lags.
+    """
+
+    def __init__(self, num_variables: int, max_lag: int):
+        if num_variables < 0:
+            raise ValueError(f"Number of variables must be >= 0: {num_variables}")
+        if max_lag < 0:
+            raise ValueError(f"Max lag must be >= 0: {max_lag}")
+        self.num_variables = num_variables
+        self.max_lag = max_lag
+        self.codes = np.zeros((2 * max_lag + 1, num_variables, num_variables), dtype=np.int8)
+
+    def get_num_variables(self) -> int:
+        return self.num_variables
+
+    def get_max_lag(self) -> int:
+        return self.max_lag
+
+    def get_codes(self) -> np.ndarray:
+        return self.codes
+
+    def _cell(self, key: Tuple[int, int]) -> Tuple[int, int, int]:
+        la, a = divmod(key[0], self.num_variables)
+        lb, b = divmod(key[1], self.num_variables)
+        return la - lb + self.max_lag, a, b
+
+    def __getitem__(self, key: Tuple[int, int]) -> int:
+        return self.codes[self._cell(key)]
+
+    def __setitem__(self, key: Tuple[int, int], code: int):
+        self.codes[self._cell(key)] = code
+
+    def num_copies(self, d: int) -> int:
+        """
+        return the number of pairs of lags whose difference is d.
+        """
+        return max(self.max_lag + 1 - abs(d), 0)
+
+    def adjacent(self, i: int) -> Set[int]:
+        """
+        return the nodes adjacent to node i.
+        """
+        la, a = divmod(i, self.num_variables)
+        # Row r of the slice is the difference la + r - L, to the nodes at lag L - r.
+        r, b = np.nonzero(self.codes[la:la + self.max_lag + 1, a, :])
+        return set(((self.max_lag - r) * self.num_variables + b).tolist())
+
+    def resized(self, num_variables: int, max_lag: int):
+        """
+        return a copy over num_variables variables (the first ones of these) and lags 0..max_lag; the edges of lag
+        differences beyond max_lag are dropped.
+        """
+        resized = LagEndpoints(num_variables, max_lag)
+        n = min(num_variables, self.num_variables)
+        lag = min(max_lag, self.max_lag)
+        resized.codes[max_lag - lag:max_lag + lag + 1, :n, :n] = \
+            self.codes[self.max_lag - lag:self.max_lag + lag + 1, :n, :n]
+        return resized
+
+    def removed(self, variable: int):
+        """
+        return a copy without the given variable; the variables after it are shifted down by one.
+        """
+        resized = LagEndpoints(self.num_variables - 1, self.max_lag)
+        keep = np.delete(np.arange(self.num_variables), variable)
+        resized.codes[:] = self.codes[:, keep[:, None], keep[None, :]]
+        return resized
+
+    def to_matrix(self) -> np.ndarray:
+        """
+        return the (L + 1) n x (L + 1) n endpoint matrix of the nodes, built from a view of the codes with strides
+        (lag, variable, lag, variable) that walks the lag differences backwards along the second lag.
+        """
+        n = self.num_variables
+        size = (self.max_lag + 1) * n
+        if n == 0:
+            return np.zeros((size, size), dtype=np.int8)
+        s0, s1, s2 = self.codes.strides
+        view = as_strided(self.codes[self.max_lag:], shape=(self.max_lag + 1, n, self.max_lag + 1, n),
+                          strides=(s0, s1, -s0, s2), writeable=False)
+        return view.reshape(size, size)
@@ -9,9 +9,9 @@ class OrderedPair(Generic[T]):
     """
 
     def __init__(self, first: T, second: T):
-        if not first:
+        if first is None:
             raise ValueError("1st node must not be null.")
-        if not second:
+        if second is None:
             raise ValueError("2nd node must not be null.")
 
         self.first = first  # The "first" node.
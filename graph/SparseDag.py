@@ -0,0 +1,144 @@
+from typing import List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+from graph.EdgeListGraph import EdgeListGraph
+from graph.Graph import Graph
+from graph.GraphNode import GraphNode
+from graph.Node import Node
+
+
+class SparseDag:
+    """
+    A DAG stored as arrays of edges, for graphs too large to be built node by node: edge k goes from node
+    sources[k] to node targets[k], nodes being numbered 0 .. num_nodes - 1. Simulations use its parents as a sparse
+    matrix and its layers, the sets of nodes whose parents are all in earlier layers; to_graph() builds the
+    EdgeListGraph.
+    """
+
+    def __init__(self, num_nodes: int, sources: np.ndarray, targets: np.ndarray, names: Optional[List[str]] = None):
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if sources.shape != targets.shape or sources.ndim != 1:
+            raise ValueError("Expecting one source and one target per edge.")
+        if len(sources) > 0 and (min(sources.min(), targets.min()) < 0 or
+                                 max(sources.max(), targets.max()) >= num_nodes):
+            raise ValueError(f"Edges must join nodes in [0, {num_nodes}).")
+        if names is not None and len(names) != num_nodes:
+            raise ValueError(f"Expecting {num_nodes} names: {len(names)}")
+        self.num_nodes = num_nodes
+        self.sources = sources
+        self.targets = targets
+        self.names = names if names is not None else [f"X{i + 1}" for i in range(num_nodes)]
+        self.layers: Optional[List[np.ndarray]] = None
+
+    @classmethod
+    def random_forward(cls, rng: np.random.Generator, num_nodes: int, num_edges: int,
+                       names: Optional[List[str]] = None):
+        """
+        return a DAG with num_edges edges, drawn uniformly among the pairs of nodes and directed forward along a
+        random order of the nodes.
+        """
+        num_pairs = num_nodes * (num_nodes - 1) // 2
+        if num_edges < 0 or num_edges > num_pairs:
+            raise ValueError(f"Number of edges must be in [0, {num_pairs}]: {num_edges}")
+        order = rng.permutation(num_nodes)
+        k = np.sort(rng.choice(num_pairs, size=num_edges, replace=False)).astype(np.int64)
+        # Pair k is (i, j), i < j, in the row-major order of the upper triangle of the order.
+        i = num_nodes - 2 - np.floor(np.sqrt(4 * num_nodes * (num_nodes - 1) - 8 * k - 7) / 2 - 0.5).astype(np.int64)
+        j = k + i + 1 - num_pairs + (num_nodes - i) * (num_nodes - i - 1) // 2
+        return cls(num_nodes, order[i], order[j], names)
+
+    @classmethod
+    def from_graph(cls, graph: Graph):
+        """
+        return the directed edges of a graph as a SparseDag, with the nodes in the order of graph.get_nodes().
+        """
+        nodes = graph.get_nodes()
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = [(index[e.get_node1()], index[e.get_node2()]) for e in graph.get_graph_edges()
+                 if graph.is_directed_from_to(e.get_node1(), e.get_node2())]
+        sources = np.array([e[0] for e in edges], dtype=np.int64)
+        targets = np.array([e[1] for e in edges], dtype=np.int64)
+        return cls(len(nodes), sources, targets, [node.get_name() for node in nodes])
+
+    def get_num_nodes(self) -> int:
+        return self.num_nodes
+
+    def get_num_edges(self) -> int:
+        return len(self.sources)
+
+    def get_names(self) -> List[str]:
+        return self.names
+
+    def get_sources(self) -> np.ndarray:
+        return self.sources
+
+    def get_targets(self) -> np.ndarray:
+        return self.targets
+
+    def get_adjacency(self, weights: Optional[np.ndarray] = None) -> sp.csr_matrix:
+        """
+        return the num_nodes x num_nodes matrix with entry (i, j) the weight of the edge i --> j; 1 for every edge
+        if no weights are given, in the order of the edges.
+        """
+        if weights is None:
+            weights = np.ones(len(self.sources))
+        return sp.csr_matrix((weights, (self.sources, self.targets)), shape=(self.num_nodes, self.num_nodes))
+
+    def get_in_degrees(self) -> np.ndarray:
+        return np.bincount(self.targets, minlength=self.num_nodes)
+
+    def get_layers(self) -> List[np.ndarray]:
+        """
+        return the nodes by layers: the first layer holds the nodes without parents, and each next layer the nodes
+        whose parents are all in earlier layers.
+
+        Raises ValueError if the edges have a cycle.
+        """
+        if self.layers is None:
+            children = self.get_adjacency()
+            in_degrees = self.get_in_degrees()
+            layer = np.flatnonzero(in_degrees == 0)
+            layers = []
+            placed = 0
+            while len(layer) > 0:
+                layers.append(layer)
+                placed += len(layer)
+                reached = children[layer].indices
+                in_degrees -= np.bincount(reached, minlength=self.num_nodes)
+                reached = np.unique(reached)
+                layer = reached[in_degrees[reached] == 0]
+            if placed < self.num_nodes:
+                raise ValueError("The graph has a directed cycle.")
+            self.layers = layers
+        return self.layers
+
+    def get_causal_order(self) -> np.ndarray:
+        return np.concatenate(self.get_layers()) if self.num_nodes > 0 else np.zeros(0, dtype=np.int64)
+
+    def get_nodes(self) -> List[Node]:
+        """
+        return new GraphNode's with the names of the nodes.
+        """
+        return [GraphNode(name) for name in self.names]
+
+    def to_graph(self, nodes: Optional[List[Node]] = None) -> Graph:
+        """
+        return the DAG as an EdgeListGraph.
+
+        :param nodes: the nodes of the graph, e.g. the variables of data simulated from the DAG; new GraphNode's with
+            the names of the nodes if None.
+        """
+        if nodes is None:
+            nodes = self.get_nodes()
+        elif len(nodes) != self.num_nodes:
+            raise ValueError(f"Expecting {self.num_nodes} nodes: {len(nodes)}")
+        graph = EdgeListGraph(nodes=nodes)
+        for i, j in zip(self.sources.tolist(), self.targets.tolist()):
+            graph.add_directed_edge(nodes[i], nodes[j])
+        return graph
+
+    def __str__(self):
+        return f"SparseDag({self.num_nodes} nodes, {len(self.sources)} edges)"
@@ -1,9 +1,200 @@
-from graph.Graph import Graph
+from typing import List, Optional, Set, Tuple
 
+import numpy as np
 
-class TimeLagGraph(Graph):
+from graph.Edge import Edge
+from graph.Endpoint import Endpoint
+from graph.IndexedGraph import IndexedGraph
+from graph.LagEndpoints import LagEndpoints
+from graph.Node import Node
+
+
+class TimeLagGraph(IndexedGraph):
     """
     Represents a time series graph--that is, a graph with a fixed number S of lags,
     with edges into initial lags only--that is, into nodes in the first R lags, for some R.
     Edge structure repeats every R nodes.
+
+    Here R = 1: the variables are the nodes of lag 0 (named X), with a copy at each lag 1..S (named X:1 .. X:S),
+    and the edge between two nodes depends only on their variables and on the difference of their lags. Adding or
+    removing the edge X:1 --> Y adds or removes X:2 --> Y:1, ..., X:S --> Y:(S-1) as well. Node i is variable
+    i % n at lag i // n, for n variables, and the edges are stored once per lag difference in a LagEndpoints,
+    which takes the place of the endpoint matrix of IndexedGraph; Edge objects are only built on demand.
     """
+
+    LAG_SEPARATOR = ":"
+
+    def __init__(self, max_lag: int = 1, nodes: Optional[List[Node]] = None):
+        super().__init__()
+        self.variables: List[Node] = []
+        self.endpoints = LagEndpoints(0, max_lag)
+        if nodes:
+            for node in nodes:
+                self.add_node(node)
+
+    def get_max_lag(self) -> int:
+        return self.endpoints.get_max_lag()
+
+    def set_max_lag(self, max_lag: int):
+        """ Sets the number of lags; edges between nodes more than max_lag lags apart are dropped.
+
+        """
+        if max_lag < 0:
+            raise ValueError(f"Max lag must be >= 0: {max_lag}")
+        self.endpoints = self.endpoints.resized(len(self.variables), max_lag)
+        self._rebuild_nodes()
+
+    def get_lag_endpoints(self) -> LagEndpoints:
+        return self.endpoints
+
+    def get_node_id(self, node: Node) -> Tuple[str, int]:
+        """
+        return the name of the variable of the given node, and its lag.
+        """
+        i = self.get_index(node)
+        if i < 0:
+            raise ValueError(f"Node {node} is not in the graph.")
+        lag, v = divmod(i, len(self.variables))
+        return self.variables[v].get_name(), lag
+
+    def get_lagged_node(self, name: str, lag: int) -> Optional[Node]:
+        """
+        return the node of the variable with the given name at the given lag, or None if there is none.
+        """
+        if lag < 0 or lag > self.get_max_lag():
+            return None
+        i = self.index.get(name, -1)
+        return self.nodes[lag * len(self.variables) + i] if 0 <= i < len(self.variables) else None
+
+    def get_lag0_nodes(self) -> List[Node]:
+        return list(self.variables)
+
+    def get_lag_nodes(self, lag: int) -> List[Node]:
+        if lag < 0 or lag > self.get_max_lag():
+            raise ValueError(f"Lag out of range [0, {self.get_max_lag()}]: {lag}")
+        n = len(self.variables)
+        return self.nodes[lag * n:(lag + 1) * n]
+
+    @classmethod
+    def lag_name(cls, name: str, lag: int) -> str:
+        return name if lag == 0 else f"{name}{TimeLagGraph.LAG_SEPARATOR}{lag}"
+
+    def _rebuild_nodes(self):
+        nodes = {node.get_name(): node for node in self.nodes}
+        self.nodes = []
+        for lag in range(self.get_max_lag() + 1):
+            for variable in self.variables:
+                name = TimeLagGraph.lag_name(variable.get_name(), lag)
+                self.nodes.append(variable if lag == 0 else nodes.get(name) or variable.like(name))
+        self.index = {node.get_name(): i for i, node in enumerate(self.nodes)}
+
+    def get_adjacency_indices(self, i: int) -> Set[int]:
+        """
+        return the indices of the nodes adjacent to the node with index i, computed from the lag differences.
+        """
+        return self.endpoints.adjacent(i)
+
+    def get_endpoint_matrix(self) -> np.ndarray:
+        """
+        return the endpoint codes between all the nodes, as a new (S + 1) n x (S + 1) n matrix.
+        """
+        return self.endpoints.to_matrix()
+
+    def _add(self, i: int, j: int, endpoint1: int, endpoint2: int) -> bool:
+        if self.endpoints[i, j] != 0:
+            return bool(self.endpoints[j, i] == endpoint1 and self.endpoints[i, j] == endpoint2)
+        self.endpoints[j, i] = endpoint1
+        self.endpoints[i, j] = endpoint2
+        return True
+
+    def _remove(self, i: int, j: int) -> bool:
+        if self.endpoints[i, j] == 0:
+            return False
+        self.endpoints[i, j] = 0
+        self.endpoints[j, i] = 0
+        return True
+
+    def add_node(self, node: Node) -> bool:
+        """
+        Adds a variable, as a node of lag 0 together with its copies at the other lags. Its name must not end in
+        a lag.
+        """
+        if not node:
+            raise ValueError()
+        name = node.get_name()
+        if name in self.index:
+            return self.nodes[self.index[name]] is node
+        if TimeLagGraph.LAG_SEPARATOR in name:
+            raise ValueError(f"Variable names may not contain '{TimeLagGraph.LAG_SEPARATOR}': {name}")
+        self.variables.append(node)
+        self.endpoints = self.endpoints.resized(len(self.variables), self.get_max_lag())
+        self._rebuild_nodes()
+        return True
+
+    def clear(self):
+        self.variables.clear()
+        self.nodes.clear()
+        self.index.clear()
+        self.endpoints = LagEndpoints(0, self.get_max_lag())
+
+    def fully_connect(self, endpoint: Endpoint):
+        codes = self.endpoints.get_codes()
+        codes[:] = endpoint.value
+        np.fill_diagonal(codes[self.get_max_lag()], 0)
+
+    def reorient_all_with(self, endpoint: Endpoint):
+        codes = self.endpoints.get_codes()
+        codes[codes != 0] = endpoint.value
+
+    def get_connectivity(self) -> int:
+        return max((len(self.get_adjacency_indices(i)) for i in range(len(self.nodes))), default=0)
+
+    def _lag_edges(self) -> List[Tuple[int, int, int]]:
+        """ The edges of the graph up to lags: (d, a, b) for the edges between a at lag l + d and b at lag l,
+        once per pair of variables and lag difference.
+
+        """
+        max_lag = self.get_max_lag()
+        d, a, b = np.nonzero(self.endpoints.get_codes())
+        d -= max_lag
+        once = (d > 0) | ((d == 0) & (a < b))
+        return list(zip(d[once].tolist(), a[once].tolist(), b[once].tolist()))
+
+    def get_graph_edges(self) -> Set[Edge]:
+        n = len(self.variables)
+        edges = set()
+        for d, a, b in self._lag_edges():
+            for lag in range(self.get_max_lag() + 1 - d):
+                edges.add(self._make_edge((lag + d) * n + a, lag * n + b))
+        return edges
+
+    def get_num_edges(self) -> int:
+        return sum(self.endpoints.num_copies(d) for d, _, _ in self._lag_edges())
+
+    def remove_node(self, node: Node) -> bool:
+        """ Removes the variable of the given node, at every lag.
+
+        """
+        i = self.get_index(node)
+        if i < 0:
+            return False
+        v = i % len(self.variables)
+        self.endpoints = self.endpoints.removed(v)
+        del self.variables[v]
+        self._rebuild_nodes()
+        return True
+
+    def set_nodes(self, nodes: List[Node]):
+        if len(nodes) != len(self.nodes):
+            raise ValueError("Sorry, there is a mismatch in the number of variables you are trying to set.")
+        for i, node in enumerate(nodes):
+            if node.get_name() != self.nodes[i].get_name():
+                raise ValueError(f"Expecting a node named {self.nodes[i].get_name()}: {node}")
+        self.nodes = list(nodes)
+        self.variables = self.nodes[:len(self.variables)]
+
+    def is_time_lag_model(self) -> bool:
+        return True
+
+    def get_time_lag_graph(self):
+        return self
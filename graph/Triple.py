@@ -38,7 +38,7 @@ class Triple:
         return self.x == other.x and self.y == other.y and self.z == other.z or self.x == other.z and self.y == other.y and self.z == other.x
 
     def __str__(self):
-        return f"<{self.x}, {self.y}, {self.z}>"
+        return f"<{self.x.get_name()}, {self.y.get_name()}, {self.z.get_name()}>"
 
     def along_path_in(self, graph: Graph) -> bool:
         return graph.is_adjacent_to(self.x, self.y) and graph.is_adjacent_to(self.y, self.z) and self.x != self.z
@@ -0,0 +1,300 @@
+import math
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Dict, Sequence
+
+import numpy as np
+from scipy.special import gammaln
+
+from data.DataSet import DataSet
+from data.DataUtils import DataUtils
+from graph.Node import Node
+from search.Score import Score
+
+ScoreKey = Tuple[int, Tuple[int, ...]]
+# The counts of the non empty parent configurations and of the non empty cells of a table.
+Table = Tuple[np.ndarray, np.ndarray]
+
+
+class BDeuScore(Score):
+    """
+    The BDeu score of a discrete Bayes net (Heckerman, Geiger and Chickering, 1995), with the structure prior of
+    Tetrad. For a node with r categories and parents with q combinations of values, the local score is
+
+        sum_j [lgamma(s / q) - lgamma(s / q + n_j)] + sum_jk [lgamma(s / (q r) + n_jk) - lgamma(s / (q r))]
+            + k log(e / (v - 1)) + (v - 1 - k) log(1 - e / (v - 1))
+
+    where n_jk counts the cases with the j-th combination of values of the parents and the k-th value of the node,
+    s is the sample prior, e the structure prior (the expected number of parents of a node; none if 0 or at least
+    v - 1), k the number of parents and v the number of variables. Empty cells add nothing to the sums, so only the
+    non empty ones are counted and kept. Cases with a missing value of the node or of a parent are left out.
+
+    Every column is integer-encoded once (see DataUtils.discrete_codes). The combinations of values of a parent set
+    are numbered in mixed radix, from the numbering of the set without its last parent, and these numberings are
+    kept in a small least recently used table; the count table of a node given its parents is then one np.bincount
+    of the numbering extended by the node. Count tables and local scores are kept per (node, sorted parent set) in
+    bounded least recently used tables, so that the parent sets that come back during a search are not counted
+    again. local_score_diffs() counts the tables of all the candidates of a batch against one numbering of the
+    current parents and sums their lgamma terms in one pass.
+    """
+
+    MAX_CELLS = 1 << 22
+    KEY_CACHE_SIZE = 256
+
+    def __init__(self, dataset: DataSet, sample_prior: float = 1., structure_prior: float = 1.,
+                 cache_size: int = 100000):
+        if not dataset.is_discrete():
+            raise ValueError("Data set must be discrete.")
+        if sample_prior <= 0:
+            raise ValueError(f"Sample prior must be positive: {sample_prior}")
+        if structure_prior < 0:
+            raise ValueError(f"Structure prior must be >= 0: {structure_prior}")
+        if cache_size < 0:
+            raise ValueError(f"Cache size must be >= 0: {cache_size}")
+        self.variables = list(dataset.get_variables())
+        self.index = {v.get_name(): i for i, v in enumerate(self.variables)}
+        self.codes, self.num_categories = DataUtils.discrete_codes(dataset)
+        self.sample_size = self.codes.shape[0]
+        self.sample_prior = sample_prior
+        self.structure_prior = structure_prior
+        self.cache_size = cache_size
+        self._tables: "OrderedDict[ScoreKey, Table]" = OrderedDict()
+        self._scores: "OrderedDict[ScoreKey, float]" = OrderedDict()
+        self._keys: "OrderedDict[Tuple[int, ...], Tuple[np.ndarray, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_sample_prior(self) -> float:
+        return self.sample_prior
+
+    def set_sample_prior(self, sample_prior: float):
+        if sample_prior <= 0:
+            raise ValueError(f"Sample prior must be positive: {sample_prior}")
+        self.sample_prior = sample_prior
+        self._scores.clear()
+
+    def get_structure_prior(self) -> float:
+        return self.structure_prior
+
+    def set_structure_prior(self, structure_prior: float):
+        if structure_prior < 0:
+            raise ValueError(f"Structure prior must be >= 0: {structure_prior}")
+        self.structure_prior = structure_prior
+        self._scores.clear()
+
+    def get_num_categories(self) -> np.ndarray:
+        return self.num_categories
+
+    def _put(self, cache: OrderedDict, key, value, size: int):
+        if size > 0:
+            cache[key] = value
+            if len(cache) > size:
+                cache.popitem(last=False)
+
+    def _extend(self, key: np.ndarray, num: int, v: int) -> Tuple[np.ndarray, int]:
+        """ Extends a numbering of combinations of values by the values of v; -1 where a value is missing.
+
+        """
+        c = int(self.num_categories[v])
+        if num * c > BDeuScore.MAX_CELLS and num > 1:
+            # Renumbers the combinations that occur, so that the numbers stay below the number of cases.
+            observed = key >= 0
+            _, inverse = np.unique(key[observed], return_inverse=True)
+            key = np.full(len(key), -1, dtype=np.int64)
+            key[observed] = inverse
+            num = int(inverse.max()) + 1 if len(inverse) else 1
+        column = self.codes[:, v]
+        extended = key * c + column
+        extended[(key < 0) | (column < 0)] = -1
+        return extended, num * c
+
+    def _configurations(self, parents: Tuple[int, ...]) -> Tuple[np.ndarray, int]:
+        """ Numbers the combinations of values of the (sorted) parents in each case.
+
+        :return: the number of the combination of each case, -1 where a parent is missing; and an upper bound on
+            the largest number + 1.
+        """
+        if len(parents) == 0:
+            return np.zeros(self.sample_size, dtype=np.int64), 1
+        if parents in self._keys:
+            self._keys.move_to_end(parents)
+            return self._keys[parents]
+        key, num = self._extend(*self._configurations(parents[:-1]), parents[-1])
+        self._put(self._keys, parents, (key, num), BDeuScore.KEY_CACHE_SIZE)
+        return key, num
+
+    def _count(self, key: np.ndarray, num: int, node: int) -> Table:
+        """ Counts the cases of each value of the node in each combination of values of the parents.
+
+        :return: the counts of the non empty combinations and of the non empty cells.
+        """
+        key, num = self._extend(key, num, node)
+        r = int(self.num_categories[node])
+        key = key[key >= 0]
+        if num <= BDeuScore.MAX_CELLS:
+            table = np.bincount(key, minlength=num).reshape(-1, r)
+            rows = table.sum(axis=1)
+            return rows[rows > 0], table[table > 0]
+        cells, counts = np.unique(key, return_counts=True)
+        if len(cells) == 0:
+            return counts, counts
+        configurations = cells // r
+        starts = np.flatnonzero(np.r_[True, configurations[1:] != configurations[:-1]])
+        return np.add.reduceat(counts, starts), counts
+
+    def _table(self, node: int, parents: Tuple[int, ...]) -> Table:
+        key = (node, parents)
+        if key in self._tables:
+            self._tables.move_to_end(key)
+            return self._tables[key]
+        table = self._count(*self._configurations(parents), node)
+        self._put(self._tables, key, table, self.cache_size)
+        return table
+
+    def _structure_prior(self, num_parents: int) -> float:
+        e = self.structure_prior
+        vm = len(self.variables) - 1
+        # e / (v - 1) is the prior probability of each edge; none is set outside (0, 1).
+        if e == 0 or e >= vm:
+            return 0.
+        return num_parents * math.log(e / vm) + (vm - num_parents) * math.log(1. - e / vm)
+
+    def _scores_of(self, node: int, parent_sets: Sequence[Tuple[int, ...]], tables: Sequence[Table]) -> np.ndarray:
+        """ The local scores of a node given parent sets of the same size, from their tables, with one lgamma call
+        for all the rows and one for all the cells.
+
+        """
+        r = int(self.num_categories[node])
+        q = np.array([math.prod(float(self.num_categories[p]) for p in parents) for parents in parent_sets])
+        row_prior = self.sample_prior / q
+        cell_prior = row_prior / r
+        rows = [table[0] for table in tables]
+        cells = [table[1] for table in tables]
+        num_rows = np.array([len(c) for c in rows])
+        num_cells = np.array([len(c) for c in cells])
+        k = len(tables)
+        row_owners = np.repeat(np.arange(k), num_rows)
+        cell_owners = np.repeat(np.arange(k), num_cells)
+        row_counts = np.concatenate(rows) if k else np.zeros(0)
+        cell_counts = np.concatenate(cells) if k else np.zeros(0)
+        scores = num_rows * gammaln(row_prior) - num_cells * gammaln(cell_prior)
+        scores -= np.bincount(row_owners, weights=gammaln(row_prior[row_owners] + row_counts), minlength=k)
+        scores += np.bincount(cell_owners, weights=gammaln(cell_prior[cell_owners] + cell_counts), minlength=k)
+        return scores + np.array([self._structure_prior(len(parents)) for parents in parent_sets])
+
+    def local_score(self, node: int, parents: List[int] = None) -> float:
+        """ Calculates the score of a node given its parents.
+
+        :param node: the index of the node.
+        :param parents: the indices of its parents.
+        :return: the local BDeu score.
+        """
+        key = (node, tuple(sorted(parents or ())))
+        score = self._scores.get(key)
+        if score is not None:
+            self.hits += 1
+            self._scores.move_to_end(key)
+            return score
+        self.misses += 1
+        score = float(self._scores_of(node, [key[1]], [self._table(*key)])[0])
+        self._put(self._scores, key, score, self.cache_size)
+        return score
+
+    def local_score_diff(self, x: int, y: int, z: List[int] = None) -> float:
+        """ Calculates the change of the score of y when x is added to its parents z.
+
+        :return: local_score(y, z + [x]) - local_score(y, z)
+        """
+        z = tuple(sorted(z or ()))
+        if x in z or x == y:
+            raise ValueError(f"Cannot add {x} to the parents {list(z)} of {y}.")
+        return self.local_score(y, z + (x,)) - self.local_score(y, z)
+
+    def local_score_diffs(self, xs: Sequence[int], y: int, z: Sequence[int] = None) -> np.ndarray:
+        """ Calculates local_score_diff(x, y, z) for each x of xs, counting the tables that are not cached against
+        one numbering of the combinations of values of z, and scoring them together.
+
+        :param xs: the indices of the candidate parents, none of them y or in z.
+        :param y: the index of the node.
+        :param z: the indices of its current parents.
+        :return: the differences of score, in the order of xs.
+        """
+        z = tuple(sorted(z or ()))
+        xs = np.asarray(xs, dtype=np.intp).reshape(-1).tolist()
+        base = self.local_score(y, z)
+        scores = np.empty(len(xs))
+        parent_sets = []
+        tables = []
+        missing = []
+        configurations = None
+        for i, x in enumerate(xs):
+            parents = tuple(sorted(z + (x,)))
+            score = self._scores.get((y, parents))
+            if score is not None:
+                self.hits += 1
+                scores[i] = score
+                continue
+            self.misses += 1
+            table = self._tables.get((y, parents))
+            if table is None:
+                if configurations is None:
+                    configurations = self._configurations(z)
+                # The numbering of z + x in any order gives the same counts, up to the order of the rows.
+                table = self._count(*self._extend(*configurations, x), y)
+                self._put(self._tables, (y, parents), table, self.cache_size)
+            parent_sets.append(parents)
+            tables.append(table)
+            missing.append(i)
+        if missing:
+            computed = self._scores_of(y, parent_sets, tables)
+            scores[missing] = computed
+            for parents, score in zip(parent_sets, computed.tolist()):
+                self._put(self._scores, (y, parents), score, self.cache_size)
+        return scores - base
+
+    def __getstate__(self):
+        # Workers of a parallel search get the data, not the tables.
+        state = self.__dict__.copy()
+        state["_tables"] = OrderedDict()
+        state["_scores"] = OrderedDict()
+        state["_keys"] = OrderedDict()
+        return state
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        return the number of hits and misses of the local score table so far, and the numbers of cached scores,
+        count tables and numberings of parent sets.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._scores), "tables": len(self._tables),
+                "configurations": len(self._keys)}
+
+    def clear_cache(self):
+        self._tables.clear()
+        self._scores.clear()
+        self._keys.clear()
+
+    def get_variables(self) -> List[Node]:
+        return self.variables
+
+    def get_variable(self, name: str) -> Optional[Node]:
+        i = self.index.get(name)
+        return self.variables[i] if i is not None else None
+
+    def is_effect_edge(self, bump: float) -> bool:
+        return bump > 0
+
+    def get_sample_size(self) -> int:
+        return self.sample_size
+
+    def get_max_degree(self) -> int:
+        return int(math.ceil(math.log(self.sample_size))) if self.sample_size > 1 else 1
+
+    def determines(self, z: List[Node], y: Node) -> bool:
+        """
+        return True if, in the cases where z and y are observed, each combination of values of z occurs with only
+        one value of y.
+        """
+        rows, cells = self._table(self.index[y.get_name()], tuple(sorted(self.index[n.get_name()] for n in z)))
+        return len(rows) == len(cells)
+
+    def __str__(self):
+        return f"BDeu Score sample prior {self.sample_prior} structure prior {self.structure_prior}"
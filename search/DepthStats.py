@@ -0,0 +1,47 @@
+from typing import Optional, Dict, Any
+
+
+class DepthStats:
+    """
+    The counts and times of one depth of an adjacency search, or of a whole phase of a search when depth is None.
+
+    Times are in nanoseconds. test_ns is the time spent in the independence test; for work done by worker processes
+    it is summed over the workers, so it can exceed elapsed_ns. Cache hits and misses are those of the caches of the
+    independence test during this depth or phase.
+    """
+
+    def __init__(self, phase: str, depth: Optional[int] = None):
+        self.phase = phase
+        self.depth = depth
+        self.num_tests = 0
+        self.num_dependence_judgments = 0
+        self.edges_removed = 0
+        self.elapsed_ns = 0
+        self.test_ns = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def get_bookkeeping_ns(self) -> int:
+        """
+        return the time spent outside the independence test, or 0 if the test time was summed over workers.
+        """
+        return max(self.elapsed_ns - self.test_ns, 0)
+
+    def get_cache_hit_rate(self) -> Optional[float]:
+        """
+        return the fraction of cache lookups that hit, or None if the caches were not used.
+        """
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total > 0 else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"phase": self.phase, "depth": self.depth, "num_tests": self.num_tests,
+                "num_dependence_judgments": self.num_dependence_judgments, "edges_removed": self.edges_removed,
+                "elapsed_ns": self.elapsed_ns, "test_ns": self.test_ns, "bookkeeping_ns": self.get_bookkeeping_ns(),
+                "cache_hits": self.cache_hits, "cache_misses": self.cache_misses,
+                "cache_hit_rate": self.get_cache_hit_rate()}
+
+    def __str__(self):
+        depth = "" if self.depth is None else f" depth {self.depth}"
+        return f"{self.phase}{depth}: {self.num_tests} tests, {self.edges_removed} edges removed, " \
+               f"{self.elapsed_ns / 1e6:.3f} ms ({self.test_ns / 1e6:.3f} ms in tests)"
@@ -1,17 +1,22 @@
 import itertools
 import logging
-from typing import List, Dict, Set, Optional
+import time
+from typing import List, Dict, Set, Optional, Union
 
-from IFas import IFas
+import numpy as np
+
+from search.IFas import IFas
 from data.IKnowledge import IKnowledge
 from data.Knowledge import Knowledge
+from data.KnowledgeIndex import KnowledgeIndex
 from graph.Edge import Edge
 from graph.Edges import Edges
 from graph.Graph import Graph
+from graph.IndexedGraph import IndexedGraph
 from graph.EdgeListGraph import EdgeListGraph
-from graph.GraphUtils import GraphUtils
 from graph.Node import Node
 from graph.Triple import Triple
+from search.SearchInstrumentation import SearchInstrumentation
 from search.SearchLogUtils import independence_fact, independence_fact_msg
 from search.idt.IndependenceTest import IndependenceTest
 from search.SepsetMap import SepsetMap
@@ -29,10 +34,15 @@ class Fas(IFas):
     depending on the assumptions of the algorithm. A mapping from {x, y} to S({x, y}) is returned
     for edges x *-* y that have been removed.
 
+    The conditioning sets of an edge at a depth are tested in batches of at most CHUNK sets, so that memory stays
+    bounded and the search of an edge stops at the first batch holding an independence.
+
     Optionally uses Heuristic 3 from Causation, Prediction and Search,
     which (like FAS-Stable) renders the output invariant to the order of the input variables (See Tsagris).
     """
 
+    CHUNK = 256
+
     def __init__(self, initial_graph: Graph, test: IndependenceTest):
         # Initial graph.
         if initial_graph:
@@ -44,6 +54,9 @@ class Fas(IFas):
         # Specification of which edges are forbidden or required.
         self.knowledge = Knowledge()
 
+        # The knowledge compiled over the variables of the test, rebuilt at the start of each search.
+        self.knowledge_index: Optional[KnowledgeIndex] = None
+
         # FAS-Stable
         self.stable = False
 
@@ -62,11 +75,20 @@ class Fas(IFas):
         # The number of independence tests.
         self.numIndependenceTests = 0
 
+        # The number of independence tests done at each depth.
+        self.numIndependenceTestsByDepth: List[int] = []
+
         # The maximum number of variables conditioned on in any conditional independence test.
         # If the depth is -1, it will be taken to be the maximum value, which is 1000.
         # Otherwise, it should be set to a non-negative integer.
         self.depth = 1000
 
+        # The time taken by the last search, in milliseconds.
+        self.elapsed_time = 0
+
+        # Records the statistics of the search, if not None.
+        self.instrumentation: Optional[SearchInstrumentation] = None
+
         self.logger = logging.Logger("Fas")
 
     def is_aggressively_prevent_cycles(self) -> bool:
@@ -109,11 +131,17 @@ class Fas(IFas):
         @return a SepSet, which indicates which variables are independent conditional on which other variables
         """
         self.logger.info("Starting Fast Adjacency Search.")
+        start_time = time.perf_counter_ns()
+        instrumentation = self.instrumentation
         _depth = 1000 if self.depth == -1 else self.depth
         self.sepset = SepsetMap()
+        self.numIndependenceTests = 0
+        self.numDependenceJudgement = 0
+        self.numIndependenceTestsByDepth = [0]
         edges: List[Edge] = []
         nodes: List[Node] = list(self.test.get_variables())
         scores: Dict[Edge, float] = {}
+        self.knowledge_index = self.knowledge.compile([node.get_name() for node in nodes])
 
         if self.heuristic == 1:
             nodes.sort()
@@ -122,9 +150,19 @@ class Fas(IFas):
             for j in range(i + 1, len(nodes)):
                 edges.append(Edges.undirected_edge(nodes[i], nodes[j]))
 
+        if instrumentation is not None:
+            instrumentation.start_phase(SearchInstrumentation.ADJACENCY, self.test)
+            instrumentation.start_depth(0)
+            test_start = time.perf_counter_ns()
+        p_values: Dict[Edge, float] = {}
         for edge in edges:
             self.test.is_independents(edge.get_node1(), edge.get_node2(), [])
             scores[edge] = self.test.get_score()
+            p_values[edge] = self.test.get_p_value()
+        if instrumentation is not None:
+            instrumentation.record_tests(len(edges), time.perf_counter_ns() - test_start)
+        self.numIndependenceTests += len(edges)
+        self.numIndependenceTestsByDepth[0] += len(edges)
 
         if self.heuristic == 2 or self.heuristic == 3:
             edges = [k for k, v in sorted(scores.items(), key=lambda item: item[1])]
@@ -140,27 +178,37 @@ class Fas(IFas):
 
         for edge in list(edges):
             if scores[edge] < 0 or \
-                    (self.knowledge.is_forbidden(edge.get_node1().get_name(), edge.get_node2().get_name()) and
-                     self.knowledge.is_forbidden(edge.get_node2().get_name(), edge.get_node1().get_name())):
+                    (self.knowledge_index.is_forbidden(edge.get_node1().get_name(), edge.get_node2().get_name()) and
+                     self.knowledge_index.is_forbidden(edge.get_node2().get_name(), edge.get_node1().get_name())):
                 edges.remove(edge)
                 adjacencies[edge.get_node1()].remove(edge.get_node2())
                 adjacencies[edge.get_node2()].remove(edge.get_node1())
                 self.sepset.sets(edge.get_node1(), edge.get_node2(), [])
+                self.sepset.set_p_value(edge.get_node1(), edge.get_node2(), p_values[edge])
+                if instrumentation is not None:
+                    instrumentation.record_edges_removed(1)
+        if instrumentation is not None:
+            instrumentation.end_depth()
 
-        for d in range(1, _depth):
+        for d in range(1, _depth + 1):
             if self.stable:
                 adjacencies_copy = {}
                 for k, v in adjacencies.items():
                     adjacencies_copy[k] = set(v)
                 adjacencies = adjacencies_copy
+            self.numIndependenceTestsByDepth.append(0)
+            if instrumentation is not None:
+                instrumentation.start_depth(d)
             more = self.search_at_depth(scores, edges, self.test, adjacencies, d)
+            if instrumentation is not None:
+                instrumentation.end_depth()
             if not more:
                 break
 
         # The search graph.
         # It is assumed going in that all of the true adjacencies of x are in this graph for every node
         # x. It is hoped (i.e. true in the large sample limit) that true adjacencies are never removed.
-        graph = EdgeListGraph(nodes=nodes)
+        graph = IndexedGraph(nodes=nodes)
         for i in range(len(nodes)):
             for j in range(i + 1, len(nodes)):
                 x = nodes[i]
@@ -168,6 +216,9 @@ class Fas(IFas):
                 if y in adjacencies[x]:
                     graph.add_undirected_edge(x, y)
 
+        if instrumentation is not None:
+            instrumentation.end_phase()
+        self.elapsed_time = (time.perf_counter_ns() - start_time) // 1000000
         self.logger.info("Finishing Fast Adjacency Search.")
         return graph
 
@@ -209,7 +260,7 @@ class Fas(IFas):
         if self.heuristic == 1 or self.heuristic == 2:
             _adjx.sort()
 
-        ppx = self.possible_parents(x, _adjx, self.knowledge, y)
+        ppx = self.possible_parents(x, _adjx, self.knowledge_index, y)
         scores2 = {}
 
         for node in ppx:
@@ -219,26 +270,42 @@ class Fas(IFas):
         if self.heuristic == 3:
             ppx = [k for k, v in sorted(scores2.items(), key=lambda item: item[1], reverse=True)]
 
-        if len(ppx) > depth:
-            combinations = itertools.combinations(ppx, 2)
-            for choice in combinations:
-                # if (Thread.currentThread().isInterrupted())
-                #   break
-                z = GraphUtils.as_list(choice, ppx)
-                self.numIndependenceTests += 1
-                independent = test.is_independents(x, y, z)
-                if not independent:
-                    self.numDependenceJudgement += 1
-                no_edge_required = self.knowledge.no_edge_required(x.get_name(), y.get_name())
-                if independent and no_edge_required:
-                    adjacencies.get(x).remove(y)
-                    adjacencies.get(y).remove(x)
-                    self.get_sepsets().sets(x, y, z)
-                    if self.verbose:
-                        self.logger.info("{} score = {:.2e}".format(independence_fact(x, y, z), test.get_score()))
-                        print(independence_fact_msg(x, y, z, test.get_p_value()))
-
-    def possible_parents(self, x: Node, adjx: List[Node], knowledge: IKnowledge, y: Node) -> List[Node]:
+        if len(ppx) >= depth:
+            # The conditioning sets of this size are submitted to the test in batches, in enumeration order,
+            # stopping at the first batch with an independent one, which becomes the sepset. Batches double in
+            # size from 1 up to Fas.CHUNK, so an edge removed early costs few more tests than one at a time.
+            choices = itertools.combinations(ppx, depth)
+            size = 1
+            while True:
+                zs = [list(choice) for choice in itertools.islice(choices, size)]
+                size = min(2 * size, Fas.CHUNK)
+                if not zs:
+                    return
+                test_start = time.perf_counter_ns() if self.instrumentation is not None else 0
+                independent, p_values = test.is_independents_batch_with_p_values([x] * len(zs), [y] * len(zs), zs)
+                found = np.flatnonzero(independent)
+                if self.instrumentation is not None:
+                    self.instrumentation.record_tests(len(zs), time.perf_counter_ns() - test_start,
+                                                      len(zs) - len(found))
+                self.numIndependenceTests += len(zs)
+                self.numIndependenceTestsByDepth[depth] += len(zs)
+                self.numDependenceJudgement += len(zs) - len(found)
+                if len(found) > 0:
+                    break
+            if self.knowledge_index.no_edge_required(x.get_name(), y.get_name()):
+                z = zs[found[0]]
+                p_value = float(p_values[found[0]])
+                adjacencies.get(x).remove(y)
+                adjacencies.get(y).remove(x)
+                self.get_sepsets().sets(x, y, z)
+                self.get_sepsets().set_p_value(x, y, p_value)
+                if self.instrumentation is not None:
+                    self.instrumentation.record_edges_removed(1)
+                if self.verbose:
+                    self.logger.info("{} p = {:.2e}".format(independence_fact(x, y, z), p_value))
+                    print(independence_fact_msg(x, y, z, p_value))
+
+    def possible_parents(self, x: Node, adjx: List[Node], knowledge: Union[IKnowledge, KnowledgeIndex], y: Node) -> List[Node]:
         possible_parents = []
         _x = x.get_name()
         for z in adjx:
@@ -250,18 +317,33 @@ class Fas(IFas):
 
         return possible_parents
 
-    def possible_parent_of(self, z: str, x: str, knowledge: IKnowledge) -> bool:
+    def possible_parent_of(self, z: str, x: str, knowledge: Union[IKnowledge, KnowledgeIndex]) -> bool:
         return not knowledge.is_forbidden(z, x) and not knowledge.is_required(x, z)
 
     def search_with_node(self, nodes: List[Node]) -> Optional[Graph]:
         return None
 
     def get_elapsed_time(self) -> int:
-        return 0
+        """ Return the time taken by the last search, in milliseconds.
+
+        """
+        return self.elapsed_time
+
+    def get_instrumentation(self) -> Optional[SearchInstrumentation]:
+        return self.instrumentation
+
+    def set_instrumentation(self, instrumentation: Optional[SearchInstrumentation]):
+        """ Sets the instrumentation that records the statistics of each depth of the search; None records nothing.
+
+        """
+        self.instrumentation = instrumentation
 
     def get_num_independence_tests(self) -> int:
         return self.numIndependenceTests
 
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        return list(self.numIndependenceTestsByDepth)
+
     def set_true_graph(self, true_graph: Graph):
         pass
 
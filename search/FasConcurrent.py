@@ -1,16 +1,100 @@
+import itertools
 import logging
-from typing import Set, Dict, List, Optional
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Set, Dict, List, Optional, Tuple, Callable
+
+import numpy as np
 
 from data.IKnowledge import IKnowledge
 from data.Knowledge import Knowledge
+from data.KnowledgeIndex import KnowledgeIndex
 from graph.EdgeListGraph import EdgeListGraph
 from graph.Graph import Graph
+from graph.IndexedGraph import IndexedGraph
 from graph.Node import Node
 from graph.Triple import Triple
+from search.Fas import Fas
 from search.IFas import IFas
+from search.idt.CachedIndependenceTest import CachedIndependenceTest
+from search.idt.IndTestFisherZ import IndTestFisherZ
 from search.idt.IndependenceTest import IndependenceTest
+from search.idt.PartialCorrelation import PartialCorrelation
+from search.SearchInstrumentation import SearchInstrumentation
 from search.SepsetMap import SepsetMap
 
+# A work unit entry: (x, y, possible parents of x, possible parents of y), all as variable indices.
+EdgeTask = Tuple[int, int, Tuple[int, ...], Tuple[int, ...]]
+
+# A removed edge: (x, y, sepset, p value of x _||_ y | sepset, or None if it was not tested), as variable indices.
+Removal = Tuple[int, int, Tuple[int, ...], Optional[float]]
+
+# State of a worker process, set up once by _init_worker.
+_worker_state: dict = {}
+
+
+def _init_worker(shm_name: str, size: int, sample_size: int, alpha: float):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray((size, size), dtype=np.float64, buffer=shm.buf)
+    _worker_state["shm"] = shm
+    _worker_state["engine"] = PartialCorrelation(matrix, cache_size=0, copy=False)
+    _worker_state["sample_size"] = sample_size
+    _worker_state["alpha"] = alpha
+
+
+def _fisher_z_independent(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    r = _worker_state["engine"].partial_correlations(x, y, z)
+    p = IndTestFisherZ.fisher_z_p_values(r, _worker_state["sample_size"], z.shape[1])
+    return np.isnan(p) | (p > _worker_state["alpha"]), p
+
+
+def _run_tasks(tasks: List[EdgeTask], depth: int) -> Tuple[List[Removal], int, int]:
+    return _check_edges(tasks, depth, _fisher_z_independent)
+
+
+def _check_edges(tasks: List[EdgeTask], depth: int,
+                 independent: Callable[[np.ndarray, np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]) \
+        -> Tuple[List[Removal], int, int]:
+    """
+    Tests the edges of a work unit at the given depth against a frozen adjacency snapshot.
+
+    :param tasks: the edges to check, with the possible parents of each endpoint.
+    :param depth: the size of the conditioning sets.
+    :param independent: judges arrays of (x, y, Z) index questions, and gives their p values.
+    :return: the removed edges with their sepsets and p values, the number of tests done and the time spent in
+        them, in ns.
+    """
+    removed = []
+    num_tests = 0
+    test_ns = 0
+    for x, y, ppx, ppy in tasks:
+        sides = ((x, y, ppx),) if depth == 0 else ((x, y, ppx), (y, x, ppy))
+        for a, b, pp in sides:
+            if len(pp) < depth:
+                continue
+            # As in Fas.check_side: batches double in size up to Fas.CHUNK, stopping at the first independence.
+            choices = itertools.combinations(pp, depth)
+            size = 1
+            found = []
+            while len(found) == 0:
+                subsets = list(itertools.islice(choices, size))
+                size = min(2 * size, Fas.CHUNK)
+                k = len(subsets)
+                if k == 0:
+                    break
+                z = np.array(subsets, dtype=np.intp).reshape(k, depth)
+                num_tests += k
+                start = time.perf_counter_ns()
+                judgements, p_values = independent(np.full(k, a, dtype=np.intp), np.full(k, b, dtype=np.intp), z)
+                found = np.flatnonzero(judgements)
+                test_ns += time.perf_counter_ns() - start
+            if len(found) > 0:
+                removed.append((x, y, tuple(int(i) for i in z[found[0]]), float(p_values[found[0]])))
+                break
+    return removed, num_tests, test_ns
+
 
 class FasConcurrent(IFas):
     """
@@ -31,81 +115,203 @@ class FasConcurrent(IFas):
 
     def __init__(self, test: IndependenceTest, graph: Optional[Graph] = None):
         self.test = test
-        if graph:
-            self.initial_graph = graph
-        else:
-            self.initial_graph = graph
+        self.initial_graph = graph
         self.stable = True
         self.chunk = 1000
+        self.num_workers = os.cpu_count() or 1
         self.verbose = False
         self.sepsets = SepsetMap()
         self.num_independence_tests = 0
+        self.num_independence_tests_by_depth: List[int] = []
         self.depth = 1000
         self.knowledge = Knowledge()
+        self.knowledge_index: Optional[KnowledgeIndex] = None
+        self.elapsed_time = 0
+        self.instrumentation: Optional[SearchInstrumentation] = None
         self.logger = logging.Logger("FasConcurrent")
 
     def search(self) -> Graph:
+        """
+        Discovers all adjacencies in data. Each depth is processed against a frozen snapshot of the
+        adjacencies (PC-Stable): the edges are cut into work units of self.chunk edges which are tested
+        in parallel, and removals and sepsets are merged in edge order after the whole depth is done,
+        so the result does not depend on scheduling.
+
+        When the test is a covariance-based IndTestFisherZ, cached or not, work units run in a process pool whose
+        workers read the correlation matrix from shared memory (the facts they test are not cached); any other
+        test is run in this process.
+        """
         self.logger.info("Starting Fast Adjacency Search.")
-        # graph = EdgeListGraphSingleConnections(self.test.get_variables())
-        graph = EdgeListGraph(nodes=self.test.get_variables())
+        start_time = time.perf_counter_ns()
+        nodes = list(self.test.get_variables())
+        graph = IndexedGraph(nodes=nodes)
+        self.knowledge_index = self.knowledge.compile([node.get_name() for node in nodes])
         self.sepsets = SepsetMap()
+        self.num_independence_tests = 0
+        self.num_independence_tests_by_depth = []
         _depth = self.depth
         if _depth == -1:
             _depth = 1000
-        adjacencies: Dict[Node, Set[Node]] = {}
-        nodes = graph.get_nodes()
-        for node in nodes:
-            adjacencies[node] = set()
-        for d in range(_depth + 1):
-            more = self.search_at_depth0(nodes, adjacencies) if d == 0 else self.search_at_depth(d, nodes, adjacencies)
-            if not more:
-                break
+
+        adjacencies: List[Set[int]] = [set(range(len(nodes))) - {i} for i in range(len(nodes))]
+        if self.initial_graph:
+            for i, x in enumerate(nodes):
+                x2 = self.initial_graph.get_node(x.get_name())
+                for j in list(adjacencies[i]):
+                    y2 = self.initial_graph.get_node(nodes[j].get_name())
+                    if not self.initial_graph.is_adjacent_to(x2, y2):
+                        adjacencies[i].discard(j)
+                        adjacencies[j].discard(i)
+
+        shm = None
+        executor = None
+        try:
+            shared_test = self._shared_matrix_test()
+            if shared_test is not None:
+                engine = shared_test.partial_correlation
+                shm = shared_memory.SharedMemory(create=True, size=max(engine.get_matrix().nbytes, 1))
+                shared = np.ndarray(engine.get_matrix().shape, dtype=np.float64, buffer=shm.buf)
+                shared[:] = engine.get_matrix()
+                executor = ProcessPoolExecutor(max_workers=self.num_workers, initializer=_init_worker,
+                                               initargs=(shm.name, len(nodes), shared_test.sample_size(),
+                                                         shared_test.get_alpha()))
+            if self.instrumentation is not None:
+                self.instrumentation.start_phase(SearchInstrumentation.ADJACENCY, self.test)
+            for d in range(_depth + 1):
+                if self.instrumentation is not None:
+                    self.instrumentation.start_depth(d)
+                more = self.search_at_depth(d, nodes, adjacencies, executor)
+                if self.instrumentation is not None:
+                    self.instrumentation.end_depth()
+                if not more:
+                    break
+            if self.instrumentation is not None:
+                self.instrumentation.end_phase()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if shm is not None:
+                shm.close()
+                shm.unlink()
 
         if self.verbose:
             print("Finished with search, constructing Graph...\n")
 
         for i in range(len(nodes)):
             for j in range(i + 1, len(nodes)):
-                x = nodes[i]
-                y = nodes[j]
-                if y in adjacencies.get(x):
-                    graph.add_undirected_edge(x, y)
+                if j in adjacencies[i]:
+                    graph.add_undirected_edge(nodes[i], nodes[j])
 
         if self.verbose:
             print("Finished constructing Graph\n")
             self.logger.info("Finishing Fast Adjacency Search.")
 
+        self.elapsed_time = (time.perf_counter_ns() - start_time) // 1000000
         return graph
 
-    def search_at_depth0(self, nodes: List[Node], adjacencies: Dict[Node, Set[Node]]) -> bool:
-        # FIXME
-        if self.verbose:
-            print("Searching at depth 0.\n")
-        empty = []
-        return self.free_degree(nodes, adjacencies) > self.depth
+    def search_at_depth(self, depth: int, nodes: List[Node], adjacencies: List[Set[int]],
+                        executor: Optional[ProcessPoolExecutor] = None) -> bool:
+        """
+        Tests every remaining edge at the given depth and removes the edges found to be independent.
 
-    def search_at_depth(self, depth: int, nodes: List[Node], adjacencies: Dict[Node, Set[Node]]) -> bool:
-        # FIXME
+        :return: true if some node still has enough adjacencies to search at the next depth.
+        """
         if self.verbose:
             print(f"Searching at depth {depth}\n")
-        return self.free_degree(nodes, adjacencies) > depth
-
-    def free_degree(self, nodes: List[Node], adjacencies: Dict[Node, Set[Node]]) -> int:
-        max_degree = 0
-        for x in nodes:
-            opposites = adjacencies.get(x)
-            for y in opposites:
-                adjx = set(opposites)
-                adjx.remove(x)
-                if len(adjx) > max_degree:
-                    max_degree = len(adjx)
-        return max_degree
+        names = [node.get_name() for node in nodes]
+        forbidden = self.knowledge_index.forbidden
+        tasks: List[EdgeTask] = []
+        removed_by_knowledge = []
+        for x in range(len(nodes)):
+            for y in sorted(adjacencies[x]):
+                if y < x:
+                    continue
+                if self.knowledge_index.required[x, y] or self.knowledge_index.required[y, x]:
+                    continue
+                if depth == 0 and forbidden[x, y] and forbidden[y, x]:
+                    # Forbidden both ways: removed without a test, with an empty sepset, as in Fas.
+                    removed_by_knowledge.append((x, y, (), None))
+                    continue
+                ppx = self._possible_parents(x, y, adjacencies) if depth > 0 else ()
+                ppy = self._possible_parents(y, x, adjacencies) if depth > 0 else ()
+                tasks.append((x, y, ppx, ppy))
+
+        units = [tasks[i:i + self.chunk] for i in range(0, len(tasks), self.chunk)]
+        if executor is not None:
+            results = executor.map(_run_tasks, units, itertools.repeat(depth))
+        else:
+            results = (_check_edges(unit, depth, self._test_independent(nodes)) for unit in units)
+
+        self.num_independence_tests_by_depth.append(0)
+        if removed_by_knowledge:
+            results = itertools.chain([(removed_by_knowledge, 0, 0)], results)
+        for removed, num_tests, test_ns in results:
+            self.num_independence_tests += num_tests
+            self.num_independence_tests_by_depth[depth] += num_tests
+            if self.instrumentation is not None:
+                self.instrumentation.record_tests(num_tests, test_ns)
+                self.instrumentation.record_edges_removed(len(removed))
+            for x, y, z, p_value in removed:
+                adjacencies[x].discard(y)
+                adjacencies[y].discard(x)
+                self.sepsets.sets(nodes[x], nodes[y], [nodes[i] for i in z])
+                if p_value is not None:
+                    self.sepsets.set_p_value(nodes[x], nodes[y], p_value)
+                if self.verbose:
+                    print(f"{names[x]} _||_ {names[y]} | {[names[i] for i in z]}")
+
+        return self.free_degree(adjacencies) > depth
+
+    def _possible_parents(self, x: int, y: int, adjacencies: List[Set[int]]) -> Tuple[int, ...]:
+        if self.knowledge_index.is_empty():
+            return tuple(sorted(adjacencies[x] - {y}))
+        forbidden = self.knowledge_index.forbidden
+        required = self.knowledge_index.required
+        return tuple(z for z in sorted(adjacencies[x]) if z != y and not forbidden[z, x] and not required[x, z])
+
+    def _test_independent(self, nodes: List[Node]) \
+            -> Callable[[np.ndarray, np.ndarray, np.ndarray], Tuple[np.ndarray, np.ndarray]]:
+        def independent(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+            return self.test.is_independents_batch_with_p_values([nodes[i] for i in x], [nodes[i] for i in y],
+                                                                 [[nodes[i] for i in s] for s in z])
+
+        return independent
+
+    def _shared_matrix_test(self) -> Optional[IndTestFisherZ]:
+        """ return the test, unwrapped from its cache, if the workers can share its correlation matrix; else None.
+
+        """
+        test = self.test.get_test() if isinstance(self.test, CachedIndependenceTest) else self.test
+        # With pairwise deletion the sample size differs between tests, so the workers could not share one.
+        if self.num_workers > 1 and isinstance(test, IndTestFisherZ) and test.partial_correlation is not None \
+                and test.pairwise_counts is None:
+            return test
+        return None
+
+    def free_degree(self, adjacencies: List[Set[int]]) -> int:
+        """
+        return the largest number of adjacencies of a node, less one.
+        """
+        return max((len(adj) - 1 for adj in adjacencies), default=-1)
 
     def search_with_node(self, nodes) -> Optional[Graph]:
         return None
 
     def get_elapsed_time(self) -> int:
-        return 0
+        """ Return the time taken by the last search, in milliseconds.
+
+        """
+        return self.elapsed_time
+
+    def get_instrumentation(self) -> Optional[SearchInstrumentation]:
+        return self.instrumentation
+
+    def set_instrumentation(self, instrumentation: Optional[SearchInstrumentation]):
+        """ Sets the instrumentation that records the statistics of each depth of the search; None records nothing.
+        Time in tests is measured in the workers and summed over them.
+
+        """
+        self.instrumentation = instrumentation
 
     def get_depth(self):
         return self.depth
@@ -136,11 +342,14 @@ class FasConcurrent(IFas):
     def get_num_independence_tests(self):
         return self.num_independence_tests
 
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        return list(self.num_independence_tests_by_depth)
+
     def set_true_graph(self, graph):
         pass
 
     def get_nodes(self) -> Optional[List[Node]]:
-        return None
+        return self.test.get_variables()
 
     def get_ambiguous_triples(self, node: Node) -> Optional[List[Triple]]:
         return None
@@ -148,6 +357,35 @@ class FasConcurrent(IFas):
     def get_sepsets(self) -> SepsetMap:
         return self.sepsets
 
+    def is_stable(self) -> bool:
+        return self.stable
+
+    def set_stable(self, stable: bool):
+        """
+        Kept for symmetry with Fas. Depths are always evaluated against a frozen adjacency snapshot here,
+        so the output is PC-Stable either way.
+        """
+        self.stable = stable
+
+    def get_chunk(self) -> int:
+        return self.chunk
+
+    def set_chunk(self, chunk: int):
+        """ Sets the number of edges in each parallel work unit.
+
+        """
+        if chunk < 1:
+            raise ValueError(f"Chunk must be >= 1: {chunk}")
+        self.chunk = chunk
+
+    def get_num_workers(self) -> int:
+        return self.num_workers
+
+    def set_num_workers(self, num_workers: int):
+        if num_workers < 1:
+            raise ValueError(f"Number of workers must be >= 1: {num_workers}")
+        self.num_workers = num_workers
+
     def set_initial_graph(self, graph: Graph):
         self.initial_graph = graph
 
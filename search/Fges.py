@@ -0,0 +1,577 @@
+import heapq
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Set, Dict, Tuple, FrozenSet
+
+import numpy as np
+
+from data.IKnowledge import IKnowledge
+from data.Knowledge import Knowledge
+from graph.Endpoint import Endpoint
+from graph.Graph import Graph
+from graph.IndexedGraph import IndexedGraph
+from graph.Node import Node
+from search.GraphSearch import GraphSearch
+from search.MeekRules import MeekRules
+from search.Score import Score
+
+_TAIL = Endpoint.TAIL.value
+_ARROW = Endpoint.ARROW.value
+
+# An operator on the heap: (-bump, sequence number, x, y, version of the pair (x, y) when it was scored, NaYX, and
+# T for an insertion or H for a deletion), with variables given by their indices in the score.
+Arrow = Tuple[float, int, int, int, int, FrozenSet[int], FrozenSet[int]]
+
+# The score and the nodes of a worker process, set up once by _init_worker.
+_worker_state: dict = {}
+
+
+def _init_worker(score: Score, nodes: np.ndarray):
+    _worker_state["score"] = score
+    _worker_state["nodes"] = nodes
+
+
+def _run_unit(ys: np.ndarray, triangle: bool) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return Fges.single_edge_bumps(_worker_state["score"], ys, _worker_state["nodes"], triangle)
+
+
+class Fges(GraphSearch):
+    """
+    Implements the Fast Greedy Equivalence Search (FGES) of Ramsey, Glymour, Sanchez-Romero and Glymour (2017),
+    "A million variables and more", an optimization of Chickering's Greedy Equivalence Search (GES): a forward phase
+    inserts the edge, with its set T of orientations, that most increases the score, until none does, and a backward
+    phase then deletes edges the same way. The result is the pattern of the highest scoring DAG found.
+
+    The first step scores a single edge x --> y in the empty graph for every pair of nodes, in units of self.chunk
+    nodes run in parallel when num_workers > 1, using Score.local_score_diffs() to score all the x of a y at once.
+    With faithfulness assumed, only the pairs with a positive score (the effect edges) are ever considered again;
+    this is faster but may stop short of the best score, since pairs that only become dependent given other parents
+    are never scored, so it is off by default.
+
+    Operators wait in a heap, most increasing first. Each operator records the version of its pair of nodes when it
+    was scored; scoring the pair again bumps the version, so that older operators are dropped when they come off
+    the heap instead of being searched for and removed. An operator whose NaYX (the neighbors of y adjacent to x)
+    has changed since it was scored is scored again when it comes off the heap. After each insertion or deletion,
+    the pattern is rebuilt around the changed nodes and their descendants only (MeekRules.orient_implied_from()),
+    and only the pairs of nodes whose edges have changed are scored again.
+
+    The search starts from the empty graph, or from an initial graph (a DAG or a pattern, matched by node names)
+    whose edges among the searched nodes are added, as a pattern, before the forward phase.
+    """
+
+    def __init__(self, score: Score):
+        if not score:
+            raise ValueError("score is required")
+        self.score = score
+        self.variables: List[Node] = score.get_variables()
+        self.knowledge: IKnowledge = Knowledge()
+        self.initial_graph: Optional[Graph] = None
+        self.faithfulness_assumed: bool = False
+        self.max_degree: int = -1
+        self.num_workers: int = 1
+        self.chunk: int = 64
+        self.verbose: bool = False
+        self.elapsed_time: int = 0
+        self.logger = logging.getLogger("Fges")
+        self.model_score: float = 0.
+        self.num_inserts: int = 0
+        self.num_deletes: int = 0
+        self.graph: Optional[IndexedGraph] = None
+        self._endpoints: Optional[np.ndarray] = None
+        self._effect_edges: List[Set[int]] = []
+        self._nodes: np.ndarray = np.zeros(0, dtype=np.intp)
+        self._meek: Optional[MeekRules] = None
+        self._heap: List[Arrow] = []
+        self._versions: Dict[Tuple[int, int], int] = {}
+        # the neighborhood of each pair when its operators were last computed
+        self._scored: Dict[Tuple[int, int], tuple] = {}
+        self._sequence = itertools.count()
+
+    def get_elapsed_time(self) -> int:
+        """ Return the time taken by the last search, in milliseconds.
+
+        """
+        return self.elapsed_time
+
+    def get_model_score(self) -> float:
+        """ Return the score of the initial graph (by default empty) over the searched nodes plus the bumps of the
+        insertions and deletions of the last search: the score of the DAGs of the returned pattern, for a score
+        equivalent score.
+
+        """
+        return self.model_score
+
+    def get_num_inserts(self) -> int:
+        return self.num_inserts
+
+    def get_num_deletes(self) -> int:
+        return self.num_deletes
+
+    def get_knowledge(self) -> IKnowledge:
+        return self.knowledge
+
+    def set_knowledge(self, knowledge: IKnowledge):
+        if not knowledge:
+            raise ValueError("knowledge is required")
+        self.knowledge = knowledge
+
+    def get_initial_graph(self) -> Optional[Graph]:
+        return self.initial_graph
+
+    def set_initial_graph(self, graph: Optional[Graph]):
+        """ Sets the graph the search starts from; None for the empty graph.
+
+        """
+        self.initial_graph = graph
+
+    def is_faithfulness_assumed(self) -> bool:
+        return self.faithfulness_assumed
+
+    def set_faithfulness_assumed(self, faithfulness_assumed: bool):
+        """ Sets whether only the pairs of nodes whose single edge increases the score are considered, rather than
+        all pairs (the default).
+
+        """
+        self.faithfulness_assumed = faithfulness_assumed
+
+    def get_max_degree(self) -> int:
+        return self.max_degree
+
+    def set_max_degree(self, max_degree: int):
+        """ Sets the largest number of parents a node may get by an insertion; -1 for no limit.
+
+        """
+        if max_degree < -1:
+            raise ValueError(f"Max degree must be -1 or >= 0: {max_degree}")
+        self.max_degree = max_degree
+
+    def get_num_workers(self) -> int:
+        return self.num_workers
+
+    def set_num_workers(self, num_workers: int):
+        """ Sets the number of processes that score the single edges of the first step.
+
+        """
+        if num_workers < 1:
+            raise ValueError(f"Number of workers must be >= 1: {num_workers}")
+        self.num_workers = num_workers
+
+    def set_chunk(self, chunk: int):
+        if chunk < 1:
+            raise ValueError(f"Chunk must be >= 1: {chunk}")
+        self.chunk = chunk
+
+    def set_verbose(self, verbose: bool):
+        self.verbose = verbose
+
+    def search(self) -> Graph:
+        return self._search(np.arange(len(self.variables))).to_edge_list_graph()
+
+    def _search(self, nodes: np.ndarray) -> IndexedGraph:
+        """ Searches over the nodes with the given (sorted) indices.
+
+        """
+        start_time = time.perf_counter_ns()
+        self.graph = IndexedGraph(nodes=self.variables)
+        self._endpoints = self.graph.get_endpoint_matrix()
+        self._nodes = nodes
+        self._meek = MeekRules()
+        if not self.knowledge.is_empty():
+            self._meek.set_knowledge(self.knowledge)
+        self.num_inserts = 0
+        self.num_deletes = 0
+        seeds = self._add_initial_edges(nodes)
+        if seeds:
+            self._rebuild_pattern(seeds)
+        self._add_required_edges()
+        self.model_score = self._dag_score(nodes)
+
+        self._heap = []
+        self._versions = {}
+        self._scored = {}
+        self._initial_arrows(nodes)
+        # The operators of the first step are scored against the empty graph; those into the nodes with initial
+        # edges are scored again against their neighbors.
+        self._reevaluate_forward({i for i in nodes.tolist() if self._adjacent(i)})
+        self._forward()
+
+        self._heap = []
+        self._versions = {}
+        self._scored = {}
+        self._backward()
+
+        self.elapsed_time = (time.perf_counter_ns() - start_time) // 1000000
+        self.logger.info("Elapsed time = %d ms", self.elapsed_time)
+        return self.graph
+
+    def _add_initial_edges(self, nodes: np.ndarray) -> Set[int]:
+        """ Adds the edges of the initial graph between the given nodes: directed edges as they are, the others as
+        undirected edges.
+
+        :return: the nodes with an edge added.
+        """
+        seeds = set()
+        if self.initial_graph is None:
+            return seeds
+        index = {self.variables[i].get_name(): i for i in nodes.tolist()}
+        for edge in self.initial_graph.get_graph_edges():
+            i = index.get(edge.get_node1().get_name())
+            j = index.get(edge.get_node2().get_name())
+            if i is None or j is None or i == j or self._is_adjacent(i, j):
+                continue
+            e1, e2 = edge.get_endpoint1(), edge.get_endpoint2()
+            if e1 == Endpoint.TAIL and e2 == Endpoint.ARROW:
+                self.graph.add_directed_edge(self.variables[i], self.variables[j])
+            elif e1 == Endpoint.ARROW and e2 == Endpoint.TAIL:
+                self.graph.add_directed_edge(self.variables[j], self.variables[i])
+            else:
+                self.graph.add_undirected_edge(self.variables[i], self.variables[j])
+            seeds.update((i, j))
+        return seeds
+
+    def _dag_score(self, nodes: np.ndarray) -> float:
+        """ The score of a DAG of the pattern over the given nodes, found by orienting the undirected edges into
+        sinks one at a time (Dor and Tarsi, 1992).
+
+        """
+        order = nodes.tolist()
+        remaining = set(order)
+        total = 0.
+        while remaining:
+            removed = False
+            for i in order:
+                adjacent = self._adjacent(i) & remaining
+                if any(self._is_directed(i, j) for j in adjacent):
+                    continue
+                neighbors = {j for j in adjacent if self._is_undirected(i, j)}
+                if not all(adjacent - {j} <= self._adjacent(j) | {j} for j in neighbors):
+                    continue
+                parents = {j for j in self._adjacent(i) if self._is_directed(j, i)} | neighbors
+                total += self.score.local_score(i, sorted(parents))
+                remaining.remove(i)
+                removed = True
+            if not removed:
+                raise ValueError("The initial graph has no DAG in its pattern.")
+            order = [i for i in order if i in remaining]
+        return float(total)
+
+    def _add_required_edges(self):
+        index = {v.get_name(): i for i, v in enumerate(self.variables)}
+        for edge in self.knowledge.required_edges_iterator():
+            i = index.get(edge.get_from())
+            j = index.get(edge.get_to())
+            if i is not None and j is not None and not self.graph.is_adjacent_to(self.variables[i], self.variables[j]):
+                self.graph.add_directed_edge(self.variables[i], self.variables[j])
+
+    @classmethod
+    def single_edge_bumps(cls, score: Score, ys: np.ndarray, nodes: np.ndarray, triangle: bool = True) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Scores the single edges x --> y into each y of ys from the nodes x; with triangle, only from the nodes
+        after y, so that every pair of nodes is scored once.
+
+        :return: the x, y and bump of the edges that increase the score.
+        """
+        found_x, found_y, found_bumps = [], [], []
+        for y in np.asarray(ys).tolist():
+            xs = nodes[nodes > y] if triangle else nodes[nodes != y]
+            if len(xs) == 0:
+                continue
+            bumps = score.local_score_diffs(xs, y, [])
+            keep = bumps > 0
+            found_x.append(xs[keep])
+            found_y.append(np.full(int(keep.sum()), y, dtype=xs.dtype))
+            found_bumps.append(bumps[keep])
+        if not found_x:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0)
+        return np.concatenate(found_x), np.concatenate(found_y), np.concatenate(found_bumps)
+
+    def _single_edge_bumps(self, ys: np.ndarray, nodes: np.ndarray, triangle: bool = True) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        units = [ys[i:i + self.chunk] for i in range(0, len(ys), self.chunk)]
+        if self.num_workers > 1 and len(units) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.num_workers, len(units)), initializer=_init_worker,
+                                     initargs=(self.score, nodes)) as executor:
+                results = list(executor.map(_run_unit, units, itertools.repeat(triangle)))
+        else:
+            results = [Fges.single_edge_bumps(self.score, unit, nodes, triangle) for unit in units]
+        if not results:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0)
+        return tuple(np.concatenate(parts) for parts in zip(*results))
+
+    def _initial_arrows(self, nodes: np.ndarray):
+        xs, ys, bumps = self._single_edge_bumps(nodes, nodes)
+        self._effect_edges = [set() for _ in self.variables]
+        for x, y, bump in zip(xs.tolist(), ys.tolist(), bumps.tolist()):
+            if not (self._allowed(x, y) or self._allowed(y, x)):
+                continue
+            self._effect_edges[x].add(y)
+            self._effect_edges[y].add(x)
+            if self._is_adjacent(x, y):
+                continue
+            # In the empty graph, NaYX and T are empty, and x --> y and y --> x score the same.
+            for a, b in ((x, y), (y, x)):
+                if self._allowed(a, b):
+                    self._push(bump, a, b, self._next_version(a, b), frozenset(), frozenset())
+                    self._scored[(a, b)] = (frozenset(), set(), set())
+        if self.verbose:
+            self.logger.info("%d effect edges", len(xs))
+
+    def _candidates(self, node: int):
+        return self._effect_edges[node] if self.faithfulness_assumed else self._nodes.tolist()
+
+    def _next_version(self, x: int, y: int) -> int:
+        version = self._versions.get((x, y), 0) + 1
+        self._versions[(x, y)] = version
+        self._scored.pop((x, y), None)
+        return version
+
+    def _changed(self, x: int, y: int, neighborhood: tuple) -> bool:
+        """ Whether the pair (x, y) must be scored again: if the neighborhood its operators are computed from is the
+        one they were last computed from, those on the heap are still current. Otherwise, a new version of the pair
+        is started.
+
+        """
+        if self._scored.get((x, y)) == neighborhood:
+            return False
+        self._next_version(x, y)
+        self._scored[(x, y)] = neighborhood
+        return True
+
+    def _push(self, bump: float, x: int, y: int, version: int, na_yx: FrozenSet[int], subset: FrozenSet[int]):
+        heapq.heappush(self._heap, (-bump, next(self._sequence), x, y, version, na_yx, subset))
+
+    def _allowed(self, x: int, y: int) -> bool:
+        """ Whether the knowledge allows x --> y.
+
+        """
+        if self.knowledge.is_empty():
+            return True
+        x_name = self.variables[x].get_name()
+        y_name = self.variables[y].get_name()
+        return not self.knowledge.is_forbidden(x_name, y_name) and not self.knowledge.is_required(y_name, x_name)
+
+    def _is_adjacent(self, x: int, y: int) -> bool:
+        return self._endpoints[x, y] != 0
+
+    def _is_undirected(self, x: int, y: int) -> bool:
+        return self._endpoints[x, y] == _TAIL and self._endpoints[y, x] == _TAIL
+
+    def _is_directed(self, x: int, y: int) -> bool:
+        return self._endpoints[x, y] == _ARROW and self._endpoints[y, x] == _TAIL
+
+    def _adjacent(self, x: int) -> Set[int]:
+        return self.graph.get_adjacency_indices(x)
+
+    def _parents(self, y: int) -> Set[int]:
+        return {x for x in self._adjacent(y) if self._is_directed(x, y)}
+
+    def _na_yx(self, x: int, y: int) -> FrozenSet[int]:
+        """ The neighbors of y (joined to y by undirected edges) that are adjacent to x.
+
+        """
+        adjacent_x = self._adjacent(x)
+        return frozenset(z for z in self._adjacent(y) if z in adjacent_x and self._is_undirected(z, y))
+
+    def _t_neighbors(self, x: int, y: int) -> Set[int]:
+        """ The neighbors of y that are not adjacent to x.
+
+        """
+        adjacent_x = self._adjacent(x)
+        return {z for z in self._adjacent(y) if z != x and z not in adjacent_x and self._is_undirected(z, y)}
+
+    def _is_clique(self, nodes: FrozenSet[int]) -> bool:
+        nodes = list(nodes)
+        for i in range(len(nodes)):
+            adjacent = self._adjacent(nodes[i])
+            for j in range(i + 1, len(nodes)):
+                if nodes[j] not in adjacent:
+                    return False
+        return True
+
+    def _exists_unblocked_semidirected_path(self, source: int, target: int, blocked: FrozenSet[int]) -> bool:
+        """ Whether a path from source to target goes only out of nodes by tails, avoiding the blocked nodes.
+
+        """
+        seen = {source}
+        stack = [source]
+        while stack:
+            i = stack.pop()
+            for j in self._adjacent(i):
+                if j in seen or j in blocked or self._endpoints[j, i] != _TAIL:
+                    continue
+                if j == target:
+                    return True
+                seen.add(j)
+                stack.append(j)
+        return False
+
+    def _orient(self, x: int, y: int):
+        self.graph.remove_connecting_edge(self.variables[x], self.variables[y])
+        self.graph.add_directed_edge(self.variables[x], self.variables[y])
+
+    def _rebuild_pattern(self, seeds: Set[int]) -> Set[int]:
+        """ Rebuilds the pattern after an insertion or deletion that changed the edges of the seeds: the directed
+        edges into the seeds and their descendants are reverted unless in unshielded colliders, and the Meek rules
+        orient again from there.
+
+        :return: the nodes whose edges changed.
+        """
+        region = set(seeds)
+        stack = list(seeds)
+        while stack:
+            i = stack.pop()
+            for j in self._adjacent(i):
+                if j not in region and self._is_directed(i, j):
+                    region.add(j)
+                    stack.append(j)
+        rows = sorted(region)
+        before = self._endpoints[rows].copy()
+        visited = self._meek.orient_implied_from(self.graph, [self.variables[i] for i in rows])
+        changed_rows, changed_columns = np.nonzero(before != self._endpoints[rows])
+        changed = {rows[i] for i in changed_rows.tolist()} | set(changed_columns.tolist())
+        # Outside the region, edges are only ever oriented.
+        changed |= {self.graph.get_index(node) for node in visited} - region
+        return changed
+
+    # Forward equivalence search.
+
+    def _calculate_arrows_forward(self, x: int, y: int):
+        if self._is_adjacent(x, y) or not self._allowed(x, y):
+            self._next_version(x, y)
+            return
+        na_yx = self._na_yx(x, y)
+        t_neighbors = self._t_neighbors(x, y)
+        parents = self._parents(y)
+        if not self._changed(x, y, (na_yx, t_neighbors, parents)):
+            return
+        version = self._versions[(x, y)]
+        if not self._is_clique(na_yx):
+            return
+        t_neighbors = sorted(t_neighbors)
+        for size in range(len(t_neighbors) + 1):
+            if 0 <= self.max_degree < len(na_yx) + len(parents) + size + 1:
+                break
+            for subset in itertools.combinations(t_neighbors, size):
+                union = na_yx.union(subset)
+                if size > 0 and not self._is_clique(union):
+                    continue
+                bump = self.score.local_score_diff(x, y, sorted(union | parents))
+                if bump > 0:
+                    self._push(bump, x, y, version, na_yx, frozenset(subset))
+
+    def _valid_insert(self, x: int, y: int, t: FrozenSet[int], na_yx: FrozenSet[int]) -> bool:
+        union = na_yx | t
+        if not self._is_clique(union):
+            return False
+        if any(not self._allowed(z, y) for z in t):
+            return False
+        return not self._exists_unblocked_semidirected_path(y, x, union)
+
+    def _insert(self, x: int, y: int, t: FrozenSet[int], bump: float):
+        self.graph.add_directed_edge(self.variables[x], self.variables[y])
+        for z in t:
+            self._orient(z, y)
+        self.model_score += bump
+        self.num_inserts += 1
+        if self.verbose:
+            self.logger.info("Insert %s --> %s %s %.4f", self.variables[x], self.variables[y],
+                             [str(self.variables[z]) for z in sorted(t)], bump)
+
+    def _forward(self):
+        while self._heap:
+            neg_bump, _, x, y, version, na_yx, t = heapq.heappop(self._heap)
+            if version != self._versions.get((x, y)) or self._is_adjacent(x, y):
+                continue
+            if na_yx != self._na_yx(x, y) or not t <= self._t_neighbors(x, y):
+                self._calculate_arrows_forward(x, y)
+                continue
+            if not self._valid_insert(x, y, t, na_yx):
+                # Whether it is valid depends on paths elsewhere in the graph; score the pair again next time.
+                self._scored.pop((x, y), None)
+                continue
+            self._insert(x, y, t, -neg_bump)
+            changed = self._rebuild_pattern({x, y} | t)
+            self._reevaluate_forward(changed | {x, y} | t)
+
+    def _reevaluate_forward(self, nodes: Set[int]):
+        for r in nodes:
+            for w in self._candidates(r):
+                if w != r and not self._is_adjacent(w, r):
+                    self._calculate_arrows_forward(w, r)
+                    self._calculate_arrows_forward(r, w)
+
+    # Backward equivalence search.
+
+    def _calculate_arrows_backward(self, x: int, y: int):
+        if not self._is_adjacent(x, y) or self._is_directed(y, x):
+            self._next_version(x, y)
+            return
+        na_yx = self._na_yx(x, y)
+        parents = self._parents(y)
+        if not self._changed(x, y, (na_yx, parents)):
+            return
+        version = self._versions[(x, y)]
+        if not self.knowledge.is_empty():
+            x_name = self.variables[x].get_name()
+            y_name = self.variables[y].get_name()
+            if self.knowledge.is_required(x_name, y_name) or self.knowledge.is_required(y_name, x_name):
+                return
+        candidates = sorted(na_yx)
+        for size in range(len(candidates) + 1):
+            for h in itertools.combinations(candidates, size):
+                diff = na_yx.difference(h)
+                if not self._is_clique(diff):
+                    continue
+                bump = -self.score.local_score_diff(x, y, sorted((diff | parents) - {x}))
+                if bump > 0:
+                    self._push(bump, x, y, version, na_yx, frozenset(h))
+
+    def _valid_delete(self, x: int, y: int, h: FrozenSet[int], na_yx: FrozenSet[int]) -> bool:
+        if not self._is_clique(na_yx - h):
+            return False
+        return all(self._allowed(y, z) and self._allowed(x, z) for z in h)
+
+    def _delete(self, x: int, y: int, h: FrozenSet[int], bump: float):
+        self.graph.remove_connecting_edge(self.variables[x], self.variables[y])
+        for z in h:
+            if self._is_undirected(y, z):
+                self._orient(y, z)
+            if self._is_undirected(x, z):
+                self._orient(x, z)
+        self.model_score += bump
+        self.num_deletes += 1
+        if self.verbose:
+            self.logger.info("Delete %s --- %s %s %.4f", self.variables[x], self.variables[y],
+                             [str(self.variables[z]) for z in sorted(h)], bump)
+
+    def _backward(self):
+        for x in self._nodes.tolist():
+            for y in list(self._adjacent(x)):
+                if x < y and self._is_undirected(x, y):
+                    self._calculate_arrows_backward(x, y)
+                    self._calculate_arrows_backward(y, x)
+                elif self._is_directed(x, y):
+                    self._calculate_arrows_backward(x, y)
+        while self._heap:
+            neg_bump, _, x, y, version, na_yx, h = heapq.heappop(self._heap)
+            if version != self._versions.get((x, y)) or not self._is_adjacent(x, y) or self._is_directed(y, x):
+                continue
+            if na_yx != self._na_yx(x, y):
+                self._calculate_arrows_backward(x, y)
+                continue
+            if not self._valid_delete(x, y, h, na_yx):
+                self._scored.pop((x, y), None)
+                continue
+            self._delete(x, y, h, -neg_bump)
+            changed = self._rebuild_pattern({x, y} | h)
+            self._reevaluate_backward(changed | {x, y} | h)
+
+    def _reevaluate_backward(self, nodes: Set[int]):
+        for r in nodes:
+            for w in list(self._adjacent(r)):
+                if not self._is_directed(r, w):
+                    self._calculate_arrows_backward(w, r)
+                if not self._is_directed(w, r):
+                    self._calculate_arrows_backward(r, w)
@@ -0,0 +1,65 @@
+from typing import List, Optional
+
+import numpy as np
+
+from graph.Graph import Graph
+from graph.Node import Node
+from search.Fges import Fges
+from search.Score import Score
+
+
+class FgesMb(Fges):
+    """
+    Searches for the Markov blanket of target nodes with FGES restricted to the neighborhood of the targets: the
+    first step scores the single edges into the targets from every node, then those into the nodes found (the
+    effect neighbors of the targets) from every node, and the search runs over the targets and the effect neighbors
+    of the two rounds only. The returned graph is the pattern found, restricted to the targets, their adjacents and
+    the other parents of their children.
+    """
+
+    def __init__(self, score: Score):
+        super().__init__(score)
+        self.targets: List[Node] = []
+
+    def get_targets(self) -> List[Node]:
+        return self.targets
+
+    def set_targets(self, targets: List[Node]):
+        if not targets:
+            raise ValueError("At least one target is required.")
+        names = {v.get_name() for v in self.variables}
+        for target in targets:
+            if target.get_name() not in names:
+                raise ValueError(f"Target {target} is not a variable of the score.")
+        self.targets = list(targets)
+
+    def search(self) -> Graph:
+        return self.search_targets(self.targets)
+
+    def search_targets(self, targets: Optional[List[Node]] = None) -> Graph:
+        if targets is not None:
+            self.set_targets(targets)
+        if not self.targets:
+            raise ValueError("At least one target is required.")
+        index = {v.get_name(): i for i, v in enumerate(self.variables)}
+        targets = np.array(sorted({index[t.get_name()] for t in self.targets}), dtype=np.intp)
+        all_nodes = np.arange(len(self.variables))
+        found = self._effect_neighbors(targets, all_nodes)
+        more = self._effect_neighbors(np.setdiff1d(found, targets), all_nodes)
+        graph = self._search(np.union1d(found, more))
+
+        blanket = set(targets.tolist())
+        for t in targets.tolist():
+            for a in self._adjacent(t):
+                blanket.add(a)
+                # The parents of a child of t, or of a node whose edge with t is not oriented.
+                if not self._is_directed(a, t):
+                    blanket.update(p for p in self._adjacent(a) if not self._is_directed(a, p))
+        return graph.subgraph([self.variables[i] for i in sorted(blanket)]).to_edge_list_graph()
+
+    def _effect_neighbors(self, ys: np.ndarray, nodes: np.ndarray) -> np.ndarray:
+        """ ys, with the nodes whose single edge into one of ys increases the score.
+
+        """
+        xs, _, _ = self._single_edge_bumps(ys, nodes, triangle=False)
+        return np.union1d(xs, ys)
@@ -0,0 +1,342 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Dict, Tuple, Any
+
+import numpy as np
+from pandas import DataFrame
+
+from algcomparison.algorithm.Algorithm import Algorithm
+from algcomparison.utils.HasKnowledge import HasKnowledge
+from data.CovarianceAccumulator import CovarianceAccumulator
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.IKnowledge import IKnowledge
+from graph.Edge import Edge
+from graph.EdgeListGraph import EdgeListGraph
+from graph.EdgeTypeProbability import EdgeTypeProbability
+from graph.Endpoint import Endpoint
+from graph.Graph import Graph
+from graph.Node import Node
+from search.ResamplingEdgeEnsemble import ResamplingEdgeEnsemble
+
+EdgeType = EdgeTypeProbability.EdgeType
+
+# The endpoints (at the node with the lower index, at the other node) of each edge type.
+ENDPOINTS: Dict[EdgeType, Tuple[Endpoint, Endpoint]] = {
+    EdgeType.ta: (Endpoint.TAIL, Endpoint.ARROW),
+    EdgeType.at: (Endpoint.ARROW, Endpoint.TAIL),
+    EdgeType.ca: (Endpoint.CIRCLE, Endpoint.ARROW),
+    EdgeType.ac: (Endpoint.ARROW, Endpoint.CIRCLE),
+    EdgeType.cc: (Endpoint.CIRCLE, Endpoint.CIRCLE),
+    EdgeType.aa: (Endpoint.ARROW, Endpoint.ARROW),
+    EdgeType.tt: (Endpoint.TAIL, Endpoint.TAIL),
+}
+EDGE_TYPES: Dict[Tuple[Endpoint, Endpoint], EdgeType] = {ends: t for t, ends in ENDPOINTS.items()}
+# The type of the same edge seen from its other node.
+REVERSED: Dict[EdgeType, EdgeType] = {EdgeType.ta: EdgeType.at, EdgeType.at: EdgeType.ta,
+                                      EdgeType.ca: EdgeType.ac, EdgeType.ac: EdgeType.ca}
+
+# An edge of a resample result: (i, j, EdgeType value), for the variables of indices i < j.
+ResampleEdge = Tuple[int, int, int]
+
+# State of a worker process, set up once by _init_worker.
+_worker_state: dict = {}
+
+
+def _init_worker(state: dict, shm_name: Optional[str], shape: Tuple[int, int]):
+    _worker_state.update(state)
+    if shm_name is not None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_state["shm"] = shm
+        _worker_state["matrix"] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def _run_resample(seed: Optional[np.random.SeedSequence]) -> List[ResampleEdge]:
+    return _search_resample(_worker_state, seed)
+
+
+def _search_resample(state: dict, seed: Optional[np.random.SeedSequence]) -> List[ResampleEdge]:
+    """
+    Draws one resample and runs the algorithm on it.
+
+    :param state: the data, the algorithm and its parameters, and how to resample.
+    :param seed: the seed of the resample, or None to run on all the data.
+    :return: the edges of the result, as indices into the variables and edge types.
+    """
+    num_rows = state["num_rows"]
+    size = state["resample_size"]
+    rng = None if seed is None else np.random.default_rng(seed)
+    variables: List[Node] = state["variables"]
+
+    if state.get("matrix") is not None:
+        # Continuous data: the resample is given by how many times each row was drawn, and its covariance matrix
+        # is accumulated over chunks of the shared data without building the resample.
+        if rng is None:
+            weights = np.ones(num_rows, dtype=np.int64)
+        elif state["with_replacement"]:
+            weights = np.bincount(rng.integers(0, num_rows, size), minlength=num_rows)
+        else:
+            weights = np.zeros(num_rows, dtype=np.int64)
+            weights[rng.choice(num_rows, size, replace=False)] = 1
+        matrix = state["matrix"]
+        accumulator = CovarianceAccumulator(variables)
+        step = state["chunk_rows"]
+        for start in range(0, num_rows, step):
+            accumulator.update_weighted(matrix[start:start + step], weights[start:start + step])
+        data = accumulator.to_covariance_matrix()
+    else:
+        dataset: DataSet = state["dataset"]
+        if rng is None:
+            data = dataset
+        else:
+            rows = rng.choice(num_rows, size, replace=state["with_replacement"])
+            data = DataSet(dataset.get_data().iloc[rows].reset_index(drop=True), variables)
+
+    graph = state["algorithm"].search(data, **state["parameters"])
+
+    index = {v.get_name(): i for i, v in enumerate(variables)}
+    edges = []
+    for edge in graph.get_graph_edges():
+        i = index[edge.get_node1().get_name()]
+        j = index[edge.get_node2().get_name()]
+        ends = (edge.get_endpoint1(), edge.get_endpoint2())
+        if i > j:
+            i, j = j, i
+            ends = (ends[1], ends[0])
+        edge_type = EDGE_TYPES.get(ends)
+        if edge_type is not None:
+            edges.append((i, j, edge_type.value))
+    return edges
+
+
+class GeneralResamplingTest:
+    """
+    Runs an algorithm on resamples of a data set (bootstrap samples if drawn with replacement, subsamples if not)
+    and combines the results into one graph whose edges carry the frequency of each edge type between their nodes
+    over the resamples, as EdgeTypeProbability's.
+
+    Resamples are searched in a pool of worker processes, each drawing its own rows from a seed spawned from the
+    seed of the test, so the result does not depend on the number of workers. For continuous data without missing
+    values the data are put once in shared memory, and each resample is given to the algorithm as the covariance
+    matrix of the rows drawn, accumulated from the shared rows weighted by the number of times each was drawn;
+    the algorithm must then accept covariance matrices, as the Fisher Z wrapper does. Other data are resampled
+    as data sets, and are copied once to each worker unless the workers are forked.
+    """
+
+    def __init__(self, data: DataModel, algorithm: Algorithm, number_resampling: int):
+        if not isinstance(data, DataSet):
+            raise ValueError("Only data sets can be resampled.")
+        if number_resampling < 1:
+            raise ValueError(f"The number of resamples must be at least 1: {number_resampling}")
+        self.data = data
+        self.algorithm = algorithm
+        self.number_resampling = number_resampling
+        self.knowledge: Optional[IKnowledge] = None
+        self.percent_resample_size = 100.
+        self.resampling_with_replacement = True
+        self.edge_ensemble = ResamplingEdgeEnsemble.Highest
+        self.add_original_dataset = False
+        self.parameters: Dict[str, Any] = {}
+        self.num_workers = os.cpu_count() or 1
+        self.seed: Optional[int] = None
+        self.chunk_rows = 1 << 16
+        self.verbose = False
+        self.resample_edges: List[List[ResampleEdge]] = []
+
+    def set_knowledge(self, knowledge: Optional[IKnowledge]):
+        self.knowledge = knowledge
+
+    def get_knowledge(self) -> Optional[IKnowledge]:
+        return self.knowledge
+
+    def set_percent_resample_size(self, percent_resample_size: float):
+        """
+        :param percent_resample_size: the size of each resample, as a percentage of the rows of the data.
+        """
+        if percent_resample_size <= 0:
+            raise ValueError(f"The resample size must be positive: {percent_resample_size}")
+        self.percent_resample_size = percent_resample_size
+
+    def get_percent_resample_size(self) -> float:
+        return self.percent_resample_size
+
+    def set_resampling_with_replacement(self, resampling_with_replacement: bool):
+        self.resampling_with_replacement = resampling_with_replacement
+
+    def is_resampling_with_replacement(self) -> bool:
+        return self.resampling_with_replacement
+
+    def set_edge_ensemble(self, edge_ensemble: ResamplingEdgeEnsemble):
+        self.edge_ensemble = edge_ensemble
+
+    def get_edge_ensemble(self) -> ResamplingEdgeEnsemble:
+        return self.edge_ensemble
+
+    def set_add_original_dataset(self, add_original_dataset: bool):
+        """
+        :param add_original_dataset: if True, the algorithm is also run on all the data, as one more resample.
+        """
+        self.add_original_dataset = add_original_dataset
+
+    def is_add_original_dataset(self) -> bool:
+        return self.add_original_dataset
+
+    def set_parameters(self, **parameters):
+        """
+        Sets the parameters the algorithm is run with.
+        """
+        self.parameters = parameters
+
+    def get_parameters(self) -> Dict[str, Any]:
+        return self.parameters
+
+    def set_num_workers(self, num_workers: int):
+        if num_workers < 1:
+            raise ValueError(f"The number of workers must be at least 1: {num_workers}")
+        self.num_workers = num_workers
+
+    def get_num_workers(self) -> int:
+        return self.num_workers
+
+    def set_seed(self, seed: Optional[int]):
+        self.seed = seed
+
+    def get_seed(self) -> Optional[int]:
+        return self.seed
+
+    def set_chunk_rows(self, chunk_rows: int):
+        """
+        :param chunk_rows: the number of rows accumulated at a time into the covariance matrix of a resample.
+        """
+        if chunk_rows < 1:
+            raise ValueError(f"The chunk size must be at least 1: {chunk_rows}")
+        self.chunk_rows = chunk_rows
+
+    def set_verbose(self, verbose: bool):
+        self.verbose = verbose
+
+    def get_resample_edges(self) -> List[List[ResampleEdge]]:
+        """
+        return the edges found in each resample by the last search, as (i, j, EdgeType value) with i < j indices
+        into the variables of the data.
+        """
+        return self.resample_edges
+
+    def _use_covariance(self) -> bool:
+        return self.data.is_continuous() and not self.data.exists_missing_value()
+
+    def search(self) -> Graph:
+        if self.knowledge is not None and isinstance(self.algorithm, HasKnowledge):
+            self.algorithm.set_knowledge(self.knowledge)
+        num_rows = self.data.get_num_rows()
+        resample_size = max(1, int(round(num_rows * self.percent_resample_size / 100)))
+        if not self.resampling_with_replacement and resample_size > num_rows:
+            raise ValueError(f"Cannot draw {resample_size} of {num_rows} rows without replacement.")
+
+        seeds: List[Optional[np.random.SeedSequence]] = \
+            list(np.random.SeedSequence(self.seed).spawn(self.number_resampling))
+        if self.add_original_dataset:
+            seeds.append(None)
+
+        variables = list(self.data.get_variables())
+        state = {"variables": variables, "algorithm": self.algorithm, "parameters": self.parameters,
+                 "num_rows": num_rows, "resample_size": resample_size,
+                 "with_replacement": self.resampling_with_replacement, "chunk_rows": self.chunk_rows}
+        use_covariance = self._use_covariance()
+        shape = (num_rows, len(variables))
+        workers = min(self.num_workers, len(seeds))
+
+        if workers <= 1:
+            if use_covariance:
+                state["matrix"] = self.data.get_data().to_numpy(dtype=np.float64)
+            else:
+                state["dataset"] = self.data
+            self.resample_edges = []
+            for k, seed in enumerate(seeds):
+                self.resample_edges.append(_search_resample(state, seed))
+                self._log_progress(k + 1, len(seeds))
+        else:
+            shm = None
+            try:
+                if use_covariance:
+                    shm = shared_memory.SharedMemory(create=True, size=max(num_rows * len(variables) * 8, 1))
+                    shared = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+                    frame: DataFrame = self.data.get_data()
+                    # Column by column, so the data are not held twice.
+                    for k in range(len(variables)):
+                        shared[:, k] = frame.iloc[:, k].to_numpy(dtype=np.float64)
+                else:
+                    state["dataset"] = self.data
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(state, None if shm is None else shm.name, shape)) as executor:
+                    self.resample_edges = []
+                    for edges in executor.map(_run_resample, seeds):
+                        self.resample_edges.append(edges)
+                        self._log_progress(len(self.resample_edges), len(seeds))
+            finally:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+
+        return self.ensemble_graph(variables, self.resample_edges, self.edge_ensemble)
+
+    def _log_progress(self, done: int, total: int):
+        if self.verbose:
+            print(f"Resampling: {done} of {total} searches done")
+
+    @classmethod
+    def edge_type_counts(cls, resample_edges: List[List[ResampleEdge]]) -> Dict[Tuple[int, int], np.ndarray]:
+        """
+        return, for each pair of variables (i, j) with i < j adjacent in some resample, the number of resamples in
+        which each edge type was found between them, indexed by EdgeType value; no edge included.
+        """
+        counts: Dict[Tuple[int, int], np.ndarray] = {}
+        for edges in resample_edges:
+            for i, j, edge_type in edges:
+                pair = counts.get((i, j))
+                if pair is None:
+                    pair = counts[(i, j)] = np.zeros(len(EdgeType) + 1, dtype=np.int64)
+                pair[edge_type] += 1
+        total = len(resample_edges)
+        for pair in counts.values():
+            pair[EdgeType.nil.value] = total - pair.sum()
+        return counts
+
+    @classmethod
+    def ensemble_graph(cls, variables: List[Node], resample_edges: List[List[ResampleEdge]],
+                       edge_ensemble: ResamplingEdgeEnsemble = ResamplingEdgeEnsemble.Highest) -> Graph:
+        """ Combines the results of the resamples into one graph.
+
+        :param variables: the variables the edges refer to by index.
+        :param resample_edges: the edges found in each resample, as returned by _search_resample.
+        :param edge_ensemble: which edges are kept; ties between edge types go to the first in EdgeType order,
+            no edge first.
+        :return: a graph over the variables whose edges carry the frequency of each edge type between their nodes.
+        """
+        graph = EdgeListGraph(nodes=variables)
+        total = len(resample_edges)
+        if total == 0:
+            return graph
+        for (i, j), counts in sorted(cls.edge_type_counts(resample_edges).items()):
+            if edge_ensemble == ResamplingEdgeEnsemble.Preserved:
+                best = EdgeType(int(np.argmax(counts[EdgeType.ta.value:])) + EdgeType.ta.value)
+            else:
+                best = EdgeType(int(np.argmax(counts[EdgeType.nil.value:])) + EdgeType.nil.value)
+                if best == EdgeType.nil:
+                    continue
+                if edge_ensemble == ResamplingEdgeEnsemble.Majority and 2 * counts[best.value] < total:
+                    continue
+            edge = Edge(variables[i], variables[j], *ENDPOINTS[best])
+            # Edge may have put the nodes the other way round, and the types are read from its first node.
+            flipped = edge.get_node1() is not variables[i]
+            for edge_type in EdgeType:
+                if counts[edge_type.value] > 0:
+                    if flipped:
+                        edge_type_of_edge = REVERSED.get(edge_type, edge_type)
+                    else:
+                        edge_type_of_edge = edge_type
+                    edge.add_edge_type_probability(
+                        EdgeTypeProbability(edge_type_of_edge, [], counts[edge_type.value] / total))
+            graph.add_edge(edge)
+        return graph
@@ -1,5 +1,6 @@
 from search.idt.IndependenceTest import IndependenceTest
-from SepsetMap import SepsetMap
+from search.SearchInstrumentation import SearchInstrumentation
+from search.SepsetMap import SepsetMap
 from data.IKnowledge import IKnowledge
 from graph.Triple import Triple
 from graph.Graph import Graph
@@ -45,9 +46,21 @@ class IFas:
     def get_elapsed_time(self) -> int:
         raise NotImplementedError
 
+    def set_instrumentation(self, instrumentation: Optional[SearchInstrumentation]):
+        """ Sets the instrumentation that records the statistics of each depth of the search; None records nothing.
+
+        """
+        raise NotImplementedError
+
     def get_num_independence_tests(self) -> int:
         raise NotImplementedError
 
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        """ Return the number of independence tests done at each depth of the last search.
+
+        """
+        raise NotImplementedError
+
     def set_true_graph(self, true_graph: Graph):
         raise NotImplementedError
 
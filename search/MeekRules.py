@@ -1,4 +1,5 @@
-from typing import Set, Dict, List
+from collections import deque
+from typing import Set, Dict, List, Optional, Tuple
 
 from search.ImpliedOrientation import ImpliedOrientation
 from data.IKnowledge import IKnowledge
@@ -17,6 +18,11 @@ class MeekRules(ImpliedOrientation):
     modified for Conservative PC to check non-colliders against recorded non-colliders before orienting.
 
     Rule R4 is only performed if knowledge is nonempty.
+
+    Orientation is driven by a worklist of undirected edges. Every undirected edge is checked once, and when
+    an edge a --> c is oriented, only the undirected edges whose rule premises that orientation can complete are
+    checked again: those incident to a or c and, when R4 is used, to their neighbors. Adjacencies do not change
+    during orientation, so they are read once into sets and common adjacents are found by set intersection.
     """
 
     def __init__(self):
@@ -25,43 +31,114 @@ class MeekRules(ImpliedOrientation):
         self.aggressively_prevent_cycles = False
         self.verbose = False
         self.is_revert_to_unshielded_colliders = True
-        self.changed_edges = Dict[Edge, Edge]
         self.logger = logging.getLogger("MeekRules")
+        # node -> adjacent nodes, and the worklist of undirected edges to check, while orient_implied() runs
+        self._adjacencies: Optional[Dict[Node, Set[Node]]] = None
+        self._queue: Optional[deque] = None
+        self._queued: Set[Tuple[Node, Node]] = set()
 
     def set_knowledge(self, knowledge: IKnowledge):
         if not knowledge:
             raise ValueError
         self.knowledge = knowledge
+        self.use_rule4 = not knowledge.is_empty()
 
     def orient_implied(self, graph: Graph) -> Set[Node]:
-        visited: Set[Node] = Set[Node]()
+        visited: Set[Node] = set()
         self.logger.info("Starting Orientation Step D.")
         if self.is_revert_to_unshielded_colliders:
             self.revert_to_unshielded_colliders(graph.get_nodes(), graph, visited)
-        oriented = True
-        while oriented:
-            oriented = False
-            for edge in graph.get_graph_edges():
-                if not Edges.is_undirected_edge(edge):
-                    continue
-                x: Node = edge.get_node1()
-                y: Node = edge.get_node2()
-                oriented = self.meek_r1(x, y, graph, visited) or self.meek_r1(y, x, graph, visited) or \
-                           self.meek_r2(x, y, graph, visited) or self.meek_r2(y, x, graph, visited) or \
-                           self.meek_r3(x, y, graph, visited) or self.meek_r3(y, x, graph, visited) or \
-                           self.meek_r4(x, y, graph, visited) or self.meek_r4(y, x, graph, visited)
+        self._adjacencies = {node: set(graph.get_adjacent_nodes(node)) for node in graph.get_nodes()}
+        edges = [(edge.get_node1(), edge.get_node2()) for edge in graph.get_graph_edges()
+                 if Edges.is_undirected_edge(edge)]
+        self._orient(edges, graph, visited)
         self.logger.info("Finishing Orientation Step D.")
         return visited
 
+    def orient_implied_from(self, graph: Graph, nodes: List[Node]) -> Set[Node]:
+        """ Adds the orientations implied around the given nodes, in a graph whose other edges are already closed
+        under the rules; e.g. after a search has changed the edges of these nodes. Edges into the nodes that are not
+        in unshielded colliders are first made undirected, if revert_to_unshielded_colliders is set.
+
+        Only the undirected edges of the nodes and of their adjacents are checked at first, and adjacencies are read
+        as they are needed, so the work is local to the change rather than to the graph.
+
+        :return: the nodes of the edges that were reverted or oriented.
+        """
+        visited: Set[Node] = set()
+        if self.is_revert_to_unshielded_colliders:
+            self.revert_to_unshielded_colliders(nodes, graph, visited)
+        self._adjacencies = {}
+        edges = []
+        for x in set(nodes).union(*(self._adjacent(node, graph) for node in nodes)):
+            for y in self._adjacent(x, graph):
+                if graph.is_undirected_from_to(x, y):
+                    edges.append((x, y))
+        self._orient(edges, graph, visited)
+        return visited
+
+    def _orient(self, edges: List[Tuple[Node, Node]], graph: Graph, visited: Set[Node]):
+        """ Applies the rules to the given undirected edges, and to those around each edge they orient.
+
+        """
+        self._queue = deque()
+        self._queued = set()
+        try:
+            for x, y in edges:
+                self._enqueue(x, y)
+            while self._queue:
+                x, y = self._queue.popleft()
+                self._queued.discard((x, y))
+                if not Edges.is_undirected_edge(graph.get_edge(x, y)):
+                    continue
+                # Each rule directs the edge at most once; direct() queues the edges around it.
+                _ = self.meek_r1(x, y, graph, visited) or self.meek_r1(y, x, graph, visited) or \
+                    self.meek_r2(x, y, graph, visited) or self.meek_r2(y, x, graph, visited) or \
+                    self.meek_r3(x, y, graph, visited) or self.meek_r3(y, x, graph, visited) or \
+                    self.meek_r4(x, y, graph, visited) or self.meek_r4(y, x, graph, visited)
+        finally:
+            self._adjacencies = None
+            self._queue = None
+            self._queued = set()
+
+    def _enqueue(self, x: Node, y: Node):
+        if (x, y) not in self._queued and (y, x) not in self._queued:
+            self._queued.add((x, y))
+            self._queue.append((x, y))
+
+    def _requeue_around(self, a: Node, c: Node, graph: Graph):
+        """ Queues the undirected edges whose rule premises may have been completed by orienting a --> c.
+
+        """
+        centers = {a, c}
+        if self.use_rule4:
+            centers |= self._adjacent(a, graph) | self._adjacent(c, graph)
+        for u in centers:
+            for v in self._adjacent(u, graph):
+                if Edges.is_undirected_edge(graph.get_edge(u, v)):
+                    self._enqueue(u, v)
+
+    def _adjacent(self, x: Node, graph: Graph) -> Set[Node]:
+        if self._adjacencies is not None:
+            adjacent = self._adjacencies.get(x)
+            if adjacent is None:
+                adjacent = self._adjacencies[x] = set(graph.get_adjacent_nodes(x))
+            return adjacent
+        return set(graph.get_adjacent_nodes(x))
+
+    def _common_adjacents(self, x: Node, y: Node, graph: Graph) -> Set[Node]:
+        return self._adjacent(x, graph) & self._adjacent(y, graph)
+
     def revert_to_unshielded_colliders(self, nodes: List[Node], graph: Graph, visited: Set[Node]):
-        reverted = True
-        while reverted:
-            reverted = False
-            for node in nodes:
-                if self._revert_to_unshielded_colliders(node, graph, visited):
-                    reverted = True
+        # Reverting edges into a node only changes the parents of that node, so one pass over the nodes will do.
+        for node in nodes:
+            while self._revert_to_unshielded_colliders(node, graph, visited):
+                pass
 
     def _revert_to_unshielded_colliders(self, y: Node, graph: Graph, visited: Set[Node]) -> bool:
+        """ Makes undirected the edges p --> y where p is not in an unshielded collider p --> y <-- q.
+
+        """
         did = False
         patterns = graph.get_parents(y)
         for p in patterns:
@@ -69,15 +146,14 @@ class MeekRules(ImpliedOrientation):
                 if not (p == q or graph.is_adjacent_to(p, q)):
                     break
             else:
-                continue
-            if self.knowledge.is_forbidden(y.get_name(), p.get_name()) or self.knowledge.is_required(p.get_name(),
-                                                                                                     y.get_name()):
-                continue
-            graph.remove_connecting_edge(p, y)
-            graph.add_undirected_edge(p, y)
-            visited.add(p)
-            visited.add(y)
-            did = True
+                if self.knowledge.is_forbidden(y.get_name(), p.get_name()) or \
+                        self.knowledge.is_required(p.get_name(), y.get_name()):
+                    continue
+                graph.remove_connecting_edge(p, y)
+                graph.add_undirected_edge(p, y)
+                visited.add(p)
+                visited.add(y)
+                did = True
         return did
 
     def set_revert_to_unshielded_colliders(self, revert_to_unshielded_colliders: bool):
@@ -108,6 +184,8 @@ class MeekRules(ImpliedOrientation):
         graph.remove_edge(before)
         graph.add_edge(after)
 
+        if self._queue is not None:
+            self._requeue_around(a, c, graph)
         return True
 
     @staticmethod
@@ -121,7 +199,7 @@ class MeekRules(ImpliedOrientation):
         Meek's rule R1: if a-->b, b---c, and a not adj to c, then b-->c
         """
         for a in graph.get_parents(b):
-            if graph.is_adjacent_to(c, a):
+            if a in self._adjacent(c, graph):
                 continue
             if self.direct(b, c, graph, visited):
                 # log(SearchLogUtils.edgeOrientedMsg("Meek R1 triangle (" + a + "-->" + b + "---" + c + ")", graph.getEdge(b, c)));
@@ -132,9 +210,7 @@ class MeekRules(ImpliedOrientation):
         """
         If a-->b-->c, a--c, then a-->c.
         """
-        adjacent_nodes = graph.get_adjacent_nodes(c)
-        adjacent_nodes.remove(a)
-        common = MeekRules.get_common_adjacents(a, c, graph)
+        common = self._common_adjacents(a, c, graph)
         for b in common:
             if graph.is_directed_from_to(a, b) and graph.is_directed_from_to(b, c):
                 if self.r2_helper(a, b, c, graph, visited):
@@ -156,14 +232,14 @@ class MeekRules(ImpliedOrientation):
         """
         Meek's rule R3. If d--a, d--b, d--c, b-->a, c-->a, then orient d-->a.
         """
-        adjacent_nodes = list(MeekRules.get_common_adjacents(a, d, graph))
+        adjacent_nodes = list(self._common_adjacents(a, d, graph))
         if len(adjacent_nodes) < 2:
             return False
         for i in range(0, len(adjacent_nodes)):
             for j in range(i + 1, len(adjacent_nodes)):
                 b = adjacent_nodes[i]
                 c = adjacent_nodes[j]
-                if not graph.is_adjacent_to(b, c):
+                if c not in self._adjacent(b, graph):
                     if self.r3_helper(a, d, b, c, graph, visited):
                         return True
         return False
@@ -188,11 +264,10 @@ class MeekRules(ImpliedOrientation):
             return False
 
         for c in graph.get_parents(b):
-            adj = MeekRules.get_common_adjacents(a, c, graph)
-            if b in adj:
-                adj.remove(b)
+            adj = self._common_adjacents(a, c, graph)
+            adj.discard(b)
             for d in adj:
-                if graph.is_adjacent_to(b, d):
+                if d in self._adjacent(b, graph):
                     continue
                 dc = graph.get_edge(d, c)
                 if not dc.points_towards(c):
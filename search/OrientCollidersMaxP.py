@@ -1,23 +1,84 @@
 import itertools
+import math
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
 
 from search.idt.IndependenceTest import IndependenceTest
+from search.idt.IndTestFisherZ import IndTestFisherZ
+from search.idt.PartialCorrelation import PartialCorrelation
 from search.ConflictRule import ConflictRule
 from data.IKnowledge import IKnowledge
 from data.Knowledge import Knowledge
 from graph.Graph import Graph
 from graph.Edges import Edges
-from graph.GraphUtils import GraphUtils
 from graph.Node import Node
 from graph.Endpoint import Endpoint
 from graph.Triple import Triple
-from typing import Dict, List, Set
+
+# A triple to score: (a, b, c, adjacents of a but c, adjacents of c but a, scored by the heuristic),
+# with variables given by their indices in the independence test.
+TripleTask = Tuple[int, int, int, Tuple[int, ...], Tuple[int, ...], bool]
+
+# The p values of a _||_ c | S for each of the given sets S, with variables given by their indices.
+PValues = Callable[[int, int, List[Tuple[int, ...]]], np.ndarray]
+
+# The score of the independence test for a _||_ c | S, with variables given by their indices.
+Score = Callable[[int, int, Tuple[int, ...]], float]
+
+# State of a worker process, set up once by _init_worker or _init_shared_worker.
+_worker_state: dict = {}
+
+
+def _init_worker(test: IndependenceTest):
+    _worker_state["test"] = test
+
+
+def _init_shared_worker(shm_name: str, size: int, sample_size: int, alpha: float):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray((size, size), dtype=np.float64, buffer=shm.buf)
+    _worker_state["shm"] = shm
+    _worker_state["engine"] = PartialCorrelation(matrix, cache_size=0, copy=False)
+    _worker_state["sample_size"] = sample_size
+    _worker_state["alpha"] = alpha
+
+
+def _shared_p_values(a: int, c: int, sets: List[Tuple[int, ...]]) -> np.ndarray:
+    p = np.empty(len(sets))
+    sizes = np.fromiter((len(s) for s in sets), dtype=np.intp, count=len(sets))
+    for d in np.unique(sizes):
+        group = np.flatnonzero(sizes == d)
+        z = np.array([sets[i] for i in group], dtype=np.intp).reshape(len(group), d)
+        r = _worker_state["engine"].partial_correlations(np.full(len(group), a, dtype=np.intp),
+                                                         np.full(len(group), c, dtype=np.intp), z)
+        p[group] = IndTestFisherZ.fisher_z_p_values(r, _worker_state["sample_size"], int(d))
+    return p
+
+
+def _shared_score(a: int, c: int, z: Tuple[int, ...]) -> float:
+    # The score of IndTestFisherZ.
+    return _worker_state["alpha"] - float(_shared_p_values(a, c, [z])[0])
+
+
+def _run_tasks(tasks: List[TripleTask], depth: int) -> List[Optional[float]]:
+    if "engine" in _worker_state:
+        return OrientCollidersMaxP.score_tasks(_shared_p_values, _shared_score, tasks, depth)
+    return OrientCollidersMaxP.score_triples(_worker_state["test"], tasks, depth)
 
 
 class OrientCollidersMaxP:
     """
     This is an optimization of the CCD (Cyclic Causal Discovery) algorithm by Thomas Richardson.
+
+    The conditioning sets of a triple are sent to the test in batches of at most BATCH sets, keeping the one with
+    the largest p value so far.
     """
 
+    BATCH = 256
+
     def __init__(self, test: IndependenceTest):
         if not test:
             raise ValueError
@@ -28,6 +89,10 @@ class OrientCollidersMaxP:
         self.use_heuristic: bool = False
         self.max_path_length: int = 3
         self.conflict_rule = ConflictRule.OVERWRITE
+        self.num_workers = 1
+        self.chunk = 100
+        self.verbose = False
+        self.num_independence_tests = 0
 
     def get_depth(self) -> int:
         """ Return the depth of search for the Fast Adjacency Search.
@@ -65,42 +130,138 @@ class OrientCollidersMaxP:
     def set_conflict_rule(self, conflict_rule: ConflictRule):
         self.conflict_rule = conflict_rule
 
+    def get_num_workers(self) -> int:
+        return self.num_workers
+
+    def set_num_workers(self, num_workers: int):
+        """ Sets the number of worker processes that score the unshielded triples; 1 scores them in this process.
+
+        :param num_workers: the number of workers.
+        """
+        if num_workers < 1:
+            raise ValueError(f"Number of workers must be >= 1: {num_workers}")
+        self.num_workers = num_workers
+
+    def get_chunk(self) -> int:
+        return self.chunk
+
+    def set_chunk(self, chunk: int):
+        """ Sets the number of triples in each parallel work unit.
+
+        """
+        if chunk < 1:
+            raise ValueError(f"Chunk must be >= 1: {chunk}")
+        self.chunk = chunk
+
+    def get_num_independence_tests(self) -> int:
+        """ Return the number of independence tests done by the last orientation.
+
+        """
+        return self.num_independence_tests
+
+    def is_verbose(self) -> bool:
+        return self.verbose
+
+    def set_verbose(self, verbose: bool):
+        self.verbose = verbose
+
     def orient(self, graph: Graph):
         self._add_colliders(graph)
 
     def _add_colliders(self, graph: Graph):
-        scores = Dict[Triple, float]()
-        nodes = graph.get_nodes()
-        for node in nodes:
-            self._do_node(graph, scores, node)
+        """
+        Scores every unshielded triple a *-* b *-* c of the graph, then orients the triples judged to be colliders
+        as a -> b <- c, most independent ones first.
+
+        Scores only depend on the graph before any collider is oriented, so they are computed first, by the work
+        units of self.chunk triples run in parallel when num_workers > 1. When the test is a covariance-based
+        IndTestFisherZ, the workers read the correlation matrix from shared memory; any other test is copied to
+        each worker. The triples are then sorted by score in a stable sort over the order in which they were
+        found, so the orientations are the same as when scoring in this process.
+        """
+        variables = self.independence_test.get_variables()
+        index = {v.get_name(): i for i, v in enumerate(variables)}
+        tasks: List[TripleTask] = []
+        triples: List[Triple] = []
+        for b in graph.get_nodes():
+            for a, c, heuristic in self._do_node(graph, b):
+                adj_a = [index[n.get_name()] for n in graph.get_adjacent_nodes(a) if n != c]
+                adj_c = [index[n.get_name()] for n in graph.get_adjacent_nodes(c) if n != a]
+                tasks.append((index[a.get_name()], index[b.get_name()], index[c.get_name()],
+                              tuple(adj_a), tuple(adj_c), heuristic))
+                triples.append(Triple(a, b, c))
+
+        units = [tasks[i:i + self.chunk] for i in range(0, len(tasks), self.chunk)]
+        if self.num_workers > 1 and len(units) > 1:
+            results = self._run_in_workers(units)
+        else:
+            results = [OrientCollidersMaxP.score_triples(self.independence_test, unit, self.depth)
+                       for unit in units]
+
+        self.num_independence_tests = sum(2 if task[5] else
+                                          OrientCollidersMaxP._num_sets(task[3], self.depth) +
+                                          OrientCollidersMaxP._num_sets(task[4], self.depth) for task in tasks)
+        scores: Dict[Triple, float] = {}
+        for unit, unit_scores in enumerate(results):
+            for k, score in enumerate(unit_scores):
+                if score is not None:
+                    scores[triples[unit * self.chunk + k]] = score
+
         triple_list = list(scores.keys())
         # Most independent ones first.
         triple_list.sort(key=lambda x: scores[x], reverse=True)
         for triple in triple_list:
-            print(f"{triple} score = {scores.get(triple)}")
+            if self.verbose:
+                print(f"{triple} score = {scores.get(triple)}")
             a = triple.get_x()
             b = triple.get_y()
             c = triple.get_z()
             self._orient_collider(graph, a, b, c, self.get_conflict_rule())
 
-    def _do_node(self, graph: Graph, scores: Dict[Triple, float], b: Node):
+    def _run_in_workers(self, units: List[List[TripleTask]]) -> List[List[Optional[float]]]:
+        test = self.independence_test
+        max_workers = min(self.num_workers, len(units))
+        # With pairwise deletion the sample size differs between tests, so the workers could not share one.
+        if not (isinstance(test, IndTestFisherZ) and test.partial_correlation is not None and
+                test.pairwise_counts is None):
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(test,)) as executor:
+                return list(executor.map(_run_tasks, units, itertools.repeat(self.depth)))
+        matrix = test.partial_correlation.get_matrix()
+        shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)[:] = matrix
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_shared_worker,
+                                     initargs=(shm.name, len(matrix), test.sample_size(),
+                                               test.get_alpha())) as executor:
+                return list(executor.map(_run_tasks, units, itertools.repeat(self.depth)))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _do_node(self, graph: Graph, b: Node) -> List[Tuple[Node, Node, bool]]:
+        """ return the unshielded triples a *-* b *-* c to score, with whether each is scored by the heuristic.
+
+        """
         adjacent_nodes = graph.get_adjacent_nodes(b)
+        triples = []
         if len(adjacent_nodes) < 2:
-            return
-        combinations = itertools.combinations(range(len(adjacent_nodes)), 2)
-        for combination in combinations:
-            a = adjacent_nodes[combination[0]]
-            c = adjacent_nodes[combination[1]]
+            return triples
+        for a, c in itertools.combinations(adjacent_nodes, 2):
             # Skip triples that are shielded.
             if graph.is_adjacent_to(a, c):
                 continue
-            if self.use_heuristic:
-                if self._exists_short_path(a, c, self.max_path_length, graph):
-                    self._test_collider_max_p(graph, scores, a, b, c)
-                else:
-                    self._test_collider_heuristic(graph, scores, a, b, c)
+            if self.use_heuristic and not self._exists_short_path(a, c, self.max_path_length, graph):
+                if self.knowledge.is_forbidden(a.get_name(), b.get_name()):
+                    continue
+                if self.knowledge.is_forbidden(c.get_name(), b.get_name()):
+                    continue
+                if len(graph.get_connecting_edges(a, b)) > 1 or len(graph.get_connecting_edges(b, c)) > 1:
+                    continue
+                triples.append((a, c, True))
             else:
-                self._test_collider_max_p(graph, scores, a, b, c)
+                triples.append((a, c, False))
+        return triples
 
     def _orient_collider(self, graph: Graph, a: Node, b: Node, c: Node, conflict_rule: ConflictRule):
         if self.knowledge.is_forbidden(a.get_name(), b.get_name()):
@@ -109,81 +270,82 @@ class OrientCollidersMaxP:
             return
         OrientCollidersMaxP.orient_collider(a, b, c, graph, conflict_rule)
 
-    def _test_collider_max_p(self, graph: Graph, scores: Dict[Triple, float], a: Node, b: Node, c: Node):
-        adj_a = graph.get_adjacent_nodes(a)
-        adj_c = graph.get_adjacent_nodes(c)
-        adj_a.remove(c)
-        adj_a.remove(a)
-        p = 0.0
-        S = None
-        p_sum1 = 0.0
-        p_sum2 = 0.0
-        count1 = 0
-        count2 = 0
-        combinations = itertools.combinations(range(len(adj_a)), self.depth)
-        for combination in combinations:
-            s = GraphUtils.as_list(combination, adj_a)
-            self.independence_test.is_independents(a, c, s)
-            _p = self.independence_test.get_p_value()
-            if _p > p:
-                p = _p
-                S = s
-            if _p < self.independence_test.get_alpha():
-                continue
-            if b in s:
-                p_sum1 += p
-                count1 += 1
-            else:
-                p_sum2 += p
-                count2 += 1
-        combinations = itertools.combinations(range(len(adj_c)), self.depth)
-        for combination in combinations:
-            s = GraphUtils.as_list(combination, adj_c)
-            self.independence_test.is_independents(a, c, s)
-            _p = self.independence_test.get_p_value()
-            if _p > p:
-                p = _p
-                S = s
-            if _p < self.independence_test.get_alpha():
-                continue
-            if b in s:
-                p_sum1 += p
-                count1 += 1
-            else:
-                p_sum2 += p
-                count2 += 1
-        avg1 = p_sum1 / count1
-        avg2 = p_sum2 / count2
+    @classmethod
+    def score_triples(cls, test: IndependenceTest, tasks: List[TripleTask], depth: int) -> List[Optional[float]]:
+        """ Scores the unshielded triples of a work unit.
 
-        if S and b not in S:
-            scores[Triple(a, b, c)] = p
+        :param test: the independence test; task indices refer to its variables.
+        :param tasks: the triples to score.
+        :param depth: the largest conditioning set size, or -1 for no limit.
+        :return: the score of each triple, or None if it is not judged a collider.
+        """
+        variables = test.get_variables()
 
-    def _test_collider_heuristic(self, graph: Graph, colliders: Dict[Triple, float], a: Node, b: Node, c: Node):
-        if self.knowledge.is_forbidden(a.get_name(), b.get_name()):
-            return
-        if self.knowledge.is_forbidden(c.get_name(), b.get_name()):
-            return
-        self.independence_test.is_independent(a, c)
-        s1 = self.independence_test.get_score()
-        self.independence_test.is_independent(a, c, b)
-        s2 = self.independence_test.get_score()
-        my_collider_2 = s2 > s1
-        if graph.is_adjacent_to(a, c):
-            return
-        if len(graph.get_connecting_edges(a, b)) > 1 or len(graph.get_connecting_edges(b, c)) > 1:
-            return
-        if my_collider_2:
-            colliders[Triple(a, b, c)] = abs(s2)
+        def p_values(a: int, c: int, sets: List[Tuple[int, ...]]) -> np.ndarray:
+            return test.get_p_values_batch([variables[a]] * len(sets), [variables[c]] * len(sets),
+                                           [[variables[i] for i in s] for s in sets])
+
+        def score(a: int, c: int, z: Tuple[int, ...]) -> float:
+            test.is_independents(variables[a], variables[c], [variables[i] for i in z])
+            return test.get_score()
+
+        return cls.score_tasks(p_values, score, tasks, depth)
+
+    @classmethod
+    def score_tasks(cls, p_values: PValues, score: Score, tasks: List[TripleTask],
+                    depth: int) -> List[Optional[float]]:
+        """ Scores the unshielded triples of a work unit with the given p values and scores of the test.
+
+        """
+        return [cls._test_collider_heuristic(score, a, b, c) if heuristic else
+                cls._test_collider_max_p(p_values, a, b, c, adj_a, adj_c, depth)
+                for a, b, c, adj_a, adj_c, heuristic in tasks]
+
+    @classmethod
+    def _test_collider_max_p(cls, p_values: PValues, a: int, b: int, c: int, adj_a: Tuple[int, ...],
+                             adj_c: Tuple[int, ...], depth: int) -> Optional[float]:
+        """ Finds the subset S of the adjacents of a or of c, of size at most depth, with the largest p value for
+        a _||_ c | S. return that p value if b is not in S.
+
+        """
+        sets: Iterable[Tuple[int, ...]] = itertools.chain.from_iterable(
+            itertools.combinations(adj, size) for adj in (adj_a, adj_c)
+            for size in range((len(adj) if depth == -1 else min(depth, len(adj))) + 1))
+        best_p = -np.inf
+        best_set: Optional[Tuple[int, ...]] = None
+        while True:
+            batch = list(itertools.islice(sets, cls.BATCH))
+            if not batch:
+                break
+            p = p_values(a, c, batch)
+            p = np.where(np.isnan(p), -np.inf, p)
+            # The first of the sets with the largest p value.
+            i = int(np.argmax(p))
+            if p[i] > best_p:
+                best_p = float(p[i])
+                best_set = batch[i]
+        if best_set is None:
+            return None
+        return None if b in best_set else best_p
+
+    @classmethod
+    def _num_sets(cls, adj: Tuple[int, ...], depth: int) -> int:
+        max_size = len(adj) if depth == -1 else min(depth, len(adj))
+        return sum(math.comb(len(adj), size) for size in range(max_size + 1))
+
+    @classmethod
+    def _test_collider_heuristic(cls, score: Score, a: int, b: int, c: int) -> Optional[float]:
+        s1 = score(a, c, ())
+        s2 = score(a, c, (b,))
+        return abs(s2) if s2 > s1 else None
 
     def _exists_short_path(self, x: Node, z: Node, bound: int, graph: Graph) -> bool:
-        Q = List[Node]()
-        V = Set[Node]()
-        Q.append(x)
-        V.add(x)
+        Q = deque([x])
+        V = {x}
         distance = 0
         e = None
         while len(Q) > 0:
-            t = Q.pop(1)
+            t = Q.popleft()
             if e == t:
                 e = None
                 distance += 1
@@ -198,8 +360,8 @@ class OrientCollidersMaxP:
                     return True
                 if c not in V:
                     V.add(c)
-                    Q.remove(c)
-                    if not e:
+                    Q.append(c)
+                    if e is None:
                         e = u
         return False
 
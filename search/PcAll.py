@@ -4,21 +4,27 @@ from graph.Triple import Triple
 from graph.Endpoint import Endpoint
 from graph.GraphUtils import GraphUtils
 from search.idt.IndependenceTest import IndependenceTest
+from search.idt.CachedIndependenceTest import CachedIndependenceTest
 from search.ConflictRule import ConflictRule
 from search.GraphSearch import GraphSearch
 from search.MeekRules import MeekRules
 from search.Fas import Fas
+from search.FasConcurrent import FasConcurrent
 from search.SepsetMap import SepsetMap
 from search.SearchGraphUtils import SearchGraphUtils
+from search.SearchInstrumentation import SearchInstrumentation
 from search.OrientCollidersMaxP import OrientCollidersMaxP
 from data.IKnowledge import IKnowledge
 from data.Knowledge import Knowledge
 from graph.Node import Node
-from typing import List, Set
+from typing import List, Set, Optional
 import logging
+import os
 import time
 import itertools
 
+import numpy as np
+
 
 class FasType(Enum):
     REGULAR = 1
@@ -64,21 +70,70 @@ class PcAll(GraphSearch):
         self.collider_triples = None
         self.non_collider_triples = None
         self.sepsets = None
+        # The numbers of independence tests of the adjacency search, in total and at each depth.
+        self.num_independence_tests: int = 0
+        self.num_independence_tests_by_depth: List[int] = []
+        # Records the statistics of the search, if not None.
+        self.instrumentation: Optional[SearchInstrumentation] = None
+        # If > 0, independence facts are cached (at most this many) across the steps of the search.
+        self.cache_size: int = 0
 
     def get_elapsed_time(self) -> int:
+        """ Return the time taken by the last search, in milliseconds.
+
+        """
         return self.elapsed_time
 
+    def get_instrumentation(self) -> Optional[SearchInstrumentation]:
+        return self.instrumentation
+
+    def set_instrumentation(self, instrumentation: Optional[SearchInstrumentation]):
+        """ Sets the instrumentation that records the statistics of the adjacency search at each depth and of each
+        phase of the search, and runs its profiler around the search; None records nothing.
+
+        """
+        self.instrumentation = instrumentation
+
+    def get_num_independence_tests(self) -> int:
+        """ Return the number of independence tests done by the adjacency search of the last search.
+
+        """
+        return self.num_independence_tests
+
+    def get_num_independence_tests_by_depth(self) -> List[int]:
+        """ Return the number of independence tests done by the adjacency search of the last search at each depth.
+
+        """
+        return self.num_independence_tests_by_depth
+
     def search(self) -> Graph:
         return self.search_nodes(self.get_independence_test().get_variables())
 
     def search_nodes(self, nodes: List[Node]) -> Graph:
         self.logger.info("Starting CPC algorithm")
+        if self.cache_size > 0 and not isinstance(self.independence_test, CachedIndependenceTest):
+            self.independence_test = CachedIndependenceTest(self.independence_test, self.cache_size)
         self.logger.info(f"Independence test = {self.get_independence_test()}.")
-        self.ambiguous_triples = Set[Triple]()
-        self.collider_triples = Set[Triple]()
-        self.non_collider_triples = Set[Triple]()
+        self.ambiguous_triples = set()
+        self.collider_triples = set()
+        self.non_collider_triples = set()
         self.independence_test.set_verbose(self.verbose)
-        start_time = time.time_ns()
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            instrumentation.start_profile()
+        try:
+            graph = self._search_nodes(nodes, instrumentation)
+        finally:
+            # Also on failure, so that the next profiled search can enable the profiler again.
+            if instrumentation is not None:
+                instrumentation.stop_profile()
+        if isinstance(self.independence_test, CachedIndependenceTest) and self.independence_test.get_path():
+            # Keeps the facts of this search for later runs over the same data.
+            self.independence_test.save()
+        return graph
+
+    def _search_nodes(self, nodes: List[Node], instrumentation: Optional[SearchInstrumentation]) -> Graph:
+        start_time = time.perf_counter_ns()
 
         all_nodes = self.get_independence_test().get_variables()
         for n in nodes:
@@ -89,27 +144,30 @@ class PcAll(GraphSearch):
                 fas = Fas(self.init_graph, self.get_independence_test())
                 fas.set_heuristic(self.heuristic)
             else:
-                raise ValueError("It's not support concurrent in Python temporarily")
-                # fas = FasConcurrent(self.init_graph, self.get_independence_test())
-                # fas.setStable(False)
+                fas = FasConcurrent(self.get_independence_test(), self.init_graph)
+                fas.set_stable(False)
         else:
             if self.concurrent == Concurrent.NO:
                 fas = Fas(self.init_graph, self.get_independence_test())
                 fas.set_stable(True)
             else:
-                raise ValueError("It's not support concurrent in Python temporarily")
-                # fas = FasConcurrent(self.init_graph, self.get_independence_test())
-                # fas.setStable(True)
+                fas = FasConcurrent(self.get_independence_test(), self.init_graph)
+                fas.set_stable(True)
 
         fas.set_knowledge(self.get_knowledge())
         fas.set_depth(self.get_depth())
         fas.set_verbose(self.verbose)
+        fas.set_instrumentation(instrumentation)
 
         self.graph = fas.search()
         self.sepsets = fas.get_sepsets()
+        self.num_independence_tests = fas.get_num_independence_tests()
+        self.num_independence_tests_by_depth = fas.get_num_independence_tests_by_depth()
 
         SearchGraphUtils.pc_orient_bk(self.knowledge, self.graph, nodes)
 
+        if instrumentation is not None:
+            instrumentation.start_phase(SearchInstrumentation.COLLIDER_ORIENTATION, self.independence_test)
         if self.collider_discovery == ColliderDiscovery.FAS_SEPSETS:
             self.orient_colliders_using_sepsets(self.sepsets, self.knowledge, self.graph, self.verbose,
                                                 self.conflict_rule)
@@ -121,30 +179,41 @@ class PcAll(GraphSearch):
             orient_colliders_max_p.set_use_heuristic(self.use_heuristic)
             orient_colliders_max_p.set_max_path_length(self.max_path_length)
             orient_colliders_max_p.set_depth(self.depth)
+            orient_colliders_max_p.set_verbose(self.verbose)
+            if self.concurrent == Concurrent.YES:
+                orient_colliders_max_p.set_num_workers(os.cpu_count() or 1)
             orient_colliders_max_p.orient(self.graph)
+            if instrumentation is not None:
+                instrumentation.record_tests(orient_colliders_max_p.get_num_independence_tests())
         elif self.collider_discovery == ColliderDiscovery.CONSERVATIVE:
             if self.verbose:
                 print("CPC orientation...")
             self.orient_unshielded_triples_conservative(self.knowledge)
 
-        self.graph = GraphUtils.replace_node(self.graph, nodes)
+        if instrumentation is not None:
+            instrumentation.end_phase()
+            instrumentation.start_phase(SearchInstrumentation.MEEK)
         meek_rules: MeekRules = MeekRules()
         meek_rules.set_knowledge(self.knowledge)
-        meek_rules.set_verbose(True)
+        meek_rules.set_verbose(self.verbose)
         meek_rules.orient_implied(self.graph)
-        self.logger.info(f"\nReturning this graph: {self.graph}")
+        if instrumentation is not None:
+            instrumentation.end_phase()
+        # The search runs on the IndexedGraph built by the adjacency search; hand back an EdgeListGraph.
+        self.graph = GraphUtils.replace_node(self.graph, nodes)
+        self.logger.info("\nReturning this graph: %s", self.graph)
 
-        self.elapsed_time = time.time_ns() - start_time
-        self.logger.info(f"Elapsed time = {self.elapsed_time} ms")
+        self.elapsed_time = (time.perf_counter_ns() - start_time) // 1000000
+        self.logger.info("Elapsed time = %d ms", self.elapsed_time)
         self.log_triples()
 
         return self.graph
 
     def orient_unshielded_triples_conservative(self, knowledge: IKnowledge):
         self.logger.info("Starting Collider Orientation:")
-        self.collider_triples = Set[Triple]()
-        self.non_collider_triples = Set[Triple]()
-        self.ambiguous_triples = Set[Triple]()
+        self.collider_triples = set()
+        self.non_collider_triples = set()
+        self.ambiguous_triples = set()
         nodes = self.graph.get_nodes()
         for y in nodes:
             adjacent_nodes = self.graph.get_adjacent_nodes(y)
@@ -173,22 +242,22 @@ class PcAll(GraphSearch):
     def _get_sepsets(self, i: Node, k: Node, g: Graph) -> List[List[Node]]:
         adj_i = g.get_adjacent_nodes(i)
         adj_k = g.get_adjacent_nodes(k)
-        sepsets = List[List[Node]]()
         _max = max(len(adj_i), len(adj_k)) + 1
-        for d in range(_max):
-            if len(adj_i) >= 2 and d <= len(adj_i):
-                combinations = itertools.combinations(range(len(adj_i)), d)
-                for combination in combinations:
-                    v = GraphUtils.as_list(combination, adj_i)
-                    if self.get_independence_test().is_independents(i, k, v):
-                        sepsets.append(v)
-            if len(adj_k) >= 2 and d <= len(adj_k):
-                combinations = itertools.combinations(range(len(adj_k)), d)
-                for combination in combinations:
-                    v = GraphUtils.as_list(combination, adj_k)
-                    if self.get_independence_test().is_independents(i, k, v):
-                        sepsets.append(v)
-        return sepsets
+        candidates = (list(v) for d in range(_max) for adj in (adj_i, adj_k) if len(adj) >= 2 and d <= len(adj)
+                      for v in itertools.combinations(adj, d))
+        sepsets = []
+        # The candidates are tested in batches of at most Fas.CHUNK sets, so that memory stays bounded.
+        while True:
+            batch = list(itertools.islice(candidates, Fas.CHUNK))
+            if not batch:
+                return sepsets
+            test_start = time.perf_counter_ns() if self.instrumentation is not None else 0
+            independent = self.get_independence_test().is_independents_batch([i] * len(batch), [k] * len(batch),
+                                                                            batch)
+            if self.instrumentation is not None:
+                self.instrumentation.record_tests(len(batch), time.perf_counter_ns() - test_start,
+                                                  len(batch) - int(np.count_nonzero(independent)))
+            sepsets.extend(v for v, judgement in zip(batch, independent) if judgement)
 
     def _is_collider_sepset(self, j: Node, sepsets: List[List[Node]]) -> bool:
         if len(sepsets) == 0:
@@ -247,16 +316,13 @@ class PcAll(GraphSearch):
                 c = adjacent_nodes[combination[1]]
                 if self.graph.is_adjacent_to(a, c):
                     continue
-                sepset = sep.gets(a, c)
-                s2 = list(sepset)
-                if b not in s2:
-                    s2.append(b)
-                if b not in sepset and PcAll.is_arrowpoint_allowed(a, b, knowledge) and PcAll.is_arrowpoint_allowed(c,
-                                                                                                                    b,
-                                                                                                                    knowledge):
+                # Pairs without a sepset were never separated, so there is nothing to orient.
+                if not sep.contains(a, c) or sep.is_in_sepset(a, c, b):
+                    continue
+                if PcAll.is_arrowpoint_allowed(a, b, knowledge) and PcAll.is_arrowpoint_allowed(c, b, knowledge):
                     self.orient_collider(a, b, c, conflict_rule, graph)
                     if verbose:
-                        print(f"Collider orientation <{a}, {b}, {c}> sepset = {sepset}")
+                        print(f"Collider orientation <{a}, {b}, {c}> sepset = {sep.gets(a, c)}")
 
     def log_triples(self):
         self.logger.info("\nCollider triples:")
@@ -316,6 +382,15 @@ class PcAll(GraphSearch):
     def set_verbose(self, verbose: bool):
         self.verbose = verbose
 
+    def set_cache_independence_tests(self, cache_size: int):
+        """ Caches up to cache_size independence facts, so that facts tested by FAS are not tested again
+        during collider orientation. 0 turns caching off.
+
+        """
+        if cache_size < 0:
+            raise ValueError(f"Cache size must be >= 0: {cache_size}")
+        self.cache_size = cache_size
+
     def set_fas_type(self, _type: FasType):
         self.fas_type = _type
 
@@ -0,0 +1,22 @@
+from enum import Enum
+
+
+class ResamplingEdgeEnsemble(Enum):
+    """
+    How the edges found in the resamples are combined into one graph:
+
+    Preserved: an edge is kept if it was found in any resample, with its most frequent type.
+    Highest: an edge is kept if its most frequent type, counting no edge as a type, is not no edge.
+    Majority: as Highest, but the most frequent type must also have been found in at least half the resamples.
+    """
+    Preserved = 1
+    Highest = 2
+    Majority = 3
+
+    @classmethod
+    def from_parameter(cls, value: int):
+        """
+        return the ensemble of the resampling_ensemble parameter: 0 for Preserved, 1 for Highest and 2 for Majority;
+        Highest otherwise.
+        """
+        return {0: cls.Preserved, 1: cls.Highest, 2: cls.Majority}.get(value, cls.Highest)
@@ -1,4 +1,6 @@
-from typing import List
+from typing import List, Sequence
+
+import numpy as np
 
 from graph.Node import Node
 
@@ -10,6 +12,13 @@ class Score:
     def local_score_diff(self, x: int, y: int, z: List[int] = None):
         raise NotImplementedError
 
+    def local_score_diffs(self, xs: Sequence[int], y: int, z: List[int] = None) -> np.ndarray:
+        """ Returns local_score_diff(x, y, z) for each x of xs; scores that can share work between the candidates
+        override this.
+
+        """
+        return np.array([self.local_score_diff(x, y, z) for x in xs], dtype=np.float64)
+
     def get_variables(self) -> List[Node]:
         raise NotImplementedError
 
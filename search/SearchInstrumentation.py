@@ -0,0 +1,176 @@
+import cProfile
+import json
+import time
+from typing import List, Optional, Dict, Any, Tuple
+
+from search.DepthStats import DepthStats
+from search.SearchListener import SearchListener
+from search.idt.CachedIndependenceTest import CachedIndependenceTest
+from search.idt.IndTestChiSquare import IndTestChiSquare
+from search.idt.IndependenceTest import IndependenceTest
+
+
+class SearchInstrumentation:
+    """
+    Records statistics of a search: for each depth of the adjacency search and for each phase (adjacency search,
+    collider orientation, Meek rules), the number of tests, the edges removed, the time spent in the test and
+    outside it, and the hits and misses of the caches of the independence test. Statistics are passed to the
+    listeners as they are recorded and can be dumped as JSON.
+
+    Time in tests is measured around batches of tests in the adjacency search and in conservative collider
+    orientation; max-P collider orientation only records its number of tests.
+
+    A search records statistics only when it is given an instrumentation; otherwise its only cost is a check for
+    None per phase or batch of tests.
+
+    A profiler can be run around the search: any object with enable() and disable() methods, such as a
+    cProfile.Profile (see with_cprofile()) or an adapter for a sampling profiler.
+    """
+
+    ADJACENCY = "adjacency"
+    COLLIDER_ORIENTATION = "collider orientation"
+    MEEK = "meek"
+
+    def __init__(self, profiler=None):
+        self.listeners: List[SearchListener] = []
+        self.stats: List[DepthStats] = []
+        self.profiler = profiler
+        self.test: Optional[IndependenceTest] = None
+        self._phase: Optional[DepthStats] = None
+        self._depth: Optional[DepthStats] = None
+        self._phase_start = (0, 0, 0)
+        self._depth_start = (0, 0, 0)
+
+    @classmethod
+    def with_cprofile(cls):
+        """
+        return an instrumentation that runs cProfile around the search; see get_profiler().
+        """
+        return cls(cProfile.Profile())
+
+    def add_listener(self, listener: SearchListener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: SearchListener):
+        self.listeners.remove(listener)
+
+    def get_profiler(self):
+        return self.profiler
+
+    def start_profile(self):
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def stop_profile(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+
+    def start_phase(self, phase: str, test: Optional[IndependenceTest] = None):
+        """ Starts a phase of the search.
+
+        :param phase: the name of the phase.
+        :param test: the independence test used in the phase, whose cache statistics are recorded.
+        """
+        self.test = test
+        self._phase = DepthStats(phase)
+        self._phase_start = self._snapshot()
+        for listener in self.listeners:
+            listener.phase_started(phase)
+
+    def end_phase(self) -> DepthStats:
+        stats = self._phase
+        self._finish(stats, self._phase_start)
+        self.stats.append(stats)
+        self._phase = None
+        for listener in self.listeners:
+            listener.phase_finished(stats)
+        return stats
+
+    def start_depth(self, depth: int):
+        """ Starts a depth of the current phase.
+
+        """
+        self._depth = DepthStats(self._phase.phase, depth)
+        self._depth_start = self._snapshot()
+
+    def end_depth(self) -> DepthStats:
+        stats = self._depth
+        self._finish(stats, self._depth_start)
+        self.stats.append(stats)
+        self._depth = None
+        for listener in self.listeners:
+            listener.depth_finished(stats)
+        return stats
+
+    def record_tests(self, num_tests: int, test_ns: int = 0, num_dependence_judgments: int = 0):
+        """ Records tests done in the current depth and phase.
+
+        :param num_tests: the number of tests.
+        :param test_ns: the time spent in the test.
+        :param num_dependence_judgments: the number of tests judged dependent.
+        """
+        for stats in (self._depth, self._phase):
+            if stats is not None:
+                stats.num_tests += num_tests
+                stats.test_ns += test_ns
+                stats.num_dependence_judgments += num_dependence_judgments
+
+    def record_edges_removed(self, num_edges: int):
+        for stats in (self._depth, self._phase):
+            if stats is not None:
+                stats.edges_removed += num_edges
+
+    def _snapshot(self) -> Tuple[int, int, int]:
+        hits, misses = SearchInstrumentation.cache_counts(self.test)
+        return time.perf_counter_ns(), hits, misses
+
+    def _finish(self, stats: DepthStats, start: Tuple[int, int, int]):
+        now, hits, misses = self._snapshot()
+        stats.elapsed_ns = now - start[0]
+        stats.cache_hits = hits - start[1]
+        stats.cache_misses = misses - start[2]
+
+    @classmethod
+    def cache_counts(cls, test: Optional[IndependenceTest]) -> Tuple[int, int]:
+        """
+        return the hits and misses so far of the fact cache and the contingency table cache of a test, if any.
+        """
+        hits = 0
+        misses = 0
+        if isinstance(test, CachedIndependenceTest):
+            stats = test.get_cache_stats()
+            hits += stats["hits"]
+            misses += stats["misses"]
+            test = test.get_test()
+        if isinstance(test, IndTestChiSquare):
+            stats = test.get_table_cache_stats()
+            if stats:
+                hits += stats["hits"] + stats["derived"]
+                misses += stats["misses"]
+        return hits, misses
+
+    def get_stats(self) -> List[DepthStats]:
+        """
+        return the statistics recorded so far, each depth before the totals of its phase.
+        """
+        return self.stats
+
+    def get_depth_stats(self, phase: str = ADJACENCY) -> List[DepthStats]:
+        return [stats for stats in self.stats if stats.phase == phase and stats.depth is not None]
+
+    def get_phase_stats(self) -> List[DepthStats]:
+        return [stats for stats in self.stats if stats.depth is None]
+
+    def clear(self):
+        self.stats = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"phases": [stats.to_dict() for stats in self.get_phase_stats()],
+                "depths": [stats.to_dict() for stats in self.stats if stats.depth is not None]}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def write_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
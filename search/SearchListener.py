@@ -0,0 +1,26 @@
+from search.DepthStats import DepthStats
+
+
+class SearchListener:
+    """
+    Receives the statistics of a search from a SearchInstrumentation as the search runs. All methods do nothing by
+    default, so a listener only overrides what it needs.
+    """
+
+    def phase_started(self, phase: str):
+        """ Called when a phase of the search (adjacency search, collider orientation or Meek rules) starts.
+
+        """
+        pass
+
+    def depth_finished(self, stats: DepthStats):
+        """ Called when a depth of the adjacency search is done, with its statistics.
+
+        """
+        pass
+
+    def phase_finished(self, stats: DepthStats):
+        """ Called when a phase of the search is done, with its totals.
+
+        """
+        pass
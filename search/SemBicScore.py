@@ -0,0 +1,292 @@
+import math
+from collections import OrderedDict
+from typing import List, Optional, Union, Tuple, Dict, Sequence
+
+import numpy as np
+from scipy.linalg import solve_triangular
+
+from data.CovarianceMatrix import CovarianceMatrix
+from data.DataSet import DataSet
+from data.ICovarianceMatrix import ICovarianceMatrix
+from graph.Node import Node
+from search.Score import Score
+
+ScoreKey = Tuple[int, Tuple[int, ...]]
+
+
+class SemBicScore(Score):
+    """
+    The BIC score of a linear, Gaussian structural equation model, computed from a covariance matrix. The local
+    score of a node given its parents is
+
+        -n log(s2) - c k log(n)
+
+    where s2 is the variance of the residual of the regression of the node on its k parents, n the sample size and c
+    the penalty discount. s2 = S[y, y] - S[y, Z] S[Z, Z]^-1 S[Z, y] is computed from the Cholesky factor L of the
+    parent submatrix S[Z, Z]; factors are cached (as their inverses) per (sorted) parent set, and local scores per
+    (node, sorted parent set), in bounded least recently used tables.
+
+    local_score_diff(x, y, Z) borders the cached factor of Z with x instead of factoring Z + x: with w = L^-1 S[Z, y]
+    and l = L^-1 S[Z, x], the pivot d2 = S[x, x] - l'l and the cross term S[x, y] - l'w give the residual variance
+    of y given Z + x as s2(y | Z) - (S[x, y] - l'w)^2 / d2. local_score_diffs() does so for many x at once, and
+    local_scores() scores a node against many parent sets of the same size at once; the scores of the candidates of
+    a batch of differences are not memoized.
+
+    Scores are NaN where the parents are linearly dependent: where a pivot of the factor is below SINGULARITY times
+    the variance of its variable.
+    """
+
+    SINGULARITY = 1e-10
+
+    def __init__(self, dataset: Union[DataSet, ICovarianceMatrix], penalty_discount: float = 1.,
+                 cache_size: int = 100000):
+        if cache_size < 0:
+            raise ValueError(f"Cache size must be >= 0: {cache_size}")
+        if isinstance(dataset, ICovarianceMatrix):
+            cov = dataset
+        else:
+            if not dataset.is_continuous():
+                raise ValueError("Data set must be continuous.")
+            if dataset.exists_missing_value():
+                raise ValueError("The SEM BIC score cannot be computed over missing values.")
+            cov = CovarianceMatrix.from_dataset(dataset)
+        self.variables = list(cov.get_variables())
+        self.index = {v.get_name(): i for i, v in enumerate(self.variables)}
+        self.matrix = np.array(cov.get_matrix(), dtype=np.float64, order="C")
+        self.sample_size = cov.get_sample_size()
+        if self.sample_size <= 0:
+            raise ValueError(f"Sample size must be positive: {self.sample_size}")
+        self.log_n = math.log(self.sample_size)
+        self.penalty_discount = penalty_discount
+        self.cache_size = cache_size
+        self._scores: "OrderedDict[ScoreKey, float]" = OrderedDict()
+        self._factors: "OrderedDict[Tuple[int, ...], Optional[np.ndarray]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_penalty_discount(self) -> float:
+        return self.penalty_discount
+
+    def set_penalty_discount(self, penalty_discount: float):
+        self.penalty_discount = penalty_discount
+        self._scores.clear()
+
+    def get_matrix(self) -> np.ndarray:
+        return self.matrix
+
+    def _score(self, variance, num_parents):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            variance = np.where(variance > 0, variance, np.nan)
+            return -self.sample_size * np.log(variance) - self.penalty_discount * num_parents * self.log_n
+
+    def _put(self, cache: OrderedDict, key, value):
+        if self.cache_size > 0:
+            cache[key] = value
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+
+    def _get(self, key: ScoreKey) -> Optional[float]:
+        score = self._scores.get(key)
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._scores.move_to_end(key)
+        return score
+
+    def _factor(self, parents: Tuple[int, ...]) -> Optional[np.ndarray]:
+        """ The inverse L^-1 of the Cholesky factor of the submatrix of the parents; None if it is singular. The
+        inverse is kept rather than L, so that the solves against it are plain products.
+
+        """
+        if parents in self._factors:
+            self._factors.move_to_end(parents)
+            return self._factors[parents]
+        try:
+            factor = np.linalg.cholesky(self.matrix[np.ix_(parents, parents)])
+        except np.linalg.LinAlgError:
+            factor = None
+        if factor is not None:
+            if (np.diag(factor) ** 2 <= SemBicScore.SINGULARITY * self.matrix[parents, parents]).any():
+                factor = None
+        if factor is not None:
+            factor = solve_triangular(factor, np.eye(len(parents)), lower=True, check_finite=False)
+        self._put(self._factors, parents, factor)
+        return factor
+
+    def _residual_variance(self, node: int, parents: Tuple[int, ...]) -> float:
+        if len(parents) == 0:
+            return float(self.matrix[node, node])
+        factor = self._factor(parents)
+        if factor is None:
+            return np.nan
+        w = factor @ self.matrix[parents, node]
+        return float(self.matrix[node, node] - w @ w)
+
+    def local_score(self, node: int, parents: List[int] = None) -> float:
+        """ Calculates the score of a node given its parents.
+
+        :param node: the index of the node.
+        :param parents: the indices of its parents.
+        :return: the local BIC score; NaN if the parents are linearly dependent.
+        """
+        key = (node, tuple(sorted(parents or ())))
+        score = self._get(key)
+        if score is None:
+            score = float(self._score(self._residual_variance(node, key[1]), len(key[1])))
+            self._put(self._scores, key, score)
+        return score
+
+    def local_score_diff(self, x: int, y: int, z: List[int] = None) -> float:
+        """ Calculates the change of the score of y when x is added to its parents z, from the cached factor of z.
+
+        :return: local_score(y, z + [x]) - local_score(y, z)
+        """
+        z = tuple(sorted(z or ()))
+        if x in z or x == y:
+            raise ValueError(f"Cannot add {x} to the parents {list(z)} of {y}.")
+        key = (y, tuple(sorted(z + (x,))))
+        score = self._scores.get(key)
+        if score is not None:
+            self.hits += 1
+            self._scores.move_to_end(key)
+            return score - self.local_score(y, z)
+        self.misses += 1
+        m = self.matrix
+        variance = m[y, y]
+        pivot = m[x, x]
+        cross = m[x, y]
+        if len(z) > 0:
+            factor = self._factor(z)
+            if factor is None:
+                return math.nan
+            solved = factor @ m[[y, x]][:, z].T
+            w = solved[:, 0]
+            l = solved[:, 1]
+            variance -= w @ w
+            pivot -= l @ l
+            cross -= l @ w
+        base = self._scores.get((y, z))
+        if base is None:
+            base = self.local_score(y, z)
+        # A pivot lost to rounding means x is (nearly) a linear function of z.
+        variance = variance - cross * cross / pivot if pivot > SemBicScore.SINGULARITY * m[x, x] else 0.
+        if variance > 0:
+            score = -self.sample_size * math.log(variance) - self.penalty_discount * (len(z) + 1) * self.log_n
+        else:
+            score = math.nan
+        self._put(self._scores, key, score)
+        return score - base
+
+    def local_score_diffs(self, xs: Sequence[int], y: int, z: Sequence[int] = None) -> np.ndarray:
+        """ Calculates local_score_diff(x, y, z) for each x of xs, with one triangular solve for all of them.
+
+        :param xs: the indices of the candidate parents, none of them y or in z.
+        :param y: the index of the node.
+        :param z: the indices of its current parents.
+        :return: the differences of score, in the order of xs; NaN where x is a linear function of z.
+        """
+        z = tuple(sorted(z or ()))
+        xs = np.asarray(xs, dtype=np.intp).reshape(-1)
+        base_key = (y, z)
+        base = self._get(base_key)
+        if len(z) == 0:
+            w = np.zeros(0)
+            l = np.zeros((0, len(xs)))
+        else:
+            factor = self._factor(z)
+            if factor is None:
+                return np.full(len(xs), np.nan)
+            solved = factor @ self.matrix[np.ix_(z, np.r_[y, xs])]
+            w = solved[:, 0]
+            l = solved[:, 1:]
+        variance = self.matrix[y, y] - w @ w
+        if base is None:
+            base = float(self._score(variance, len(z)))
+            self._put(self._scores, base_key, base)
+        pivots = self.matrix[xs, xs] - np.einsum("ij,ij->j", l, l)
+        cross = self.matrix[xs, y] - w @ l
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # A pivot lost to rounding means x is (nearly) a linear function of z.
+            pivots = np.where(pivots > SemBicScore.SINGULARITY * self.matrix[xs, xs], pivots, np.nan)
+            scores = self._score(variance - cross * cross / pivots, len(z) + 1)
+        return scores - base
+
+    def local_scores(self, node: int, parent_sets: np.ndarray) -> np.ndarray:
+        """ Scores a node against many parent sets of the same size at once, by factoring all the parent submatrices
+        together. A parent set is singular under the same pivot test as in local_score().
+
+        :param node: the index of the node.
+        :param parent_sets: the indices of the parents, shape (k, number of parents).
+        :return: an array of k local scores; NaN where the parents are linearly dependent.
+        """
+        parent_sets = np.sort(np.asarray(parent_sets, dtype=np.intp).reshape(len(parent_sets), -1), axis=1)
+        num_parents = parent_sets.shape[1]
+        if num_parents == 0:
+            return np.full(len(parent_sets), self.local_score(node, []))
+        sub = self.matrix[parent_sets[:, :, None], parent_sets[:, None, :]]
+        b = self.matrix[parent_sets, node][:, :, None]
+        try:
+            factors = np.linalg.cholesky(sub)
+        except np.linalg.LinAlgError:
+            factors = np.full_like(sub, np.nan)
+            for i in range(len(sub)):
+                try:
+                    factors[i] = np.linalg.cholesky(sub[i])
+                except np.linalg.LinAlgError:
+                    pass
+        pivots = np.diagonal(factors, axis1=1, axis2=2)
+        singular = ~(pivots ** 2 > SemBicScore.SINGULARITY * self.matrix[parent_sets, parent_sets]).all(axis=1)
+        factors[singular] = np.eye(num_parents)
+        w = np.linalg.solve(factors, b)[:, :, 0]
+        variances = self.matrix[node, node] - np.einsum("ij,ij->i", w, w)
+        variances[singular] = np.nan
+        scores = self._score(variances, num_parents)
+        for parents, score in zip(parent_sets.tolist(), scores.tolist()):
+            self._put(self._scores, (node, tuple(parents)), score)
+        return scores
+
+    def __getstate__(self):
+        # Workers of a parallel search get the matrix, not the tables.
+        state = self.__dict__.copy()
+        state["_scores"] = OrderedDict()
+        state["_factors"] = OrderedDict()
+        return state
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        return the number of hits and misses of the local score table so far, and the numbers of cached scores and
+        factors.
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._scores), "factors": len(self._factors)}
+
+    def clear_cache(self):
+        self._scores.clear()
+        self._factors.clear()
+
+    def get_variables(self) -> List[Node]:
+        return self.variables
+
+    def get_variable(self, name: str) -> Optional[Node]:
+        i = self.index.get(name)
+        return self.variables[i] if i is not None else None
+
+    def is_effect_edge(self, bump: float) -> bool:
+        return bump > 0
+
+    def get_sample_size(self) -> int:
+        return self.sample_size
+
+    def get_max_degree(self) -> int:
+        return int(math.ceil(self.log_n))
+
+    def determines(self, z: List[Node], y: Node) -> bool:
+        """
+        return True if y is (up to rounding) a linear function of z.
+        """
+        i = self.index[y.get_name()]
+        variance = self._residual_variance(i, tuple(sorted(self.index[n.get_name()] for n in z)))
+        return bool(variance <= SemBicScore.SINGULARITY * self.matrix[i, i])
+
+    def __str__(self):
+        return f"SEM BIC Score penalty {self.penalty_discount}"
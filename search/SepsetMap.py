@@ -1,6 +1,13 @@
-from typing import List, Dict, Set
+from array import array
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
 from graph.Node import Node
 
+# Multiplier used to pack an ordered pair of node indices (i < j) into one integer id, i * _STRIDE + j.
+_STRIDE = 1 << 32
+
 
 class SepsetMap:
     """
@@ -15,41 +22,182 @@ class SepsetMap:
     We cast the variable-like objects to Node to allow them either to be variables explicitly or else to be graph
     nodes that in some model could be considered as variables. This allows us to use d-separation as a graphical
     indicator of what independence in models ideally should be.
+
+    Nodes are numbered (by name) in the order given to the constructor, or in the order they are first seen, and
+    a pair {x, y} is stored under the packed id i * 2^32 + j of its indices i < j. Sepsets are kept as runs of
+    node indices in one flat int array, so a map with millions of removed pairs costs a dict entry plus a few
+    bytes per pair and per sepset member, and no Node lists.
     """
 
-    def __init__(self, sepset=None):
-        self.parents: Dict[Node, Set[Node]] = {}
+    def __init__(self, sepset=None, nodes: Optional[List[Node]] = None):
+        self.nodes: List[Node] = []
+        self.index: Dict[str, int] = {}
+        # pair id -> slot in the arrays below
+        self.slots: Dict[int, int] = {}
+        self.offsets = array('q')
+        self.lengths = array('i')
+        self.members = array('i')
+        self.p_values = array('d')
         if sepset:
-            self.sepsets = dict(sepset.sepsets)
-            self.p_values = dict(sepset.p_values)
-        else:
-            self.sepsets = Dict[Set[Node], List[Node]]()
-            self.p_values = Dict[Set[Node], float]()
+            self.nodes = list(sepset.nodes)
+            self.index = dict(sepset.index)
+            self.slots = dict(sepset.slots)
+            self.offsets = array('q', sepset.offsets)
+            self.lengths = array('i', sepset.lengths)
+            self.members = array('i', sepset.members)
+            self.p_values = array('d', sepset.p_values)
+        if nodes:
+            for node in nodes:
+                self._index_of(node)
+
+    def _index_of(self, node: Node) -> int:
+        i = self.index.get(node.get_name())
+        if i is None:
+            i = len(self.nodes)
+            self.index[node.get_name()] = i
+            self.nodes.append(node)
+        return i
+
+    def _pair_id(self, x: Node, y: Node) -> Optional[int]:
+        i = self.index.get(x.get_name())
+        j = self.index.get(y.get_name())
+        if i is None or j is None:
+            return None
+        return i * _STRIDE + j if i < j else j * _STRIDE + i
+
+    def _slot(self, x: Node, y: Node) -> Optional[int]:
+        pair_id = self._pair_id(x, y)
+        return None if pair_id is None else self.slots.get(pair_id)
 
-    def sets(self, x: Node, y: Node, z: List[Node]):
-        """ Sets the sepset for {x, y} to be z. Note that {x, y} is unordered.
+    def sets(self, x: Node, y: Node, z: Optional[List[Node]]):
+        """ Sets the sepset for {x, y} to be z. Note that {x, y} is unordered. Setting z to None removes the
+        sepset together with its p value; an empty z is stored as the empty sepset. A new sepset has no p value
+        (0) until set_p_value() is called.
 
         :param x:
         :param y:
         :param z:
         :return:
         """
-        pair = {x, y}
-        if not z:
-            del self.sepsets[pair]
+        if z is None:
+            pair_id = self._pair_id(x, y)
+            slot = None if pair_id is None else self.slots.pop(pair_id, None)
+            if slot is not None:
+                self.lengths[slot] = 0
+                self.p_values[slot] = 0.
+            return
+        i = self._index_of(x)
+        j = self._index_of(y)
+        pair_id = i * _STRIDE + j if i < j else j * _STRIDE + i
+        slot = self.slots.get(pair_id)
+        if slot is None:
+            slot = len(self.offsets)
+            self.slots[pair_id] = slot
+            self.offsets.append(0)
+            self.lengths.append(0)
+            self.p_values.append(0.)
         else:
-            self.sepsets[pair] = z
+            self.p_values[slot] = 0.
+        indices = [self._index_of(n) for n in z]
+        if len(indices) > self.lengths[slot]:
+            self.offsets[slot] = len(self.members)
+            self.members.extend(indices)
+        else:
+            start = self.offsets[slot]
+            self.members[start:start + len(indices)] = array('i', indices)
+        self.lengths[slot] = len(indices)
 
-    def gets(self, a: Node, b: Node) -> List[Node]:
+    def gets(self, a: Node, b: Node) -> Optional[List[Node]]:
         """ Retrieves the sepset previously set for {a, b}, or null if no such set was previously set.
 
         :param a:
         :param b:
         :return:
         """
-        pair = {a, b}
-        return self.sepsets.get(pair, [])
+        slot = self._slot(a, b)
+        if slot is None:
+            return None
+        start = self.offsets[slot]
+        return [self.nodes[i] for i in self.members[start:start + self.lengths[slot]]]
+
+    def gets_indices(self, a: Node, b: Node) -> Optional[np.ndarray]:
+        """ Retrieves the sepset for {a, b} as an array of node indices (see get_nodes()), or null if there is none.
+
+        """
+        slot = self._slot(a, b)
+        if slot is None:
+            return None
+        start = self.offsets[slot]
+        return np.array(self.members[start:start + self.lengths[slot]], dtype=np.int32)
+
+    def is_in_sepset(self, x: Node, y: Node, z: Node) -> bool:
+        """ return true iff {x, y} has a sepset and z is in it.
+
+        """
+        slot = self._slot(x, y)
+        k = self.index.get(z.get_name())
+        if slot is None or k is None:
+            return False
+        start = self.offsets[slot]
+        return k in self.members[start:start + self.lengths[slot]]
+
+    def contains(self, x: Node, y: Node) -> bool:
+        return self._slot(x, y) is not None
+
+    def set_p_value(self, x: Node, y: Node, p: float):
+        """ Sets the p value of the test that separated {x, y}. The sepset must have been set already.
+
+        """
+        slot = self._slot(x, y)
+        if slot is None:
+            raise ValueError(f"No sepset has been set for {x} and {y}")
+        self.p_values[slot] = p
 
     def get_p_value(self, x: Node, y: Node) -> float:
-        pair = {x, y}
-        return self.p_values.get(pair, 0)
+        slot = self._slot(x, y)
+        return 0 if slot is None else self.p_values[slot]
+
+    def get_nodes(self) -> List[Node]:
+        """ return the nodes, in the order of the indices used by gets_indices() and to_arrays().
+
+        """
+        return list(self.nodes)
+
+    def size(self) -> int:
+        return len(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ Exports the map in compressed sparse row form, with pairs in increasing order of their ids.
+
+        :return: pairs, an (m, 2) array of node indices i < j; offsets, an array of m + 1 positions such that
+            members[offsets[k]:offsets[k + 1]] is the sepset of pairs[k]; members; and the m p values.
+        """
+        pair_ids = np.fromiter(self.slots.keys(), dtype=np.int64, count=len(self.slots))
+        slots = np.fromiter(self.slots.values(), dtype=np.int64, count=len(self.slots))
+        order = np.argsort(pair_ids)
+        pair_ids = pair_ids[order]
+        slots = slots[order]
+        pairs = np.column_stack((pair_ids // _STRIDE, pair_ids % _STRIDE)).astype(np.int32)
+        all_offsets = np.frombuffer(self.offsets, dtype=np.int64) if len(self.offsets) else np.zeros(0, np.int64)
+        all_lengths = np.frombuffer(self.lengths, dtype=np.int32) if len(self.lengths) else np.zeros(0, np.int32)
+        all_members = np.frombuffer(self.members, dtype=np.int32) if len(self.members) else np.zeros(0, np.int32)
+        starts = all_offsets[slots]
+        lengths = all_lengths[slots].astype(np.int64)
+        offsets = np.zeros(len(slots) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        members = all_members[gather].copy()
+        p_values = np.array(self.p_values, dtype=np.float64)[slots] if len(slots) else np.zeros(0)
+        return pairs, offsets, members, p_values
+
+    def __str__(self):
+        return "\n".join(f"{{{self.nodes[i]}, {self.nodes[j]}}}: {[str(self.nodes[k]) for k in members]}"
+                         for (i, j), members in self._items())
+
+    def _items(self):
+        for pair_id, slot in self.slots.items():
+            start = self.offsets[slot]
+            yield divmod(pair_id, _STRIDE), self.members[start:start + self.lengths[slot]]
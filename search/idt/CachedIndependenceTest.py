@@ -0,0 +1,316 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Dict
+
+import numpy as np
+from pandas.util import hash_pandas_object
+
+from data.DataModel import DataModel
+from data.DataSet import DataSet
+from data.ICovarianceMatrix import ICovarianceMatrix
+from graph.Node import Node
+from search.idt.IndependenceTest import IndependenceTest
+
+# (min(x, y), max(x, y), sorted z) as variable indices
+CacheKey = Tuple[int, int, Tuple[int, ...]]
+
+# (independent, p value, score); a field is None until a test that computes it has been run
+CacheValue = Tuple[Optional[bool], Optional[float], Optional[float]]
+
+
+class CachedIndependenceTest(IndependenceTest):
+    """
+    Wraps an independence test and remembers its answers, so that facts tested again (by the collider
+    orientation steps after FAS, or by the several algorithms of a comparison) are not recomputed.
+
+    Facts are keyed by (min(x, y), max(x, y), sorted Z) over the indices of the test's variables, and at
+    most cache_size of them are kept, evicting the least recently used. Hits, misses and evictions are
+    counted. Batches of judgements, of p values, or of both are answered from the cache and only the
+    missing facts are sent to the wrapped test, as one batch. The cache can be saved to disk and loaded
+    in a later run over the same data (by default to and from the path it was made with); it is cleared
+    when alpha is changed.
+    """
+
+    def __init__(self, test: IndependenceTest, cache_size: int = 100000, path: Optional[str] = None):
+        """
+        :param test: the test to wrap.
+        :param cache_size: the maximum number of facts kept.
+        :param path: if given, the default file of save(); if the file exists and was saved for the same
+            variables, alpha and data, the cache is loaded from it.
+        """
+        if not test:
+            raise ValueError("An independence test is required.")
+        if cache_size < 1:
+            raise ValueError(f"Cache size must be >= 1: {cache_size}")
+        self.test = test
+        self.cache_size = cache_size
+        self.variables = list(test.get_variables())
+        self.index: Dict[str, int] = {v.get_name(): i for i, v in enumerate(self.variables)}
+        self.cache: "OrderedDict[CacheKey, CacheValue]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.p = np.nan
+        self.score = np.nan
+        self.path = path
+        if path and os.path.exists(path):
+            try:
+                self.load(path)
+            except ValueError:
+                # Saved for other data (e.g. another resample) or another alpha: start empty, and replace it on save.
+                self.clear_cache()
+
+    def get_test(self) -> IndependenceTest:
+        """
+        return the wrapped test.
+        """
+        return self.test
+
+    def _key(self, x: Node, y: Node, z: List[Node]) -> CacheKey:
+        i = self.index[x.get_name()]
+        j = self.index[y.get_name()]
+        if i > j:
+            i, j = j, i
+        return i, j, tuple(sorted(self.index[n.get_name()] for n in z))
+
+    def _put(self, key: CacheKey, value: CacheValue):
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+            self.evictions += 1
+
+    def _test(self, x: Node, y: Node, z: List[Node], key: CacheKey) -> bool:
+        independent = bool(self.test.is_independents(x, y, z))
+        self.p = self.test.get_p_value()
+        try:
+            self.score = self.test.get_score()
+        except NotImplementedError:
+            self.score = np.nan
+        self._put(key, (independent, self.p, self.score))
+        return independent
+
+    def is_independents(self, x: Node, y: Node, z: List[Node]) -> bool:
+        key = self._key(x, y, z)
+        value = self.cache.get(key)
+        # Facts answered in a batch lack a judgement, a p value or a score; test them again to fill these in.
+        if value is None or None in value:
+            self.misses += 1
+            return self._test(x, y, z, key)
+        self.hits += 1
+        self.cache.move_to_end(key)
+        independent, self.p, self.score = value
+        return independent
+
+    def is_independent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
+        return self.is_independents(x, y, [z] if z else [])
+
+    def is_dependents(self, x: Node, y: Node, z: List[Node]) -> bool:
+        return not self.is_independents(x, y, z)
+
+    def is_dependent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
+        return not self.is_independent(x, y, z)
+
+    def _lookup(self, keys: List[CacheKey], field: int) -> Tuple[List[int], List]:
+        """
+        return the positions of the keys whose given field is not cached, and the cached fields of the others
+        (None at the missing positions).
+        """
+        missing = []
+        values = [None] * len(keys)
+        for i, key in enumerate(keys):
+            value = self.cache.get(key)
+            if value is None or value[field] is None:
+                missing.append(i)
+            else:
+                self.cache.move_to_end(key)
+                values[i] = value[field]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        return missing, values
+
+    def is_independents_batch(self, xs: List[Node], ys: List[Node], zs: List[List[Node]]) -> np.ndarray:
+        """
+        Answers the cached questions from the cache and sends the rest to the wrapped test as one batch.
+        """
+        keys = [self._key(x, y, z) for x, y, z in zip(xs, ys, zs)]
+        missing, independent = self._lookup(keys, 0)
+        if missing:
+            answers = self.test.is_independents_batch([xs[i] for i in missing], [ys[i] for i in missing],
+                                                      [zs[i] for i in missing])
+            for i, answer in zip(missing, answers):
+                independent[i] = bool(answer)
+                _, p, score = self.cache.get(keys[i], (None, None, None))
+                self._put(keys[i], (bool(answer), p, score))
+        return np.array(independent, dtype=bool)
+
+    def get_p_values_batch(self, xs: List[Node], ys: List[Node], zs: List[List[Node]]) -> np.ndarray:
+        """
+        Answers the questions whose p values are cached from the cache and sends the rest to the wrapped test
+        as one batch.
+        """
+        keys = [self._key(x, y, z) for x, y, z in zip(xs, ys, zs)]
+        missing, p_values = self._lookup(keys, 1)
+        if missing:
+            answers = self.test.get_p_values_batch([xs[i] for i in missing], [ys[i] for i in missing],
+                                                   [zs[i] for i in missing])
+            for i, p in zip(missing, answers.tolist()):
+                p_values[i] = p
+                independent, _, score = self.cache.get(keys[i], (None, None, None))
+                self._put(keys[i], (independent, p, score))
+        return np.array(p_values, dtype=np.float64)
+
+    def is_independents_batch_with_p_values(self, xs: List[Node], ys: List[Node],
+                                            zs: List[List[Node]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Answers the questions whose judgements and p values are both cached from the cache and sends the rest to
+        the wrapped test as one batch.
+        """
+        keys = [self._key(x, y, z) for x, y, z in zip(xs, ys, zs)]
+        independent = [None] * len(keys)
+        p_values = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            value = self.cache.get(key)
+            if value is None or value[0] is None or value[1] is None:
+                missing.append(i)
+            else:
+                self.cache.move_to_end(key)
+                independent[i], p_values[i], _ = value
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            answers, answer_p_values = self.test.is_independents_batch_with_p_values(
+                [xs[i] for i in missing], [ys[i] for i in missing], [zs[i] for i in missing])
+            for i, answer, p in zip(missing, answers.tolist(), answer_p_values.tolist()):
+                independent[i] = bool(answer)
+                p_values[i] = p
+                _, _, score = self.cache.get(keys[i], (None, None, None))
+                self._put(keys[i], (bool(answer), p, score))
+        return np.array(independent, dtype=bool), np.array(p_values, dtype=np.float64)
+
+    def get_cache_stats(self) -> Dict[str, int]:
+        """
+        return the number of hits, misses and evictions so far, and the current number of cached facts.
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.cache)}
+
+    def get_hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.
+
+    def reset_cache_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear_cache(self):
+        self.cache.clear()
+
+    def get_fingerprint(self) -> Optional[str]:
+        """
+        return a hash of the sample size and the values of the data of the wrapped test (its data set or
+        covariance matrix), or None if the test has no data.
+        """
+        try:
+            data = self.test.get_data()
+        except (NotImplementedError, ValueError):
+            return None
+        if isinstance(data, ICovarianceMatrix):
+            frame, sample_size = data.get_matrix(), data.get_sample_size()
+        elif isinstance(data, DataSet):
+            frame, sample_size = data.get_data(), data.get_num_rows()
+        else:
+            return None
+        digest = hashlib.sha256(str(sample_size).encode())
+        digest.update(hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def get_path(self) -> Optional[str]:
+        return self.path
+
+    def save(self, path: Optional[str] = None):
+        """
+        Writes the cached facts, with the variable names, alpha and the fingerprint of the data they were
+        computed for, to the given file, or by default to the path the cache was made with. The file is
+        replaced at once, so a concurrent load never sees it half written.
+        """
+        path = path or self.path
+        if not path:
+            raise ValueError("No path was given to save the cache to.")
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            pickle.dump({"variables": [v.get_name() for v in self.variables], "alpha": self.get_alpha(),
+                         "fingerprint": self.get_fingerprint(), "facts": list(self.cache.items())}, f)
+        os.replace(temp, path)
+
+    def load(self, path: str):
+        """
+        Adds the facts saved to the given file by save(). The file must have been written for the same
+        variables, in the same order, the same alpha and the same data (see get_fingerprint()).
+        """
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        if saved["variables"] != [v.get_name() for v in self.variables]:
+            raise ValueError(f"The cache in {path} was saved for different variables.")
+        if saved["alpha"] != self.get_alpha():
+            raise ValueError(f"The cache in {path} was saved for alpha = {saved['alpha']}.")
+        if saved.get("fingerprint") != self.get_fingerprint():
+            raise ValueError(f"The cache in {path} was saved for different data.")
+        for key, value in saved["facts"]:
+            self._put(key, value)
+
+    def get_p_value(self) -> float:
+        return self.p
+
+    def get_score(self) -> float:
+        return self.score
+
+    def get_variables(self) -> List[Node]:
+        return self.variables
+
+    def get_variable(self) -> Node:
+        return self.test.get_variable()
+
+    def get_variable_names(self) -> List[str]:
+        return [v.get_name() for v in self.variables]
+
+    def determines(self, z: List[Node], y: Node) -> bool:
+        return self.test.determines(z, y)
+
+    def get_alpha(self) -> float:
+        return self.test.get_alpha()
+
+    def set_alpha(self, alpha: float):
+        if alpha != self.test.get_alpha():
+            self.clear_cache()
+        self.test.set_alpha(alpha)
+
+    def get_data(self) -> DataModel:
+        return self.test.get_data()
+
+    def get_cov(self):
+        return self.test.get_cov()
+
+    def get_datasets(self) -> List:
+        return self.test.get_datasets()
+
+    def get_sample_size(self) -> int:
+        return self.test.get_sample_size()
+
+    def get_cov_matrices(self) -> List[np.ndarray]:
+        return self.test.get_cov_matrices()
+
+    def set_verbose(self, verbose: bool):
+        self.test.set_verbose(verbose)
+
+    def is_verbose(self) -> bool:
+        return self.test.is_verbose()
+
+    def ind_test_subset(self, nodes: List[Node]):
+        return self.test.ind_test_subset(nodes)
+
+    def __str__(self):
+        return f"Cached {self.test}"
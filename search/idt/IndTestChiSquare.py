@@ -1,10 +1,12 @@
-from typing import List
+from typing import List, Optional, Dict
 
 import numpy as np
 
 from data.DataModel import DataModel
+from data.DataSet import DataSet
 from graph.Node import Node
 from search.idt.IndependenceTest import IndependenceTest
+from search.idt.test.ChiSquareTest import ChiSquareTest
 
 
 class IndTestChiSquare(IndependenceTest):
@@ -13,58 +15,128 @@ class IndTestChiSquare(IndependenceTest):
     and X and Y are discrete variable not in S, by applying a conditional Chi Square test.
     A description of such a test is given in Fienberg, "The Analysis of Cross-Classified Categorical Data" 2nd edition.
     The formula for degrees of freedom used in this test are equivalent to the formulation on page 142 of Fienberg.
-    """
 
-    def ind_test_subset(self, nodes: List[Node]):
-        pass
+    With table_cache_bytes > 0, contingency tables are kept in a ContingencyTableCache of that many bytes and
+    shared between the tests over the same variables.
+    """
 
-    def is_independent(self, x: Node, y: Node, z: List[Node]) -> bool:
-        pass
+    def __init__(self, dataset: DataSet, alpha: float = 0.05, table_cache_bytes: int = 0):
+        if alpha < 0 or alpha > 1:
+            raise ValueError("Alpha mut be in [0, 1]")
+        if not dataset.is_discrete():
+            raise ValueError("Data set must be discrete.")
+        self.dataset = dataset
+        self.variables: List[Node] = list(dataset.get_variables())
+        self.index: Dict[str, int] = {v.get_name(): i for i, v in enumerate(self.variables)}
+        self.table_cache_bytes = table_cache_bytes
+        self.engine = self._make_engine(dataset, alpha, table_cache_bytes)
+        self.p = np.nan
+        self.statistic = np.nan
+        self.dof = 0
+        self.verbose = False
+
+    def _make_engine(self, dataset: DataSet, alpha: float, table_cache_bytes: int) -> ChiSquareTest:
+        return ChiSquareTest(dataset, alpha, table_cache_bytes)
 
-    def is_dependent(self, x: Node, y: Node, z: List[Node]) -> bool:
-        pass
+    def ind_test_subset(self, nodes: List[Node]):
+        names = [n.get_name() for n in nodes]
+        if any(name not in self.index for name in names):
+            raise ValueError("All nodes must be variables of this test.")
+        data = self.dataset.get_data().iloc[:, [self.index[name] for name in names]]
+        return type(self)(DataSet(data, [self.variables[self.index[name]] for name in names]), self.get_alpha(),
+                          self.table_cache_bytes)
+
+    def is_independents(self, x: Node, y: Node, z: List[Node]) -> bool:
+        """
+        Determines whether variable x is independent of variable y given a list of conditioning variables z.
+
+        Args:
+            x: the 1st variable being compared.
+            y: the 2nd variable being compared.
+            z: the list of conditioning variables.
+        Returns:
+            True iff x _||_ y | z
+        """
+        self.statistic, self.dof, self.p = self.engine.calc(self.index[x.get_name()], self.index[y.get_name()],
+                                                            [self.index[n.get_name()] for n in z])
+        independent = self.p > self.get_alpha()
+        if self.verbose:
+            print(f"{x} _||_ {y} | {[str(n) for n in z]}: p = {self.p:.4f}, independent = {independent}")
+        return independent
+
+    def is_independent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
+        return self.is_independents(x, y, [z] if z else [])
+
+    def is_dependents(self, x: Node, y: Node, z: List[Node]) -> bool:
+        return not self.is_independents(x, y, z)
+
+    def is_dependent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
+        return not self.is_independent(x, y, z)
 
     def get_p_value(self) -> float:
-        pass
+        return self.p
+
+    def get_statistic(self) -> float:
+        """
+        return the statistic of the most recent test.
+        """
+        return self.statistic
+
+    def get_degrees_of_freedom(self) -> int:
+        """
+        return the degrees of freedom of the most recent test.
+        """
+        return self.dof
+
+    def get_table_cache_stats(self) -> Dict[str, int]:
+        """
+        return the statistics of the contingency table cache (see ContingencyTableCache.get_stats()), or an empty
+        dict if tables are not cached.
+        """
+        cache = self.engine.get_table_cache()
+        return {} if cache is None else cache.get_stats()
 
     def get_variables(self) -> List[Node]:
-        pass
+        return self.variables
 
-    def get_variable(self) -> Node:
-        pass
+    def get_variable(self, name: Optional[str] = None) -> Optional[Node]:
+        return self.dataset.get_variable(name) if name else None
 
     def get_variable_names(self) -> List[str]:
-        pass
+        return [v.get_name() for v in self.variables]
 
     def determines(self, z: List[Node], y: Node) -> bool:
-        pass
+        return self.engine.determines([self.index[n.get_name()] for n in z], self.index[y.get_name()])
 
     def get_alpha(self) -> float:
-        pass
+        return self.engine.get_alpha()
 
     def set_alpha(self, alpha: float):
-        pass
+        self.engine.set_alpha(alpha)
 
     def get_data(self) -> DataModel:
-        pass
+        return self.dataset
 
     def get_cov(self):
-        pass
+        raise ValueError("A discrete test has no covariance matrix.")
 
     def get_datasets(self) -> List:
-        pass
+        return [self.dataset]
 
     def get_sample_size(self) -> int:
-        pass
+        return self.dataset.get_num_rows()
 
     def get_cov_matrices(self) -> List[np.ndarray]:
-        pass
+        raise ValueError("A discrete test has no covariance matrices.")
 
     def get_score(self) -> float:
-        pass
+        return self.get_alpha() - self.p
 
     def set_verbose(self, verbose: bool):
-        pass
+        self.verbose = verbose
 
     def is_verbose(self) -> bool:
-        pass
+        return self.verbose
+
+    def __str__(self):
+        return f"Chi Square, alpha = {self.get_alpha()}"
@@ -0,0 +1,138 @@
+from typing import List, Optional, Dict, Set, Tuple, FrozenSet
+
+import numpy as np
+
+from data.DataModel import DataModel
+from graph.Graph import Graph
+from graph.GraphUtils import GraphUtils
+from graph.Node import Node
+from graph.NodeType import NodeType
+from search.idt.IndependenceTest import IndependenceTest
+
+
+class IndTestDSeparation(IndependenceTest):
+    """
+    Checks independence facts for variables associated with the nodes in a given graph by checking d-separation
+    facts on the underlying nodes. Used to run searches as if with infinite data, e.g. to compare algorithms
+    without statistical noise.
+
+    Variables are matched to graph nodes by name. Each question takes one O(V + E) reachability search; the
+    ancestors of a conditioning set and the nodes d-connected to an x given it are kept for the most recently
+    used conditioning sets, so the many questions of a search that share Z reuse them.
+    """
+
+    def __init__(self, graph: Graph, keep_latents: bool = False, cache_size: int = 100):
+        """
+        :param graph: the true graph.
+        :param keep_latents: if False, only the measured nodes of the graph are variables of the test.
+        :param cache_size: the number of conditioning sets whose reachability results are kept.
+        """
+        if graph is None:
+            raise ValueError("Graph must not be None.")
+        self.graph = graph
+        self.variables: List[Node] = [n for n in graph.get_nodes()
+                                      if keep_latents or n.get_node_type() == NodeType.MEASURED]
+        self.names: Dict[str, Node] = {n.get_name(): n for n in graph.get_nodes()}
+        self.cache_size = cache_size
+        # Z -> (ancestors of Z, x -> the nodes d-connected to x given Z)
+        self._reach: Dict[FrozenSet[Node], Tuple[Set[Node], Dict[Node, Set[Node]]]] = {}
+        self.p = np.nan
+        self.verbose = False
+
+    def get_graph(self) -> Graph:
+        return self.graph
+
+    def _node(self, variable: Node) -> Node:
+        node = self.names.get(variable.get_name())
+        if node is None:
+            raise ValueError(f"{variable} is not a node of the graph.")
+        return node
+
+    def _reached(self, x: Node, z: List[Node]) -> Set[Node]:
+        key = frozenset(z)
+        entry = self._reach.pop(key, None)
+        if entry is None:
+            entry = (GraphUtils.get_ancestor_set(key, self.graph), {})
+        # Re-inserting keeps the dict in order of use, for eviction.
+        self._reach[key] = entry
+        if len(self._reach) > self.cache_size:
+            del self._reach[next(iter(self._reach))]
+        ancestors, reached = entry
+        if x not in reached:
+            reached[x] = GraphUtils.d_reachable(x, set(key), ancestors, self.graph)
+        return reached[x]
+
+    def is_independents(self, x: Node, y: Node, z: List[Node]) -> bool:
+        x = self._node(x)
+        y = self._node(y)
+        z = [self._node(n) for n in z]
+        independent = x != y and y not in self._reached(x, z)
+        self.p = 1. if independent else 0.
+        if self.verbose:
+            print(f"{x} _||_ {y} | {[str(n) for n in z]}: {independent}")
+        return independent
+
+    def is_independent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
+        return self.is_independents(x, y, [z] if z else [])
+
+    def is_dependents(self, x: Node, y: Node, z: List[Node]) -> bool:
+        return not self.is_independents(x, y, z)
+
+    def is_dependent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
+        return not self.is_independent(x, y, z)
+
+    def get_p_value(self) -> float:
+        """
+        return 1 if the most recent question was judged independent and 0 if not.
+        """
+        return self.p
+
+    def get_variables(self) -> List[Node]:
+        return self.variables
+
+    def get_variable(self, name: Optional[str] = None) -> Optional[Node]:
+        return self.names.get(name) if name else None
+
+    def get_variable_names(self) -> List[str]:
+        return [v.get_name() for v in self.variables]
+
+    def determines(self, z: List[Node], y: Node) -> bool:
+        return False
+
+    def get_alpha(self) -> float:
+        return 0.5
+
+    def set_alpha(self, alpha: float):
+        pass
+
+    def get_data(self) -> DataModel:
+        raise ValueError("A d-separation test has no data.")
+
+    def get_cov(self):
+        raise ValueError("A d-separation test has no covariance matrix.")
+
+    def get_datasets(self) -> List:
+        return []
+
+    def get_sample_size(self) -> int:
+        return 0
+
+    def get_cov_matrices(self) -> List[np.ndarray]:
+        return []
+
+    def get_score(self) -> float:
+        return self.get_alpha() - self.p
+
+    def set_verbose(self, verbose: bool):
+        self.verbose = verbose
+
+    def is_verbose(self) -> bool:
+        return self.verbose
+
+    def ind_test_subset(self, nodes: List[Node]):
+        test = IndTestDSeparation(self.graph, True, self.cache_size)
+        test.variables = [self._node(n) for n in nodes]
+        return test
+
+    def __str__(self):
+        return "D-separation"
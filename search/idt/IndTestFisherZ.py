@@ -1,5 +1,5 @@
 import math
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Union, Tuple
 
 import numpy as np
 from pandas import DataFrame
@@ -9,25 +9,47 @@ from data.CorrelationMatrix import CorrelationMatrix
 from data.CovarianceMatrix import CovarianceMatrix
 from data.DataModel import DataModel
 from data.DataSet import DataSet
+from data.ICovarianceMatrix import ICovarianceMatrix
+from data.MissingDataIndex import MissingDataIndex
 from graph.Node import Node
 from search.idt.IndependenceTest import IndependenceTest
+from search.idt.PartialCorrelation import PartialCorrelation
 
 
 class IndTestFisherZ(IndependenceTest):
     """
     Checks conditional independence of variable in a continuous data set using Fisher's Z test.
     See Spirtes, Glymour and Scheines - "Causation, Prediction and Search" 2nd edition, page 94.
+
+    A data set with missing values is handled in one of two ways. With TESTWISE_DELETION (the default) each
+    test uses the rows complete for its own variables, found with a MissingDataIndex. With PAIRWISE_DELETION
+    the tests use one covariance matrix whose entries are each computed from the rows where both variables are
+    present, and the sample size of a test is the smallest number of such rows among its variables.
     """
 
-    def __init__(self, dataset: Optional[DataSet] = None, data: Optional[DataFrame] = None,
-                 variables: Optional[List[Node]] = None, alpha: float = 0):
+    TESTWISE_DELETION = "testwise"
+    PAIRWISE_DELETION = "pairwise"
+
+    def __init__(self, dataset: Optional[Union[DataSet, ICovarianceMatrix]] = None, data: Optional[DataFrame] = None,
+                 variables: Optional[List[Node]] = None, alpha: float = 0, cache_size: int = 10000,
+                 missing_data: str = TESTWISE_DELETION):
         self.alpha = alpha
         if alpha < 0 or alpha > 1:
             raise ValueError("Alpha mut be in [0, 1]")
+        if missing_data not in (IndTestFisherZ.TESTWISE_DELETION, IndTestFisherZ.PAIRWISE_DELETION):
+            raise ValueError(f"Unknown missing data handling: {missing_data}")
+        self.missing_data = missing_data
+        self.missing_data_index: Optional[MissingDataIndex] = None
+        # the number of rows used for each covariance, with pairwise deletion
+        self.pairwise_counts: Optional[np.ndarray] = None
         if dataset is None:
             self.dataset = DataSet(data)
             self.cor = CorrelationMatrix.from_dataset(self.dataset)
             self.variables = list(variables)
+        elif isinstance(dataset, ICovarianceMatrix):
+            self.dataset = dataset
+            self.cor = dataset
+            self.variables = list(dataset.get_variables())
         else:
             self.dataset = dataset
             if not (self.dataset.is_continuous()):
@@ -37,8 +59,21 @@ class IndTestFisherZ(IndependenceTest):
                 self.cor = CovarianceMatrix.from_dataset(self.dataset)
                 self.variables = self.cor.get_variables()
             else:
-                self.cor = CorrelationMatrix.from_dataset(self.dataset)
                 self.variables = list(dataset.get_variables())
+                self.missing_data_index = MissingDataIndex(self.dataset.get_data().to_numpy(dtype=np.float64),
+                                                           cache_size)
+                if missing_data == IndTestFisherZ.PAIRWISE_DELETION:
+                    cov, self.pairwise_counts = self.missing_data_index.pairwise_covariances()
+                    names = [v.get_name() for v in self.variables]
+                    self.cor = CovarianceMatrix(self.variables, DataFrame(cov, index=names, columns=names),
+                                                self.dataset.get_num_rows())
+                else:
+                    self.cor = None
+        # Partial correlations are computed from a float64 copy of the matrix,
+        # caching the factorizations of conditioning sets shared between tests.
+        self.partial_correlation: Optional[PartialCorrelation] = None
+        if self.cor is not None:
+            self.partial_correlation = PartialCorrelation.from_covariance_matrix(self.cor, cache_size)
         self.indexMap = IndTestFisherZ.index_map(self.variables)
         self.nameMap = IndTestFisherZ.name_map(self.variables)
         self.set_alpha(alpha)
@@ -67,13 +102,85 @@ class IndTestFisherZ(IndependenceTest):
             return p > self.alpha
 
     def is_independent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
-        return self.is_independents(x, y, [z])
+        return self.is_independents(x, y, [z] if z else [])
 
     def is_dependents(self, x: Node, y: Node, z: List[Node]) -> bool:
         return not self.is_independents(x, y, z)
 
     def is_dependent(self, x: Node, y: Node, z: Optional[Node] = None) -> bool:
-        return self.is_dependents(x, y, [z])
+        return self.is_dependents(x, y, [z] if z else [])
+
+    def is_independents_batch(self, xs: List[Node], ys: List[Node], zs: List[List[Node]]) -> np.ndarray:
+        return self.is_independents_batch_with_p_values(xs, ys, zs)[0]
+
+    def is_independents_batch_with_p_values(self, xs: List[Node], ys: List[Node],
+                                            zs: List[List[Node]]) -> Tuple[np.ndarray, np.ndarray]:
+        p = self.get_p_values_batch(xs, ys, zs)
+        return np.isnan(p) | (p > self.alpha), p
+
+    def get_p_values_batch(self, xs: List[Node], ys: List[Node], zs: List[List[Node]]) -> np.ndarray:
+        """
+        Calculate the p values of many questions at once. Questions are grouped by the size of
+        their conditioning sets and each group is evaluated in one vectorized pass.
+
+        Args:
+            xs: the 1st variables being compared.
+            ys: the 2nd variables being compared.
+            zs: the lists of conditioning variables.
+        Returns:
+            the p values, in the order of the questions
+        """
+        if self.partial_correlation is None:
+            return super().get_p_values_batch(xs, ys, zs)
+        p = np.empty(len(xs))
+        sizes = np.fromiter((len(z) for z in zs), dtype=np.intp, count=len(zs))
+        for d in np.unique(sizes):
+            group = np.flatnonzero(sizes == d)
+            x = np.fromiter((self.indexMap[xs[i]] for i in group), dtype=np.intp, count=len(group))
+            y = np.fromiter((self.indexMap[ys[i]] for i in group), dtype=np.intp, count=len(group))
+            z = np.array([[self.indexMap[n] for n in zs[i]] for i in group], dtype=np.intp).reshape(len(group), d)
+            p[group] = self.get_p_values_by_index(x, y, z)
+        return p
+
+    def get_p_values_by_index(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+        """
+        Calculate the p values for arrays of variable indices with a fixed number of conditioning variables.
+        This does not change the state reported by get_p_value().
+
+        Args:
+            x: the indices of the 1st variables, shape (k,).
+            y: the indices of the 2nd variables, shape (k,).
+            z: the indices of the conditioning variables, shape (k, |Z|).
+        Returns:
+            an array of k p values
+        """
+        z = np.asarray(z, dtype=np.intp).reshape(len(x), -1)
+        r = self.partial_correlation.partial_correlations(x, y, z)
+        if self.pairwise_counts is not None:
+            idx = np.column_stack((x, y, z))
+            n = self.pairwise_counts[idx[:, :, None], idx[:, None, :]].min(axis=(1, 2))
+        else:
+            n = self.sample_size()
+        return IndTestFisherZ.fisher_z_p_values(r, n, z.shape[1])
+
+    @classmethod
+    def fisher_z_p_values(cls, r: np.ndarray, n: int, num_conditioning: int) -> np.ndarray:
+        """
+        Two-sided p values of Fisher's Z for an array of partial correlations.
+
+        Args:
+            r: the partial correlations.
+            n: the sample size.
+            num_conditioning: the number of conditioning variables.
+        Returns:
+            the p values; NaN where n - 3 - num_conditioning <= 0, as in cal_p_value()
+        """
+        r = np.abs(r)
+        dof = np.asarray(n - 3. - num_conditioning, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            q = 0.5 * (np.log1p(r) - np.log1p(-r))
+            fisher_z = np.sqrt(np.where(dof > 0, dof, np.nan)) * q
+        return 2 * (1.0 - st.norm.cdf(fisher_z))
 
     def get_p_value(self) -> float:
         return self.p
@@ -90,9 +197,9 @@ class IndTestFisherZ(IndependenceTest):
             p-value
         """
 
-        if self.cov_matrix():
+        if self.cov_matrix() is not None:
             r = self._partial_correlation(x, y, z, None)
-            n = self.sample_size()
+            n = self._effective_sample_size([x, y] + list(z))
         else:
             all_vars = list(z)
             all_vars.append(x)
@@ -101,19 +208,30 @@ class IndTestFisherZ(IndependenceTest):
             r = self._get_r(x, y, z, rows)
             n = len(rows)
         self.r = r
+        if n - 3. - len(z) <= 0 or np.isnan(r):
+            self.p = np.nan
+            return self.p
         q = 0.5 * (math.log(1.0 + abs(r)) - math.log(1.0 - abs(r)))
         fisher_z = math.sqrt(n - 3. - len(z)) * q
         self.p = 2 * (1.0 - st.norm.cdf(fisher_z))
         return self.p
 
+    def _effective_sample_size(self, nodes: List[Node]) -> int:
+        if self.pairwise_counts is None:
+            return self.sample_size()
+        indices = [self.indexMap[n] for n in nodes]
+        return int(self.pairwise_counts[np.ix_(indices, indices)].min())
+
     def cov_matrix(self):
         return self.cor
 
     def sample_size(self) -> int:
+        if self.cov_matrix() is None:
+            return self.dataset.get_num_rows()
         return self.cov_matrix().get_sample_size()
 
     def get_variables(self) -> List[Node]:
-        pass
+        return self.variables
 
     def get_variable(self) -> Node:
         pass
@@ -133,16 +251,16 @@ class IndTestFisherZ(IndependenceTest):
         self.alpha = alpha
 
     def get_data(self) -> DataModel:
-        pass
+        return self.dataset
 
     def get_cov(self):
-        pass
+        return self.cor
 
     def get_datasets(self) -> List:
         pass
 
     def get_sample_size(self) -> int:
-        pass
+        return self.sample_size()
 
     def get_cov_matrices(self) -> List[np.ndarray]:
         pass
@@ -173,14 +291,8 @@ class IndTestFisherZ(IndependenceTest):
             nmap[n.get_name()] = n
         return nmap
 
-    def _get_rows(self, allVars: List[Node]) -> list:
-        rows = []
-        for i, r in self.dataset.data.iterrows():
-            for node in allVars:
-                if np.isnan(r[node.get_name()]):
-                    break
-            rows.append(i)
-        return rows
+    def _get_rows(self, allVars: List[Node]) -> np.ndarray:
+        return self.missing_data_index.complete_rows([self.indexMap[n] for n in allVars])
 
     def _get_r(self, x: Node, y: Node, z: List[Node], rows: Optional[List[int]]) -> float:
         try:
@@ -189,15 +301,14 @@ class IndTestFisherZ(IndependenceTest):
             raise ValueError("SingularMatrixException")
 
     def _partial_correlation(self, x: Node, y: Node, z: List[Node], rows: Optional[List[int]]) -> float:
+        if rows is None and self.partial_correlation is not None:
+            return self.partial_correlation.partial_correlation(self.indexMap[x], self.indexMap[y],
+                                                                [self.indexMap[n] for n in z])
         indices = [self.indexMap[x], self.indexMap[y]]
         for n in z:
             indices.append(self.indexMap[n])
-        cor: Optional[DataFrame] = None
-        if self.cor is None:
-            cov = self.get_cov(rows, indices)
-            cor = MatrixUtils.convertCovToCorr(cov)
-        else:
-            cor = self.cor.get_selection(indices, indices)
-        if len(z) == 0:
-            return cor[0, 1]
-        return StatUtils.partialCorrelation(cor)
+        if len(rows) < 2:
+            return np.nan
+        sub = self.missing_data_index.data[np.ix_(rows, indices)]
+        cor = PartialCorrelation(np.cov(sub, rowvar=False), cache_size=0)
+        return cor.partial_correlation(0, 1, list(range(2, len(indices))))
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from graph.Node import Node
 from data.DataModel import DataModel
 import numpy as np
@@ -41,6 +41,53 @@ class IndependenceTest:
         """
         raise NotImplementedError
 
+    def is_independents_batch(self, xs: List[Node], ys: List[Node], zs: List[List[Node]]) -> np.ndarray:
+        """ Return, for each i, whether the independence question xs[i] _||_ ys[i] | zs[i] is judged true.
+        The default implementation asks the questions one at a time; tests that can answer
+        many questions at once should override it.
+
+        :param xs:
+        :param ys:
+        :param zs:
+        :return: a boolean array with one entry per question.
+        """
+        independent = np.empty(len(xs), dtype=bool)
+        for i, (x, y, z) in enumerate(zip(xs, ys, zs)):
+            independent[i] = self.is_independents(x, y, z)
+        return independent
+
+    def get_p_values_batch(self, xs: List[Node], ys: List[Node], zs: List[List[Node]]) -> np.ndarray:
+        """ Return the p values of the independence questions xs[i] _||_ ys[i] | zs[i], in order.
+        The default implementation asks the questions one at a time.
+
+        :param xs:
+        :param ys:
+        :param zs:
+        :return: an array with one p value per question.
+        """
+        p_values = np.empty(len(xs))
+        for i, (x, y, z) in enumerate(zip(xs, ys, zs)):
+            self.is_independents(x, y, z)
+            p_values[i] = self.get_p_value()
+        return p_values
+
+    def is_independents_batch_with_p_values(self, xs: List[Node], ys: List[Node],
+                                            zs: List[List[Node]]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Return, for each i, whether the independence question xs[i] _||_ ys[i] | zs[i] is judged true, and
+        its p value, from one pass over the questions. The default implementation asks the questions one at a time.
+
+        :param xs:
+        :param ys:
+        :param zs:
+        :return: a boolean array and an array of p values, with one entry per question.
+        """
+        independent = np.empty(len(xs), dtype=bool)
+        p_values = np.empty(len(xs))
+        for i, (x, y, z) in enumerate(zip(xs, ys, zs)):
+            independent[i] = self.is_independents(x, y, z)
+            p_values[i] = self.get_p_value()
+        return independent, p_values
+
     def is_dependents(self, x: Node, y: Node, z: List[Node]) -> bool:
         """ Return true if the given independence question is judged false, true if not.
         The independence question is of the form x _||_ y | z, z = <z1,...,zn>,
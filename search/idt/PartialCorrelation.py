@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from typing import Sequence, Tuple
+
+import numpy as np
+from scipy.linalg import solve_triangular
+
+from data.ICovarianceMatrix import ICovarianceMatrix
+
+
+class PartialCorrelation:
+    """
+    Computes partial correlations r(x, y | Z) from a fixed covariance matrix.
+
+    The matrix is standardized once to a contiguous float64 correlation matrix. For a conditioning set Z,
+    r(x, y | Z) is read off the 2 x 2 residual matrix C[xy, xy] - C[xy, Z] C[Z, Z]^-1 C[Z, xy], which is
+    computed from the Cholesky factor of C[Z, Z]. Factors are cached per (sorted) conditioning set, so the
+    many tests of an adjacency search that share a Z reuse a single factorization.
+    """
+
+    def __init__(self, matrix: np.ndarray, cache_size: int = 10000, copy: bool = True):
+        """
+        :param matrix: a covariance or correlation matrix, indexed like the variables of the test.
+        :param cache_size: the maximum number of conditioning set factorizations kept in memory.
+        :param copy: if False, matrix must already be a C-contiguous float64 correlation matrix and is used
+            as is (e.g. a view over shared memory).
+        """
+        if copy:
+            m = np.array(matrix, dtype=np.float64, order="C")
+        else:
+            m = matrix
+        if m.ndim != 2 or m.shape[0] != m.shape[1]:
+            raise ValueError("Matrix must be square.")
+        if cache_size < 0:
+            raise ValueError(f"Cache size must be >= 0: {cache_size}")
+        if copy:
+            sd = np.sqrt(np.diag(m))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                m /= np.outer(sd, sd)
+        self.matrix = m
+        self.cache_size = cache_size
+        self._factors: "OrderedDict[Tuple[int, ...], np.ndarray]" = OrderedDict()
+
+    @classmethod
+    def from_covariance_matrix(cls, cov: ICovarianceMatrix, cache_size: int = 10000):
+        return cls(np.asarray(cov.get_matrix(), dtype=np.float64), cache_size)
+
+    def get_matrix(self) -> np.ndarray:
+        """
+        return the correlation matrix used by this engine.
+        """
+        return self.matrix
+
+    def get_size(self) -> int:
+        return self.matrix.shape[0]
+
+    def partial_correlation(self, x: int, y: int, z: Sequence[int]) -> float:
+        """ Calculates the partial correlation of x and y given z.
+
+        :param x: the index of the 1st variable.
+        :param y: the index of the 2nd variable.
+        :param z: the indices of the conditioning variables.
+        :return: r(x, y | z); NaN if the submatrix of z is singular, as in partial_correlations().
+        """
+        if len(z) == 0:
+            return float(self.matrix[x, y])
+        key = tuple(sorted(z))
+        try:
+            factor = self._factor(key)
+        except ValueError:
+            return np.nan
+        xy = [x, y]
+        w = solve_triangular(factor, self.matrix[np.ix_(key, xy)], lower=True, check_finite=False)
+        resid = self.matrix[np.ix_(xy, xy)] - w.T @ w
+        return float(resid[0, 1] / np.sqrt(resid[0, 0] * resid[1, 1]))
+
+    def partial_correlations(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+        """ Calculates r(x[i], y[i] | z[i]) for a batch of questions sharing the same number of
+        conditioning variables, by inverting all (|Z| + 2)-dimensional submatrices at once.
+
+        :param x: the indices of the 1st variables, shape (k,).
+        :param y: the indices of the 2nd variables, shape (k,).
+        :param z: the indices of the conditioning variables, shape (k, |Z|).
+        :return: an array of k partial correlations; NaN where the submatrix is singular.
+        """
+        x = np.asarray(x, dtype=np.intp)
+        y = np.asarray(y, dtype=np.intp)
+        z = np.asarray(z, dtype=np.intp).reshape(len(x), -1)
+        if z.shape[1] == 0:
+            return self.matrix[x, y]
+        idx = np.column_stack((x, y, z))
+        sub = self.matrix[idx[:, :, None], idx[:, None, :]]
+        try:
+            precision = np.linalg.inv(sub)
+        except np.linalg.LinAlgError:
+            precision = np.full_like(sub, np.nan)
+            for i in range(len(sub)):
+                try:
+                    precision[i] = np.linalg.inv(sub[i])
+                except np.linalg.LinAlgError:
+                    pass
+        return -precision[:, 0, 1] / np.sqrt(precision[:, 0, 0] * precision[:, 1, 1])
+
+    def clear_cache(self):
+        self._factors.clear()
+
+    def _factor(self, key: Tuple[int, ...]) -> np.ndarray:
+        factor = self._factors.get(key)
+        if factor is not None:
+            self._factors.move_to_end(key)
+            return factor
+        try:
+            factor = np.linalg.cholesky(self.matrix[np.ix_(key, key)])
+        except np.linalg.LinAlgError:
+            raise ValueError(f"Singular matrix for conditioning set {list(key)}")
+        if self.cache_size > 0:
+            self._factors[key] = factor
+            if len(self._factors) > self.cache_size:
+                self._factors.popitem(last=False)
+        return factor
@@ -1,5 +1,168 @@
+from typing import Sequence, Tuple, Optional
+
+import numpy as np
+import scipy.stats as st
+
+from data.DataSet import DataSet
+from data.DataUtils import DataUtils
+from search.idt.test.ContingencyTableCache import ContingencyTableCache
+
+
 class ChiSquareTest:
     """
     Calculates marginal chi square test results for a discrete dataset.
+
+    Every column is integer-encoded once (see DataUtils.discrete_codes). For a question x _||_ y | Z the
+    rows complete for x, y and Z are given one mixed-radix key (stratum of Z, x, y), and a single np.bincount
+    over these keys gives the x by y table of every stratum at once, as an array of shape (strata, |x|, |y|).
+    Expected counts, the statistic and the degrees of freedom are then computed over all strata in vectorized
+    form. Degrees of freedom are summed over the strata as in Fienberg, The Analysis of Cross-Classified
+    Categorical Data, 2nd Edition, 142, counting only the rows and columns of a stratum that are not empty.
+
+    Strata keys are renumbered to the strata that occur in the data whenever the product of the numbers of
+    categories would give more possible keys than MAX_CELLS, so the tables never have more than
+    (number of rows) x |x| x |y| cells.
+
+    With table_cache_bytes > 0, the tables of sets of variables small enough to be kept dense are read from a
+    ContingencyTableCache of that size instead.
     """
-    pass
+
+    MAX_CELLS = 1 << 22
+
+    def __init__(self, dataset: DataSet, alpha: float = 0.05, table_cache_bytes: int = 0):
+        if alpha < 0 or alpha > 1:
+            raise ValueError(f"Significance out of range: {alpha}")
+        self.alpha = alpha
+        self.codes, self.num_categories = DataUtils.discrete_codes(dataset)
+        self.num_rows = self.codes.shape[0]
+        self.missing = (self.codes < 0).any(axis=0)
+        self.table_cache: Optional[ContingencyTableCache] = None
+        if table_cache_bytes > 0:
+            self.table_cache = ContingencyTableCache(self.codes, self.num_categories, table_cache_bytes)
+
+    def get_alpha(self) -> float:
+        return self.alpha
+
+    def set_alpha(self, alpha: float):
+        if alpha < 0 or alpha > 1:
+            raise ValueError(f"Significance out of range: {alpha}")
+        self.alpha = alpha
+
+    def get_num_categories(self) -> np.ndarray:
+        return self.num_categories
+
+    def get_codes(self) -> np.ndarray:
+        return self.codes
+
+    def get_table_cache(self) -> Optional[ContingencyTableCache]:
+        return self.table_cache
+
+    def _cached(self, variables: Sequence[int]) -> bool:
+        return self.table_cache is not None and self.table_cache.can_cache(variables)
+
+    def _complete_rows(self, variables: Sequence[int]) -> Optional[np.ndarray]:
+        """ return the rows where all the given variables are observed, or None if that is every row.
+
+        """
+        variables = [v for v in variables if self.missing[v]]
+        if not variables:
+            return None
+        return np.flatnonzero((self.codes[:, variables] >= 0).all(axis=1))
+
+    def _column(self, v: int, rows: Optional[np.ndarray]) -> np.ndarray:
+        column = self.codes[:, v]
+        return column if rows is None else column[rows]
+
+    def strata(self, z: Sequence[int], rows: Optional[np.ndarray] = None, cells_per_stratum: int = 1) \
+            -> Tuple[np.ndarray, int]:
+        """ Numbers the combinations of values of the variables z in the given rows.
+
+        :param z: the indices of the conditioning variables.
+        :param rows: the rows to use; all rows if None.
+        :param cells_per_stratum: the number of cells each stratum will be split into by the caller, used to
+            keep the number of possible keys below MAX_CELLS.
+        :return: the stratum of each row, and the number of strata (an upper bound on the largest stratum + 1).
+        """
+        num = self.num_rows if rows is None else len(rows)
+        key = np.zeros(num, dtype=np.int64)
+        num_strata = 1
+        for v in z:
+            c = int(self.num_categories[v])
+            if num_strata * c * cells_per_stratum > ChiSquareTest.MAX_CELLS and num_strata > 1:
+                _, key = np.unique(key, return_inverse=True)
+                key = key.astype(np.int64, copy=False)
+                num_strata = int(key.max()) + 1 if num else 1
+            key *= c
+            key += self._column(v, rows)
+            num_strata *= c
+        if num_strata * cells_per_stratum > ChiSquareTest.MAX_CELLS and num_strata > 1:
+            _, key = np.unique(key, return_inverse=True)
+            key = key.astype(np.int64, copy=False)
+            num_strata = int(key.max()) + 1 if num else 1
+        return key, num_strata
+
+    def counts(self, x: int, y: int, z: Sequence[int]) -> np.ndarray:
+        """ Counts the cases of each combination of values of x and y in each stratum of z, over the rows where
+        x, y and z are all observed.
+
+        :return: an array of shape (strata, |x|, |y|); strata with no cases are dropped.
+        """
+        cx = int(self.num_categories[x])
+        cy = int(self.num_categories[y])
+        variables = list(z) + [x, y]
+        if self._cached(variables):
+            table = self.table_cache.table(variables).reshape(-1, cx, cy)
+        else:
+            rows = self._complete_rows(variables)
+            key, num_strata = self.strata(z, rows, cx * cy)
+            key *= cx
+            key += self._column(x, rows)
+            key *= cy
+            key += self._column(y, rows)
+            table = np.bincount(key, minlength=num_strata * cx * cy).reshape(num_strata, cx, cy)
+        return table[table.sum(axis=(1, 2)) > 0]
+
+    def statistic(self, observed: np.ndarray, expected: np.ndarray) -> float:
+        """ The chi square statistic summed over all cells with a positive expected count.
+
+        """
+        cells = expected > 0
+        return float((np.square(observed[cells] - expected[cells]) / expected[cells]).sum())
+
+    def calc(self, x: int, y: int, z: Sequence[int]) -> Tuple[float, int, float]:
+        """ Tests x _||_ y | z, for variables given by their column indices.
+
+        :return: the statistic, the degrees of freedom and the p value.
+        """
+        observed = self.counts(x, y, z).astype(np.float64)
+        if len(observed) == 0:
+            return 0., 0, 1.
+        row_sums = observed.sum(axis=2)
+        column_sums = observed.sum(axis=1)
+        totals = row_sums.sum(axis=1)
+        expected = row_sums[:, :, None] * column_sums[:, None, :] / totals[:, None, None]
+        statistic = self.statistic(observed, expected)
+        dof = int((np.maximum((row_sums > 0).sum(axis=1) - 1, 0) *
+                   np.maximum((column_sums > 0).sum(axis=1) - 1, 0)).sum())
+        if dof == 0:
+            # Every stratum has a single row or column of values: there is no evidence of dependence.
+            return statistic, dof, 1.
+        return statistic, dof, float(st.chi2.sf(statistic, dof))
+
+    def is_independent(self, x: int, y: int, z: Sequence[int]) -> bool:
+        return self.calc(x, y, z)[2] > self.alpha
+
+    def determines(self, z: Sequence[int], y: int) -> bool:
+        """ return true if, in the rows where z and y are observed, each combination of values of z occurs with
+        only one value of y.
+
+        """
+        cy = int(self.num_categories[y])
+        variables = list(z) + [y]
+        if self._cached(variables):
+            table = self.table_cache.table(variables).reshape(-1, cy)
+        else:
+            rows = self._complete_rows(variables)
+            key, num_strata = self.strata(z, rows, cy)
+            table = np.bincount(key * cy + self._column(y, rows), minlength=num_strata * cy).reshape(num_strata, cy)
+        return bool(((table > 0).sum(axis=1) <= 1).all())
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from typing import Sequence, Tuple, Dict, Set, Optional
+
+import numpy as np
+
+# The key of a cached table: the sorted indices of its variables.
+TableKey = Tuple[int, ...]
+
+
+class ContingencyTableCache:
+    """
+    Caches the full contingency tables of sets of discrete variables, so that the tests of an adjacency search
+    that involve the same variables do not count the data again.
+
+    A table is kept once per set of variables, whatever their roles: x _||_ y | {z} and x _||_ z | {y} are
+    answered from the same table of (x, y, z). A table that is not cached is derived, when possible, by summing
+    a cached table over a superset of its variables; this is exact only when the summed out variables have no
+    missing values (each table counts the rows complete for its own variables), so only such supersets are used.
+    Otherwise the table is counted from the data with one np.bincount.
+
+    Tables are dense arrays, so only tables of at most max_cells cells are cached. The cache holds at most
+    max_bytes of tables, evicting the least recently used tables first. Exact hits, derived tables, misses and
+    evictions are counted.
+    """
+
+    def __init__(self, codes: np.ndarray, num_categories: np.ndarray, max_bytes: int = 256 << 20,
+                 max_cells: int = 1 << 20):
+        """
+        :param codes: the rows x variables matrix of category codes, -1 for missing values.
+        :param num_categories: the number of categories of each variable.
+        :param max_bytes: the largest total size of the cached tables.
+        :param max_cells: the largest number of cells of a cached table.
+        """
+        if max_bytes < 1:
+            raise ValueError(f"The cache size must be >= 1 byte: {max_bytes}")
+        self.codes = codes
+        self.num_categories = np.asarray(num_categories, dtype=np.int64)
+        self.num_rows = codes.shape[0]
+        self.missing = (codes < 0).any(axis=0)
+        self.dtype = np.uint32 if self.num_rows < (1 << 32) else np.uint64
+        self.max_bytes = max_bytes
+        self.max_cells = min(max_cells, max_bytes // np.dtype(self.dtype).itemsize)
+        self.tables: "OrderedDict[TableKey, np.ndarray]" = OrderedDict()
+        # variable -> the keys of the cached tables that include it
+        self.including: Dict[int, Set[TableKey]] = {}
+        self.num_bytes = 0
+        self.hits = 0
+        self.derived = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def num_cells(self, variables: Sequence[int]) -> int:
+        return int(np.prod(self.num_categories[list(variables)]))
+
+    def can_cache(self, variables: Sequence[int]) -> bool:
+        """
+        true if the table of these (distinct) variables is small enough to be cached.
+        """
+        return len(set(variables)) == len(variables) and self.num_cells(variables) <= self.max_cells
+
+    def table(self, variables: Sequence[int]) -> np.ndarray:
+        """
+        return the table of counts of the given variables, with one axis per variable in the given order,
+        over the rows where they are all observed. The table must not be modified.
+        """
+        if not self.can_cache(variables):
+            raise ValueError(f"Table over {list(variables)} is too large to cache.")
+        key = tuple(sorted(variables))
+        table = self.tables.get(key)
+        if table is not None:
+            self.hits += 1
+            self.tables.move_to_end(key)
+        else:
+            table = self._derive(key)
+            if table is not None:
+                self.derived += 1
+            else:
+                self.misses += 1
+                table = self._count(key)
+            self._put(key, table)
+        order = [key.index(v) for v in variables]
+        return table.transpose(order)
+
+    def _derive(self, key: TableKey) -> Optional[np.ndarray]:
+        """ Sums the smallest cached table over a superset of key whose other variables have no missing values.
+
+        """
+        if not key:
+            return None
+        candidates = min((self.including.get(v, set()) for v in key), key=len)
+        best: Optional[TableKey] = None
+        for other in candidates:
+            if len(other) > len(key) and set(key).issubset(other) and \
+                    not any(self.missing[v] for v in other if v not in key) and \
+                    (best is None or self.tables[other].size < self.tables[best].size):
+                best = other
+        if best is None:
+            return None
+        self.tables.move_to_end(best)
+        axes = tuple(i for i, v in enumerate(best) if v not in key)
+        return self.tables[best].sum(axis=axes, dtype=self.dtype)
+
+    def _count(self, key: TableKey) -> np.ndarray:
+        columns = list(key)
+        shape = tuple(int(c) for c in self.num_categories[columns])
+        if not columns:
+            return np.array(self.num_rows, dtype=self.dtype)
+        observed = [v for v in columns if self.missing[v]]
+        rows = np.flatnonzero((self.codes[:, observed] >= 0).all(axis=1)) if observed else None
+        index = np.zeros(self.num_rows if rows is None else len(rows), dtype=np.int64)
+        for v, c in zip(columns, shape):
+            index *= c
+            index += self.codes[:, v] if rows is None else self.codes[rows, v]
+        counts = np.bincount(index, minlength=int(np.prod(shape)))
+        return counts.astype(self.dtype).reshape(shape)
+
+    def _put(self, key: TableKey, table: np.ndarray):
+        if table.nbytes > self.max_bytes:
+            return
+        self.tables[key] = table
+        self.num_bytes += table.nbytes
+        for v in key:
+            self.including.setdefault(v, set()).add(key)
+        while self.num_bytes > self.max_bytes:
+            old_key, old = self.tables.popitem(last=False)
+            self.num_bytes -= old.nbytes
+            for v in old_key:
+                self.including[v].discard(old_key)
+            self.evictions += 1
+
+    def clear(self):
+        self.tables.clear()
+        self.including.clear()
+        self.num_bytes = 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        return the numbers of hits, derived tables, misses and evictions so far, and the number and total size
+        in bytes of the cached tables.
+        """
+        return {"hits": self.hits, "derived": self.derived, "misses": self.misses, "evictions": self.evictions,
+                "tables": len(self.tables), "bytes": self.num_bytes}
+
+    def get_hit_rate(self) -> float:
+        """
+        return the fraction of tables answered without counting the data.
+        """
+        total = self.hits + self.derived + self.misses
+        return (self.hits + self.derived) / total if total > 0 else 0.
+
+    def reset_stats(self):
+        self.hits = 0
+        self.derived = 0
+        self.misses = 0
+        self.evictions = 0
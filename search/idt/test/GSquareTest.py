@@ -1,3 +1,5 @@
+import numpy as np
+
 from search.idt.test.ChiSquareTest import ChiSquareTest
 
 
@@ -7,4 +9,10 @@ class GSquareTest(ChiSquareTest):
     Degrees of freedom are calculated as in Fienberg,
     The Analysis of Cross-Classified Categorical Data, 2nd Edition, 142.
     """
-    pass
+
+    def statistic(self, observed: np.ndarray, expected: np.ndarray) -> float:
+        """ The G square statistic, 2 sum O ln(O / E), summed over all cells with a positive observed count.
+
+        """
+        cells = observed > 0
+        return float(2 * (observed[cells] * np.log(observed[cells] / expected[cells])).sum())